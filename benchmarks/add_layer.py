@@ -0,0 +1,139 @@
+"""
+Benchmark for the preprocessing stages of `ChunkedGraph.add_layer` on
+synthetic layer 3..N chunks: the former counter loop deduplication and
+set based cross chunk edge resolution vs. `get_latest_duplicate_mask` and
+`resolve_cross_chunk_edges`.
+
+    python benchmarks/add_layer.py
+"""
+
+import collections
+import time
+
+import numpy as np
+
+from pychunkedgraph.backend.chunkedgraph_utils import (
+    get_latest_duplicate_mask,
+    resolve_cross_chunk_edges,
+)
+
+
+def make_layer_chunk(n_nodes, n_cross_edges_per_node=4, n_svs_per_node=20,
+                     duplicate_fraction=0.01, seed=0):
+    """ Nodes of the child chunks of a chunk in one layer
+
+    Every node owns `n_svs_per_node` supervoxels, its atomic cross chunk
+    edges point to supervoxels of random other nodes (both directions are
+    stored) or of nodes outside the chunk. A fraction of nodes exists twice,
+    as after a restarted job.
+
+    :return: dict
+        "segment_ids", "row_ids", "max_child_ids": one entry per node row
+        "cross_edge_node_ids", "atomic_cross_edges": flat cross edges of the
+        rows that are kept
+    """
+    rng = np.random.RandomState(seed)
+    node_ids = np.arange(1, n_nodes + 1, dtype=np.uint64) + np.uint64(1 << 40)
+    sv_ids = (np.arange(n_nodes * n_svs_per_node, dtype=np.uint64)
+              + np.uint64(1 << 20)).reshape(n_nodes, n_svs_per_node)
+
+    n_edges = n_nodes * n_cross_edges_per_node // 2
+    node_a = rng.randint(0, n_nodes, n_edges)
+    node_b = rng.randint(0, n_nodes, n_edges)
+    sv_a = sv_ids[node_a, rng.randint(0, n_svs_per_node, n_edges)]
+    sv_b = sv_ids[node_b, rng.randint(0, n_svs_per_node, n_edges)]
+    # Partners outside of the chunk
+    outside = rng.rand(n_edges) < 0.1
+    sv_b[outside] += np.uint64(1 << 36)
+
+    cross_edge_node_ids = np.concatenate([node_ids[node_a], node_ids[node_b[~outside]]])
+    atomic_cross_edges = np.concatenate([np.stack([sv_a, sv_b], axis=1),
+                                         np.stack([sv_b, sv_a], axis=1)[~outside]])
+
+    n_duplicates = int(n_nodes * duplicate_fraction)
+    duplicate_idx = rng.choice(n_nodes, n_duplicates, replace=False)
+    segment_ids = np.concatenate([np.arange(n_duplicates, n_nodes + n_duplicates),
+                                  np.arange(n_duplicates)]).astype(np.uint64)
+    row_ids = np.concatenate([node_ids, node_ids[duplicate_idx] + np.uint64(1 << 30)])
+    max_child_ids = np.concatenate([sv_ids[:, -1], sv_ids[duplicate_idx, -1]])
+
+    return {"segment_ids": segment_ids, "row_ids": row_ids,
+            "max_child_ids": max_child_ids,
+            "cross_edge_node_ids": cross_edge_node_ids,
+            "atomic_cross_edges": atomic_cross_edges}
+
+
+def deduplicate_old(segment_ids, row_ids, max_child_ids):
+    """ Former duplicate filter in `add_layer._read_subchunks_thread` """
+    sorting = np.argsort(segment_ids)[::-1]
+    row_ids = row_ids[sorting]
+    max_child_ids = max_child_ids[sorting]
+
+    counter = collections.defaultdict(int)
+    max_child_ids_occ_so_far = np.zeros(len(max_child_ids), dtype=np.int)
+    for i_row in range(len(max_child_ids)):
+        max_child_ids_occ_so_far[i_row] = counter[max_child_ids[i_row]]
+        counter[max_child_ids[i_row]] += 1
+
+    m = max_child_ids_occ_so_far == 0
+    return row_ids[m]
+
+
+def resolve_cross_chunk_edges_old(cross_edge_node_ids, atomic_cross_edges):
+    """ Former `add_layer._resolve_cross_chunk_edges_thread` (single job)
+    including the construction of its dictionaries """
+    atomic_partner_id_dict = collections.defaultdict(list)
+    atomic_child_id_dict_pairs = []
+    for node_id, edge in zip(cross_edge_node_ids, atomic_cross_edges):
+        atomic_partner_id_dict[node_id].append(edge[1])
+        atomic_child_id_dict_pairs.append((edge[0], node_id))
+    atomic_child_id_dict = collections.defaultdict(np.uint64,
+                                                   dict(atomic_child_id_dict_pairs))
+
+    edge_ids = []
+    for child_key, this_atomic_partner_ids in atomic_partner_id_dict.items():
+        partners = {
+            atomic_child_id_dict[atomic_cross_id]
+            for atomic_cross_id in this_atomic_partner_ids
+            if atomic_child_id_dict[atomic_cross_id] != 0
+        }
+
+        if len(partners) > 0:
+            partners = np.array(list(partners), dtype=np.uint64)[:, None]
+            this_ids = np.array([child_key] * len(partners), dtype=np.uint64)[:, None]
+            edge_ids.extend(np.concatenate([this_ids, partners], axis=1))
+    return np.array(edge_ids, dtype=np.uint64).reshape(-1, 2)
+
+
+def _time(func, *args, n_repeats=3):
+    timings = []
+    for _ in range(n_repeats):
+        time_start = time.time()
+        result = func(*args)
+        timings.append(time.time() - time_start)
+    return np.min(timings), result
+
+
+def run_timings(layers=range(3, 9), n_nodes_layer_3=5000, max_nodes=200000):
+    """ Prints timings of both versions, nodes per chunk double with every
+    layer (up to `max_nodes`) """
+    print("layer  nodes    dedup old/new (s)   cross edges old/new (s)")
+    for layer in layers:
+        n_nodes = min(n_nodes_layer_3 * 2 ** (layer - 3), max_nodes)
+        chunk = make_layer_chunk(n_nodes, seed=layer)
+
+        dedup_old, _ = _time(deduplicate_old, chunk["segment_ids"],
+                             chunk["row_ids"], chunk["max_child_ids"])
+        dedup_new, _ = _time(get_latest_duplicate_mask, chunk["segment_ids"],
+                             chunk["max_child_ids"])
+        cross_old, _ = _time(resolve_cross_chunk_edges_old,
+                             chunk["cross_edge_node_ids"], chunk["atomic_cross_edges"])
+        cross_new, _ = _time(resolve_cross_chunk_edges,
+                             chunk["cross_edge_node_ids"], chunk["atomic_cross_edges"])
+
+        print("%5d  %7d  %7.4f / %7.4f   %7.4f / %7.4f" % (
+            layer, n_nodes, dedup_old, dedup_new, cross_old, cross_new))
+
+
+if __name__ == "__main__":
+    run_timings()
@@ -0,0 +1,203 @@
+"""
+Benchmark for collecting the edges of every supervoxel in
+`ChunkedGraph.add_atomic_edges_in_chunks` on synthetic chunks: the former
+per supervoxel lookups (pandas index groups, masks and concatenations) vs.
+the slices of `group_edges_by_supervoxel`.
+
+    python benchmarks/atomic_rows.py
+"""
+
+import time
+
+import numpy as np
+
+from pychunkedgraph.backend.chunkedgraph_utils import (
+    compute_indices_pandas,
+    group_edges_by_supervoxel,
+)
+
+_IN_CHUNK = np.uint64(1 << 56 | 1 << 40)
+_OTHER_CHUNK = np.uint64(1 << 56 | 2 << 40)
+
+
+def make_chunk_edges(n_svs, n_edges_per_sv=6, between_fraction=0.1,
+                     disconnected_fraction=0.3, seed=0):
+    """ Edge dictionaries of a chunk as passed to `add_atomic_edges_in_chunks`
+
+    :return: edge_id_dict, edge_aff_dict, edge_area_dict, node_ids
+    """
+    rng = np.random.RandomState(seed)
+    node_ids = np.arange(1, n_svs + 1, dtype=np.uint64) | _IN_CHUNK
+
+    def _edges(n, between):
+        edges = node_ids[rng.randint(0, n_svs, (n, 2))]
+        if between:
+            edges[:, 1] = rng.randint(1, n_svs, n).astype(np.uint64) | _OTHER_CHUNK
+        return edges
+
+    n_edges = n_svs * n_edges_per_sv // 2
+    n_between = int(n_edges * between_fraction)
+    n_in = n_edges - n_between
+    sizes = {
+        "in_connected": int(n_in * (1 - disconnected_fraction)),
+        "in_disconnected": int(n_in * disconnected_fraction),
+        "between_connected": int(n_between * (1 - disconnected_fraction)) // 2,
+        "between_disconnected": int(n_between * disconnected_fraction),
+        "cross": int(n_between * (1 - disconnected_fraction)) // 2,
+    }
+    edge_id_dict = {k: _edges(n, k not in ["in_connected", "in_disconnected"])
+                    for k, n in sizes.items()}
+    edge_aff_dict = {k: rng.rand(n).astype(np.float32)
+                     for k, n in sizes.items() if k != "cross"}
+    edge_area_dict = {k: rng.randint(1, 1000, n).astype(np.uint64)
+                      for k, n in sizes.items() if k != "cross"}
+    return edge_id_dict, edge_aff_dict, edge_area_dict, node_ids
+
+
+def extract_node_edges_old(edge_id_dict, edge_aff_dict, edge_area_dict, node_ids):
+    """ Former per supervoxel edge extraction of `add_atomic_edges_in_chunks`
+
+    :return: dict
+        node id -> (partners, affinities, areas, n_connected, parent cross edges)
+    """
+    sparse_indices = {}
+    remapping = {}
+    for k in edge_id_dict.keys():
+        u_ids, inv_ids = np.unique(edge_id_dict[k], return_inverse=True)
+        mapped_ids = np.arange(len(u_ids), dtype=np.int32)
+        remapped_arr = mapped_ids[inv_ids].reshape(edge_id_dict[k].shape)
+
+        sparse_indices[k] = compute_indices_pandas(remapped_arr)
+        remapping[k] = dict(zip(u_ids, mapped_ids))
+
+    node_edges = {}
+    for node_id in node_ids:
+        parent_cross_edges = np.array([], dtype=np.uint64).reshape(0, 2)
+
+        if node_id in remapping["in_connected"]:
+            row_ids, column_ids = sparse_indices["in_connected"][
+                remapping["in_connected"][node_id]]
+            inv_column_ids = (column_ids + 1) % 2
+            connected_ids = edge_id_dict["in_connected"][row_ids, inv_column_ids]
+            connected_affs = edge_aff_dict["in_connected"][row_ids]
+            connected_areas = edge_area_dict["in_connected"][row_ids]
+        else:
+            connected_ids = np.array([], dtype=np.uint64)
+            connected_affs = np.array([], dtype=np.float32)
+            connected_areas = np.array([], dtype=np.uint64)
+
+        if node_id in remapping["in_disconnected"]:
+            row_ids, column_ids = sparse_indices["in_disconnected"][
+                remapping["in_disconnected"][node_id]]
+            inv_column_ids = (column_ids + 1) % 2
+            disconnected_ids = edge_id_dict["in_disconnected"][row_ids, inv_column_ids]
+            disconnected_affs = edge_aff_dict["in_disconnected"][row_ids]
+            disconnected_areas = edge_area_dict["in_disconnected"][row_ids]
+        else:
+            disconnected_ids = np.array([], dtype=np.uint64)
+            disconnected_affs = np.array([], dtype=np.float32)
+            disconnected_areas = np.array([], dtype=np.uint64)
+
+        if node_id in remapping["between_connected"]:
+            row_ids, column_ids = sparse_indices["between_connected"][
+                remapping["between_connected"][node_id]]
+            row_ids = row_ids[column_ids == 0]
+            column_ids = column_ids[column_ids == 0]
+            inv_column_ids = (column_ids + 1) % 2
+            connected_ids = np.concatenate(
+                [connected_ids, edge_id_dict["between_connected"][row_ids, inv_column_ids]])
+            connected_affs = np.concatenate(
+                [connected_affs, edge_aff_dict["between_connected"][row_ids]])
+            connected_areas = np.concatenate(
+                [connected_areas, edge_area_dict["between_connected"][row_ids]])
+            parent_cross_edges = np.concatenate(
+                [parent_cross_edges, edge_id_dict["between_connected"][row_ids]])
+
+        if node_id in remapping["between_disconnected"]:
+            row_ids, column_ids = sparse_indices["between_disconnected"][
+                remapping["between_disconnected"][node_id]]
+            row_ids = row_ids[column_ids == 0]
+            column_ids = column_ids[column_ids == 0]
+            inv_column_ids = (column_ids + 1) % 2
+            disconnected_ids = np.concatenate(
+                [disconnected_ids,
+                 edge_id_dict["between_disconnected"][row_ids, inv_column_ids]])
+            disconnected_affs = np.concatenate(
+                [disconnected_affs, edge_aff_dict["between_disconnected"][row_ids]])
+            disconnected_areas = np.concatenate(
+                [disconnected_areas, edge_area_dict["between_disconnected"][row_ids]])
+
+        if node_id in remapping["cross"]:
+            row_ids, column_ids = sparse_indices["cross"][remapping["cross"][node_id]]
+            row_ids = row_ids[column_ids == 0]
+            column_ids = column_ids[column_ids == 0]
+            inv_column_ids = (column_ids + 1) % 2
+            connected_ids = np.concatenate(
+                [connected_ids, edge_id_dict["cross"][row_ids, inv_column_ids]])
+            connected_affs = np.concatenate(
+                [connected_affs, np.full((len(row_ids)), np.inf, dtype=np.float32)])
+            connected_areas = np.concatenate(
+                [connected_areas, np.ones((len(row_ids)), dtype=np.uint64)])
+            parent_cross_edges = np.concatenate(
+                [parent_cross_edges, edge_id_dict["cross"][row_ids]])
+
+        node_edges[node_id] = (
+            np.concatenate([connected_ids, disconnected_ids]),
+            np.concatenate([connected_affs, disconnected_affs]),
+            np.concatenate([connected_areas, disconnected_areas]),
+            len(connected_ids),
+            parent_cross_edges,
+        )
+    return node_edges
+
+
+def extract_node_edges(edge_id_dict, edge_aff_dict, edge_area_dict, node_ids):
+    """ Same as `extract_node_edges_old` from `group_edges_by_supervoxel` """
+    grouped_edges = group_edges_by_supervoxel(edge_id_dict, edge_aff_dict,
+                                              edge_area_dict)
+    idx = np.searchsorted(grouped_edges["node_ids"], node_ids)
+    cross_starts = np.searchsorted(grouped_edges["parent_cross_node_ids"], node_ids,
+                                   side="left")
+    cross_ends = np.searchsorted(grouped_edges["parent_cross_node_ids"], node_ids,
+                                 side="right")
+
+    node_edges = {}
+    for i_node, node_id in enumerate(node_ids):
+        if idx[i_node] < len(grouped_edges["node_ids"]) and \
+                grouped_edges["node_ids"][idx[i_node]] == node_id:
+            start = grouped_edges["offsets"][idx[i_node]]
+            end = grouped_edges["offsets"][idx[i_node] + 1]
+            n_connected = grouped_edges["n_connected"][idx[i_node]]
+        else:
+            start, end, n_connected = 0, 0, 0
+
+        node_edges[node_id] = (
+            grouped_edges["partners"][start:end],
+            grouped_edges["affinities"][start:end],
+            grouped_edges["areas"][start:end],
+            n_connected,
+            grouped_edges["parent_cross_edges"][cross_starts[i_node]: cross_ends[i_node]],
+        )
+    return node_edges
+
+
+def run_timings(n_svs_list=(10000, 30000, 100000)):
+    """ Prints timings of both versions """
+    print("supervoxels   old (s)   new (s)")
+    for n_svs in n_svs_list:
+        edge_id_dict, edge_aff_dict, edge_area_dict, node_ids = \
+            make_chunk_edges(n_svs)
+
+        time_start = time.time()
+        extract_node_edges_old(edge_id_dict, edge_aff_dict, edge_area_dict, node_ids)
+        dt_old = time.time() - time_start
+
+        time_start = time.time()
+        extract_node_edges(edge_id_dict, edge_aff_dict, edge_area_dict, node_ids)
+        dt_new = time.time() - time_start
+
+        print("%11d  %8.3f  %8.3f" % (n_svs, dt_old, dt_new))
+
+
+if __name__ == "__main__":
+    run_timings()
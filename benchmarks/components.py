@@ -0,0 +1,64 @@
+"""
+Benchmark for decoding connected components files of atomic chunks: the
+former per component loop building a dict vs. the vectorized
+`io.components.deserialize`.
+
+    python benchmarks/components.py
+"""
+
+import time
+
+import numpy as np
+
+from pychunkedgraph.backend.utils import basetypes
+from pychunkedgraph.io.components import deserialize, serialize
+
+
+def make_components(n_svs, mean_component_size=4, seed=0):
+    """ Components of a chunk, about a third of them single supervoxels
+
+    :return: list of np.ndarray
+    """
+    rng = np.random.RandomState(seed)
+    sv_ids = rng.permutation(n_svs).astype(basetypes.NODE_ID) + np.uint64(1 << 50)
+    sizes = rng.geometric(1 / mean_component_size, n_svs)
+    ends = np.cumsum(sizes)
+    ends = ends[ends < n_svs]
+    return np.split(sv_ids, ends)
+
+
+def deserialize_old(components_message):
+    """ Former `io.components.deserialize` """
+    mapping = {}
+    components = np.array(components_message.components, basetypes.NODE_ID)
+    idx = 0
+    n_components = 0
+    while idx < components.size:
+        component_size = int(components[idx])
+        start = idx + 1
+        component = components[start : start + component_size]
+        mapping.update(dict(zip(component, [n_components] * component_size)))
+        idx += component_size + 1
+        n_components += 1
+    return mapping
+
+
+def run_timings(n_svs_list=(10000, 100000, 1000000)):
+    """ Prints timings of both versions """
+    print("supervoxels   old (s)   new (s)")
+    for n_svs in n_svs_list:
+        components_message = serialize(make_components(n_svs))
+
+        time_start = time.time()
+        deserialize_old(components_message)
+        dt_old = time.time() - time_start
+
+        time_start = time.time()
+        deserialize(components_message)
+        dt_new = time.time() - time_start
+
+        print("%11d  %8.3f  %8.3f" % (n_svs, dt_old, dt_new))
+
+
+if __name__ == "__main__":
+    run_timings()
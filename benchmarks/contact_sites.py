@@ -0,0 +1,329 @@
+"""
+Benchmarks for contact sites on synthetic neurons running next to each
+other through a row of chunks:
+
+- `contact_sites.get_contact_sites`: the former implementation (separate
+  node and edge traversals, dict based area lookups, components per
+  representative) vs. the single traversal.
+- `contact_sites.get_contact_sites_multi` vs. `get_contact_sites_pairwise`
+  on every pair of roots.
+
+    python benchmarks/contact_sites.py
+"""
+
+import collections
+import datetime
+import time
+
+import numpy as np
+
+from pychunkedgraph.backend import chunkedgraph, flatgraph_utils
+from pychunkedgraph.backend.utils import column_keys
+from pychunkedgraph.graph_analysis import contact_sites
+
+
+class _Cell:
+    def __init__(self, value, timestamp):
+        self.value = value
+        self.timestamp = timestamp
+
+
+class SyntheticChunkedGraph:
+    """ Neurons are chains of supervoxels through a row of chunks along x.
+    Ids: supervoxel (1 << 56) | chunk << 32 | neuron << 16 | i,
+    level 2 (2 << 56) | chunk << 32 | neuron, root (3 << 56) | neuron.
+    """
+
+    vx_vol_bounds = np.array([[0, 1024], [0, 1024], [0, 1024]])
+    chunk_size = np.array([64, 64, 64])
+    segmentation_resolution = np.array([4, 4, 40])
+
+    _retrieve_connectivity = chunkedgraph.ChunkedGraph._retrieve_connectivity
+    _connected_or_not = chunkedgraph.ChunkedGraph._connected_or_not
+
+    def __init__(self, n_chunks=16, n_svs_per_chunk=200, n_neurons=2,
+                 contact_probability=0.05, seed=0):
+        rng = np.random.RandomState(seed)
+        self.time_stamp = datetime.datetime.utcnow()
+        self.n_neurons = n_neurons
+        # Stand-ins for round trips to bigtable
+        self.counters = collections.Counter()
+
+        partners = collections.defaultdict(list)
+        connected = collections.defaultdict(list)
+        areas = collections.defaultdict(list)
+
+        def add_edge(sv_a, sv_b, is_connected, area):
+            for a, b in [(sv_a, sv_b), (sv_b, sv_a)]:
+                if is_connected:
+                    connected[a].append(len(partners[a]))
+                partners[a].append(b)
+                areas[a].append(area)
+
+        self.l2_children = {}
+        for neuron in range(n_neurons):
+            last_sv = None
+            for chunk in range(n_chunks):
+                svs = [self._sv_id(chunk, neuron, i) for i in range(n_svs_per_chunk)]
+                self.l2_children[self._l2_id(chunk, neuron)] = np.array(svs, dtype=np.uint64)
+                for sv in svs:
+                    if last_sv is not None:
+                        add_edge(last_sv, sv, True, 10)
+                    last_sv = sv
+
+        # Unconnected edges between neighboring neurons in the same chunk
+        for neuron in range(n_neurons - 1):
+            for chunk in range(n_chunks):
+                for i in np.where(rng.rand(n_svs_per_chunk) < contact_probability)[0]:
+                    j = min(n_svs_per_chunk - 1, max(0, i + rng.randint(-2, 3)))
+                    add_edge(self._sv_id(chunk, neuron, i),
+                             self._sv_id(chunk, neuron + 1, j),
+                             False, int(rng.randint(1, 100)))
+
+        self.rows = {}
+        for sv in partners:
+            self.rows[sv] = {
+                column_keys.Connectivity.Partner: [
+                    _Cell(np.array(partners[sv], dtype=np.uint64), self.time_stamp)],
+                column_keys.Connectivity.Area: [
+                    _Cell(np.array(areas[sv], dtype=np.uint64), self.time_stamp)],
+                column_keys.Connectivity.Affinity: [
+                    _Cell(np.ones(len(partners[sv]), dtype=np.float32), self.time_stamp)],
+                column_keys.Connectivity.Connected: [
+                    _Cell(np.array(connected[sv], dtype=np.uint64), self.time_stamp)],
+            }
+
+    @staticmethod
+    def _sv_id(chunk, neuron, i):
+        return np.uint64((1 << 56) | (chunk << 32) | (neuron << 16) | i)
+
+    @staticmethod
+    def _l2_id(chunk, neuron):
+        return np.uint64((2 << 56) | (chunk << 32) | neuron)
+
+    @staticmethod
+    def root_id(neuron):
+        return np.uint64((3 << 56) | neuron)
+
+    def _l2_ids(self, root_id):
+        self.counters["traversals"] += 1
+        neuron = int(root_id) & 0xFFFF
+        return np.array([l2 for l2 in self.l2_children if int(l2) & 0xFFFF == neuron],
+                        dtype=np.uint64)
+
+    def normalize_bounding_box(self, bounding_box, bb_is_coordinate):
+        return None if bounding_box is None else np.array(bounding_box)
+
+    def _get_subgraph_multiple_nodes(self, node_ids, bounding_box, return_layers,
+                                     serializable):
+        return {node_id: self._l2_ids(node_id) for node_id in node_ids}
+
+    def get_children(self, node_ids, flatten=False):
+        return np.concatenate(
+            [np.empty(0, dtype=np.uint64)] + [self.l2_children[n] for n in node_ids])
+
+    def get_children_at_layer(self, node_id, layer):
+        return self._l2_ids(node_id)
+
+    def get_subgraph_nodes(self, root_id, bounding_box=None, bb_is_coordinate=False):
+        return self.get_children(self._l2_ids(root_id), flatten=True)
+
+    def get_subgraph_edges(self, root_id, bounding_box=None, bb_is_coordinate=False,
+                           connected_edges=True):
+        sv_ids = self.get_subgraph_nodes(root_id)
+        edges, areas = contact_sites._read_sv_edges(self, sv_ids, connected_edges, None)
+        return edges, None, areas
+
+    def read_node_id_row(self, node_id, columns):
+        return [_Cell(None, self.time_stamp)]
+
+    def read_node_id_rows(self, node_ids, columns, end_time=None,
+                          end_time_inclusive=False):
+        self.counters["rows_read"] += len(node_ids)
+        return {n: {c: self.rows[n][c] for c in columns} for n in node_ids if n in self.rows}
+
+    def get_roots(self, sv_ids, time_stamp=None):
+        self.counters["roots_read"] += len(sv_ids)
+        return np.array([self.root_id((int(sv) >> 16) & 0xFFFF) for sv in sv_ids],
+                        dtype=np.uint64)
+
+    def get_chunk_coordinates(self, node_id):
+        return np.array([(int(node_id) >> 32) & 0xFFFFFF, 0, 0])
+
+    def get_chunk_ids_from_node_ids(self, node_ids):
+        return np.array(node_ids, dtype=np.uint64) & np.uint64(0xFFFFFFFF00000000)
+
+    def get_chunk_voxel_location(self, chunk_coordinate):
+        return self.vx_vol_bounds[:, 0] + self.chunk_size * np.array(chunk_coordinate)
+
+
+def get_contact_sites_old(cg, root_id, compute_partner=True, areas_only=False):
+    """ Former `contact_sites.get_contact_sites` (without bounding boxes and with
+    voxel_location=True) """
+    sv_ids = cg.get_subgraph_nodes(root_id)
+    edges, _, areas = cg.get_subgraph_edges(root_id, connected_edges=False)
+    edge_mask = ~np.isin(edges, sv_ids).reshape(-1, 2)
+    area_mask = np.where(edge_mask)[0]
+    masked_areas = areas[area_mask]
+    contact_sites_svs = edges[edge_mask]
+    contact_sites_svs_area_dict = collections.defaultdict(int)
+    for area, sv_id in zip(masked_areas, contact_sites_svs):
+        contact_sites_svs_area_dict[sv_id] += area
+    unique_contact_sites_svs = np.unique(contact_sites_svs)
+
+    edges_contact_sites_svs_rows = cg.read_node_id_rows(
+        node_ids=unique_contact_sites_svs,
+        columns=[column_keys.Connectivity.Partner, column_keys.Connectivity.Connected],
+    )
+    contact_sites_edges = []
+    for row_information in edges_contact_sites_svs_rows.items():
+        sv_edges, _, _ = cg._retrieve_connectivity(row_information)
+        contact_sites_edges.extend(sv_edges)
+    if len(contact_sites_edges) == 0:
+        return []
+    contact_sites_edges_array = np.array(contact_sites_edges)
+    contact_sites_edge_mask = np.isin(
+        contact_sites_edges_array[:, 1], unique_contact_sites_svs
+    )
+    self_edges = np.stack((unique_contact_sites_svs, unique_contact_sites_svs), axis=-1)
+    contact_sites_graph_edges = np.concatenate(
+        (contact_sites_edges_array[contact_sites_edge_mask], self_edges), axis=0
+    )
+
+    contact_sites_svs_area_dict_vec = np.vectorize(contact_sites_svs_area_dict.get)
+    graph, _, _, unique_sv_ids = flatgraph_utils.build_gt_graph(
+        contact_sites_graph_edges, make_directed=True
+    )
+    connected_components = flatgraph_utils.connected_components(graph)
+
+    contact_site_dict = collections.defaultdict(list)
+    intermediary_sv_dict = {}
+    for cc in connected_components:
+        cc_sv_ids = unique_sv_ids[cc]
+        contact_sites_areas = contact_sites_svs_area_dict_vec(cc_sv_ids)
+        representative_sv = cc_sv_ids[0]
+        chunk_coordinates = cg.get_chunk_coordinates(representative_sv)
+        if areas_only:
+            data_pair = np.sum(contact_sites_areas)
+        else:
+            data_pair = (
+                (cg.vx_vol_bounds[:, 0] + cg.chunk_size * chunk_coordinates)
+                * cg.segmentation_resolution,
+                (cg.vx_vol_bounds[:, 0] + cg.chunk_size * (chunk_coordinates + 1))
+                * cg.segmentation_resolution,
+                np.sum(contact_sites_areas),
+            )
+        if compute_partner:
+            intermediary_sv_dict[int(representative_sv)] = data_pair
+        else:
+            contact_site_dict[len(contact_site_dict)].append(data_pair)
+    if compute_partner:
+        sv_list = np.array(list(intermediary_sv_dict.keys()), dtype=np.uint64)
+        partner_roots = cg.get_roots(sv_list)
+        for i in range(len(partner_roots)):
+            contact_site_dict[int(partner_roots[i])].append(
+                intermediary_sv_dict.get(int(sv_list[i]))
+            )
+
+    contact_site_list = []
+    for partner_id in contact_site_dict:
+        if compute_partner:
+            contact_site_list.append((np.uint64(partner_id), contact_site_dict[partner_id]))
+        else:
+            contact_site_list.extend(contact_site_dict[partner_id])
+    return contact_site_list
+
+
+def summarize(contact_site_list):
+    """ Sorted (partner, area) pairs, comparable across implementations """
+    return sorted(
+        (int(partner_id), int(area))
+        for partner_id, sites in contact_site_list
+        for site in sites
+        for area in [site[-1] if isinstance(site, tuple) else site]
+    )
+
+
+def run_timings(n_chunks_list=(4, 16, 64), n_svs_per_chunk=200, n_neurons=3):
+    results = {}
+    for n_chunks in n_chunks_list:
+        cg = SyntheticChunkedGraph(n_chunks=n_chunks, n_svs_per_chunk=n_svs_per_chunk,
+                                   n_neurons=n_neurons)
+        root_id = cg.root_id(1)
+
+        time_start = time.time()
+        old_sites = get_contact_sites_old(cg, root_id)
+        old_dt = time.time() - time_start
+        old_counters = dict(cg.counters)
+        cg.counters.clear()
+
+        time_start = time.time()
+        new_sites, _ = contact_sites.get_contact_sites(cg, root_id)
+        new_dt = time.time() - time_start
+        new_counters = dict(cg.counters)
+
+        same = summarize(old_sites) == summarize(new_sites)
+        results[n_chunks] = {"old": old_dt, "single_traversal": new_dt, "same": same,
+                             "old_reads": old_counters, "single_traversal_reads": new_counters}
+        print(f"{n_chunks} chunks ({n_chunks * n_svs_per_chunk} svs per neuron): "
+              f"old {old_dt:.3f}s {old_counters}, "
+              f"single traversal {new_dt:.3f}s {new_counters}, same: {same}")
+    return results
+
+
+def get_contact_sites_all_pairs(cg, root_ids):
+    """ Contact area and number of sites of every pair of roots from
+    `get_contact_sites_pairwise`, as {(root_id, root_id): (area, n_sites)} """
+    pair_contacts = {}
+    for i, first_root_id in enumerate(root_ids):
+        for second_root_id in root_ids[i + 1:]:
+            sites = contact_sites.get_contact_sites_pairwise(
+                cg, first_root_id, second_root_id, exact_location=False
+            )
+            if sites and len(sites[0]) > 0:
+                pair_contacts[(int(first_root_id), int(second_root_id))] = (
+                    int(np.sum([site[-1] for site in sites[0]])), len(sites[0]))
+    return pair_contacts
+
+
+def summarize_multi(root_ids, area_matrix, site_matrix):
+    """ `get_contact_sites_multi` results in the format of `get_contact_sites_all_pairs` """
+    area_matrix = area_matrix.tocoo()
+    site_matrix = site_matrix.tocsr()
+    return {
+        (int(root_ids[i]), int(root_ids[j])): (int(area), int(site_matrix[i, j]))
+        for i, j, area in zip(area_matrix.row, area_matrix.col, area_matrix.data)
+        if i < j
+    }
+
+
+def run_multi_timings(n_neurons_list=(4, 8, 16), n_chunks=8, n_svs_per_chunk=100):
+    results = {}
+    for n_neurons in n_neurons_list:
+        cg = SyntheticChunkedGraph(n_chunks=n_chunks, n_svs_per_chunk=n_svs_per_chunk,
+                                   n_neurons=n_neurons)
+        root_ids = np.array([cg.root_id(i) for i in range(n_neurons)], dtype=np.uint64)
+
+        time_start = time.time()
+        pairwise = get_contact_sites_all_pairs(cg, root_ids)
+        pairwise_dt = time.time() - time_start
+        pairwise_counters = dict(cg.counters)
+        cg.counters.clear()
+
+        time_start = time.time()
+        multi = summarize_multi(*contact_sites.get_contact_sites_multi(cg, root_ids))
+        multi_dt = time.time() - time_start
+        multi_counters = dict(cg.counters)
+
+        same = pairwise == multi
+        results[n_neurons] = {"pairwise": pairwise_dt, "multi": multi_dt, "same": same,
+                              "pairwise_reads": pairwise_counters,
+                              "multi_reads": multi_counters}
+        print(f"{n_neurons} roots: pairwise {pairwise_dt:.3f}s {pairwise_counters}, "
+              f"multi {multi_dt:.3f}s {multi_counters}, same: {same}")
+    return results
+
+
+if __name__ == "__main__":
+    run_timings()
+    run_multi_timings()
@@ -0,0 +1,123 @@
+"""
+Benchmark for combining the cross chunk edges of the nodes of an edit in
+`propagate_edits_to_root`: the former pairwise `combine_cross_chunk_edge_dicts`
+loop and `np.vectorize(dict.get)` mapping vs. `CrossChunkEdgeAccumulator` and
+`resolve_cross_chunk_edges`.
+
+    python benchmarks/cross_edges.py
+"""
+
+import time
+
+import numpy as np
+
+from pychunkedgraph.backend.chunkedgraph_utils import (
+    CrossChunkEdgeAccumulator,
+    resolve_cross_chunk_edges,
+)
+
+
+def make_cross_edge_dicts(n_nodes, n_edges_per_layer=20, layers=range(2, 8),
+                          seed=0):
+    """ Cross edge dicts of nodes, every node owns `n_edges_per_layer`
+    supervoxels per layer whose partners belong to random other nodes
+
+    :return: list of dict
+        layer -> n x 2 np.ndarray of np.uint64, one dict per node
+    """
+    rng = np.random.RandomState(seed)
+    n_edges = n_nodes * n_edges_per_layer
+
+    cross_edge_dicts = [{} for _ in range(n_nodes)]
+    for layer in layers:
+        sv_ids = np.arange(n_edges, dtype=np.uint64) + np.uint64(layer << 40)
+        partner_ids = sv_ids[rng.permutation(n_edges)]
+        edges = np.stack([sv_ids, partner_ids], axis=1)
+        for i_node, node_edges in enumerate(np.split(edges, n_nodes)):
+            cross_edge_dicts[i_node][layer] = node_edges
+    return cross_edge_dicts
+
+
+def combine_cross_chunk_edge_dicts_old(d1, d2, start_layer=2):
+    """ Former `combine_cross_chunk_edge_dicts` """
+    new_d = {}
+    layers = np.unique(list(d1.keys()) + list(d2.keys()))
+    layers = layers[layers >= start_layer]
+
+    for l in layers:
+        if l in d1 and l in d2:
+            new_d[l] = np.concatenate([d1[l].reshape(-1, 2),
+                                       d2[l].reshape(-1, 2)])
+        elif l in d1:
+            new_d[l] = d1[l].reshape(-1, 2)
+        else:
+            new_d[l] = d2[l].reshape(-1, 2)
+
+        edges_flattened_view = new_d[l].view(dtype='u8,u8')
+        m = np.unique(edges_flattened_view, return_index=True)[1]
+        new_d[l] = new_d[l][m]
+    return new_d
+
+
+def combine_old(cross_edge_dicts, start_layer=2):
+    """ Former loop in `propagate_edits_to_root` """
+    combined = {}
+    for cross_edge_dict in cross_edge_dicts:
+        combined = combine_cross_chunk_edge_dicts_old(combined, cross_edge_dict,
+                                                      start_layer=start_layer)
+    return combined
+
+
+def combine(cross_edge_dicts, start_layer=2):
+    """ Same as `combine_old` with `CrossChunkEdgeAccumulator` """
+    accumulator = CrossChunkEdgeAccumulator(start_layer=start_layer)
+    for cross_edge_dict in cross_edge_dicts:
+        accumulator.add(cross_edge_dict)
+    return accumulator.build()
+
+
+def map_cross_edges_old(node_ids, cross_edge_dicts, layer):
+    """ Former node edges in `compute_cross_chunk_connected_components`,
+    including the construction of the dictionary """
+    edge_id_map = {}
+    cross_edges_lvl1 = []
+    for node_id, cross_edge_dict in zip(node_ids, cross_edge_dicts):
+        node_cross_edges = cross_edge_dict[layer]
+        edge_id_map.update(dict(zip(node_cross_edges[:, 0],
+                                    [node_id] * len(node_cross_edges))))
+        cross_edges_lvl1.extend(node_cross_edges)
+
+    edge_id_map_vec = np.vectorize(edge_id_map.get)
+    return edge_id_map_vec(np.array(cross_edges_lvl1))
+
+
+def map_cross_edges(node_ids, cross_edge_dicts, layer):
+    """ Same as `map_cross_edges_old` but unique edges """
+    cross_edges_lvl1 = [d[layer] for d in cross_edge_dicts]
+    cross_edge_node_ids = [np.full(len(edges), node_id, dtype=np.uint64)
+                           for node_id, edges in zip(node_ids, cross_edges_lvl1)]
+    return resolve_cross_chunk_edges(np.concatenate(cross_edge_node_ids),
+                                     np.concatenate(cross_edges_lvl1))
+
+
+def run_timings(n_nodes_list=(100, 500, 2000)):
+    """ Prints timings of both versions """
+    print("nodes   combine old/new (s)   map old/new (s)")
+    for n_nodes in n_nodes_list:
+        cross_edge_dicts = make_cross_edge_dicts(n_nodes, seed=n_nodes)
+        node_ids = np.arange(1, n_nodes + 1, dtype=np.uint64)
+
+        timings = []
+        for func, args in [(combine_old, (cross_edge_dicts,)),
+                           (combine, (cross_edge_dicts,)),
+                           (map_cross_edges_old, (node_ids, cross_edge_dicts, 2)),
+                           (map_cross_edges, (node_ids, cross_edge_dicts, 2))]:
+            time_start = time.time()
+            func(*args)
+            timings.append(time.time() - time_start)
+
+        print("%5d  %8.3f / %8.3f   %7.3f / %7.3f" % (n_nodes, *timings))
+
+
+if __name__ == "__main__":
+    run_timings()
@@ -0,0 +1,212 @@
+"""
+Benchmark for the chunk boundary merging of draco fragments and the dust
+removal in meshgen: the former dict / per id implementations vs. the array
+based ones, on synthetic meshes and segmentations.
+
+    python benchmarks/mesh_merging.py
+"""
+
+import time
+from unittest import mock
+
+import fastremap
+import numpy as np
+
+from pychunkedgraph.meshing import meshgen
+
+# Quantization of the mocked child chunk: bins of 1, boundary planes at 64
+ENCODING_SETTINGS = {
+    "quantization_bits": 7,
+    "quantization_range": 127,
+    "quantization_origin": np.array([0, 0, 0]),
+}
+CHILD_CHUNK_OFFSET = np.array([64, 64, 64])
+
+
+class _MockChunkedGraph:
+    def get_chunk_coordinates(self, chunk_id):
+        return np.array([0, 0, 0])
+
+    def get_chunk_layer(self, chunk_id):
+        return 3
+
+    def get_chunk_id(self, *args):
+        return 0
+
+
+def merge_draco_meshes_across_boundaries_dict(cg, fragments, chunk_id, mip,
+                                              high_padding):
+    """ Former `meshgen.merge_draco_meshes_across_boundaries` """
+    vertexct = np.zeros(len(fragments) + 1, np.uint32)
+    vertexct[1:] = np.cumsum([x["mesh"]["num_vertices"] for x in fragments])
+    vertices = np.concatenate([x["mesh"]["vertices"] for x in fragments])
+    faces = np.concatenate(
+        [mesh["mesh"]["faces"] + vertexct[i] for i, mesh in enumerate(fragments)]
+    )
+    del fragments
+
+    if vertexct[-1] > 0:
+        chunk_coords = cg.get_chunk_coordinates(chunk_id)
+        coords_bottom_corner_child_chunk = chunk_coords * 2 + 1
+        child_chunk_id = cg.get_chunk_id(
+            None, cg.get_chunk_layer(chunk_id) - 1, *coords_bottom_corner_child_chunk
+        )
+        _, _, child_chunk_offset = meshgen.get_meshing_necessities_from_graph(
+            cg, child_chunk_id, mip
+        )
+        draco_encoding_settings_smaller_chunk = meshgen.get_draco_encoding_settings_for_chunk(
+            cg, child_chunk_id, mip=mip, high_padding=high_padding
+        )
+        draco_bin_size = draco_encoding_settings_smaller_chunk["quantization_range"] / (
+            2 ** draco_encoding_settings_smaller_chunk["quantization_bits"] - 1
+        )
+        chunk_boundary_bin_index = np.floor(
+            (
+                child_chunk_offset
+                - draco_encoding_settings_smaller_chunk["quantization_origin"]
+            )
+            / draco_bin_size
+            + np.float32(0.5)
+        )
+        quantized_chunk_boundary = (
+            draco_encoding_settings_smaller_chunk["quantization_origin"]
+            + chunk_boundary_bin_index * draco_bin_size
+        )
+        are_chunk_aligned = (vertices == quantized_chunk_boundary).any(axis=1)
+        vertices = np.hstack((vertices, np.arange(vertexct[-1])[:, np.newaxis]))
+        chunk_aligned = vertices[are_chunk_aligned]
+        not_chunk_aligned = vertices[~are_chunk_aligned]
+        del vertices
+        del are_chunk_aligned
+        faces_remapping = {}
+        if len(not_chunk_aligned) > 0:
+            not_chunk_aligned_remap = dict(
+                zip(
+                    not_chunk_aligned[:, 3].astype(np.uint32),
+                    np.arange(len(not_chunk_aligned), dtype=np.uint32),
+                )
+            )
+            faces_remapping.update(not_chunk_aligned_remap)
+        if len(chunk_aligned) > 0:
+            unique_chunk_aligned, inverse_to_chunk_aligned = np.unique(
+                chunk_aligned[:, 0:3], return_inverse=True, axis=0
+            )
+            chunk_aligned_remap = dict(
+                zip(
+                    chunk_aligned[:, 3].astype(np.uint32),
+                    np.uint32(len(not_chunk_aligned))
+                    + inverse_to_chunk_aligned.reshape(-1).astype(np.uint32),
+                )
+            )
+            faces_remapping.update(chunk_aligned_remap)
+            vertices = np.concatenate((not_chunk_aligned[:, 0:3], unique_chunk_aligned))
+        else:
+            vertices = not_chunk_aligned[:, 0:3]
+        fastremap.remap(faces, faces_remapping, in_place=True)
+
+    return {
+        "num_vertices": np.uint32(len(vertices)),
+        "vertices": vertices[:, 0:3].reshape(-1),
+        "faces": faces,
+    }
+
+
+def black_out_dust_from_segmentation_per_id(seg, dust_threshold):
+    """ Former `meshgen.black_out_dust_from_segmentation` """
+    seg_ids, voxel_count = np.unique(seg, return_counts=True)
+    boundary = np.concatenate(
+        (
+            seg[-2, :, :],
+            seg[-1, :, :],
+            seg[:, -2, :],
+            seg[:, -1, :],
+            seg[:, :, -2],
+            seg[:, :, -1],
+        ),
+        axis=None,
+    )
+    seg_ids_on_boundary = np.unique(boundary)
+    dust_segids = [
+        sid
+        for sid, ct in zip(seg_ids, voxel_count)
+        if ct < int(dust_threshold) and np.isin(sid, seg_ids_on_boundary, invert=True)
+    ]
+    seg = fastremap.mask(seg, dust_segids, in_place=True)
+
+
+def make_fragments(n_fragments, n_vertices, boundary_fraction=0.2):
+    """ Random fragments with integer vertices in [0, 128), a share of them
+    on the boundary planes at 64 and duplicated across fragments
+    """
+    shared = np.random.randint(0, 128, size=(n_vertices, 3)).astype(np.float64)
+    shared[:, 0] = CHILD_CHUNK_OFFSET[0]
+
+    fragments = []
+    for _ in range(n_fragments):
+        vertices = np.random.randint(0, 128, size=(n_vertices, 3)).astype(np.float64)
+        vertices[vertices == 64] = 63
+        n_shared = int(n_vertices * boundary_fraction)
+        vertices[:n_shared] = shared[np.random.choice(n_vertices, n_shared)]
+        vertices = vertices[np.random.permutation(n_vertices)]
+        faces = np.random.randint(0, n_vertices, size=2 * n_vertices * 3)
+        fragments.append({"mesh": {"num_vertices": n_vertices,
+                                   "vertices": vertices,
+                                   "faces": faces}})
+    return fragments
+
+
+def make_segmentation(shape=(256, 256, 64), n_ids=20000):
+    """ Random ids with a long tail of small (dust) objects """
+    ids = (np.random.pareto(1.0, size=shape) * n_ids / 100).astype(np.uint64)
+    return ids % np.uint64(n_ids) + np.uint64(1)
+
+
+def _merge(merge_func, fragments):
+    with mock.patch.object(meshgen, "get_meshing_necessities_from_graph",
+                           return_value=(0, 0, CHILD_CHUNK_OFFSET)), \
+            mock.patch.object(meshgen, "get_draco_encoding_settings_for_chunk",
+                              return_value=ENCODING_SETTINGS):
+        return merge_func(_MockChunkedGraph(), fragments, 0, 2, 1)
+
+
+def run_timings(n_vertices_list=(1000, 10000, 100000), n_fragments=8,
+                dust_threshold=100, seed=0):
+    np.random.seed(seed)
+    results = {}
+    for n_vertices in n_vertices_list:
+        fragments = make_fragments(n_fragments, n_vertices)
+
+        time_start = time.time()
+        old = _merge(merge_draco_meshes_across_boundaries_dict, fragments)
+        old_dt = time.time() - time_start
+
+        time_start = time.time()
+        new = _merge(meshgen.merge_draco_meshes_across_boundaries, fragments)
+        new_dt = time.time() - time_start
+
+        same = all(np.array_equal(old[k], new[k]) for k in old)
+        results[("merge", n_vertices)] = {"dict": old_dt, "array": new_dt,
+                                          "identical": same}
+        print(f"merge {n_fragments} x {n_vertices} vertices: dict {old_dt:.3f}s, "
+              f"array {new_dt:.3f}s, identical: {same}")
+
+    seg = make_segmentation()
+    seg_old, seg_new = seg.copy(), seg.copy()
+
+    time_start = time.time()
+    black_out_dust_from_segmentation_per_id(seg_old, dust_threshold)
+    old_dt = time.time() - time_start
+
+    time_start = time.time()
+    meshgen.black_out_dust_from_segmentation(seg_new, dust_threshold)
+    new_dt = time.time() - time_start
+
+    same = np.array_equal(seg_old, seg_new)
+    results["dust"] = {"per_id": old_dt, "array": new_dt, "identical": same}
+    print(f"dust {seg.shape}: per id {old_dt:.3f}s, array {new_dt:.3f}s, "
+          f"identical: {same}")
+    return results
+
+
+if __name__ == "__main__":
+    run_timings()
@@ -14,9 +14,6 @@ from pychunkedgraph.backend import chunkedgraph
 from pychunkedgraph.backend import chunkedgraph_exceptions as cg_exceptions
 from pychunkedgraph.logging import flask_log_db, jsonformatter
 
-import networkx as nx
-from scipy import spatial
-
 
 from typing import (
     Any,
@@ -182,49 +179,25 @@ def handle_supervoxel_id_lookup(
 ) -> Sequence[np.uint64]:
     """Helper to lookup supervoxel ids.
 
-    This takes care of grouping coordinates."""
-
-    def ccs(coordinates_nm_):
-        graph = nx.Graph()
-
-        dist_mat = spatial.distance.cdist(coordinates_nm_, coordinates_nm_)
-        for edge in np.array(np.where(dist_mat < 1000)).T:
-            graph.add_edge(*edge)
-
-        ccs = [np.array(list(cc)) for cc in nx.connected_components(graph)]
-        return ccs
-
+    All coordinates are resolved in one batch, see
+    ChunkedGraph.get_atomic_ids_from_coords_multi."""
     coordinates = np.array(coordinates, dtype=np.int)
-    coordinates_nm = coordinates * cg.cv.resolution
-
     node_ids = np.array(node_ids, dtype=np.uint64)
 
-    if len(coordinates.shape) != 2:
+    if len(coordinates.shape) != 2 or len(coordinates) != len(node_ids):
         raise cg_exceptions.BadRequest(
             f"Could not determine supervoxel ID for coordinates "
             f"{coordinates} - Validation stage."
         )
 
-    atomic_ids = np.zeros(len(coordinates), dtype=np.uint64)
-    for node_id in np.unique(node_ids):
-        node_id_m = node_ids == node_id
-
-        for cc in ccs(coordinates_nm[node_id_m]):
-            m_ids = np.where(node_id_m)[0][cc]
-
-            for max_dist_nm in [75, 150, 250, 500]:
-                atomic_ids_sub = cg.get_atomic_ids_from_coords(
-                    coordinates[m_ids], parent_id=node_id, max_dist_nm=max_dist_nm
-                )
-                if atomic_ids_sub is not None:
-                    break
-            if atomic_ids_sub is None:
-                raise cg_exceptions.BadRequest(
-                    f"Could not determine supervoxel ID for coordinates "
-                    f"{coordinates} - Validation stage."
-                )
-
-            atomic_ids[m_ids] = atomic_ids_sub
+    atomic_ids = cg.get_atomic_ids_from_coords_multi(
+        coordinates, node_ids, max_dist_nm=500
+    )
+    if np.any(atomic_ids == 0):
+        raise cg_exceptions.BadRequest(
+            f"Could not determine supervoxel ID for coordinates "
+            f"{coordinates[atomic_ids == 0]} - Validation stage."
+        )
     return atomic_ids
 
 
@@ -1,3 +1,4 @@
+import atexit
 import json
 import os
 
@@ -14,7 +15,7 @@ from pychunkedgraph import __version__
 from pychunkedgraph.app import app_utils
 from pychunkedgraph.app.meshing import tasks as meshing_tasks
 from pychunkedgraph.backend import chunkedgraph
-from pychunkedgraph.meshing import meshgen, meshgen_utils
+from pychunkedgraph.meshing import meshgen, meshgen_utils, remesh_coalescer
 
 
 # -------------------------------
@@ -225,32 +226,93 @@ def str2bool(v):
   return v.lower() in ("yes", "true", "t", "1")
 
 ## REMESHING -----------------------------------------------------
+
+# Requests with `coalesce=true` are collected for this long and remeshed in
+# one job. Pending ids of rq jobs are kept in Redis and shared by all server
+# processes, pending ids of thread jobs live in the process and are flushed
+# when it exits.
+REMESH_DEBOUNCE_S = float(os.environ.get("REMESH_DEBOUNCE_S", 2))
+REMESH_COALESCERS = {}
+REMESH_COALESCERS_LOCK = threading.Lock()
+
+
+def _get_remesh_queue_name(is_priority):
+    if is_priority:
+        return "mesh-chunks"
+    return "mesh-chunks-low-priority"
+
+
+def _enqueue_remeshing(redis_url, is_priority, fan_out, table_id, lvl2_nodes,
+                       job_id=None, coalesce=False):
+    with Connection(redis.from_url(redis_url)):
+        if is_priority:
+            retry = Retry(max=3, interval=[1, 10, 60])
+        else:
+            retry = Retry(max=3, interval=[60, 60, 60])
+        queue_name = _get_remesh_queue_name(is_priority)
+        q = Queue(queue_name, retry=retry, default_timeout=1200)
+        coalesce_kwargs = {}
+        if coalesce:
+            coalesce_kwargs = {"coalesce_name": queue_name,
+                               "debounce_s": REMESH_DEBOUNCE_S}
+        return q.enqueue(meshing_tasks.remeshing, table_id,
+                         [int(l2_id) for l2_id in lvl2_nodes], fan_out=fan_out,
+                         job_id=job_id, **coalesce_kwargs)
+
+
+def _get_remesh_coalescer():
+    with REMESH_COALESCERS_LOCK:
+        if "thread" not in REMESH_COALESCERS:
+            def flush_func(cg, lvl2_nodes):
+                _remeshing(cg.get_serialized_info(), lvl2_nodes)
+
+            coalescer = remesh_coalescer.RemeshCoalescer(
+                flush_func, debounce_s=REMESH_DEBOUNCE_S
+            )
+            atexit.register(coalescer.flush_all)
+            REMESH_COALESCERS["thread"] = coalescer
+        return REMESH_COALESCERS["thread"]
+
+
+def _get_redis_remesh_coalescer(redis_url, is_priority):
+    return remesh_coalescer.RedisRemeshCoalescer(
+        redis.from_url(redis_url), _get_remesh_queue_name(is_priority),
+        debounce_s=REMESH_DEBOUNCE_S
+    )
+
+
 def handle_remesh(table_id):
     current_app.request_type = "remesh_enque"
     current_app.table_id = table_id
     is_priority = request.args.get('priority', True, type=str2bool)
     is_redisjob = request.args.get('use_redis', False, type=str2bool)
+    fan_out = request.args.get('fan_out', False, type=str2bool)
+    coalesce = request.args.get('coalesce', False, type=str2bool)
+    coalesce = coalesce and REMESH_DEBOUNCE_S > 0
     user_id = str(g.auth_user["id"])
     current_app.user_id = user_id
     new_lvl2_ids = json.loads(request.data)["new_lvl2_ids"]
 
-    if is_redisjob:    
-        with Connection(redis.from_url(current_app.config["REDIS_URL"])):
-            
-            if is_priority:
-                retry = Retry(max=3, interval=[1, 10, 60])
-                queue_name = "mesh-chunks"
-            else:
-                retry = Retry(max=3, interval=[60, 60, 60])
-                queue_name = "mesh-chunks-low-priority"
-            q = Queue(queue_name, retry=retry, default_timeout=1200)
-            task = q.enqueue(meshing_tasks.remeshing, table_id, 
-                             new_lvl2_ids)
+    if is_redisjob:
+        redis_url = current_app.config["REDIS_URL"]
+        if coalesce:
+            coalescer = _get_redis_remesh_coalescer(redis_url, is_priority)
+            task_id = coalescer.add(
+                table_id, new_lvl2_ids,
+                lambda job_id: _enqueue_remeshing(
+                    redis_url, is_priority, fan_out, table_id, [],
+                    job_id=job_id, coalesce=True
+                )
+            )
+        else:
+            task = _enqueue_remeshing(redis_url, is_priority, fan_out,
+                                      table_id, new_lvl2_ids)
+            task_id = task.get_id()
 
         response_object = {
             "status": "success",
             "data": {
-                "task_id": task.get_id()
+                "task_id": task_id
             }
         }
         
@@ -259,12 +321,32 @@ def handle_remesh(table_id):
         new_lvl2_ids = np.array(new_lvl2_ids, dtype=np.uint64)
         cg = app_utils.get_cg(table_id)
         
-        if len(new_lvl2_ids) > 0:
+        if coalesce:
+            _get_remesh_coalescer().add(cg, new_lvl2_ids)
+        elif len(new_lvl2_ids) > 0:
             t = threading.Thread(target=_remeshing, 
                                  args=(cg.get_serialized_info(), new_lvl2_ids))
             t.start()
     
         return Response(status=202)
+
+
+def handle_remesh_stats():
+    current_app.request_type = "remesh_stats"
+
+    with REMESH_COALESCERS_LOCK:
+        coalescers = dict(REMESH_COALESCERS)
+
+    stats = {}
+    for name, coalescer in coalescers.items():
+        stats[f"{name} (pid {os.getpid()})"] = coalescer.stats()
+
+    redis_url = current_app.config.get("REDIS_URL")
+    if redis_url:
+        for is_priority in [True, False]:
+            coalescer = _get_redis_remesh_coalescer(redis_url, is_priority)
+            stats[_get_remesh_queue_name(is_priority)] = coalescer.stats()
+    return jsonify(stats)
     
 
 def _remeshing(serialized_cg_info, lvl2_nodes):
@@ -273,7 +355,7 @@ def _remeshing(serialized_cg_info, lvl2_nodes):
     # TODO: stop_layer and mip should be configurable by dataset
     meshgen.remeshing(
         cg, lvl2_nodes, stop_layer=4, mesh_path=None, mip=1,
-        max_err=320
+        max_err=320, n_threads=meshgen.REMESHING_N_THREADS
     )
     
     return Response(status=200)
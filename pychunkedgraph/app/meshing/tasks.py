@@ -1,17 +1,42 @@
 from pychunkedgraph.app import app_utils
-from pychunkedgraph.meshing import meshgen
+from pychunkedgraph.meshing import meshgen, remesh_coalescer
 import numpy as np
 from flask import current_app
+from rq import Queue, get_current_job
 
 
-def remeshing(table_id, lvl2_nodes):
+def remeshing(table_id, lvl2_nodes, fan_out=False, coalesce_name=None,
+              debounce_s=0):
     lvl2_nodes = np.array(lvl2_nodes, dtype=np.uint64)
     cg = app_utils.get_cg(table_id)
+
+    coalescer = None
+    if coalesce_name is not None:
+        # Remesh everything requested for this table since the job was enqueued
+        job = get_current_job()
+        coalescer = remesh_coalescer.RedisRemeshCoalescer(
+            job.connection, coalesce_name, debounce_s=debounce_s
+        )
+        lvl2_nodes = np.union1d(lvl2_nodes, coalescer.pop(cg, job.id))
+        if len(lvl2_nodes) == 0:
+            coalescer.done(table_id, job.id)
+            return
     
     current_app.logger.debug(f"remeshing {lvl2_nodes} {cg.get_serialized_info()}")
 
+    queue = None
+    if fan_out:
+        # Schedule the chunk tasks on the queue this job came from, rq
+        # releases parent chunks once all of their children are done
+        job = get_current_job()
+        queue = Queue(job.origin, connection=job.connection)
+
     # TODO: stop_layer and mip should be configurable by dataset
-    meshgen.remeshing(
-        cg, lvl2_nodes, stop_layer=4, cv_path=None,
-        cv_mesh_dir=None, mip=1, max_err=320
+    result = meshgen.remeshing(
+        cg, lvl2_nodes, stop_layer=4, mesh_path=None, mip=1, max_err=320,
+        n_threads=meshgen.REMESHING_N_THREADS, queue=queue
     )
+    if queue is None:
+        current_app.logger.debug(f"remeshing layer timings {result}")
+    if coalescer is not None:
+        coalescer.done(table_id, job.id)
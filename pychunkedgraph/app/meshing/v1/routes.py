@@ -81,3 +81,9 @@ def handle_get_manifest(table_id, node_id):
 @auth_requires_permission("edit")
 def handle_remesh(table_id):
     return common.handle_remesh(table_id)
+
+
+@bp.route("/remeshing/stats", methods=["GET"])
+@auth_required
+def handle_remesh_stats():
+    return common.handle_remesh_stats()
@@ -22,9 +22,9 @@ from pychunkedgraph import __version__
 from pychunkedgraph.app import app_utils
 from pychunkedgraph.backend import chunkedgraph_exceptions as cg_exceptions
 from pychunkedgraph.backend import history as cg_history
-from pychunkedgraph.backend import lineage
+from pychunkedgraph.backend import lineage, node_stats
 from pychunkedgraph.backend.utils import column_keys
-from pychunkedgraph.graph_analysis import analysis, contact_sites
+from pychunkedgraph.graph_analysis import analysis, contact_sites, l2_graph_cache
 from pychunkedgraph.backend.graphoperation import GraphEditOperation
 
 __api_versions__ = [0, 1]
@@ -379,6 +379,63 @@ def handle_merge(table_id):
     return ret
 
 
+def handle_merge_bulk(table_id):
+    """Applies many merges, merges between the same roots in one operation.
+    Request data: list of merges [[sv_id, x, y, z], [sv_id, x, y, z]]"""
+    current_app.table_id = table_id
+
+    merges = json.loads(request.data)
+    is_priority = request.args.get("priority", True, type=str2bool)
+    n_threads = request.args.get("n_threads", 1, type=int)
+    user_id = str(g.auth_user["id"])
+    current_app.user_id = user_id
+
+    if len(merges) == 0 or any(len(nodes) != 2 for nodes in merges):
+        raise cg_exceptions.BadRequest("Every merge needs exactly two points.")
+
+    # Call ChunkedGraph
+    cg = app_utils.get_cg(table_id)
+
+    node_ids = []
+    coords = []
+    for nodes in merges:
+        for node in nodes:
+            node_ids.append(node[0])
+            coords.append(np.array(node[1:]) / cg.segmentation_resolution)
+
+    atomic_edges = app_utils.handle_supervoxel_id_lookup(cg, coords, node_ids)
+    atomic_edges = np.array(atomic_edges, dtype=np.uint64).reshape(-1, 2)
+    coords = np.array(coords).reshape(-1, 2, 3)
+
+    # Protection from long range mergers
+    chunk_coord_delta = cg.get_chunk_coordinates_multiple(
+        atomic_edges[:, 0]
+    ) - cg.get_chunk_coordinates_multiple(atomic_edges[:, 1])
+
+    if np.any(np.abs(chunk_coord_delta) > 3):
+        raise cg_exceptions.BadRequest(
+            "Chebyshev distance between merge points exceeded allowed maximum "
+            "(3 chunks)."
+        )
+
+    results = cg.add_edges_bulk(
+        user_id=user_id,
+        atomic_edges=atomic_edges,
+        source_coords=coords[:, 0],
+        sink_coords=coords[:, 1],
+        n_threads=n_threads,
+    )
+
+    new_lvl2_ids = [r.result.new_lvl2_ids for r in results if r.result is not None]
+    if len(new_lvl2_ids) > 0:
+        new_lvl2_ids = np.concatenate(new_lvl2_ids)
+        current_app.logger.debug(("lvl2_nodes:", new_lvl2_ids))
+        if len(new_lvl2_ids) > 0:
+            trigger_remesh(table_id, new_lvl2_ids, is_priority=is_priority)
+
+    return results
+
+
 ### SPLIT ----------------------------------------------------------------------
 
 
@@ -1093,9 +1150,14 @@ def handle_find_path(table_id, precision_mode):
 
     l2_path = analysis.find_l2_shortest_path(cg, source_l2_id, target_l2_id)
     if precision_mode:
-        centroids, failed_l2_ids = analysis.compute_mesh_centroids_of_l2_ids(
+        centroids, failed_l2_ids = analysis.compute_attribute_centroids_of_l2_ids(
             cg, l2_path, flatten=True
         )
+        if len(failed_l2_ids) > 0:
+            # Graphs without (complete) level 2 attributes
+            centroids, failed_l2_ids = analysis.compute_mesh_centroids_of_l2_ids(
+                cg, l2_path, flatten=True
+            )
         return {
             "centroids_list": centroids,
             "failed_l2_ids": failed_l2_ids,
@@ -1114,7 +1176,12 @@ def handle_get_layer2_graph(table_id, node_id):
     current_app.user_id = user_id
 
     cg = app_utils.get_cg(table_id)
-    edge_graph = analysis.get_lvl2_edge_list(cg, int(node_id))
+    node_id = np.uint64(node_id)
+    if cg.is_root(node_id):
+        cache = l2_graph_cache.get_l2_graph_cache()
+        edge_graph = cache.get_lvl2_edge_list(cg, node_id)
+    else:
+        edge_graph = analysis.get_lvl2_edge_list(cg, node_id)
     return {"edge_graph": edge_graph}
 
 
@@ -1160,6 +1227,28 @@ def handle_root_timestamps(table_id, is_binary):
     return [ts.timestamp() for ts in timestamps]
 
 
+def handle_root_stats(table_id, root_id):
+    current_app.request_type = "root_stats"
+    current_app.table_id = table_id
+
+    cg = app_utils.get_cg(table_id)
+    root_id = np.uint64(root_id)
+    if cg.get_chunk_layer(root_id) < 2:
+        raise cg_exceptions.BadRequest("Supervoxels have no stats.")
+
+    # Graphs ingested without stats fall back to a traversal
+    stats = node_stats.read_node_stats(cg, [root_id]).get(root_id)
+    precomputed = stats is not None
+    if not precomputed:
+        stats = node_stats.compute_node_stats(cg, root_id)
+    return {
+        "n_supervoxels": stats["n_supervoxels"],
+        "n_l2": stats["n_l2"],
+        "chunk_bbox": stats["chunk_bbox"].tolist(),
+        "precomputed": precomputed,
+    }
+
+
 ### OPERATION DETAILS ------------------------------------------------------------
 
 
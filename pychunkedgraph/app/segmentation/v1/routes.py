@@ -89,6 +89,21 @@ def handle_merge(table_id):
     return jsonify_with_kwargs(resp, int64_as_str=int64_as_str)
 
 
+@bp.route("/table/<table_id>/merge_bulk", methods=["POST"])
+@auth_requires_permission("edit")
+def handle_merge_bulk(table_id):
+    int64_as_str = request.args.get("int64_as_str", default=False, type=toboolean)
+    merge_results = common.handle_merge_bulk(table_id)
+    resp = {"operations": []}
+    for merge_result in merge_results:
+        operation = {"merge_ids": merge_result.edge_indices, "error": merge_result.error}
+        if merge_result.result is not None:
+            operation["operation_id"] = merge_result.result.operation_id
+            operation["new_root_ids"] = merge_result.result.new_root_ids
+        resp["operations"].append(operation)
+    return jsonify_with_kwargs(resp, int64_as_str=int64_as_str)
+
+
 ### SPLIT ----------------------------------------------------------------------
 
 
@@ -492,6 +507,14 @@ def handle_root_timestamps(table_id):
     return jsonify_with_kwargs(resp, int64_as_str=int64_as_str)
 
 
+@bp.route("/table/<table_id>/root/<root_id>/stats", methods=["GET"])
+@auth_requires_permission("view")
+def handle_root_stats(table_id, root_id):
+    int64_as_str = request.args.get("int64_as_str", default=False, type=toboolean)
+    resp = common.handle_root_stats(table_id, root_id)
+    return jsonify_with_kwargs(resp, int64_as_str=int64_as_str)
+
+
 ### GET OPERATION DETAILS --------------------------------------------------------
 
 
@@ -9,12 +9,19 @@ import pytz
 import cloudvolume
 import re
 import itertools
+import threading
 import logging
 import fastremap
 
 from itertools import chain
 from multiwrapper import multiprocessing_utils as mu
-from pychunkedgraph.backend import cutting, chunkedgraph_comp, flatgraph_utils
+from pychunkedgraph.backend import (
+    cutting,
+    chunkedgraph_comp,
+    flatgraph_utils,
+    l2_attributes,
+    node_stats,
+)
 from pychunkedgraph.backend.chunkedgraph_utils import (
     compute_indices_pandas,
     compute_bitmasks,
@@ -25,6 +32,9 @@ from pychunkedgraph.backend.chunkedgraph_utils import (
     combine_cross_chunk_edge_dicts,
     get_min_time,
     partial_row_data_to_column_dict,
+    get_latest_duplicate_mask,
+    resolve_cross_chunk_edges,
+    group_edges_by_supervoxel,
 )
 from pychunkedgraph.backend.utils import (
     serializers,
@@ -39,14 +49,19 @@ from pychunkedgraph.backend import (
     ChunkedGraphMeta,
 )
 from pychunkedgraph.backend.graphoperation import (
+    BulkMergeResult,
     GraphEditOperation,
     MergeOperation,
     MulticutOperation,
     SplitOperation,
     UndoOperation,
     RedoOperation,
+    execute_bulk_merge,
 )
 
+from pychunkedgraph.io.segmentation import SegmentationCache
+from pychunkedgraph.io.segmentation import DEFAULT_CACHE_DIR as SEGMENTATION_CACHE_DIR
+
 # from pychunkedgraph.meshing import meshgen
 
 from google.api_core.retry import Retry, if_exception_type
@@ -112,6 +127,7 @@ class ChunkedGraph(object):
         is_new: bool = False,
         logger: Optional[logging.Logger] = None,
         meta: Optional[ChunkedGraphMeta] = None,
+        segmentation_cache_dir: Optional[str] = SEGMENTATION_CACHE_DIR,
     ) -> None:
 
         if logger is None:
@@ -188,14 +204,15 @@ class ChunkedGraph(object):
         )
 
         self._cv = None
+        self._segmentation_cache_dir = segmentation_cache_dir
+        self._segmentation_caches = {}
+        self._segmentation_caches_lock = threading.Lock()
 
         # Hardcoded parameters
         self._n_bits_for_layer_id = 8
         self._cv_mip = 0
 
         # Vectorized calls
-        self._get_chunk_layer_vec = np.vectorize(self.get_chunk_layer)
-        self._get_chunk_id_vec = np.vectorize(self.get_chunk_id)
 
         # Augment dataset info
         if "leaves_request_bounding_box" in self._dataset_info:
@@ -326,6 +343,27 @@ class ChunkedGraph(object):
 
         return self._cv
 
+    def get_segmentation_cache(self, mip: Optional[int] = None) -> SegmentationCache:
+        """Local disk + memory cache in front of the watershed cloudvolume,
+        reads go to the cloudvolume directly unless segmentation_cache_dir is set
+
+        :param mip: int or None (cv mip)
+        :return: SegmentationCache
+        """
+        mip = self._cv_mip if mip is None else mip
+        with self._segmentation_caches_lock:
+            if mip not in self._segmentation_caches:
+                if mip == self._cv_mip:
+                    cv = self.cv
+                else:
+                    cv = cloudvolume.CloudVolume(
+                        self._cv_path, mip=mip, info=self.dataset_info
+                    )
+                self._segmentation_caches[mip] = SegmentationCache(
+                    cv, cache_dir=self._segmentation_cache_dir
+                )
+            return self._segmentation_caches[mip]
+
     @property
     def vx_vol_bounds(self):
         return np.array(self.cv.bounds.to_list()).reshape(2, -1).T
@@ -535,7 +573,10 @@ class ChunkedGraph(object):
         if len(node_or_chunk_ids) == 0:
             return np.array([], dtype=np.int)
 
-        return self._get_chunk_layer_vec(node_or_chunk_ids)
+        node_or_chunk_ids = np.asarray(node_or_chunk_ids, dtype=np.uint64)
+        return (node_or_chunk_ids >> np.uint64(64 - self._n_bits_for_layer_id)).astype(
+            np.int
+        )
 
     def get_chunk_coordinates(self, node_or_chunk_id: np.uint64) -> np.ndarray:
         """Extract X, Y and Z coordinate from Node ID or Chunk ID
@@ -555,6 +596,29 @@ class ChunkedGraph(object):
         z = int(node_or_chunk_id) >> z_offset & 2 ** bits_per_dim - 1
         return np.array([x, y, z])
 
+    def get_chunk_coordinates_multiple(self, node_or_chunk_ids: Sequence[np.uint64]) -> np.ndarray:
+        """Extract X, Y and Z coordinates from Node IDs or Chunk IDs
+
+        :param node_or_chunk_ids: np.ndarray
+        :return: n x 3 np.ndarray
+        """
+        node_or_chunk_ids = np.asarray(node_or_chunk_ids, dtype=np.uint64)
+        if len(node_or_chunk_ids) == 0:
+            return np.zeros((0, 3), dtype=np.int)
+
+        bits_per_dim = np.array(
+            [self.bitmasks.get(l, 0) for l in range(max(self.bitmasks) + 1)],
+            dtype=np.uint64,
+        )[self.get_chunk_layers(node_or_chunk_ids)]
+        dim_masks = (np.uint64(1) << bits_per_dim) - np.uint64(1)
+        x_offsets = np.uint64(64 - self._n_bits_for_layer_id) - bits_per_dim
+
+        coordinates = np.empty((len(node_or_chunk_ids), 3), dtype=np.int)
+        for i_dim in range(3):
+            offsets = x_offsets - np.uint64(i_dim) * bits_per_dim
+            coordinates[:, i_dim] = (node_or_chunk_ids >> offsets) & dim_masks
+        return coordinates
+
     def get_chunk_id(
         self,
         node_id: Optional[np.uint64] = None,
@@ -613,7 +677,13 @@ class ChunkedGraph(object):
         if len(node_ids) == 0:
             return np.array([], dtype=np.int)
 
-        return self._get_chunk_id_vec(node_ids)
+        node_ids = np.asarray(node_ids, dtype=np.uint64)
+        bits_per_dim = np.array(
+            [self.bitmasks.get(l, 0) for l in range(max(self.bitmasks) + 1)],
+            dtype=np.uint64,
+        )[self.get_chunk_layers(node_ids)]
+        chunk_offsets = np.uint64(64 - self._n_bits_for_layer_id) - np.uint64(3) * bits_per_dim
+        return (node_ids >> chunk_offsets) << chunk_offsets
 
     def get_child_chunk_ids(self, node_or_chunk_id: np.uint64) -> np.ndarray:
         """Calculates the ids of the children chunks in the next lower layer
@@ -961,16 +1031,10 @@ class ChunkedGraph(object):
 
         cross_chunk_edge_layers = np.ones(len(cross_edges), dtype=np.int)
 
-        cross_edge_coordinates = []
-        for cross_edge in cross_edges:
-            cross_edge_coordinates.append(
-                [
-                    self.get_chunk_coordinates(cross_edge[0]),
-                    self.get_chunk_coordinates(cross_edge[1]),
-                ]
-            )
-
-        cross_edge_coordinates = np.array(cross_edge_coordinates, dtype=np.int)
+        cross_edges = np.asarray(cross_edges, dtype=np.uint64).reshape(-1, 2)
+        cross_edge_coordinates = self.get_chunk_coordinates_multiple(
+            cross_edges.ravel()
+        ).reshape(-1, 2, 3)
 
         for layer in range(2, self.n_layers):
             edge_diff = np.sum(
@@ -1327,21 +1391,30 @@ class ChunkedGraph(object):
             return cross_edge_dict
 
     def read_cross_chunk_edges_for_nodes(
-        self, node_ids: Sequence[np.uint64], start_layer: int = 2, end_layer: int = None
+        self,
+        node_ids: Sequence[np.uint64],
+        start_layer: int = 2,
+        end_layer: int = None,
+        flatten: bool = True,
     ) -> Dict:
-        """Reads the cross chunk edge entry from the table for a given node id
-        and formats it as cross edge dict
+        """Reads the cross chunk edge entries from the table for the given node ids
+        with one multi row read.
 
-        :param node_id:
+        :param node_ids:
         :param start_layer:
         :param end_layer:
+        :param flatten:
+            True: maps every node id with a row to an array of its edges
+            False: maps every node id to a cross edge dict as returned by
+                   `read_cross_chunk_edges`, layers below the layer of a node are
+                   skipped (root nodes get an empty dict)
         :return:
         """
         if end_layer is None:
             end_layer = self.n_layers
 
         if start_layer < 2 or start_layer == self.n_layers:
-            return {}
+            return {} if flatten else {node_id: {} for node_id in node_ids}
 
         assert end_layer > start_layer and end_layer <= self.n_layers
 
@@ -1352,6 +1425,19 @@ class ChunkedGraph(object):
         row_dict = self.read_node_id_rows(node_ids=node_ids, columns=columns)
 
         cross_edge_dict = {}
+        if not flatten:
+            node_layers = self.get_chunk_layers(node_ids)
+            for node_id, node_layer in zip(node_ids, node_layers):
+                node_row = row_dict.get(node_id, {})
+                cross_edge_dict[node_id] = {}
+                for l in range(max(node_layer, start_layer), end_layer):
+                    col = column_keys.Connectivity.CrossChunkEdge[l]
+                    if col in node_row:
+                        cross_edge_dict[node_id][l] = node_row[col][0].value
+                    else:
+                        cross_edge_dict[node_id][l] = col.deserialize(b"")
+            return cross_edge_dict
+
         for node_id in row_dict:
             cross_edge_array = np.zeros((0, 2), dtype=np.uint64)
             for l in range(start_layer, end_layer):
@@ -1657,9 +1743,7 @@ class ChunkedGraph(object):
             ]
         )
 
-        local_sv_seg = self.cv[
-            bbox[0, 0] : bbox[1, 0], bbox[0, 1] : bbox[1, 1], bbox[0, 2] : bbox[1, 2]
-        ].squeeze()
+        local_sv_seg = self.get_segmentation_cache().cutout(bbox[0], bbox[1])
 
         # limit get_roots calls to the relevant areas of the data
         lower_bs = np.floor(
@@ -1716,6 +1800,111 @@ class ChunkedGraph(object):
 
         return matched_sv_ids
 
+    def get_atomic_ids_from_coords_multi(
+        self,
+        coordinates: Sequence[Sequence[int]],
+        parent_ids: Sequence[np.uint64],
+        max_dist_nm: int = 500,
+        cluster_size_nm: int = 1000,
+    ) -> np.ndarray:
+        """Retrieves supervoxel ids for many coords at once.
+
+        For every coordinate the closest voxel (within max_dist_nm) whose
+        supervoxel belongs to the given parent is picked. Coordinates are
+        grouped on a grid of cluster_size_nm and each group is cut out once.
+        All supervoxels of all cutouts are mapped with one get_roots call per
+        parent layer and timestamp, then each point searches windows of
+        growing size around it.
+
+        :param coordinates: n x 3 np.ndarray of locations in voxel space
+        :param parent_ids: n parent ids (any layer), one per coordinate
+        :param max_dist_nm: max distance explored
+        :param cluster_size_nm: size of the grid cells used for grouping
+        :return: n supervoxel ids; 0 where no supervoxel was found
+        """
+        coordinates = np.array(coordinates, dtype=np.int64).reshape(-1, 3)
+        parent_ids = np.array(parent_ids, dtype=np.uint64)
+        atomic_ids = np.zeros(len(coordinates), dtype=np.uint64)
+        if len(coordinates) == 0:
+            return atomic_ids
+
+        resolution = np.array(self.cv.resolution, dtype=np.float64)
+        parent_layers = self.get_chunk_layers(parent_ids)
+        layer1_mask = parent_layers == 1
+        atomic_ids[layer1_mask] = parent_ids[layer1_mask]
+
+        # Enable search with old parents by using their timestamps
+        u_parent_ids = np.unique(parent_ids)
+        parent_rows = self.read_node_id_rows(
+            node_ids=u_parent_ids[self.get_chunk_layers(u_parent_ids) > 1],
+            columns=column_keys.Hierarchy.Child,
+        )
+        parent_ts = {k: v[0].timestamp for k, v in parent_rows.items()}
+
+        # Group coordinates on a grid, one cutout per cell
+        max_dist_vx = np.ceil(max_dist_nm / resolution).astype(np.int64)
+        cell_size_vx = np.maximum(np.ceil(cluster_size_nm / resolution), 1)
+        cells = (coordinates // cell_size_vx).astype(np.int64)
+        _, cell_inverse = np.unique(cells, axis=0, return_inverse=True)
+        cell_inverse = cell_inverse.reshape(-1)
+
+        cutouts = []
+        search_mask = ~layer1_mask & np.isin(parent_ids, list(parent_ts.keys()))
+        for cell_id in np.unique(cell_inverse[search_mask]):
+            point_ids = np.where((cell_inverse == cell_id) & search_mask)[0]
+            bbox_start = np.min(coordinates[point_ids], axis=0) - max_dist_vx
+            bbox_end = np.max(coordinates[point_ids], axis=0) + max_dist_vx + 1
+            seg = self.get_segmentation_cache().cutout(bbox_start, bbox_end)
+            cutouts.append((point_ids, bbox_start, seg))
+
+        # Candidate supervoxels of all cutouts, mapped with one get_roots
+        # call per (layer, timestamp) of the parents
+        parent_keys = {p: (self.get_chunk_layer(p), ts) for p, ts in parent_ts.items()}
+        candidates = collections.defaultdict(list)
+        for point_ids, _, seg in cutouts:
+            sv_ids = fastremap.unique(seg)
+            for key in set(parent_keys[p] for p in parent_ids[point_ids]):
+                candidates[key].append(sv_ids)
+
+        root_lookup = {}
+        for key, sv_ids in candidates.items():
+            sv_ids = np.unique(np.concatenate(sv_ids).astype(np.uint64))
+            sv_ids = sv_ids[sv_ids != 0]
+            root_ids = self.get_roots(sv_ids, time_stamp=key[1], stop_layer=key[0])
+            root_lookup[key] = (sv_ids, np.array(root_ids, dtype=np.uint64))
+
+        # Closest voxel of the parent in a window around each point. Most
+        # points sit on or right next to their object, so small windows are
+        # searched first and only unresolved points get larger ones.
+        radii_nm = [r for r in [75, 150, 250] if r < max_dist_nm] + [max_dist_nm]
+        for point_ids, bbox_start, seg in cutouts:
+            for point_id in point_ids:
+                parent_id = parent_ids[point_id]
+                sv_ids, root_ids = root_lookup[parent_keys[parent_id]]
+                if len(sv_ids) == 0:
+                    continue
+                local = coordinates[point_id] - bbox_start
+                for radius_nm in radii_nm:
+                    radius_vx = np.ceil(radius_nm / resolution).astype(np.int64)
+                    lb = local - radius_vx
+                    ub = local + radius_vx + 1
+                    window = seg[lb[0] : ub[0], lb[1] : ub[1], lb[2] : ub[2]]
+                    idx = np.searchsorted(sv_ids, window)
+                    idx[idx == len(sv_ids)] = 0
+                    mask = (sv_ids[idx] == window) & (root_ids[idx] == parent_id)
+                    locs = np.argwhere(mask)
+                    if len(locs) == 0:
+                        continue
+
+                    dists = np.sqrt(
+                        np.sum(((locs - radius_vx) * resolution) ** 2, axis=1)
+                    )
+                    closest = np.argmin(dists)
+                    if dists[closest] <= radius_nm:
+                        atomic_ids[point_id] = window[tuple(locs[closest])]
+                        break
+        return atomic_ids
+
     def read_log_row(
         self, operation_id: np.uint64
     ) -> Union[
@@ -1818,6 +2007,8 @@ class ChunkedGraph(object):
         isolated_node_ids: Sequence[np.uint64],
         verbose: bool = True,
         time_stamp: Optional[datetime.datetime] = None,
+        compute_l2_attributes: bool = False,
+        compute_node_stats: bool = False,
     ):
         """Creates atomic nodes in first abstraction layer for a SINGLE chunk
             and all abstract nodes in the second for the same chunk
@@ -1834,6 +2025,10 @@ class ChunkedGraph(object):
             ids of nodes that have no edge in the chunked graph
         :param verbose: bool
         :param time_stamp: datetime
+        :param compute_l2_attributes: bool
+            computes and writes level 2 attributes from the chunk segmentation
+        :param compute_node_stats: bool
+            writes aggregate statistics (`node_stats`) of the level 2 nodes
         """
         if time_stamp is None:
             time_stamp = datetime.datetime.utcnow()
@@ -1905,9 +2100,7 @@ class ChunkedGraph(object):
 
         chunk_node_ids = np.unique(chunk_node_ids)
 
-        node_chunk_ids = np.array(
-            [self.get_chunk_id(c) for c in chunk_node_ids], dtype=np.uint64
-        )
+        node_chunk_ids = self.get_chunk_ids_from_node_ids(chunk_node_ids)
 
         u_node_chunk_ids, c_node_chunk_ids = np.unique(
             node_chunk_ids, return_counts=True
@@ -1942,221 +2135,92 @@ class ChunkedGraph(object):
         time_start = time.time()
 
         time_dict = collections.defaultdict(list)
+        l2_children = {}
 
+        # Edges of each supervoxel are contiguous slices of these arrays
         time_start_1 = time.time()
-        sparse_indices = {}
-        remapping = {}
-        for k in edge_id_dict.keys():
-            # Circumvent datatype issues
-
-            u_ids, inv_ids = np.unique(edge_id_dict[k], return_inverse=True)
-            mapped_ids = np.arange(len(u_ids), dtype=np.int32)
-            remapped_arr = mapped_ids[inv_ids].reshape(edge_id_dict[k].shape)
-
-            sparse_indices[k] = compute_indices_pandas(remapped_arr)
-            remapping[k] = dict(zip(u_ids, mapped_ids))
-
-        time_dict["sparse_indices"].append(time.time() - time_start_1)
+        grouped_edges = group_edges_by_supervoxel(
+            edge_id_dict, edge_aff_dict, edge_area_dict
+        )
+        # Supervoxels with edges are a subset of the graph ids
+        graph_id_idx = np.searchsorted(unique_graph_ids, grouped_edges["node_ids"])
+        edge_starts = np.zeros(len(unique_graph_ids), dtype=np.int)
+        edge_ends = np.zeros(len(unique_graph_ids), dtype=np.int)
+        n_connected = np.zeros(len(unique_graph_ids), dtype=np.int)
+        edge_starts[graph_id_idx] = grouped_edges["offsets"][:-1]
+        edge_ends[graph_id_idx] = grouped_edges["offsets"][1:]
+        n_connected[graph_id_idx] = grouped_edges["n_connected"]
+
+        cross_starts = np.searchsorted(
+            grouped_edges["parent_cross_node_ids"], unique_graph_ids, side="left"
+        )
+        cross_ends = np.searchsorted(
+            grouped_edges["parent_cross_node_ids"], unique_graph_ids, side="right"
+        )
+        all_cce_layers = self.get_cross_chunk_edges_layer(
+            grouped_edges["parent_cross_edges"]
+        )
+        time_dict["grouping_edges"].append(time.time() - time_start_1)
 
         rows = []
 
         for i_cc, cc in enumerate(ccs):
             node_ids = unique_graph_ids[cc]
 
-            u_chunk_ids = np.unique([self.get_chunk_id(n) for n in node_ids])
-
-            if len(u_chunk_ids) > 1:
-                self.logger.error(f"Found multiple chunk ids: {u_chunk_ids}")
-                raise Exception()
-
             # Create parent id
             parent_id = parent_ids[i_cc]
 
-            parent_cross_edges = np.array([], dtype=np.uint64).reshape(0, 2)
-
             # Add rows for nodes that are in this chunk
-            for i_node_id, node_id in enumerate(node_ids):
-                # Extract edges relevant to this node
-
-                # in chunk + connected
-                time_start_2 = time.time()
-                if node_id in remapping["in_connected"]:
-                    row_ids, column_ids = sparse_indices["in_connected"][
-                        remapping["in_connected"][node_id]
-                    ]
-
-                    inv_column_ids = (column_ids + 1) % 2
-
-                    connected_ids = edge_id_dict["in_connected"][
-                        row_ids, inv_column_ids
-                    ]
-                    connected_affs = edge_aff_dict["in_connected"][row_ids]
-                    connected_areas = edge_area_dict["in_connected"][row_ids]
-                    time_dict["in_connected"].append(time.time() - time_start_2)
-                    time_start_2 = time.time()
-                else:
-                    connected_ids = np.array([], dtype=np.uint64)
-                    connected_affs = np.array([], dtype=np.float32)
-                    connected_areas = np.array([], dtype=np.uint64)
-
-                # in chunk + disconnected
-                if node_id in remapping["in_disconnected"]:
-                    row_ids, column_ids = sparse_indices["in_disconnected"][
-                        remapping["in_disconnected"][node_id]
-                    ]
-                    inv_column_ids = (column_ids + 1) % 2
-
-                    disconnected_ids = edge_id_dict["in_disconnected"][
-                        row_ids, inv_column_ids
-                    ]
-                    disconnected_affs = edge_aff_dict["in_disconnected"][row_ids]
-                    disconnected_areas = edge_area_dict["in_disconnected"][row_ids]
-                    time_dict["in_disconnected"].append(time.time() - time_start_2)
-                    time_start_2 = time.time()
-                else:
-                    disconnected_ids = np.array([], dtype=np.uint64)
-                    disconnected_affs = np.array([], dtype=np.float32)
-                    disconnected_areas = np.array([], dtype=np.uint64)
-
-                # out chunk + connected
-                if node_id in remapping["between_connected"]:
-                    row_ids, column_ids = sparse_indices["between_connected"][
-                        remapping["between_connected"][node_id]
-                    ]
-
-                    row_ids = row_ids[column_ids == 0]
-                    column_ids = column_ids[column_ids == 0]
-                    inv_column_ids = (column_ids + 1) % 2
-                    time_dict["out_connected_mask"].append(time.time() - time_start_2)
-                    time_start_2 = time.time()
-
-                    connected_ids = np.concatenate(
-                        [
-                            connected_ids,
-                            edge_id_dict["between_connected"][row_ids, inv_column_ids],
-                        ]
-                    )
-                    connected_affs = np.concatenate(
-                        [connected_affs, edge_aff_dict["between_connected"][row_ids]]
-                    )
-                    connected_areas = np.concatenate(
-                        [connected_areas, edge_area_dict["between_connected"][row_ids]]
-                    )
-
-                    parent_cross_edges = np.concatenate(
-                        [parent_cross_edges, edge_id_dict["between_connected"][row_ids]]
-                    )
-
-                    time_dict["out_connected"].append(time.time() - time_start_2)
-                    time_start_2 = time.time()
-
-                # out chunk + disconnected
-                if node_id in remapping["between_disconnected"]:
-                    row_ids, column_ids = sparse_indices["between_disconnected"][
-                        remapping["between_disconnected"][node_id]
-                    ]
-
-                    row_ids = row_ids[column_ids == 0]
-                    column_ids = column_ids[column_ids == 0]
-                    inv_column_ids = (column_ids + 1) % 2
-                    time_dict["out_disconnected_mask"].append(
-                        time.time() - time_start_2
-                    )
-                    time_start_2 = time.time()
-
-                    disconnected_ids = np.concatenate(
-                        [
-                            disconnected_ids,
-                            edge_id_dict["between_disconnected"][
-                                row_ids, inv_column_ids
-                            ],
-                        ]
-                    )
-                    disconnected_affs = np.concatenate(
-                        [
-                            disconnected_affs,
-                            edge_aff_dict["between_disconnected"][row_ids],
-                        ]
-                    )
-                    disconnected_areas = np.concatenate(
-                        [
-                            disconnected_areas,
-                            edge_area_dict["between_disconnected"][row_ids],
-                        ]
-                    )
-
-                    time_dict["out_disconnected"].append(time.time() - time_start_2)
-                    time_start_2 = time.time()
-
-                # cross
-                if node_id in remapping["cross"]:
-                    row_ids, column_ids = sparse_indices["cross"][
-                        remapping["cross"][node_id]
-                    ]
-
-                    row_ids = row_ids[column_ids == 0]
-                    column_ids = column_ids[column_ids == 0]
-                    inv_column_ids = (column_ids + 1) % 2
-                    time_dict["cross_mask"].append(time.time() - time_start_2)
-                    time_start_2 = time.time()
-
-                    connected_ids = np.concatenate(
-                        [connected_ids, edge_id_dict["cross"][row_ids, inv_column_ids]]
-                    )
-                    connected_affs = np.concatenate(
-                        [
-                            connected_affs,
-                            np.full((len(row_ids)), np.inf, dtype=np.float32),
-                        ]
-                    )
-                    connected_areas = np.concatenate(
-                        [connected_areas, np.ones((len(row_ids)), dtype=np.uint64)]
-                    )
-
-                    parent_cross_edges = np.concatenate(
-                        [parent_cross_edges, edge_id_dict["cross"][row_ids]]
-                    )
-                    time_dict["cross"].append(time.time() - time_start_2)
-                    time_start_2 = time.time()
-
-                # Create node
-                partners = np.concatenate([connected_ids, disconnected_ids])
-                affinities = np.concatenate([connected_affs, disconnected_affs])
-                areas = np.concatenate([connected_areas, disconnected_areas])
-                connected = np.arange(len(connected_ids), dtype=np.int)
-
+            time_start_2 = time.time()
+            for i_graph_id in cc:
+                start, end = edge_starts[i_graph_id], edge_ends[i_graph_id]
                 val_dict = {
-                    column_keys.Connectivity.Partner: partners,
-                    column_keys.Connectivity.Affinity: affinities,
-                    column_keys.Connectivity.Area: areas,
-                    column_keys.Connectivity.Connected: connected,
+                    column_keys.Connectivity.Partner: grouped_edges["partners"][start:end],
+                    column_keys.Connectivity.Affinity: grouped_edges["affinities"][start:end],
+                    column_keys.Connectivity.Area: grouped_edges["areas"][start:end],
+                    column_keys.Connectivity.Connected: np.arange(
+                        n_connected[i_graph_id], dtype=np.int
+                    ),
                     column_keys.Hierarchy.Parent: parent_id,
                 }
 
                 rows.append(
                     self.mutate_row(
-                        serializers.serialize_uint64(node_id),
+                        serializers.serialize_uint64(unique_graph_ids[i_graph_id]),
                         val_dict,
                         time_stamp=time_stamp,
                     )
                 )
                 node_c += 1
-                time_dict["creating_lv1_row"].append(time.time() - time_start_2)
+            time_dict["creating_lv1_rows"].append(time.time() - time_start_2)
+
+            parent_cross_idx = np.concatenate(
+                [np.arange(cross_starts[i], cross_ends[i]) for i in cc]
+            ).astype(np.int)
+            parent_cross_edges = grouped_edges["parent_cross_edges"][parent_cross_idx]
+            cce_layers = all_cce_layers[parent_cross_idx]
 
             time_start_1 = time.time()
             # Create parent node
+            val_dict = {column_keys.Hierarchy.Child: node_ids}
+            if compute_node_stats:
+                val_dict.update(
+                    node_stats.create_node_stats_val_dict(
+                        node_stats.get_l2_node_stats(self, parent_id, len(node_ids))
+                    )
+                )
             rows.append(
                 self.mutate_row(
                     serializers.serialize_uint64(parent_id),
-                    {column_keys.Hierarchy.Child: node_ids},
+                    val_dict,
                     time_stamp=time_stamp,
                 )
             )
+            l2_children[parent_id] = node_ids
 
             time_dict["creating_lv2_row"].append(time.time() - time_start_1)
             time_start_1 = time.time()
 
-            cce_layers = self.get_cross_chunk_edges_layer(parent_cross_edges)
             u_cce_layers = np.unique(cce_layers)
 
             val_dict = {}
@@ -2183,8 +2247,22 @@ class ChunkedGraph(object):
             if len(rows) > 100000:
                 time_start_1 = time.time()
                 self.bulk_write(rows)
+                rows = []
                 time_dict["writing"].append(time.time() - time_start_1)
 
+        if compute_l2_attributes:
+            time_start_1 = time.time()
+            rows.extend(
+                l2_attributes.create_l2_attribute_rows(
+                    self,
+                    l2_attributes.compute_l2_attributes_from_segmentation(
+                        self, l2_children
+                    ),
+                    time_stamp=time_stamp,
+                )
+            )
+            time_dict["l2_attributes"].append(time.time() - time_start_1)
+
         if len(rows) > 0:
             time_start_1 = time.time()
             self.bulk_write(rows)
@@ -2214,6 +2292,7 @@ class ChunkedGraph(object):
         time_stamp: Optional[datetime.datetime] = None,
         verbose: bool = True,
         n_threads: int = 20,
+        compute_node_stats: bool = False,
     ) -> None:
         """Creates the abstract nodes for a given chunk in a given layer
 
@@ -2223,6 +2302,9 @@ class ChunkedGraph(object):
         :param time_stamp: datetime
         :param verbose: bool
         :param n_threads: int
+        :param compute_node_stats: bool
+            writes aggregate statistics (`node_stats`) of the new nodes from
+            those of their children
         """
 
         def _read_subchunks_thread(chunk_coord):
@@ -2233,6 +2315,8 @@ class ChunkedGraph(object):
                 column_keys.Connectivity.CrossChunkEdge[l]
                 for l in range(layer_id - 1, self.n_layers)
             ]
+            if compute_node_stats:
+                columns += node_stats.NODE_STATS_COLUMNS
             range_read = self.range_read_chunk(layer_id - 1, x, y, z, columns=columns)
 
             # Due to restarted jobs some nodes in the layer below might be
@@ -2263,27 +2347,20 @@ class ChunkedGraph(object):
 
                 node_child_ids = row_data[column_keys.Hierarchy.Child][0].value
 
+                if compute_node_stats:
+                    child_stats = node_stats.parse_node_stats(row_data)
+                    if child_stats is not None:
+                        node_stats_dict[row_id] = child_stats
+
                 max_child_ids.append(np.max(node_child_ids))
                 segment_ids.append(segment_id)
                 row_ids.append(row_id)
 
             segment_ids = np.array(segment_ids, dtype=np.uint64)
-            row_ids = np.array(row_ids)
+            row_ids = np.array(row_ids, dtype=np.uint64)
             max_child_ids = np.array(max_child_ids, dtype=np.uint64)
 
-            sorting = np.argsort(segment_ids)[::-1]
-            row_ids = row_ids[sorting]
-            max_child_ids = max_child_ids[sorting]
-
-            counter = collections.defaultdict(int)
-            max_child_ids_occ_so_far = np.zeros(len(max_child_ids), dtype=np.int)
-            for i_row in range(len(max_child_ids)):
-                max_child_ids_occ_so_far[i_row] = counter[max_child_ids[i_row]]
-                counter[max_child_ids[i_row]] += 1
-
-            # Filter last occurences (we inverted the list) of each node
-            m = max_child_ids_occ_so_far == 0
-            row_ids = row_ids[m]
+            row_ids = row_ids[get_latest_duplicate_mask(segment_ids, max_child_ids)]
             ll_node_ids.extend(row_ids)
 
             # Loop through nodes from this chunk
@@ -2302,37 +2379,10 @@ class ChunkedGraph(object):
                         atomic_cross_edges = cross_edge_dict[row_id][layer_id - 1]
 
                         if len(atomic_cross_edges) > 0:
-                            atomic_partner_id_dict[row_id] = atomic_cross_edges[:, 1]
-
-                            new_pairs = zip(
-                                atomic_cross_edges[:, 0],
-                                [row_id] * len(atomic_cross_edges),
+                            atomic_cross_edge_list.append(atomic_cross_edges)
+                            cross_edge_node_id_list.append(
+                                np.full(len(atomic_cross_edges), row_id, dtype=np.uint64)
                             )
-                            atomic_child_id_dict_pairs.extend(new_pairs)
-
-        def _resolve_cross_chunk_edges_thread(args) -> None:
-            start, end = args
-
-            for i_child_key, child_key in enumerate(
-                atomic_partner_id_dict_keys[start:end]
-            ):
-                this_atomic_partner_ids = atomic_partner_id_dict[child_key]
-
-                partners = {
-                    atomic_child_id_dict[atomic_cross_id]
-                    for atomic_cross_id in this_atomic_partner_ids
-                    if atomic_child_id_dict[atomic_cross_id] != 0
-                }
-
-                if len(partners) > 0:
-                    partners = np.array(list(partners), dtype=np.uint64)[:, None]
-
-                    this_ids = np.array([child_key] * len(partners), dtype=np.uint64)[
-                        :, None
-                    ]
-                    these_edges = np.concatenate([this_ids, partners], axis=1)
-
-                    edge_ids.extend(these_edges)
 
         def _write_out_connected_components(args) -> None:
             start, end = args
@@ -2395,6 +2445,14 @@ class ChunkedGraph(object):
                         )
 
                     val_dict = {column_keys.Hierarchy.Child: node_ids}
+                    if compute_node_stats and all(n in node_stats_dict for n in node_ids):
+                        val_dict.update(
+                            node_stats.create_node_stats_val_dict(
+                                node_stats.combine_node_stats(
+                                    [node_stats_dict[n] for n in node_ids]
+                                )
+                            )
+                        )
                     for l in range(parent_layer_id, self.n_layers):
                         if l in parent_cross_edges and len(parent_cross_edges[l]) > 0:
                             val_dict[
@@ -2431,9 +2489,10 @@ class ChunkedGraph(object):
 
         time_start = time.time()
 
-        atomic_partner_id_dict = {}
         cross_edge_dict = {}
-        atomic_child_id_dict_pairs = []
+        node_stats_dict = {}
+        atomic_cross_edge_list = []
+        cross_edge_node_id_list = []
         ll_node_ids = []
 
         multi_args = child_chunk_coords
@@ -2442,8 +2501,6 @@ class ChunkedGraph(object):
         if n_jobs > 0:
             mu.multithread_func(_read_subchunks_thread, multi_args, n_threads=n_jobs)
 
-        d = dict(atomic_child_id_dict_pairs)
-        atomic_child_id_dict = collections.defaultdict(np.uint64, d)
         ll_node_ids = np.array(ll_node_ids, dtype=np.uint64)
 
         if verbose:
@@ -2453,32 +2510,13 @@ class ChunkedGraph(object):
         time_start = time.time()
 
         # Extract edges from remaining cross chunk edges
-        # and maintain unused cross chunk edges
-        edge_ids = []
-        # u_atomic_child_ids = np.unique(atomic_child_ids)
-        atomic_partner_id_dict_keys = np.array(
-            list(atomic_partner_id_dict.keys()), dtype=np.uint64
-        )
-
-        if n_threads > 1:
-            n_jobs = n_threads * 3  # Heuristic
-        else:
-            n_jobs = 1
-
-        n_jobs = np.min([n_jobs, len(atomic_partner_id_dict_keys)])
-
-        if n_jobs > 0:
-            spacing = np.linspace(
-                0, len(atomic_partner_id_dict_keys), n_jobs + 1
-            ).astype(np.int)
-            starts = spacing[:-1]
-            ends = spacing[1:]
-
-            multi_args = list(zip(starts, ends))
-
-            mu.multithread_func(
-                _resolve_cross_chunk_edges_thread, multi_args, n_threads=n_threads
+        if len(atomic_cross_edge_list) > 0:
+            edge_ids = resolve_cross_chunk_edges(
+                np.concatenate(cross_edge_node_id_list),
+                np.concatenate(atomic_cross_edge_list),
             )
+        else:
+            edge_ids = np.empty((0, 2), dtype=np.uint64)
 
         if verbose:
             self.logger.debug(
@@ -2497,10 +2535,10 @@ class ChunkedGraph(object):
         parent_chunk_id_dict = self.get_parent_chunk_id_dict(chunk_id)
 
         # Extract connected components
-        isolated_node_mask = ~np.in1d(ll_node_ids, np.unique(edge_ids))
-        add_node_ids = ll_node_ids[isolated_node_mask].squeeze()
+        isolated_node_mask = ~np.in1d(ll_node_ids, edge_ids)
+        add_node_ids = ll_node_ids[isolated_node_mask]
         add_edge_ids = np.vstack([add_node_ids, add_node_ids]).T
-        edge_ids.extend(add_edge_ids)
+        edge_ids = np.concatenate([edge_ids, add_edge_ids])
 
         graph, _, _, unique_graph_ids = flatgraph_utils.build_gt_graph(
             edge_ids, make_directed=True
@@ -4130,6 +4168,42 @@ class ChunkedGraph(object):
             sink_coords=sink_coord,
         ).execute()
 
+    def add_edges_bulk(
+        self,
+        user_id: str,
+        atomic_edges: Sequence[Sequence[np.uint64]],
+        affinities: Sequence[np.float32] = None,
+        source_coords: Sequence[Sequence[int]] = None,
+        sink_coords: Sequence[Sequence[int]] = None,
+        n_threads: int = 1,
+    ) -> List[BulkMergeResult]:
+        """Adds many edges, edges between the same roots are merged together
+
+            One operation (root lock, hierarchy update and log row) per group
+            of edges whose roots are connected through the edges
+
+        :param user_id: str
+        :param atomic_edges: n x 2 uint64s
+            may connect any root ids
+        :param affinities: list of np.float32 or None
+        :param source_coords: list of int (n x 3)
+        :param sink_coords: list of int (n x 3)
+        :param n_threads: int
+            groups executed concurrently
+        :return: list of BulkMergeResult
+            one per group, `result` is None and `error` is set if its lock could
+            not be acquired or a precondition failed
+        """
+        return execute_bulk_merge(
+            self,
+            user_id=user_id,
+            added_edges=atomic_edges,
+            affinities=affinities,
+            source_coords=source_coords,
+            sink_coords=sink_coords,
+            n_threads=n_threads,
+        )
+
     def remove_edges(
         self,
         user_id: str,
@@ -4388,12 +4462,7 @@ class ChunkedGraph(object):
         """
         chunk_start = self.get_chunk_voxel_location(chunk_coordinate)
         chunk_end = self.get_chunk_voxel_location(chunk_coordinate + 1)
-        ws_seg = self.cv[
-            chunk_start[0] : chunk_end[0],
-            chunk_start[1] : chunk_end[1],
-            chunk_start[2] : chunk_end[2],
-        ].squeeze()
-        return ws_seg
+        return self.get_segmentation_cache().cutout(chunk_start, chunk_end)
 
     def get_proofread_root_ids(
         self,
@@ -5,12 +5,11 @@ import collections
 from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union,\
     NamedTuple
 
-from multiwrapper import multiprocessing_utils as mu
-
 from pychunkedgraph.backend.chunkedgraph_utils \
-    import get_google_compatible_time_stamp, combine_cross_chunk_edge_dicts
+    import get_google_compatible_time_stamp, CrossChunkEdgeAccumulator, \
+    resolve_cross_chunk_edges
 from pychunkedgraph.backend.utils import column_keys, serializers
-from pychunkedgraph.backend import flatgraph_utils
+from pychunkedgraph.backend import flatgraph_utils, l2_attributes, node_stats
 
 def _write_atomic_merge_edges(cg, atomic_edges, affinities, areas, time_stamp):
     rows = []
@@ -141,12 +140,6 @@ def add_edges(cg,
     :param affinities: list of np.float32
     :return: list
     """
-    def _read_cc_edges_thread(node_ids):
-        for node_id in node_ids:
-            cc_dict[node_id] = cg.read_cross_chunk_edges(node_id)
-
-    cc_dict = {}
-
     atomic_edges = np.array(atomic_edges,
                             dtype=column_keys.Connectivity.Partner.basetype)
 
@@ -172,6 +165,7 @@ def add_edges(cg,
 
     rows = [] # list of rows to be written to BigTable
     lvl2_dict = {}
+    lvl2_children_dict = {}
     lvl2_cross_chunk_edge_dict = {}
 
     # Analyze atomic_edges --> translate them to lvl2 edges and extract cross
@@ -182,15 +176,9 @@ def add_edges(cg,
     graph, _, _, unique_graph_ids = flatgraph_utils.build_gt_graph(
         lvl2_edges, make_directed=True)
 
-    # Read cross chunk edges efficiently
-    cc_dict = {}
+    # Read cross chunk edges of all involved lvl2 nodes at once
     node_ids = np.unique(lvl2_edges)
-    n_threads = int(np.ceil(len(node_ids) / 5))
-
-    node_id_blocks = np.array_split(node_ids, n_threads)
-
-    mu.multithread_func(_read_cc_edges_thread, node_id_blocks,
-                        n_threads=n_threads, debug=False)
+    cc_dict = cg.read_cross_chunk_edges_for_nodes(node_ids, flatten=False)
 
     ccs = flatgraph_utils.connected_components(graph)
     for cc in ccs:
@@ -200,20 +188,14 @@ def add_edges(cg,
         new_node_id = cg.get_unique_node_id(chunk_id)
         lvl2_dict[new_node_id] = lvl2_ids
 
-        cross_chunk_edge_dict = {}
+        cross_chunk_edges = CrossChunkEdgeAccumulator()
         for lvl2_id in lvl2_ids:
-            lvl2_id_cross_chunk_edges = cc_dict[lvl2_id]
-            cross_chunk_edge_dict = \
-                combine_cross_chunk_edge_dicts(
-                    cross_chunk_edge_dict,
-                    lvl2_id_cross_chunk_edges)
+            cross_chunk_edges.add(cc_dict[lvl2_id])
 
             if lvl2_id in new_cross_edge_dict:
-                cross_chunk_edge_dict = \
-                    combine_cross_chunk_edge_dicts(
-                        new_cross_edge_dict[lvl2_id],
-                        lvl2_id_cross_chunk_edges)
+                cross_chunk_edges.add(new_cross_edge_dict[lvl2_id])
 
+        cross_chunk_edge_dict = cross_chunk_edges.build()
         lvl2_cross_chunk_edge_dict[new_node_id] = cross_chunk_edge_dict
 
         if cg.n_layers == 2:
@@ -222,11 +204,15 @@ def add_edges(cg,
                                                time_stamp=time_stamp))
 
         children_ids = cg.get_children(lvl2_ids, flatten=True)
+        lvl2_children_dict[new_node_id] = children_ids
 
         rows.extend(create_parent_children_rows(cg, new_node_id, children_ids,
                                                 cross_chunk_edge_dict,
                                                 time_stamp))
 
+    rows.extend(l2_attributes.create_edit_l2_attribute_rows(
+        cg, lvl2_dict, lvl2_children_dict, time_stamp=time_stamp))
+
     # Write atomic nodes
     rows.extend(_write_atomic_merge_edges(cg, atomic_edges, affinities, areas,
                                           time_stamp=time_stamp))
@@ -235,7 +221,8 @@ def add_edges(cg,
     if cg.n_layers > 2:
         new_root_ids, new_rows = propagate_edits_to_root(
             cg, lvl2_dict.copy(), lvl2_cross_chunk_edge_dict,
-            operation_id=operation_id, time_stamp=time_stamp)
+            operation_id=operation_id, time_stamp=time_stamp,
+            lvl2_children_dict=lvl2_children_dict)
         rows.extend(new_rows)
     else:
         new_root_ids = np.array(list(lvl2_dict.keys()))
@@ -259,6 +246,7 @@ def remove_edges(cg, operation_id: np.uint64,
 
     rows = [] # list of rows to be written to BigTable
     lvl2_dict = {}
+    lvl2_children_dict = {}
     lvl2_cross_chunk_edge_dict = {}
 
     # Analyze atomic_edges --> translate them to lvl2 edges and extract cross
@@ -312,6 +300,7 @@ def remove_edges(cg, operation_id: np.uint64,
             cc_node_ids = unique_graph_ids[cc]
 
             lvl2_dict[new_parent_id] = [lvl2_node_id]
+            lvl2_children_dict[new_parent_id] = cc_node_ids
 
             # Write changes to atomic nodes and new lvl2 parent row
             val_dict = {column_keys.Hierarchy.Child: cc_node_ids}
@@ -359,6 +348,9 @@ def remove_edges(cg, operation_id: np.uint64,
                                                operation_id=operation_id,
                                                time_stamp=time_stamp))
 
+    rows.extend(l2_attributes.create_edit_l2_attribute_rows(
+        cg, lvl2_dict, lvl2_children_dict, time_stamp=time_stamp))
+
     # Write atomic nodes
     rows.extend(_write_atomic_split_edges(cg, atomic_edges,
                                           time_stamp=time_stamp))
@@ -367,7 +359,8 @@ def remove_edges(cg, operation_id: np.uint64,
     if cg.n_layers > 2:
         new_root_ids, new_rows = propagate_edits_to_root(
             cg, lvl2_dict.copy(), lvl2_cross_chunk_edge_dict,
-            operation_id=operation_id, time_stamp=time_stamp)
+            operation_id=operation_id, time_stamp=time_stamp,
+            lvl2_children_dict=lvl2_children_dict)
         rows.extend(new_rows)
     else:
         new_root_ids = np.array(list(lvl2_dict.keys()))
@@ -403,6 +396,7 @@ def old_parent_childrens(eh, node_ids, layer):
     old_next_layer_node_ids = np.unique(old_next_layer_node_ids)
     next_layer_m = eh.cg.get_chunk_layers(old_next_layer_node_ids) == layer + 1
     old_next_layer_node_ids = old_next_layer_node_ids[next_layer_m]
+    eh.bulk_layer_children_read(old_next_layer_node_ids, layer)
 
     old_this_layer_node_ids = np.unique(old_this_layer_node_ids)
     this_layer_m = eh.cg.get_chunk_layers(old_this_layer_node_ids) == layer
@@ -446,28 +440,27 @@ def compute_cross_chunk_connected_components(eh, node_ids, layer):
             old_parent_childrens(eh, node_ids, layer)
 
     # Build network from cross chunk edges
-    edge_id_map = {}
-    cross_edges_lvl1 = []
-    for node_id in node_ids:
+    eh.bulk_cross_chunk_edge_read(old_this_layer_partner_ids)
+    cross_edges_lvl1 = [np.empty([0, 2], dtype=np.uint64)]
+    cross_edge_node_ids = [np.empty(0, dtype=np.uint64)]
+    for node_id in list(node_ids) + list(old_this_layer_partner_ids):
         node_cross_edges = eh.read_cross_chunk_edges(node_id)[layer]
-        edge_id_map.update(dict(zip(node_cross_edges[:, 0],
-                                    [node_id] * len(node_cross_edges))))
-        cross_edges_lvl1.extend(node_cross_edges)
+        cross_edges_lvl1.append(node_cross_edges.reshape(-1, 2))
+        cross_edge_node_ids.append(np.full(len(node_cross_edges), node_id,
+                                           dtype=np.uint64))
 
-    for old_partner_id in old_this_layer_partner_ids:
-        node_cross_edges = eh.read_cross_chunk_edges(old_partner_id)[layer]
+    cross_edge_node_ids = np.concatenate(cross_edge_node_ids)
+    cross_edges_lvl1 = np.concatenate(cross_edges_lvl1)
 
-        edge_id_map.update(dict(zip(node_cross_edges[:, 0],
-                                    [old_partner_id] * len(node_cross_edges))))
-        cross_edges_lvl1.extend(node_cross_edges)
+    # The partners are all nodes of the old parents, so every atomic partner
+    # belongs to one of the nodes. resolve_cross_chunk_edges would silently
+    # drop edges to unknown supervoxels.
+    n_unresolved = np.sum(~np.in1d(cross_edges_lvl1[:, 1], cross_edges_lvl1[:, 0]))
+    assert n_unresolved == 0, \
+        f"{n_unresolved} cross chunk edges on layer {layer} could not be resolved"
 
-    cross_edges_lvl1 = np.array(cross_edges_lvl1)
-    edge_id_map_vec = np.vectorize(edge_id_map.get)
-
-    if len(cross_edges_lvl1) > 0:
-        cross_edges = edge_id_map_vec(cross_edges_lvl1)
-    else:
-        cross_edges = np.empty([0, 2], dtype=np.uint64)
+    # Sorted lookup of the nodes the atomic partners belong to
+    cross_edges = resolve_cross_chunk_edges(cross_edge_node_ids, cross_edges_lvl1)
 
     assert np.sum(np.in1d(eh.old_node_ids, cross_edges)) == 0
 
@@ -541,7 +534,8 @@ def propagate_edits_to_root(cg,
                             lvl2_dict: Dict,
                             lvl2_cross_chunk_edge_dict: Dict,
                             operation_id: np.uint64,
-                            time_stamp: datetime.datetime):
+                            time_stamp: datetime.datetime,
+                            lvl2_children_dict: Optional[Dict] = None):
     """ Propagates changes through layers
 
     :param cg: ChunkedGraph instance
@@ -550,6 +544,9 @@ def propagate_edits_to_root(cg,
     :param lvl2_cross_chunk_edge_dict: dict
     :param operation_id: np.uint64
     :param time_stamp: datetime.datetime
+    :param lvl2_children_dict: dict
+        maps new ids to their supervoxels, aggregate statistics of the new
+        nodes are written if given and the old lvl2 nodes have them
     :return:
     """
     rows = []
@@ -558,6 +555,15 @@ def propagate_edits_to_root(cg,
     eh = EditHelper(cg, lvl2_dict, lvl2_cross_chunk_edge_dict)
     eh.bulk_family_read()
 
+    stats_dict = {}
+    if lvl2_children_dict is not None and \
+            node_stats.read_node_stats(cg, np.unique(eh.old_node_ids)):
+        stats_dict = {node_id: node_stats.get_l2_node_stats(cg, node_id,
+                                                            len(children_ids))
+                      for node_id, children_ids in lvl2_children_dict.items()}
+        rows.extend(node_stats.create_node_stats_rows(cg, stats_dict,
+                                                      time_stamp=time_stamp))
+
     # Setup loop variables
     layer_dict = collections.defaultdict(list)
     layer_dict[2] = list(lvl2_dict.keys())
@@ -579,13 +585,11 @@ def propagate_edits_to_root(cg,
         cc_collections = collections.defaultdict(list)
         for cc in ccs:
             cc_node_ids = unique_graph_ids[cc]
-            cc_cross_edge_dict = collections.defaultdict(list)
+            cc_cross_edges = CrossChunkEdgeAccumulator(
+                start_layer=current_layer + 1)
             for cc_node_id in cc_node_ids:
-                node_cross_edges = eh.read_cross_chunk_edges(cc_node_id)
-                cc_cross_edge_dict = \
-                    combine_cross_chunk_edge_dicts(cc_cross_edge_dict,
-                                                   node_cross_edges,
-                                                   start_layer=current_layer + 1)
+                cc_cross_edges.add(eh.read_cross_chunk_edges(cc_node_id))
+            cc_cross_edge_dict = cc_cross_edges.build()
 
             if (not current_layer + 1 in cc_cross_edge_dict or
                 len(cc_cross_edge_dict[current_layer + 1]) == 0) and \
@@ -615,6 +619,16 @@ def propagate_edits_to_root(cg,
                                                             n_ids)
             next_layer = eh.cg.get_chunk_layer(next_layer_chunk_id)
 
+            if len(stats_dict) > 0:
+                parent_children = {
+                    new_parent_id: cc_collection[0] for new_parent_id, cc_collection
+                    in zip(new_parent_ids, cc_collections[next_layer_chunk_id])}
+                parent_stats_dict = node_stats.compute_parent_node_stats(
+                    eh.cg, parent_children, stats_dict)
+                stats_dict.update(parent_stats_dict)
+                rows.extend(node_stats.create_node_stats_rows(
+                    eh.cg, parent_stats_dict, time_stamp=time_stamp))
+
             for new_parent_id, cc_collection in \
                     zip(new_parent_ids, cc_collections[next_layer_chunk_id]):
                 layer_dict[next_layer].append(new_parent_id)
@@ -835,56 +849,110 @@ class EditHelper(object):
         return self._cross_chunk_edge_dict[node_id]
 
     def bulk_family_read(self):
-        """ Caches parent and children information that will be needed later """
-        def _get_root_thread(lvl2_node_id):
-            p_ids = self.cg.get_root(lvl2_node_id, get_all_parents=True)
-            p_ids = np.concatenate([[lvl2_node_id], p_ids])
-
-            for i_parent in range(len(p_ids) - 1):
-                self._parent_dict[p_ids[i_parent]] = p_ids[i_parent+1]
-
-        def _read_cc_edges_thread(node_ids):
-            for node_id in node_ids:
-                if self.cg.get_chunk_layer(node_id) == self.cg.n_layers:
-                    continue
-
-                self.read_cross_chunk_edges(node_id)
+        """ Caches parent and children information that will be needed later
 
+        Parents of the old lvl2 nodes are read layer by layer, then the
+        children and cross chunk edges of all of them with one read each. The
+        number of reads depends on the number of layers, not on the number of
+        nodes.
+        """
         lvl2_node_ids = []
         for v in self.lvl2_dict.values():
             lvl2_node_ids.extend(v)
 
-        mu.multithread_func(_get_root_thread, lvl2_node_ids,
-                            n_threads=len(lvl2_node_ids), debug=False)
+        parent_ids = self.bulk_parent_read(lvl2_node_ids)
+        self.bulk_children_read(parent_ids)
+
+        node_ids = [parent_ids]
+        parent_layers = self.cg.get_chunk_layers(parent_ids)
+        for parent_id in parent_ids[parent_layers > 2]:
+            node_ids.append(self._children_dict[parent_id])
 
-        parent_ids = list(self._parent_dict.values())
-        child_dict = self.cg.get_children(parent_ids, flatten=False)
-        node_ids = []
+        self.bulk_cross_chunk_edge_read(np.concatenate(node_ids))
 
-        for parent_id in child_dict:
-            self._children_dict[parent_id] = child_dict[parent_id]
+    def bulk_parent_read(self, node_ids):
+        """ Caches the parents of nodes up to their roots, one read per layer
 
-            if self.cg.get_chunk_layer(parent_id) > 2:
-                node_ids.extend(child_dict[parent_id])
+        :param node_ids: list of np.uint64s
+        :return: np.ndarray of np.uint64s
+            all ancestors of the nodes
+        """
+        ancestor_ids = [np.empty(0, dtype=np.uint64)]
+        node_ids = np.unique(np.array(node_ids, dtype=np.uint64))
+
+        while len(node_ids) > 0:
+            missing_ids = np.array([node_id for node_id in node_ids
+                                    if not node_id in self._parent_dict],
+                                   dtype=np.uint64)
+            if len(missing_ids) > 0:
+                parent_ids = self.cg.get_parents(missing_ids)
+                if parent_ids is None:
+                    parent_ids = np.zeros(len(missing_ids), dtype=np.uint64)
+
+                for node_id, parent_id in zip(missing_ids, parent_ids):
+                    self._parent_dict[node_id] = \
+                        parent_id if parent_id != 0 else None
+
+            node_ids = np.unique(np.array(
+                [self._parent_dict[node_id] for node_id in node_ids
+                 if self._parent_dict[node_id] is not None], dtype=np.uint64))
+            ancestor_ids.append(node_ids)
+
+        return np.unique(np.concatenate(ancestor_ids))
 
-            node_ids.append(parent_id)
+    def bulk_children_read(self, node_ids):
+        """ Caches the children of all nodes with one read
 
-            for child_id in self._children_dict[parent_id]:
+        :param node_ids: list of np.uint64s
+        """
+        node_ids = [node_id for node_id in np.unique(node_ids)
+                    if not node_id in self._children_dict]
+        if len(node_ids) == 0:
+            return
+
+        child_dict = self.cg.get_children(node_ids, flatten=False)
+        for node_id, children_ids in child_dict.items():
+            self._children_dict[node_id] = children_ids
+
+            for child_id in children_ids:
                 if not child_id in self._parent_dict:
-                    self._parent_dict[child_id] = parent_id
+                    self._parent_dict[child_id] = node_id
                 else:
-                    assert self._parent_dict[child_id] == parent_id
+                    assert self._parent_dict[child_id] == node_id
+
+    def bulk_layer_children_read(self, node_ids, layer):
+        """ Caches the descendants of nodes down to layer, one read per layer
+
+        :param node_ids: list of np.uint64s
+        :param layer: np.int
+        """
+        node_ids = np.unique(np.array(node_ids, dtype=np.uint64))
+
+        while len(node_ids) > 0:
+            node_ids = node_ids[self.cg.get_chunk_layers(node_ids) > layer]
+            self.bulk_children_read(node_ids)
 
-        node_ids = np.unique(node_ids)
-        n_threads = int(np.ceil(len(node_ids) / 5))
+            children_ids = [np.empty(0, dtype=np.uint64)]
+            children_ids.extend(self._children_dict[node_id]
+                                for node_id in node_ids)
+            node_ids = np.unique(np.concatenate(children_ids))
 
-        if len(node_ids) > 0:
-            node_id_blocks = np.array_split(node_ids, n_threads)
-            mu.multithread_func(_read_cc_edges_thread, node_id_blocks,
-                                n_threads=n_threads, debug=False)
+    def bulk_cross_chunk_edge_read(self, node_ids):
+        """ Caches the cross chunk edges of all nodes with one read
 
-    def bulk_cross_chunk_edge_read(self):
-        raise NotImplementedError
+        Root nodes have no cross chunk edges and are skipped.
+
+        :param node_ids: list of np.uint64s
+        """
+        node_ids = np.unique(np.array(node_ids, dtype=np.uint64))
+        node_ids = node_ids[self.cg.get_chunk_layers(node_ids) < self.cg.n_layers]
+        node_ids = [node_id for node_id in node_ids
+                    if not node_id in self._cross_chunk_edge_dict]
+        if len(node_ids) == 0:
+            return
+
+        self._cross_chunk_edge_dict.update(
+            self.cg.read_cross_chunk_edges_for_nodes(node_ids, flatten=False))
 
     def add_new_layer_node(self, node_id, children_ids, cross_chunk_edge_dict):
         """ Adds a new node to the helper infrastructure
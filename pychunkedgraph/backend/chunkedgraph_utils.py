@@ -177,38 +177,192 @@ def combine_cross_chunk_edge_dicts(d1, d2, start_layer=2):
     """ Combines two cross chunk dictionaries
     Cross chunk dictionaries contain a layer id -> edge list mapping.
 
+    Use `CrossChunkEdgeAccumulator` to combine more than two dictionaries.
+
     :param d1: dict
     :param d2: dict
     :param start_layer: int
     :return: dict
     """
-    assert start_layer >= 2
+    accumulator = CrossChunkEdgeAccumulator(start_layer=start_layer)
+    accumulator.add(d1)
+    accumulator.add(d2)
+    return accumulator.build()
+
+
+class CrossChunkEdgeAccumulator:
+    """ Combines many cross chunk dictionaries
+
+    Edges are collected per layer and concatenated and deduplicated once in
+    `build`, instead of copying the combined arrays for every added
+    dictionary.
+    """
 
-    new_d = {}
+    def __init__(self, start_layer: int = 2):
+        assert start_layer >= 2
+
+        self._start_layer = start_layer
+        self._layer_edges = {}
+
+    def add(self, cross_edge_dict: Dict[int, np.ndarray]) -> None:
+        """
+        :param cross_edge_dict: dict
+            layer id -> edge list
+        """
+        for l, edges in cross_edge_dict.items():
+            if l < self._start_layer:
+                continue
+            self._layer_edges.setdefault(l, []).append(edges.reshape(-1, 2))
+
+    def build(self) -> Dict[int, np.ndarray]:
+        """ Combined dictionary, unique edges of every layer
+
+        :return: dict
+        """
+        new_d = {}
+        for l in sorted(self._layer_edges):
+            edges = np.concatenate(self._layer_edges[l])
+
+            edges_flattened_view = edges.view(dtype='u8,u8').reshape(-1)
+            m = np.unique(edges_flattened_view, return_index=True)[1]
+            new_d[l] = edges[m]
+        return new_d
+
+
+def get_latest_duplicate_mask(segment_ids: np.ndarray,
+                              max_child_ids: np.ndarray) -> np.ndarray:
+    """ Finds the latest version of nodes created more than once
+
+    Restarted ingest jobs can create a node again with the same children.
+    Nodes with the same largest child are duplicates, the one with the
+    highest segment id was created last.
+
+    :param segment_ids: np.ndarray
+    :param max_child_ids: np.ndarray
+    :return: np.ndarray of bool
+        True for the nodes to keep
+    """
+    segment_ids = np.asarray(segment_ids, dtype=np.uint64)
+    max_child_ids = np.asarray(max_child_ids, dtype=np.uint64)
+
+    sorting = np.argsort(segment_ids)[::-1]
+    _, first_ids = np.unique(max_child_ids[sorting], return_index=True)
+
+    mask = np.zeros(len(segment_ids), dtype=np.bool)
+    mask[sorting[first_ids]] = True
+    return mask
 
-    for l in d2:
-        if l < start_layer:
-            continue
 
-    layers = np.unique(list(d1.keys()) + list(d2.keys()))
-    layers = layers[layers >= start_layer]
+def resolve_cross_chunk_edges(node_ids: np.ndarray,
+                              atomic_cross_edges: np.ndarray) -> np.ndarray:
+    """ Edges between nodes from the atomic cross chunk edges of the nodes
 
-    for l in layers:
-        if l in d1 and l in d2:
-            new_d[l] = np.concatenate([d1[l].reshape(-1, 2),
-                                       d2[l].reshape(-1, 2)])
-        elif l in d1:
-            new_d[l] = d1[l].reshape(-1, 2)
-        elif l in d2:
-            new_d[l] = d2[l].reshape(-1, 2)
-        else:
-            raise Exception()
+    The first supervoxel of each atomic edge belongs to its node. Edges to
+    supervoxels not in any of the nodes are dropped.
+
+    :param node_ids: np.ndarray of np.uint64
+        node of every atomic cross chunk edge
+    :param atomic_cross_edges: n x 2 np.ndarray of np.uint64
+    :return: m x 2 np.ndarray of np.uint64
+        unique edges
+    """
+    node_ids = np.asarray(node_ids, dtype=basetypes.NODE_ID)
+    atomic_cross_edges = np.asarray(atomic_cross_edges,
+                                    dtype=basetypes.NODE_ID).reshape(-1, 2)
 
-        edges_flattened_view = new_d[l].view(dtype='u8,u8')
-        m = np.unique(edges_flattened_view, return_index=True)[1]
-        new_d[l] = new_d[l][m]
+    if len(atomic_cross_edges) == 0:
+        return np.empty((0, 2), dtype=basetypes.NODE_ID)
 
-    return new_d
+    sorting = np.argsort(atomic_cross_edges[:, 0])
+    sorted_sv_ids = atomic_cross_edges[sorting, 0]
+    sorted_node_ids = node_ids[sorting]
+
+    partner_idx = np.searchsorted(sorted_sv_ids, atomic_cross_edges[:, 1])
+    partner_idx[partner_idx == len(sorted_sv_ids)] = 0
+    found = sorted_sv_ids[partner_idx] == atomic_cross_edges[:, 1]
+
+    edges = np.stack([node_ids[found], sorted_node_ids[partner_idx[found]]], axis=1)
+
+    # Faster than np.unique(edges, axis=0)
+    edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+    unique_mask = np.ones(len(edges), dtype=np.bool)
+    unique_mask[1:] = np.any(edges[1:] != edges[:-1], axis=1)
+    return edges[unique_mask]
+
+
+def group_edges_by_supervoxel(edge_id_dict: Dict[str, np.ndarray],
+                              edge_aff_dict: Dict[str, np.ndarray],
+                              edge_area_dict: Dict[str, np.ndarray]) -> Dict:
+    """ Sorts the edges of a chunk by their supervoxel in the chunk
+
+    Edges within the chunk ("in_*") belong to both supervoxels, edges
+    leaving the chunk ("between_*", "cross") to their first supervoxel. Per
+    supervoxel the connected edges (in chunk, between chunks, cross) come
+    before the disconnected ones (in chunk, between chunks), each in the
+    order of the input arrays. Cross edges have infinite affinity and area 1.
+
+    :param edge_id_dict: dict
+        see `ChunkedGraph.add_atomic_edges_in_chunks`, all keys present
+    :param edge_aff_dict: dict
+    :param edge_area_dict: dict
+    :return: dict
+        "node_ids": sorted supervoxel ids with edges,
+        "offsets": len(node_ids) + 1 offsets into
+        "partners", "affinities", "areas",
+        "n_connected": number of connected edges per supervoxel,
+        "parent_cross_node_ids", "parent_cross_edges": connected edges
+        leaving the chunk sorted by (stable) their first supervoxel
+    """
+    def _half_edges(key, both_directions, affs, areas):
+        edges = edge_id_dict[key].reshape(-1, 2).astype(basetypes.NODE_ID)
+        if both_directions:
+            return (edges.ravel(), edges[:, ::-1].ravel(),
+                    np.repeat(affs, 2), np.repeat(areas, 2))
+        return edges[:, 0], edges[:, 1], affs, areas
+
+    n_cross = len(edge_id_dict["cross"])
+    half_edges = [
+        _half_edges("in_connected", True, edge_aff_dict["in_connected"],
+                    edge_area_dict["in_connected"]),
+        _half_edges("between_connected", False, edge_aff_dict["between_connected"],
+                    edge_area_dict["between_connected"]),
+        _half_edges("cross", False, np.full(n_cross, np.inf),
+                    np.ones(n_cross)),
+        _half_edges("in_disconnected", True, edge_aff_dict["in_disconnected"],
+                    edge_area_dict["in_disconnected"]),
+        _half_edges("between_disconnected", False,
+                    edge_aff_dict["between_disconnected"],
+                    edge_area_dict["between_disconnected"]),
+    ]
+    n_connected_half_edges = sum(len(h[0]) for h in half_edges[:3])
+
+    sources = np.concatenate([h[0] for h in half_edges])
+    sorting = np.argsort(sources, kind="stable")
+    sources = sources[sorting]
+
+    node_ids, starts = np.unique(sources, return_index=True)
+    is_connected = (sorting < n_connected_half_edges).astype(np.int)
+    n_connected = np.add.reduceat(is_connected, starts) if len(starts) else \
+        np.zeros(0, dtype=np.int)
+
+    parent_cross_edges = np.concatenate(
+        [edge_id_dict["between_connected"].reshape(-1, 2),
+         edge_id_dict["cross"].reshape(-1, 2)]).astype(basetypes.NODE_ID)
+    cross_sorting = np.argsort(parent_cross_edges[:, 0], kind="stable")
+    parent_cross_edges = parent_cross_edges[cross_sorting]
+
+    return {
+        "node_ids": node_ids,
+        "offsets": np.append(starts, len(sources)),
+        "partners": np.concatenate([h[1] for h in half_edges])[sorting],
+        "affinities": np.concatenate(
+            [h[2] for h in half_edges]).astype(basetypes.EDGE_AFFINITY)[sorting],
+        "areas": np.concatenate(
+            [h[3] for h in half_edges]).astype(basetypes.EDGE_AREA)[sorting],
+        "n_connected": n_connected,
+        "parent_cross_node_ids": parent_cross_edges[:, 0],
+        "parent_cross_edges": parent_cross_edges,
+    }
 
 
 def time_min():
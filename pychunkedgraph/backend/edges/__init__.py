@@ -2,6 +2,7 @@
 Classes and types for edges
 """
 
+from typing import Iterable
 from typing import Optional
 from collections import namedtuple
 
@@ -17,7 +18,9 @@ EdgeTypes = namedtuple("EdgeTypes", _edge_type_fileds, defaults=_edge_type_defau
 EDGE_TYPES = EdgeTypes()
 
 DEFAULT_AFFINITY = np.finfo(np.float32).tiny
-DEFAULT_AREA = np.finfo(np.float32).tiny
+# areas are integers (basetypes.EDGE_AREA), the former float default
+# np.finfo(np.float32).tiny was stored as 0 as well
+DEFAULT_AREA = 0
 
 
 class Edges:
@@ -29,34 +32,58 @@ class Edges:
         affinities: Optional[np.ndarray] = None,
         areas: Optional[np.ndarray] = None,
     ):
-        self.node_ids1 = np.array(node_ids1, dtype=basetypes.NODE_ID)
-        self.node_ids2 = np.array(node_ids2, dtype=basetypes.NODE_ID)
+        """
+        Missing affinities and areas are created with default values
+        on first access.
+        """
+        self.node_ids1 = np.asarray(node_ids1, dtype=basetypes.NODE_ID)
+        self.node_ids2 = np.asarray(node_ids2, dtype=basetypes.NODE_ID)
         assert self.node_ids1.size == self.node_ids2.size
         self._as_pairs = None
 
-        self.affinities = np.ones(len(self.node_ids1)) * DEFAULT_AFFINITY
+        self._affinities = None
         if affinities is not None:
-            assert node_ids1.size == affinities.size
-            self.affinities = np.array(affinities, dtype=basetypes.EDGE_AFFINITY)
+            assert self.node_ids1.size == np.size(affinities)
+            self._affinities = np.asarray(affinities, dtype=basetypes.EDGE_AFFINITY)
 
-        self.areas = np.ones(len(self.node_ids1)) * DEFAULT_AREA
+        self._areas = None
         if areas is not None:
-            assert node_ids1.size == areas.size
-            self.areas = np.array(areas, dtype=basetypes.EDGE_AREA)
+            assert self.node_ids1.size == np.size(areas)
+            self._areas = np.asarray(areas, dtype=basetypes.EDGE_AREA)
+
+    @property
+    def affinities(self) -> np.ndarray:
+        if self._affinities is None:
+            self._affinities = np.full(
+                len(self.node_ids1), DEFAULT_AFFINITY, dtype=basetypes.EDGE_AFFINITY
+            )
+        return self._affinities
+
+    @affinities.setter
+    def affinities(self, affinities: np.ndarray):
+        self._affinities = np.asarray(affinities, dtype=basetypes.EDGE_AFFINITY)
+
+    @property
+    def areas(self) -> np.ndarray:
+        if self._areas is None:
+            self._areas = np.full(len(self.node_ids1), DEFAULT_AREA, dtype=basetypes.EDGE_AREA)
+        return self._areas
+
+    @areas.setter
+    def areas(self, areas: np.ndarray):
+        self._areas = np.asarray(areas, dtype=basetypes.EDGE_AREA)
 
     def __add__(self, other):
         """add two Edges instances"""
-        node_ids1 = np.concatenate([self.node_ids1, other.node_ids1])
-        node_ids2 = np.concatenate([self.node_ids2, other.node_ids2])
-        affinities = np.concatenate([self.affinities, other.affinities])
-        areas = np.concatenate([self.areas, other.areas])
-        return Edges(node_ids1, node_ids2, affinities=affinities, areas=areas)
+        return EdgesBuilder([self, other]).build()
 
     def __iadd__(self, other):
-        self.node_ids1 = np.concatenate([self.node_ids1, other.node_ids1])
-        self.node_ids2 = np.concatenate([self.node_ids2, other.node_ids2])
-        self.affinities = np.concatenate([self.affinities, other.affinities])
-        self.areas = np.concatenate([self.areas, other.areas])
+        edges = EdgesBuilder([self, other]).build()
+        self.node_ids1 = edges.node_ids1
+        self.node_ids2 = edges.node_ids2
+        self._affinities = edges._affinities
+        self._areas = edges._areas
+        self._as_pairs = None
         return self
 
     def __len__(self):
@@ -72,6 +99,71 @@ class Edges:
         return self._as_pairs
 
 
+class EdgesBuilder:
+    """
+    Collects Edges and concatenates them once into preallocated arrays.
+    Affinities and areas stay unset (default values) if they are unset
+    in all parts.
+    """
+
+    def __init__(self, parts: Optional[Iterable[Edges]] = None):
+        self._parts = []
+        for edges in parts or []:
+            self.add(edges)
+
+    def add(self, edges: Edges) -> "EdgesBuilder":
+        if len(edges) > 0:
+            self._parts.append(edges)
+        return self
+
+    def add_arrays(
+        self,
+        node_ids1: np.ndarray,
+        node_ids2: np.ndarray,
+        *,
+        affinities: Optional[np.ndarray] = None,
+        areas: Optional[np.ndarray] = None,
+    ) -> "EdgesBuilder":
+        return self.add(Edges(node_ids1, node_ids2, affinities=affinities, areas=areas))
+
+    def __len__(self):
+        return sum(len(edges) for edges in self._parts)
+
+    def build(self) -> Edges:
+        if len(self._parts) == 1:
+            edges = self._parts[0]
+            return Edges(
+                edges.node_ids1,
+                edges.node_ids2,
+                affinities=edges._affinities,
+                areas=edges._areas,
+            )
+
+        n_edges = len(self)
+        node_ids1 = np.empty(n_edges, dtype=basetypes.NODE_ID)
+        node_ids2 = np.empty(n_edges, dtype=basetypes.NODE_ID)
+        affinities = None
+        if any(edges._affinities is not None for edges in self._parts):
+            affinities = np.empty(n_edges, dtype=basetypes.EDGE_AFFINITY)
+        areas = None
+        if any(edges._areas is not None for edges in self._parts):
+            areas = np.empty(n_edges, dtype=basetypes.EDGE_AREA)
+
+        start = 0
+        for edges in self._parts:
+            end = start + len(edges)
+            node_ids1[start:end] = edges.node_ids1
+            node_ids2[start:end] = edges.node_ids2
+            if affinities is not None:
+                affinities[start:end] = (
+                    DEFAULT_AFFINITY if edges._affinities is None else edges._affinities
+                )
+            if areas is not None:
+                areas[start:end] = DEFAULT_AREA if edges._areas is None else edges._areas
+            start = end
+        return Edges(node_ids1, node_ids2, affinities=affinities, areas=areas)
+
+
 _chunk_edges_defaults = (Edges([], []), Edges([], []), Edges([], []))
 ChunkEdges = namedtuple("ChunkEdges", _edge_type_fileds, defaults=_chunk_edges_defaults)
 
@@ -1,6 +1,7 @@
 import itertools
 from abc import ABC, abstractmethod
 from collections import namedtuple
+from concurrent import futures
 from datetime import datetime
 from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple, Type, Union
 
@@ -8,6 +9,7 @@ import numpy as np
 
 from pychunkedgraph.backend import chunkedgraph_edits as cg_edits
 from pychunkedgraph.backend import chunkedgraph_exceptions as cg_exceptions
+from pychunkedgraph.backend import flatgraph_utils
 from pychunkedgraph.backend.root_lock import RootLock
 from pychunkedgraph.backend.utils import basetypes, column_keys, serializers
 
@@ -455,6 +457,102 @@ class MergeOperation(GraphEditOperation):
         )
 
 
+BulkMergeResult = namedtuple("BulkMergeResult", ["edge_indices", "result", "error"])
+
+
+def group_merge_edges(cg: "ChunkedGraph", added_edges: np.ndarray) -> List[np.ndarray]:
+    """Groups edges by the connected components of their root IDs: every group
+        touches other roots than all other groups and can be merged in one
+        MergeOperation independent of them.
+
+    :param cg: The ChunkedGraph instance
+    :type cg: "ChunkedGraph"
+    :param added_edges: Supervoxel IDs of all added edges [[source, sink]]
+    :type added_edges: np.ndarray
+
+    :return: Indices into added_edges of every group
+    :rtype: List[np.ndarray]
+    """
+    root_edges = cg.get_roots(added_edges.ravel()).reshape(-1, 2)
+    graph, _, _, unique_root_ids = flatgraph_utils.build_gt_graph(
+        root_edges, make_directed=True
+    )
+    root_labels = np.zeros(len(unique_root_ids), dtype=np.int64)
+    for i_cc, cc in enumerate(flatgraph_utils.connected_components(graph)):
+        root_labels[cc] = i_cc
+
+    edge_labels = root_labels[np.searchsorted(unique_root_ids, root_edges[:, 0])]
+    sorting = np.argsort(edge_labels, kind="stable")
+    _, group_starts = np.unique(edge_labels[sorting], return_index=True)
+    return np.split(sorting, group_starts[1:])
+
+
+def execute_bulk_merge(
+    cg: "ChunkedGraph",
+    *,
+    user_id: str,
+    added_edges: Sequence[Sequence[np.uint64]],
+    source_coords: Optional[Sequence[Sequence[np.int]]] = None,
+    sink_coords: Optional[Sequence[Sequence[np.int]]] = None,
+    affinities: Optional[Sequence[np.float32]] = None,
+    n_threads: int = 1,
+) -> List[BulkMergeResult]:
+    """Applies many merges with one MergeOperation per group of edges that share
+        root IDs (see group_merge_edges): each group is locked once, its hierarchy
+        is rebuilt by one cg_edits.add_edges call and all of its edges are stored
+        in one log row, which can be undone like any other merge.
+
+    :param cg: The ChunkedGraph instance
+    :type cg: "ChunkedGraph"
+    :param user_id: User ID that will be assigned to all operations
+    :type user_id: str
+    :param added_edges: Supervoxel IDs of all added edges [[source, sink]]
+    :type added_edges: Sequence[Sequence[np.uint64]]
+    :param source_coords: world space coordinates in nm, one per edge, defaults to None
+    :type source_coords: Optional[Sequence[Sequence[np.int]]], optional
+    :param sink_coords: world space coordinates in nm, one per edge, defaults to None
+    :type sink_coords: Optional[Sequence[Sequence[np.int]]], optional
+    :param affinities: edge weights, one per edge, defaults to None
+    :type affinities: Optional[Sequence[np.float32]], optional
+    :param n_threads: groups executed concurrently (they lock disjoint roots)
+    :type n_threads: int
+
+    :return: One entry per group with the indices of its edges and either the
+        operation result or the error message of a failed lock or precondition
+    :rtype: List[BulkMergeResult]
+    """
+    added_edges = np.atleast_2d(added_edges).astype(basetypes.NODE_ID)
+    if source_coords is not None:
+        source_coords = np.atleast_2d(source_coords)
+    if sink_coords is not None:
+        sink_coords = np.atleast_2d(sink_coords)
+    if affinities is not None:
+        affinities = np.atleast_1d(affinities)
+
+    def _optional_slice(values, edge_indices):
+        return None if values is None else values[edge_indices]
+
+    def _merge(edge_indices):
+        try:
+            result = MergeOperation(
+                cg,
+                user_id=user_id,
+                added_edges=added_edges[edge_indices],
+                source_coords=_optional_slice(source_coords, edge_indices),
+                sink_coords=_optional_slice(sink_coords, edge_indices),
+                affinities=_optional_slice(affinities, edge_indices),
+            ).execute()
+        except (cg_exceptions.LockingError, cg_exceptions.PreconditionError) as e:
+            return BulkMergeResult(edge_indices=edge_indices, result=None, error=str(e))
+        return BulkMergeResult(edge_indices=edge_indices, result=result, error=None)
+
+    groups = group_merge_edges(cg, added_edges)
+    if n_threads <= 1:
+        return [_merge(edge_indices) for edge_indices in groups]
+    with futures.ThreadPoolExecutor(max_workers=n_threads) as executor:
+        return list(executor.map(_merge, groups))
+
+
 class SplitOperation(GraphEditOperation):
     """Split Operation: Cut *known* pairs of supervoxel that are directly connected by an edge.
 
@@ -0,0 +1,264 @@
+"""
+Precomputed attributes of level 2 nodes.
+
+Voxel count, centroid and bounding box of every level 2 node are stored in
+its own row (`column_keys.L2Attributes`), so that they can be read in bulk
+like any other node column instead of being derived from meshes.
+Coordinates are voxel coordinates of the segmentation (`cg.cv`), multiply by
+`cg.segmentation_resolution` for nm.
+
+Attributes are computed from the watershed segmentation of the chunk during
+ingest. Level 2 nodes created by edits are either merges of former level 2
+nodes, whose attributes are combined, or parts of split level 2 nodes, which
+are recomputed from the chunk segmentation. Edits only write attributes for
+graphs flagged in their dataset info (`enable_l2_attributes`), the rows are
+part of the edit's write.
+"""
+
+import collections
+import datetime
+from typing import TYPE_CHECKING, Dict, Optional, Sequence
+
+import fastremap
+import numpy as np
+
+from pychunkedgraph.backend.utils import basetypes, column_keys, serializers
+
+if TYPE_CHECKING:
+    from pychunkedgraph.backend.chunkedgraph import ChunkedGraph
+
+# Flag in the dataset info of graphs ingested with attributes
+DATASET_INFO_KEY = "l2_attributes"
+
+
+def compute_l2_attributes(
+    seg: np.ndarray,
+    sv_ids: Sequence[np.uint64],
+    l2_ids: Sequence[np.uint64],
+    offset: Sequence[int],
+) -> Dict[np.uint64, Dict]:
+    """ Computes voxel count, centroid and bounding box of level 2 nodes
+
+    :param seg: 3d np.ndarray
+        watershed segmentation
+    :param sv_ids: [np.uint64]
+    :param l2_ids: [np.uint64]
+        level 2 id of each supervoxel in `sv_ids`
+    :param offset: [int, int, int]
+        voxel coordinate of seg[0, 0, 0]
+    :return: dict
+        l2 id -> {"voxel_count": int, "centroid": [float] * 3,
+                  "bbox": [[int] * 3, [int] * 3] ([min, max))}
+        level 2 ids without voxels in seg are left out
+    """
+    sv_ids = np.array(sv_ids, dtype=np.uint64)
+    l2_ids = np.array(l2_ids, dtype=np.uint64)
+    offset = np.array(offset, dtype=np.int64)
+
+    u_l2_ids, l2_labels = np.unique(l2_ids, return_inverse=True)
+    mapping = dict(zip(sv_ids, l2_labels.reshape(-1) + 1))
+    mapping[0] = 0
+
+    # Label voxels with the index of their level 2 node (+1), 0 elsewhere
+    labels = fastremap.mask_except(np.array(seg), list(sv_ids))
+    labels = fastremap.remap(labels, mapping, preserve_missing_labels=True)
+    labels = labels.astype(np.int64)
+
+    n_labels = len(u_l2_ids) + 1
+    voxel_counts = np.bincount(labels.ravel(), minlength=n_labels)
+    coordinate_sums = np.zeros((n_labels, 3), dtype=np.float64)
+    bbox_mins = np.zeros((n_labels, 3), dtype=np.int64)
+    bbox_maxs = np.zeros((n_labels, 3), dtype=np.int64)
+    for axis in range(3):
+        # Voxel counts per label and position along the axis
+        size = labels.shape[axis]
+        position_shape = [1, 1, 1]
+        position_shape[axis] = size
+        positions = np.arange(size).reshape(position_shape)
+        counts = np.bincount(
+            (labels * size + positions).ravel(), minlength=n_labels * size
+        ).reshape(n_labels, size)
+
+        present = counts > 0
+        coordinate_sums[:, axis] = counts @ np.arange(size)
+        bbox_mins[:, axis] = np.argmax(present, axis=1)
+        bbox_maxs[:, axis] = size - np.argmax(present[:, ::-1], axis=1)
+
+    attributes = {}
+    for label in np.where(voxel_counts[1:] > 0)[0] + 1:
+        count = voxel_counts[label]
+        attributes[u_l2_ids[label - 1]] = {
+            "voxel_count": int(count),
+            "centroid": (coordinate_sums[label] / count + offset).astype(np.float32),
+            "bbox": np.array(
+                [bbox_mins[label] + offset, bbox_maxs[label] + offset], dtype=np.int64
+            ),
+        }
+    return attributes
+
+
+def compute_l2_attributes_from_segmentation(
+    cg: "ChunkedGraph", l2_children: Dict[np.uint64, Sequence[np.uint64]]
+) -> Dict[np.uint64, Dict]:
+    """ Downloads the segmentation of the chunks of the given level 2 nodes
+    and computes their attributes
+
+    :param cg: ChunkedGraph
+    :param l2_children: dict
+        l2 id -> supervoxel ids
+    :return: dict (see `compute_l2_attributes`)
+    """
+    chunk_l2_ids = collections.defaultdict(list)
+    for l2_id in l2_children:
+        chunk_l2_ids[cg.get_chunk_id(l2_id)].append(l2_id)
+
+    attributes = {}
+    for chunk_id, l2_ids in chunk_l2_ids.items():
+        chunk_coordinate = cg.get_chunk_coordinates(chunk_id)
+        seg = cg.download_chunk_segmentation(chunk_coordinate)
+
+        sv_ids = np.concatenate([l2_children[l2_id] for l2_id in l2_ids])
+        sv_l2_ids = np.concatenate(
+            [np.full(len(l2_children[l2_id]), l2_id, dtype=np.uint64)
+             for l2_id in l2_ids]
+        )
+        attributes.update(
+            compute_l2_attributes(
+                seg, sv_ids, sv_l2_ids, cg.get_chunk_voxel_location(chunk_coordinate)
+            )
+        )
+    return attributes
+
+
+def combine_l2_attributes(attributes: Sequence[Dict]) -> Dict:
+    """ Attributes of the union of disjoint level 2 nodes """
+    voxel_counts = np.array([a["voxel_count"] for a in attributes], dtype=np.float64)
+    centroids = np.array([a["centroid"] for a in attributes], dtype=np.float64)
+    bboxes = np.array([a["bbox"] for a in attributes], dtype=np.int64)
+    return {
+        "voxel_count": int(np.sum(voxel_counts)),
+        "centroid": (
+            np.sum(centroids * voxel_counts[:, None], axis=0) / np.sum(voxel_counts)
+        ).astype(np.float32),
+        "bbox": np.array(
+            [np.min(bboxes[:, 0], axis=0), np.max(bboxes[:, 1], axis=0)], dtype=np.int64
+        ),
+    }
+
+
+def create_l2_attribute_rows(
+    cg: "ChunkedGraph",
+    attributes: Dict[np.uint64, Dict],
+    time_stamp: Optional[datetime.datetime] = None,
+) -> list:
+    """ Bigtable rows for `attributes` (see `compute_l2_attributes`) """
+    rows = []
+    for l2_id, l2_attributes in attributes.items():
+        val_dict = {
+            column_keys.L2Attributes.VoxelCount: np.array(
+                l2_attributes["voxel_count"], dtype=basetypes.VOXEL_COUNT
+            ),
+            column_keys.L2Attributes.Centroid: np.array(
+                l2_attributes["centroid"], dtype=basetypes.CENTROID
+            ),
+            column_keys.L2Attributes.BoundingBox: np.array(
+                l2_attributes["bbox"], dtype=basetypes.COORDINATES
+            ),
+        }
+        rows.append(
+            cg.mutate_row(
+                serializers.serialize_uint64(l2_id), val_dict, time_stamp=time_stamp
+            )
+        )
+    return rows
+
+
+def read_l2_attributes(
+    cg: "ChunkedGraph", l2_ids: Sequence[np.uint64]
+) -> Dict[np.uint64, Dict]:
+    """ Reads stored attributes of level 2 nodes
+
+    :param cg: ChunkedGraph
+    :param l2_ids: [np.uint64]
+    :return: dict (see `compute_l2_attributes`)
+        level 2 ids without stored attributes are left out
+    """
+    if len(l2_ids) == 0:
+        return {}
+
+    columns = [
+        column_keys.L2Attributes.VoxelCount,
+        column_keys.L2Attributes.Centroid,
+        column_keys.L2Attributes.BoundingBox,
+    ]
+    rows = cg.read_node_id_rows(node_ids=l2_ids, columns=columns)
+
+    attributes = {}
+    for l2_id, row in rows.items():
+        if not all(column in row for column in columns):
+            continue
+        attributes[l2_id] = {
+            "voxel_count": int(row[column_keys.L2Attributes.VoxelCount][0].value),
+            "centroid": row[column_keys.L2Attributes.Centroid][0].value,
+            "bbox": row[column_keys.L2Attributes.BoundingBox][0].value,
+        }
+    return attributes
+
+
+def has_l2_attributes(cg: "ChunkedGraph") -> bool:
+    """ Whether the graph was ingested with level 2 attributes """
+    return bool(cg.dataset_info.get(DATASET_INFO_KEY, False))
+
+
+def enable_l2_attributes(cg: "ChunkedGraph") -> None:
+    """ Marks the graph as ingested with level 2 attributes, edits only
+    maintain the attributes of graphs with this flag """
+    cg.set_dataset_info_parameter(DATASET_INFO_KEY, True, overwrite=True)
+
+
+def create_edit_l2_attribute_rows(
+    cg: "ChunkedGraph",
+    lvl2_dict: Dict[np.uint64, Sequence[np.uint64]],
+    lvl2_children_dict: Dict[np.uint64, Sequence[np.uint64]],
+    time_stamp: datetime.datetime,
+) -> list:
+    """ Bigtable rows with the attributes of level 2 nodes created by an edit,
+    written together with the other rows of the edit
+
+    :param cg: ChunkedGraph
+    :param lvl2_dict: dict
+        new level 2 id -> former level 2 ids
+    :param lvl2_children_dict: dict
+        new level 2 id -> supervoxel ids
+    :param time_stamp: datetime
+        time stamp of the edit
+    :return: list
+    """
+    if not has_l2_attributes(cg) or len(lvl2_dict) == 0:
+        return []
+
+    u_former_l2_ids = np.unique(
+        np.concatenate([np.array(v, dtype=np.uint64) for v in lvl2_dict.values()])
+    )
+    former_attributes = read_l2_attributes(cg, u_former_l2_ids)
+    former_children = cg.get_children(u_former_l2_ids)
+
+    attributes = {}
+    to_compute = {}
+    for l2_id, formers in lvl2_dict.items():
+        children = lvl2_children_dict[l2_id]
+        # Former level 2 nodes are disjoint, the new node is their union if
+        # it has as many supervoxels
+        is_union = all(f in former_attributes for f in formers) and np.sum(
+            [len(former_children[f]) for f in formers]
+        ) == len(children)
+        if is_union:
+            attributes[l2_id] = combine_l2_attributes(
+                [former_attributes[f] for f in formers]
+            )
+        else:
+            to_compute[l2_id] = children
+
+    if to_compute:
+        attributes.update(compute_l2_attributes_from_segmentation(cg, to_compute))
+    return create_l2_attribute_rows(cg, attributes, time_stamp=time_stamp)
@@ -0,0 +1,183 @@
+"""
+Aggregate statistics of non-atomic nodes.
+
+Supervoxel count, level 2 count and the bounding box of the node's level 2
+chunks (in chunk coordinates) are stored in the node's own row
+(`column_keys.NodeStats`). They are written for level 2 nodes from their
+children and for every higher node by summing the statistics of its
+children, during ingest (`add_atomic_edges_in_chunks` and `add_layer`) and
+for nodes created by edits (`propagate_edits_to_root`). Clients can then
+size a root without traversing its hierarchy.
+"""
+
+import datetime
+from typing import TYPE_CHECKING, Dict, Optional, Sequence
+
+import numpy as np
+
+from pychunkedgraph.backend.utils import basetypes, column_keys, serializers
+
+if TYPE_CHECKING:
+    from pychunkedgraph.backend.chunkedgraph import ChunkedGraph
+
+NODE_STATS_COLUMNS = [
+    column_keys.NodeStats.SupervoxelCount,
+    column_keys.NodeStats.L2Count,
+    column_keys.NodeStats.ChunkBoundingBox,
+]
+
+
+def get_l2_node_stats(
+    cg: "ChunkedGraph", l2_id: np.uint64, n_supervoxels: int
+) -> Dict:
+    """ Statistics of a level 2 node
+
+    :param cg: ChunkedGraph
+    :param l2_id: np.uint64
+    :param n_supervoxels: int
+    :return: dict
+        {"n_supervoxels": int, "n_l2": int,
+         "chunk_bbox": [[int] * 3, [int] * 3] ([min, max) chunk coordinates)}
+    """
+    chunk_coordinate = np.array(cg.get_chunk_coordinates(l2_id), dtype=np.int64)
+    return {
+        "n_supervoxels": int(n_supervoxels),
+        "n_l2": 1,
+        "chunk_bbox": np.array([chunk_coordinate, chunk_coordinate + 1], dtype=np.int64),
+    }
+
+
+def combine_node_stats(stats: Sequence[Dict]) -> Dict:
+    """ Statistics of the parent of nodes """
+    chunk_bboxes = np.array([s["chunk_bbox"] for s in stats], dtype=np.int64)
+    return {
+        "n_supervoxels": int(np.sum([s["n_supervoxels"] for s in stats])),
+        "n_l2": int(np.sum([s["n_l2"] for s in stats])),
+        "chunk_bbox": np.array(
+            [np.min(chunk_bboxes[:, 0], axis=0), np.max(chunk_bboxes[:, 1], axis=0)],
+            dtype=np.int64,
+        ),
+    }
+
+
+def create_node_stats_val_dict(stats: Dict) -> Dict:
+    """ Column values of `stats` for `cg.mutate_row` """
+    return {
+        column_keys.NodeStats.SupervoxelCount: np.array(
+            stats["n_supervoxels"], dtype=basetypes.NODE_COUNT
+        ),
+        column_keys.NodeStats.L2Count: np.array(
+            stats["n_l2"], dtype=basetypes.NODE_COUNT
+        ),
+        column_keys.NodeStats.ChunkBoundingBox: np.array(
+            stats["chunk_bbox"], dtype=basetypes.COORDINATES
+        ),
+    }
+
+
+def create_node_stats_rows(
+    cg: "ChunkedGraph",
+    stats_dict: Dict[np.uint64, Dict],
+    time_stamp: Optional[datetime.datetime] = None,
+) -> list:
+    """ Bigtable rows for `stats_dict` (node id -> stats) """
+    return [
+        cg.mutate_row(
+            serializers.serialize_uint64(node_id),
+            create_node_stats_val_dict(stats),
+            time_stamp=time_stamp,
+        )
+        for node_id, stats in stats_dict.items()
+    ]
+
+
+def parse_node_stats(row: Dict) -> Optional[Dict]:
+    """ Statistics from a row read with `NODE_STATS_COLUMNS`, None if missing """
+    if not all(column in row for column in NODE_STATS_COLUMNS):
+        return None
+    return {
+        "n_supervoxels": int(row[column_keys.NodeStats.SupervoxelCount][0].value),
+        "n_l2": int(row[column_keys.NodeStats.L2Count][0].value),
+        "chunk_bbox": np.array(
+            row[column_keys.NodeStats.ChunkBoundingBox][0].value, dtype=np.int64
+        ),
+    }
+
+
+def read_node_stats(
+    cg: "ChunkedGraph", node_ids: Sequence[np.uint64]
+) -> Dict[np.uint64, Dict]:
+    """ Reads stored statistics of nodes
+
+    :param cg: ChunkedGraph
+    :param node_ids: [np.uint64]
+    :return: dict
+        node id -> stats (see `get_l2_node_stats`)
+        nodes without stored statistics are left out
+    """
+    if len(node_ids) == 0:
+        return {}
+
+    rows = cg.read_node_id_rows(node_ids=node_ids, columns=NODE_STATS_COLUMNS)
+    stats_dict = {}
+    for node_id, row in rows.items():
+        stats = parse_node_stats(row)
+        if stats is not None:
+            stats_dict[node_id] = stats
+    return stats_dict
+
+
+def compute_parent_node_stats(
+    cg: "ChunkedGraph",
+    parent_children: Dict[np.uint64, Sequence[np.uint64]],
+    stats_dict: Dict[np.uint64, Dict],
+) -> Dict[np.uint64, Dict]:
+    """ Statistics of parents from those of their children
+
+    Children missing in `stats_dict` are read, parents with children without
+    statistics are left out.
+
+    :param cg: ChunkedGraph
+    :param parent_children: dict
+        parent id -> children ids
+    :param stats_dict: dict
+        node id -> stats of known (e.g. new) nodes
+    :return: dict
+        parent id -> stats
+    """
+    missing_ids = [
+        child_id
+        for children in parent_children.values()
+        for child_id in children
+        if child_id not in stats_dict
+    ]
+    known_stats = dict(stats_dict)
+    known_stats.update(read_node_stats(cg, np.unique(np.array(missing_ids, dtype=np.uint64))))
+
+    parent_stats = {}
+    for parent_id, children in parent_children.items():
+        if all(child_id in known_stats for child_id in children):
+            parent_stats[parent_id] = combine_node_stats(
+                [known_stats[child_id] for child_id in children]
+            )
+    return parent_stats
+
+
+def compute_node_stats(cg: "ChunkedGraph", node_id: np.uint64) -> Dict:
+    """ Statistics of a node by traversing its hierarchy, for nodes without
+    stored statistics
+
+    :param cg: ChunkedGraph
+    :param node_id: np.uint64
+    :return: dict (see `get_l2_node_stats`)
+    """
+    if cg.get_chunk_layer(node_id) == 2:
+        l2_ids = np.array([node_id], dtype=np.uint64)
+    else:
+        l2_ids = cg._get_subgraph_multiple_nodes(
+            node_ids=[node_id], bounding_box=None, return_layers=[2], serializable=False
+        )[node_id]
+    l2_children = cg.get_children(l2_ids)
+    return combine_node_stats(
+        [get_l2_node_stats(cg, l2_id, len(l2_children[l2_id])) for l2_id in l2_ids]
+    )
@@ -13,4 +13,9 @@ FANOUT = np.dtype('uint64').newbyteorder('L')
 LAYERCOUNT = np.dtype('uint64').newbyteorder('L')
 SPATIALBITS = np.dtype('uint64').newbyteorder('L')
 ROOTCOUNTERBITS = np.dtype('uint64').newbyteorder('L')
-SKIPCONNECTIONS = np.dtype('uint64').newbyteorder('L')
\ No newline at end of file
+SKIPCONNECTIONS = np.dtype('uint64').newbyteorder('L')
+
+VOXEL_COUNT = np.dtype('uint64').newbyteorder('L')
+CENTROID = np.dtype('float32').newbyteorder('L')
+
+NODE_COUNT = np.dtype('uint64').newbyteorder('L')
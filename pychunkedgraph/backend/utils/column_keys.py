@@ -133,6 +133,40 @@ class Hierarchy:
         serializer=serializers.NumPyValue(dtype=basetypes.NODE_ID))
 
 
+class L2Attributes:
+    VoxelCount = _Column(
+        key=b'voxel_count',
+        family_id='0',
+        serializer=serializers.NumPyValue(dtype=basetypes.VOXEL_COUNT))
+
+    Centroid = _Column(
+        key=b'centroid',
+        family_id='0',
+        serializer=serializers.NumPyArray(dtype=basetypes.CENTROID))
+
+    BoundingBox = _Column(
+        key=b'bbox',
+        family_id='0',
+        serializer=serializers.NumPyArray(dtype=basetypes.COORDINATES, shape=(2, 3)))
+
+
+class NodeStats:
+    SupervoxelCount = _Column(
+        key=b'sv_count',
+        family_id='0',
+        serializer=serializers.NumPyValue(dtype=basetypes.NODE_COUNT))
+
+    L2Count = _Column(
+        key=b'l2_count',
+        family_id='0',
+        serializer=serializers.NumPyValue(dtype=basetypes.NODE_COUNT))
+
+    ChunkBoundingBox = _Column(
+        key=b'chunk_bbox',
+        family_id='0',
+        serializer=serializers.NumPyArray(dtype=basetypes.COORDINATES, shape=(2, 3)))
+
+
 class GraphSettings:
     DatasetInfo = _Column(
         key=b'dataset_info',
@@ -0,0 +1,72 @@
+"""
+Benchmark for level 2 shortest paths: the former search on the full level 2
+graph of the shared parent vs. the lazily expanded bidirectional search
+(`analysis.find_l2_shortest_path`).
+
+    from pychunkedgraph.benchmarking import l2_path
+    l2_path.run_timings("my_table_id", root_id)
+"""
+
+import time
+
+import graph_tool
+import graph_tool.topology
+import numpy as np
+
+from pychunkedgraph.backend import chunkedgraph, flatgraph_utils
+from pychunkedgraph.graph_analysis import analysis
+
+
+def find_l2_shortest_path_full_graph(cg, source_l2_id, target_l2_id):
+    """Former `analysis.find_l2_shortest_path`"""
+    shared_parent_id = cg.get_first_shared_parent(source_l2_id, target_l2_id)
+    if shared_parent_id is None:
+        return None
+
+    edge_array = analysis.get_lvl2_edge_list(cg, shared_parent_id)
+    weighted_graph, _, _, graph_indexed_l2_ids = flatgraph_utils.build_gt_graph(
+        edge_array, is_directed=False
+    )
+
+    source_graph_id = np.where(graph_indexed_l2_ids == source_l2_id)[0][0]
+    target_graph_id = np.where(graph_indexed_l2_ids == target_l2_id)[0][0]
+    source_vertex = weighted_graph.vertex(source_graph_id)
+    target_vertex = weighted_graph.vertex(target_graph_id)
+    vertex_list, _ = graph_tool.topology.shortest_path(
+        weighted_graph, source=source_vertex, target=target_vertex
+    )
+
+    vertex_indices = [weighted_graph.vertex_index[vertex] for vertex in vertex_list]
+    return graph_indexed_l2_ids[vertex_indices]
+
+
+def run_timings(table_id, root_id, n_pairs=10, seed=0):
+    np.random.seed(seed)
+    cg = chunkedgraph.ChunkedGraph(table_id)
+    l2_ids = cg.get_children_at_layer(np.uint64(root_id), 2)
+
+    results = []
+    for _ in range(n_pairs):
+        source_l2_id, target_l2_id = np.random.choice(l2_ids, 2, replace=False)
+
+        time_start = time.time()
+        old_path = find_l2_shortest_path_full_graph(cg, source_l2_id, target_l2_id)
+        old_dt = time.time() - time_start
+
+        time_start = time.time()
+        new_path, stats = analysis.find_l2_shortest_path(
+            cg, source_l2_id, target_l2_id, return_stats=True
+        )
+        new_dt = time.time() - time_start
+
+        # Several shortest paths may exist, only their lengths have to agree
+        same_length = len(old_path) == len(new_path)
+        results.append(
+            {"full_graph": old_dt, "bidirectional": new_dt,
+             "same_length": same_length, "n_l2_ids": len(l2_ids), **stats}
+        )
+        print(f"path of {len(new_path)}: full graph {old_dt:.3f}s, "
+              f"bidirectional {new_dt:.3f}s, explored {stats['n_explored']} "
+              f"(read {stats['n_read']}) of {len(l2_ids)} level 2 ids, "
+              f"same length: {same_length}")
+    return results
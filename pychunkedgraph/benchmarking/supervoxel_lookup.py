@@ -0,0 +1,110 @@
+"""
+Benchmark for the supervoxel lookup of annotation coordinates: the former
+per connected component lookup with growing radii vs. the batched lookup
+(`ChunkedGraph.get_atomic_ids_from_coords_multi`).
+
+    from pychunkedgraph.benchmarking import supervoxel_lookup
+    supervoxel_lookup.run_timings("my_table_id")
+"""
+
+import time
+
+import networkx as nx
+import numpy as np
+from scipy import spatial
+
+from pychunkedgraph.backend import chunkedgraph
+
+
+def lookup_per_component(cg, coordinates, node_ids):
+    """Former `app_utils.handle_supervoxel_id_lookup` (kept verbatim apart
+    from returning None instead of raising BadRequest)."""
+
+    def ccs(coordinates_nm_):
+        graph = nx.Graph()
+
+        dist_mat = spatial.distance.cdist(coordinates_nm_, coordinates_nm_)
+        for edge in np.array(np.where(dist_mat < 1000)).T:
+            graph.add_edge(*edge)
+
+        ccs = [np.array(list(cc)) for cc in nx.connected_components(graph)]
+        return ccs
+
+    coordinates = np.array(coordinates, dtype=np.int)
+    coordinates_nm = coordinates * cg.cv.resolution
+
+    node_ids = np.array(node_ids, dtype=np.uint64)
+
+    atomic_ids = np.zeros(len(coordinates), dtype=np.uint64)
+    for node_id in np.unique(node_ids):
+        node_id_m = node_ids == node_id
+
+        for cc in ccs(coordinates_nm[node_id_m]):
+            m_ids = np.where(node_id_m)[0][cc]
+
+            for max_dist_nm in [75, 150, 250, 500]:
+                atomic_ids_sub = cg.get_atomic_ids_from_coords(
+                    coordinates[m_ids], parent_id=node_id, max_dist_nm=max_dist_nm
+                )
+                if atomic_ids_sub is not None:
+                    break
+            if atomic_ids_sub is None:
+                return None
+
+            atomic_ids[m_ids] = atomic_ids_sub
+    return atomic_ids
+
+
+def sample_points(cg, n_points, n_clusters=10, cluster_size_vx=(256, 256, 32),
+                  jitter_vx=(4, 4, 1)):
+    """Samples annotation-like points: clustered around a few locations,
+    placed next to (not necessarily on) the root they refer to.
+    """
+    bounds = cg.vx_vol_bounds
+    cluster_size_vx = np.array(cluster_size_vx)
+    centers = np.random.randint(
+        bounds[:, 0] + cluster_size_vx, bounds[:, 1] - cluster_size_vx,
+        size=(n_clusters, 3)
+    )
+    coords = centers[np.random.randint(0, n_clusters, n_points)]
+    coords += np.random.randint(-cluster_size_vx, cluster_size_vx,
+                                size=(n_points, 3))
+
+    seg_cache = cg.get_segmentation_cache()
+    sv_ids = np.array([seg_cache.cutout(c, c + 1)[0, 0, 0] for c in coords],
+                      dtype=np.uint64)
+    coords = coords[sv_ids != 0]
+    sv_ids = sv_ids[sv_ids != 0]
+    node_ids = cg.get_roots(sv_ids)
+
+    jitter = np.random.randint(-np.array(jitter_vx), np.array(jitter_vx) + 1,
+                               size=coords.shape)
+    return coords + jitter, node_ids
+
+
+def run_timings(table_id, n_points_list=(10, 100, 1000), seed=0):
+    np.random.seed(seed)
+    cg = chunkedgraph.ChunkedGraph(table_id)
+
+    results = {}
+    for n_points in n_points_list:
+        coords, node_ids = sample_points(cg, n_points)
+
+        # Warm the segmentation cache so that both measure the lookup only
+        cg.get_atomic_ids_from_coords_multi(coords, node_ids)
+
+        time_start = time.time()
+        old_ids = lookup_per_component(cg, coords, node_ids)
+        old_dt = time.time() - time_start
+
+        time_start = time.time()
+        new_ids = cg.get_atomic_ids_from_coords_multi(coords, node_ids)
+        new_dt = time.time() - time_start
+
+        # Both can only differ where several voxels are equally close
+        same = np.nan if old_ids is None else np.mean(old_ids == new_ids)
+        results[n_points] = {"per_component": old_dt, "batched": new_dt,
+                             "identical": same}
+        print(f"{len(coords)} points: per component {old_dt:.3f}s, "
+              f"batched {new_dt:.3f}s, {same:.1%} identical")
+    return results
@@ -118,12 +118,12 @@ def root_cross_edge_test(node_id, table_id=None, cg=None):
     for layer in range(2, cg.n_layers):
         child_ids = cg.get_subgraph_nodes(node_id, return_layers=[layer])
 
-        cross_edge_dict = {}
+        cross_edges = pychunkedgraph.backend.chunkedgraph_utils.CrossChunkEdgeAccumulator()
         child_reference_ids = []
         for child_id in child_ids:
-            cross_edge_dict = pychunkedgraph.backend.chunkedgraph_utils.combine_cross_chunk_edge_dicts(cross_edge_dict, cg.read_cross_chunk_edges(child_id))
+            cross_edges.add(cg.read_cross_chunk_edges(child_id))
 
-        cross_edge_dict_layers[layer] = cross_edge_dict
+        cross_edge_dict_layers[layer] = cross_edges.build()
 
     for layer in cross_edge_dict_layers.keys():
         print("\n--------\n")
@@ -1,22 +1,95 @@
-import numpy as np
-import cloudvolume
+import datetime
 import itertools
+
+from cloudfiles import CloudFiles
+import cloudvolume
 import dill
+import fastremap
+import numpy as np
 
 from pychunkedgraph.backend import chunkedgraph
-from pychunkedgraph.backend.utils import serializers, column_keys
+from pychunkedgraph.backend.chunkedgraph_utils import get_google_compatible_time_stamp
+from pychunkedgraph.backend.utils import basetypes, serializers, column_keys
 from multiwrapper import multiprocessing_utils as mu
 
-
-def get_sv_to_root_id_mapping_chunk(cg, chunk_coords, vol=None):
+# Parents are forgotten above this many cached nodes
+MAX_PARENT_CACHE_SIZE = 1_000_000
+
+
+class ParentCache(object):
+    def __init__(self, cg, time_stamp=None, max_size=MAX_PARENT_CACHE_SIZE):
+        """ Parents of nodes at one time stamp, shared by neighbouring chunks
+        whose level 2 nodes have common parents in the higher layers
+
+        :param cg: chunkedgraph instance
+        :param time_stamp: datetime or None (now)
+        :param max_size: int
+        """
+        if time_stamp is None:
+            time_stamp = datetime.datetime.utcnow()
+
+        self._cg = cg
+        self._time_stamp = get_google_compatible_time_stamp(time_stamp, round_up=False)
+        self._max_size = max_size
+        self._parents = {}
+
+    @property
+    def time_stamp(self):
+        return self._time_stamp
+
+    def get_roots(self, node_ids):
+        """ Batched root lookup, only parents of uncached nodes are read
+
+        :param node_ids: list of np.uint64
+        :return: np.ndarray of np.uint64 (0 for nodes without root)
+        """
+        if len(node_ids) == 0:
+            return np.empty(0, dtype=basetypes.NODE_ID)
+
+        if len(self._parents) > self._max_size:
+            self._parents = {}
+
+        unique_ids, inverse = np.unique(np.array(node_ids, dtype=basetypes.NODE_ID),
+                                        return_inverse=True)
+        parent_ids = unique_ids.copy()
+        layer_mask = self._cg.get_chunk_layers(parent_ids) < self._cg.n_layers
+        for _ in range(int(self._cg.n_layers)):
+            if not np.any(layer_mask):
+                break
+
+            next_ids = np.unique(parent_ids[layer_mask])
+            uncached_ids = np.array([node_id for node_id in next_ids
+                                     if node_id not in self._parents],
+                                    dtype=basetypes.NODE_ID)
+            if len(uncached_ids) > 0:
+                uncached_parents = self._cg.get_parents(uncached_ids,
+                                                        time_stamp=self._time_stamp)
+                if uncached_parents is None:
+                    uncached_parents = np.zeros(len(uncached_ids), dtype=basetypes.NODE_ID)
+                self._parents.update(zip(uncached_ids, uncached_parents))
+
+            next_parents = np.array([self._parents[node_id] for node_id in next_ids],
+                                    dtype=basetypes.NODE_ID)
+            parent_ids[layer_mask] = next_parents[np.searchsorted(next_ids, parent_ids[layer_mask])]
+            layer_mask[parent_ids == 0] = False
+            layer_mask[self._cg.get_chunk_layers(parent_ids) >= self._cg.n_layers] = False
+
+        return parent_ids[inverse.reshape(-1)]
+
+
+def get_sv_to_root_id_mapping_chunk(cg, chunk_coords, vol=None, time_stamp=None,
+                                    parent_cache=None):
     """ Acquires a svid -> rootid dictionary for a chunk
 
     :param cg: chunkedgraph instance
     :param chunk_coords: list
-    :return: dict
+    :param vol: np.ndarray or None
+        supervoxel segmentation of the chunk, remapped to root ids if given
+    :param time_stamp: datetime or None (now)
+    :param parent_cache: ParentCache or None
+        reuse across chunks, overrides time_stamp
+    :return: dict (and remapped vol)
     """
-    sv_to_root_mapping = {}
-
     chunk_coords = np.array(chunk_coords, dtype=np.int)
 
     if np.any((chunk_coords % cg.chunk_size) != 0):
@@ -24,98 +97,141 @@ def get_sv_to_root_id_mapping_chunk(cg, chunk_coords, vol=None):
 
     chunk_coords = chunk_coords / cg.chunk_size
     chunk_coords = chunk_coords.astype(np.int)
-    bb = np.array([chunk_coords, chunk_coords + 1], dtype=np.int)
 
-    remapped_vol = None
-    vol_shape = None
-
-    if vol is not None:
-        vol_shape = vol.shape
-        vol = vol.flatten()
-        remapped_vol = np.zeros_like(vol)
+    if parent_cache is None:
+        parent_cache = ParentCache(cg, time_stamp=time_stamp)
 
+    # The parent column of the supervoxels already holds their level 2 ids
     atomic_rows = cg.range_read_chunk(layer=1, x=chunk_coords[0],
                                       y=chunk_coords[1], z=chunk_coords[2],
-                                      columns=column_keys.Hierarchy.Parent)
-    for atomic_id in atomic_rows.keys():
-        # Check if already found the root for this supervoxel
-        if atomic_id in sv_to_root_mapping:
-            continue
-
-        # Find root
-        root_id = cg.get_root(atomic_id)
-        sv_to_root_mapping[atomic_id] = root_id
-
-        # Add atomic children of root_id
-        atomic_ids = cg.get_subgraph_nodes(root_id, bounding_box=bb,
-                                           bb_is_coordinate=False)
-        sv_to_root_mapping.update(dict(zip(atomic_ids,
-                                           [root_id] * len(atomic_ids))))
-
-        if remapped_vol is not None:
-            remapped_vol[np.in1d(vol, atomic_ids)] = root_id
-
-    if remapped_vol is not None:
-        remapped_vol = remapped_vol.reshape(vol_shape)
-        return sv_to_root_mapping, remapped_vol
-    else:
+                                      columns=column_keys.Hierarchy.Parent,
+                                      time_stamp=parent_cache.time_stamp)
+    atomic_ids = np.fromiter(atomic_rows.keys(), dtype=basetypes.NODE_ID,
+                             count=len(atomic_rows))
+    l2_ids = np.array([cells[0].value for cells in atomic_rows.values()],
+                      dtype=basetypes.NODE_ID)
+    root_ids = parent_cache.get_roots(l2_ids)
+    sv_to_root_mapping = dict(zip(atomic_ids, root_ids))
+
+    if vol is None:
         return sv_to_root_mapping
 
+    # Supervoxels without root are set to 0
+    vol_mapping = {sv_id: 0 for sv_id in fastremap.unique(vol)}
+    vol_mapping.update(sv_to_root_mapping)
+    remapped_vol = fastremap.remap(vol, vol_mapping)
+    return sv_to_root_mapping, remapped_vol
 
-def _write_flat_segmentation_thread(args):
-    """ Helper of write_flat_segmentation """
-    cg_info, start_block, end_block, from_url, to_url, mip = args
 
-    assert 'segmentation' in to_url
-    assert 'svenmd' in to_url
+def write_flat_segmentation_block(cg, start_block, end_block, from_cv, to_cv,
+                                  time_stamp=None, progress_cf=None):
+    """ Remaps the chunks of a block, which share one parent cache
 
-    from_cv = cloudvolume.CloudVolume(from_url, mip=mip)
-    to_cv = cloudvolume.CloudVolume(to_url, mip=mip)
+    :param cg: chunkedgraph instance
+    :param start_block: list of int
+        first chunk coordinate
+    :param end_block: list of int
+        last chunk coordinate (exclusive)
+    :param from_cv: CloudVolume
+        supervoxel segmentation
+    :param to_cv: CloudVolume
+    :param time_stamp: datetime or None (now)
+    :param progress_cf: CloudFiles or None
+        blocks are marked done here and skipped when run again
+    :return: bool
+        False if the block was done already
+    """
+    block_key = "_".join(str(int(c)) for c in start_block)
+    if progress_cf is not None and progress_cf.exists(block_key):
+        return False
 
-    cg = chunkedgraph.ChunkedGraph(table_id=cg_info["table_id"],
-                                   instance_id=cg_info["instance_id"],
-                                   project_id=cg_info["project_id"],
-                                   credentials=cg_info["credentials"])
+    parent_cache = ParentCache(cg, time_stamp=time_stamp)
+    bounds_max = np.array(from_cv.bounds.maxpt)
 
     for block_z in range(start_block[2], end_block[2]):
         z_start = block_z * cg.chunk_size[2]
-        z_end = (block_z + 1) * cg.chunk_size[2]
+        z_end = min((block_z + 1) * cg.chunk_size[2], bounds_max[2])
         for block_y in range(start_block[1], end_block[1]):
             y_start = block_y * cg.chunk_size[1]
-            y_end = (block_y + 1) * cg.chunk_size[1]
+            y_end = min((block_y + 1) * cg.chunk_size[1], bounds_max[1])
             for block_x in range(start_block[0], end_block[0]):
                 x_start = block_x * cg.chunk_size[0]
-                x_end = (block_x + 1) * cg.chunk_size[0]
+                x_end = min((block_x + 1) * cg.chunk_size[0], bounds_max[0])
 
                 block = from_cv[x_start: x_end, y_start: y_end, z_start: z_end]
 
-                _, remapped_block = get_sv_to_root_id_mapping_chunk(cg, [x_start, y_start, z_start], block)
+                _, remapped_block = get_sv_to_root_id_mapping_chunk(
+                    cg, [x_start, y_start, z_start], block, parent_cache=parent_cache)
 
                 to_cv[x_start: x_end, y_start: y_end, z_start: z_end] = remapped_block
 
+    if progress_cf is not None:
+        progress_cf.put(block_key, b"")
+    return True
+
+
+def _write_flat_segmentation_thread(args):
+    """ Helper of write_flat_segmentation """
+    cg_info, start_block, end_block, from_url, to_url, mip, time_stamp, \
+        progress_path = args
+
+    assert from_url != to_url
+
+    from_cv = cloudvolume.CloudVolume(from_url, mip=mip)
+    to_cv = cloudvolume.CloudVolume(to_url, mip=mip)
+
+    cg = chunkedgraph.ChunkedGraph(table_id=cg_info["table_id"],
+                                   instance_id=cg_info["instance_id"],
+                                   project_id=cg_info["project_id"],
+                                   credentials=cg_info["credentials"])
+
+    write_flat_segmentation_block(cg, start_block, end_block, from_cv, to_cv,
+                                  time_stamp=time_stamp,
+                                  progress_cf=CloudFiles(progress_path))
 
-def write_flat_segmentation(cg, dataset_name, bounding_box=None, block_factor=2,
-                            n_threads=1, mip=0):
+
+def write_flat_segmentation(cg, dataset_name=None, bounding_box=None, block_factor=2,
+                            n_threads=1, mip=0, from_url=None, to_url=None,
+                            time_stamp=None, progress_path=None):
     """ Applies the mapping in the chunkedgraph to the supervoxels to create
         a flattened segmentation
 
+    Finished blocks are recorded in `progress_path`, running again with the
+    same time_stamp skips them.
+
     :param cg: chunkedgraph instance
     :param dataset_name: str
+        "pinky" or "basil", alternatively to from_url and to_url
     :param bounding_box: np.array
     :param block_factor: int
     :param n_threads: int
     :param mip: int
+    :param from_url: str
+        supervoxel segmentation
+    :param to_url: str
+        existing CloudVolume the segmentation is written to
+    :param time_stamp: datetime or None (now)
+    :param progress_path: str or None
+        defaults to a directory next to the segmentation in to_url
     :return: bool
     """
 
-    if dataset_name == "pinky":
-        from_url = "gs://neuroglancer/svenmd/pinky40_v11/watershed/"
-        to_url = "gs://neuroglancer/svenmd/pinky40_v11/segmentation/"
-    elif dataset_name == "basil":
-        from_url = "gs://neuroglancer/svenmd/basil_4k_oldnet_cg/watershed/"
-        to_url = "gs://neuroglancer/svenmd/basil_4k_oldnet_cg/segmentation/"
-    else:
-        raise Exception("Dataset unknown")
+    if from_url is None or to_url is None:
+        if dataset_name == "pinky":
+            from_url = "gs://neuroglancer/svenmd/pinky40_v11/watershed/"
+            to_url = "gs://neuroglancer/svenmd/pinky40_v11/segmentation/"
+        elif dataset_name == "basil":
+            from_url = "gs://neuroglancer/svenmd/basil_4k_oldnet_cg/watershed/"
+            to_url = "gs://neuroglancer/svenmd/basil_4k_oldnet_cg/segmentation/"
+        else:
+            raise Exception("Dataset unknown")
+
+    if time_stamp is None:
+        time_stamp = datetime.datetime.utcnow()
+
+    if progress_path is None:
+        progress_path = "%s/export_progress/%d" % (
+            to_url.rstrip("/"), int(time_stamp.timestamp() * 1000))
 
     from_cv = cloudvolume.CloudVolume(from_url, mip=mip)
 
@@ -156,7 +272,7 @@ def write_flat_segmentation(cg, dataset_name, bounding_box=None, block_factor=2,
         end_block[m] = block_bounding_box_cg[1][m]
 
         multi_args.append([cg_info, start_block, end_block,
-                           from_url, to_url, mip])
+                           from_url, to_url, mip, time_stamp, progress_path])
 
     # Run parallelizing
     if n_threads == 1:
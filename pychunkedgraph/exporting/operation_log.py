@@ -0,0 +1,212 @@
+"""
+Columnar export of the operation log.
+
+Log rows (`column_keys.OperationLogs`) are read in batches of consecutive
+operation ids and appended as Parquet files to a dataset partitioned by the
+day of the operation (`date=YYYY-MM-DD/`). Every file is named after the
+first operation id of its batch, so running the export again with
+`start_operation_id=None` only appends operations newer than the last
+exported one.
+
+Operation ids are allocated before the log row of an operation is written,
+an operation can still be running while operations with larger ids are
+logged already. Without an explicit end the export therefore stops before the
+first operation logged within `grace_period` (the lock timeout by default),
+operations older than that are either logged or failed.
+"""
+
+import datetime
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pytz import UTC
+
+from pychunkedgraph.backend.chunkedgraph import LOCK_EXPIRED_TIME_DELTA
+from pychunkedgraph.backend.utils import column_keys
+
+DEFAULT_BATCH_SIZE = 10000
+
+_ID_LIST = pa.list_(pa.uint64())
+_COORDINATE_LIST = pa.list_(pa.list_(pa.int64(), 3))
+_EDGE_LIST = pa.list_(pa.list_(pa.uint64(), 2))
+
+OPERATION_LOG_SCHEMA = pa.schema(
+    [
+        ("operation_id", pa.uint64()),
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("user_id", pa.string()),
+        ("undo_operation_id", pa.uint64()),
+        ("redo_operation_id", pa.uint64()),
+        ("root_ids", _ID_LIST),
+        ("source_ids", _ID_LIST),
+        ("sink_ids", _ID_LIST),
+        ("source_coords", _COORDINATE_LIST),
+        ("sink_coords", _COORDINATE_LIST),
+        ("bb_offset", pa.list_(pa.int64())),
+        ("added_edges", _EDGE_LIST),
+        ("removed_edges", _EDGE_LIST),
+        ("affinities", pa.list_(pa.float32())),
+        ("date", pa.string()),
+    ]
+)
+
+# Schema field -> log column
+_LOG_COLUMNS = {
+    "user_id": column_keys.OperationLogs.UserID,
+    "undo_operation_id": column_keys.OperationLogs.UndoOperationID,
+    "redo_operation_id": column_keys.OperationLogs.RedoOperationID,
+    "root_ids": column_keys.OperationLogs.RootID,
+    "source_ids": column_keys.OperationLogs.SourceID,
+    "sink_ids": column_keys.OperationLogs.SinkID,
+    "source_coords": column_keys.OperationLogs.SourceCoordinate,
+    "sink_coords": column_keys.OperationLogs.SinkCoordinate,
+    "bb_offset": column_keys.OperationLogs.BoundingBoxOffset,
+    "added_edges": column_keys.OperationLogs.AddedEdge,
+    "removed_edges": column_keys.OperationLogs.RemovedEdge,
+    "affinities": column_keys.OperationLogs.Affinity,
+}
+
+
+def _to_pylist(value):
+    if value is None:
+        return None
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def log_rows_to_table(log_rows: Dict[np.uint64, Dict]) -> pa.Table:
+    """ Arrow table of log rows as returned by `cg.read_log_rows`
+
+    :param log_rows: dict
+        operation id -> {column: value, "timestamp": datetime}
+    :return: pa.Table with `OPERATION_LOG_SCHEMA`
+    """
+    operation_ids = sorted(log_rows.keys())
+    data = {"operation_id": [int(operation_id) for operation_id in operation_ids]}
+    data["timestamp"] = [log_rows[op_id]["timestamp"] for op_id in operation_ids]
+    data["date"] = [ts.strftime("%Y-%m-%d") for ts in data["timestamp"]]
+    for name, column in _LOG_COLUMNS.items():
+        data[name] = [_to_pylist(log_rows[op_id].get(column)) for op_id in operation_ids]
+    return pa.Table.from_pydict(data, schema=OPERATION_LOG_SCHEMA)
+
+
+def get_last_exported_operation_id(path: str) -> Optional[int]:
+    """ Largest operation id in an exported dataset, None if there is none
+
+    :param path: str
+        local directory or URI (e.g. gs://) of the dataset
+    :return: int or None
+    """
+    try:
+        dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    except (FileNotFoundError, OSError):
+        return None
+
+    max_id = None
+    for batch in dataset.to_batches(columns=["operation_id"]):
+        if batch.num_rows == 0:
+            continue
+        batch_max = int(np.max(batch.column(0).to_numpy()))
+        max_id = batch_max if max_id is None else max(max_id, batch_max)
+    return max_id
+
+
+def export_operation_log(
+    cg,
+    path: str,
+    start_operation_id: Optional[int] = None,
+    end_operation_id: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    grace_period: datetime.timedelta = LOCK_EXPIRED_TIME_DELTA,
+) -> int:
+    """ Appends log rows to a Parquet dataset partitioned by date
+
+    Only `batch_size` log rows are held in memory at a time.
+
+    :param cg: ChunkedGraph instance
+    :param path: str
+        local directory or URI (e.g. gs://) of the dataset
+    :param start_operation_id: int or None
+        None continues after the last operation in `path`
+    :param end_operation_id: int or None
+        last exported operation id (inclusive), defaults to the current maximum
+        up to the first operation logged within `grace_period`
+    :param batch_size: int
+    :param grace_period: datetime.timedelta
+        only applies without `end_operation_id`
+    :return: int
+        number of exported operations
+    """
+    if start_operation_id is None:
+        last_operation_id = get_last_exported_operation_id(path)
+        start_operation_id = 1 if last_operation_id is None else last_operation_id + 1
+
+    time_cutoff = None
+    if end_operation_id is None:
+        end_operation_id = int(cg.get_max_operation_id())
+        time_cutoff = datetime.datetime.now(UTC) - grace_period
+
+    n_exported = 0
+    for batch_start in range(int(start_operation_id), int(end_operation_id) + 1, batch_size):
+        batch_end = min(batch_start + batch_size, int(end_operation_id) + 1)
+        log_rows = cg.read_log_rows(
+            operation_ids=np.arange(batch_start, batch_end, dtype=np.uint64)
+        )
+
+        is_last_batch = False
+        if time_cutoff is not None:
+            recent_ids = [
+                op_id for op_id, row in log_rows.items() if row["timestamp"] >= time_cutoff
+            ]
+            if recent_ids:
+                # Earlier ids without a row may still be written
+                log_rows = {
+                    op_id: row for op_id, row in log_rows.items() if op_id < min(recent_ids)
+                }
+                is_last_batch = True
+
+        if len(log_rows) == 0:
+            if is_last_batch:
+                break
+            continue
+
+        pq.write_to_dataset(
+            log_rows_to_table(log_rows),
+            root_path=path,
+            partition_cols=["date"],
+            basename_template="part-%020d-{i}.parquet" % batch_start,
+        )
+        n_exported += len(log_rows)
+        if is_last_batch:
+            break
+    return n_exported
+
+
+def load_operation_log(
+    path: str,
+    start_operation_id: Optional[int] = None,
+    columns: Optional[Sequence[str]] = None,
+):
+    """ Reads an exported dataset
+
+    :param path: str
+    :param start_operation_id: int or None
+        only operations with this or a larger id
+    :param columns: list of str or None (all)
+    :return: pd.DataFrame sorted by operation id
+    """
+    filters = None
+    if start_operation_id is not None:
+        filters = [("operation_id", ">=", int(start_operation_id))]
+
+    table = pq.read_table(path, columns=columns, filters=filters, partitioning="hive")
+    df = table.to_pandas()
+    if "operation_id" in df:
+        df = df.sort_values("operation_id").reset_index(drop=True)
+    return df
@@ -1,10 +1,14 @@
+import heapq
+
 import fastremap
-import graph_tool
 import numpy as np
-from pychunkedgraph.backend import flatgraph_utils
+from pychunkedgraph.backend import l2_attributes
 from pychunkedgraph.meshing import meshgen, meshgen_utils
 from cloudvolume import Storage
 
+L2_PATH_BATCH_SIZE = 64
+
+
 def get_lvl2_edge_list(cg, node_id: np.uint64):
     """get an edge list of lvl2 ids for a particular node
 
@@ -54,41 +58,157 @@ def get_lvl2_edge_list(cg, node_id: np.uint64):
     fastremap.remap_from_array_kv(edge_view, known_supervoxel_array, known_l2_array)
     return np.unique(np.sort(edge_array,axis=1),axis=0)
 
-def find_l2_shortest_path(cg, source_l2_id: np.uint64, target_l2_id: np.uint64):
+def find_l2_shortest_path(
+    cg,
+    source_l2_id: np.uint64,
+    target_l2_id: np.uint64,
+    batch_size: int = L2_PATH_BATCH_SIZE,
+    return_stats: bool = False,
+):
     """
     Find a path of level 2 ids that connect two level 2 node ids through cross chunk edges.
     Return a list of level 2 ids representing this path.
     Return None if the two level 2 ids do not belong to the same object.
 
+    Runs a bidirectional A* search with the chunk distance as heuristic. Neighbors
+    of level 2 ids are read on demand, for up to `batch_size` ids of the frontiers
+    at once, instead of reading the level 2 graph of the whole object.
+
     :param cg: ChunkedGraph object
     :param source_l2_id: np.uint64
     :param target_l2_id: np.uint64
-    :return: [np.uint64] or None
+    :param batch_size: int
+    :param return_stats: bool
+        also return a dict with the number of explored and read level 2 ids
+    :return: [np.uint64] or None (, dict)
     """
-    # Get the cross-chunk edges that we need to build the graph
+    stats = {"n_explored": 0, "n_read": 0, "n_read_batches": 0}
+    if source_l2_id == target_l2_id:
+        path = np.array([source_l2_id], dtype=np.uint64)
+        return (path, stats) if return_stats else path
+
+    # Paths stay within the first shared parent, like its level 2 graph
     shared_parent_id = cg.get_first_shared_parent(source_l2_id, target_l2_id)
     if shared_parent_id is None:
-        return None
-    
-    edge_array = get_lvl2_edge_list(cg, shared_parent_id)
-    # Create a graph-tool graph of the mapped cross-chunk-edges
-    weighted_graph, _, _, graph_indexed_l2_ids = flatgraph_utils.build_gt_graph(
-        edge_array, is_directed=False
-    )
+        return (None, stats) if return_stats else None
+    end_layer = cg.get_chunk_layer(shared_parent_id)
+
+    source_l2_id = int(source_l2_id)
+    target_l2_id = int(target_l2_id)
+    source_coords = cg.get_chunk_coordinates(source_l2_id)
+    target_coords = cg.get_chunk_coordinates(target_l2_id)
+
+    # Cross chunk edges connect neighboring chunks, every step changes the chunk
+    # coordinates by one. Both searches use the average of the two distance
+    # heuristics as potential (forward: +, backward: -), which keeps them consistent
+    potentials = {}
+
+    def potential(l2_id):
+        if l2_id not in potentials:
+            coords = cg.get_chunk_coordinates(l2_id)
+            potentials[l2_id] = (
+                np.sum(np.abs(coords - target_coords))
+                - np.sum(np.abs(coords - source_coords))
+            ) / 2
+        return potentials[l2_id]
+
+    neighbors = {}
+    signs = [1, -1]
+    distances = [{source_l2_id: 0}, {target_l2_id: 0}]
+    predecessors = [{source_l2_id: None}, {target_l2_id: None}]
+    explored = [set(), set()]
+    frontiers = [
+        [(potential(source_l2_id), source_l2_id)],
+        [(-potential(target_l2_id), target_l2_id)],
+    ]
+    best_length = np.inf
+    meeting_l2_id = None
+    while frontiers[0] and frontiers[1]:
+        if frontiers[0][0][0] + frontiers[1][0][0] >= best_length:
+            break
+
+        # Advance the smaller frontier
+        d = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        _, l2_id = heapq.heappop(frontiers[d])
+        if l2_id in explored[d]:
+            continue
+        explored[d].add(l2_id)
+
+        if l2_id not in neighbors:
+            to_read = [l2_id]
+            for frontier in frontiers:
+                for _, candidate in heapq.nsmallest(batch_size, frontier):
+                    if candidate not in neighbors and len(to_read) < batch_size:
+                        to_read.append(candidate)
+            to_read = list(set(to_read))
+            neighbors.update(_read_l2_neighbors(cg, to_read, end_layer))
+            stats["n_read"] += len(to_read)
+            stats["n_read_batches"] += 1
+
+        distance = distances[d][l2_id] + 1
+        for neighbor in neighbors[l2_id]:
+            if distance < distances[d].get(neighbor, np.inf):
+                distances[d][neighbor] = distance
+                predecessors[d][neighbor] = l2_id
+                heapq.heappush(
+                    frontiers[d], (distance + signs[d] * potential(neighbor), neighbor)
+                )
+            if neighbor in distances[1 - d]:
+                length = distances[d][neighbor] + distances[1 - d][neighbor]
+                if length < best_length:
+                    best_length = length
+                    meeting_l2_id = neighbor
+
+    stats["n_explored"] = len(explored[0] | explored[1])
+    if meeting_l2_id is None:
+        return (None, stats) if return_stats else None
+
+    path = []
+    l2_id = meeting_l2_id
+    while l2_id is not None:
+        path.append(l2_id)
+        l2_id = predecessors[0][l2_id]
+    path = path[::-1]
+    l2_id = predecessors[1][meeting_l2_id]
+    while l2_id is not None:
+        path.append(l2_id)
+        l2_id = predecessors[1][l2_id]
+
+    path = np.array(path, dtype=np.uint64)
+    return (path, stats) if return_stats else path
+
 
-    # Find the shortest path from the source_l2_id to the target_l2_id
-    source_graph_id = np.where(graph_indexed_l2_ids == source_l2_id)[0][0]
-    target_graph_id = np.where(graph_indexed_l2_ids == target_l2_id)[0][0]
-    source_vertex = weighted_graph.vertex(source_graph_id)
-    target_vertex = weighted_graph.vertex(target_graph_id)
-    vertex_list, _ = graph_tool.topology.shortest_path(
-        weighted_graph, source=source_vertex, target=target_vertex
+def _read_l2_neighbors(cg, l2_ids, end_layer: int, time_stamp=None):
+    """
+    Level 2 ids connected to each of the given level 2 ids by cross chunk edges
+    below end_layer.
+
+    :param cg: ChunkedGraph object
+    :param l2_ids: [int]
+    :param end_layer: int
+    :param time_stamp: datetime or None
+        neighbors are the level 2 parents of the partner supervoxels at this time
+    :return: Dict[int, [int]]
+    """
+    cce_dict = cg.read_cross_chunk_edges_for_nodes(
+        l2_ids, start_layer=2, end_layer=end_layer
     )
+    cross_edges = [cce_dict.get(l2_id, np.zeros((0, 2), dtype=np.uint64)) for l2_id in l2_ids]
+    partner_sv_ids = fastremap.unique(
+        np.concatenate([edges[:, 1] for edges in cross_edges]).astype(np.uint64)
+    )
+    partner_l2_ids = np.zeros(0, dtype=np.uint64)
+    if len(partner_sv_ids) > 0:
+        partner_l2_ids = np.array(
+            cg.get_parents(partner_sv_ids, time_stamp=time_stamp), dtype=np.uint64
+        )
 
-    # Remap the graph-tool ids to lvl2 ids and return the path
-    vertex_indices = [weighted_graph.vertex_index[vertex] for vertex in vertex_list]
-    l2_traversal_path = graph_indexed_l2_ids[vertex_indices]
-    return l2_traversal_path
+    neighbors = {}
+    for l2_id, edges in zip(l2_ids, cross_edges):
+        indices = np.searchsorted(partner_sv_ids, edges[:, 1])
+        neighbor_ids = fastremap.unique(partner_l2_ids[indices])
+        neighbors[l2_id] = [int(n) for n in neighbor_ids if n != 0 and n != l2_id]
+    return neighbors
 
 
 def compute_centroid_by_range(vertices):
@@ -187,6 +307,32 @@ def compute_mesh_centroids_of_l2_ids(cg, l2_ids, flatten=False):
     return centroids_with_chunk_boundary_points, failed_l2_ids
 
 
+def compute_attribute_centroids_of_l2_ids(cg, l2_ids, flatten=False):
+    """
+    Given a list of l2_ids, return a tuple containing a dict that maps l2_ids to their
+    stored centroid (a global coordinate in nm), and a list of the l2_ids without stored
+    attributes. Unlike `compute_mesh_centroids_of_l2_ids` no meshes are downloaded.
+
+    :param cg: ChunkedGraph object
+    :param l2_ids: Sequence[np.uint64]
+    :return: Union[Dict[np.uint64, np.ndarray], [np.ndarray]], [np.uint64]
+    """
+    attributes = l2_attributes.read_l2_attributes(cg, l2_ids)
+    centroids = [] if flatten else {}
+    failed_l2_ids = []
+    for l2_id in l2_ids:
+        if l2_id not in attributes:
+            failed_l2_ids.append(l2_id)
+            continue
+        centroid = attributes[l2_id]["centroid"] * cg.segmentation_resolution
+        centroid = centroid.astype(np.float32)
+        if flatten:
+            centroids.append(centroid)
+        else:
+            centroids[l2_id] = centroid
+    return centroids, failed_l2_ids
+
+
 def compute_rough_coordinate_path(cg, l2_ids):
     """
     Given a list of l2_ids, return a list of rough coordinates representing
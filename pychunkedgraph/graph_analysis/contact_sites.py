@@ -3,67 +3,120 @@ from enum import auto, Enum
 import itertools
 
 from contact_points import find_contact_points
+from multiwrapper import multiprocessing_utils as mu
 import numpy as np
+from scipy import sparse
 
 from pychunkedgraph.backend import flatgraph_utils
-from pychunkedgraph.backend.utils import column_keys
+from pychunkedgraph.backend.utils import basetypes, column_keys
 
-def _get_edges_for_contact_site_graph(
-    cg, root_id, bounding_box, bb_is_coordinate, end_time
-):
+# Number of chunks whose supervoxel rows are read together in get_contact_sites_multi
+CONTACT_CHUNK_BATCH_SIZE = 8
+
+def _in_sorted(sorted_ids, ids):
     """
-    Helper function for get_contact_sites that queries the ChunkedGraph for edges and returns
-    a list of edges that are involved in the root_id's contact sites.
+    Mask of ids that are in the sorted array sorted_ids.
     """
-    # Get information about the root id
-    # All supervoxels
-    sv_ids = cg.get_subgraph_nodes(
-        root_id, bounding_box=bounding_box, bb_is_coordinate=bb_is_coordinate
-    )
-    # All edges that are _not_ connected / on
-    edges, _, areas = cg.get_subgraph_edges(
-        root_id,
-        bounding_box=bounding_box,
-        bb_is_coordinate=bb_is_coordinate,
-        connected_edges=False,
-    )
-    # Build area lookup dictionary
-    edge_mask = ~np.in1d(edges, sv_ids).reshape(-1, 2)
-    area_mask = np.where(edge_mask)[0]
-    masked_areas = areas[area_mask]
-    contact_sites_svs = edges[edge_mask]
-    contact_sites_svs_area_dict = collections.defaultdict(int)
+    if len(sorted_ids) == 0:
+        return np.zeros(len(ids), dtype=bool)
+    indices = np.searchsorted(sorted_ids, ids)
+    indices[indices == len(sorted_ids)] = 0
+    return sorted_ids[indices] == ids
 
-    for area, sv_id in zip(masked_areas, contact_sites_svs):
-        contact_sites_svs_area_dict[sv_id] += area
-
-    # Extract svs from contacting root ids
-    unique_contact_sites_svs = np.unique(contact_sites_svs)
 
-    # Load edges of these contact sites' supervoxels
-    edges_contact_sites_svs_rows = cg.read_node_id_rows(
-        node_ids=unique_contact_sites_svs,
-        columns=[column_keys.Connectivity.Partner, column_keys.Connectivity.Connected],
+def _read_sv_edges(cg, sv_ids, connected_edges, end_time):
+    """
+    Reads the (un)connected edges and their areas of supervoxels.
+    """
+    rows = cg.read_node_id_rows(
+        node_ids=sv_ids,
+        columns=[
+            column_keys.Connectivity.Area,
+            column_keys.Connectivity.Partner,
+            column_keys.Connectivity.Connected,
+        ],
         end_time=end_time,
         end_time_inclusive=True,
     )
+    edges = [np.empty((0, 2), dtype=basetypes.NODE_ID)]
+    areas = [np.empty(0, dtype=basetypes.EDGE_AREA)]
+    for row_information in rows.items():
+        sv_edges, _, sv_areas = cg._retrieve_connectivity(
+            row_information, connected_edges=connected_edges
+        )
+        edges.append(sv_edges)
+        areas.append(sv_areas)
+    return np.concatenate(edges), np.concatenate(areas)
+
 
-    contact_sites_edges = []
-    for row_information in edges_contact_sites_svs_rows.items():
-        sv_edges, _, _ = cg._retrieve_connectivity(row_information)
-        contact_sites_edges.extend(sv_edges)
-    if len(contact_sites_edges) == 0:
-        return None, None, False
-    contact_sites_edges_array = np.array(contact_sites_edges)
-    contact_sites_edge_mask = np.isin(
-        contact_sites_edges_array[:, 1], unique_contact_sites_svs
+def get_contact_site_edges(
+    cg, root_id, bounding_box=None, bb_is_coordinate=True, end_time=None,
+    compute_partner=True
+):
+    """
+    Given a root id, return all supervoxel edges between the root and other roots
+    in a single traversal of the root's subgraph.
+
+    Returns three arrays: the edges (root supervoxel, partner supervoxel), their areas
+    and the root id of the partner supervoxel of each edge (0 if compute_partner=False).
+    If a bounding box is given, edges with a partner supervoxel in a chunk outside of
+    it are pruned as well.
+    """
+    bounding_box = cg.normalize_bounding_box(bounding_box, bb_is_coordinate)
+    l2_ids = cg._get_subgraph_multiple_nodes(
+        node_ids=[root_id],
+        bounding_box=bounding_box,
+        return_layers=[2],
+        serializable=False,
+    )[root_id]
+    sv_ids = np.sort(cg.get_children(l2_ids, flatten=True)).astype(basetypes.NODE_ID)
+
+    # Edges are read as of the creation of the root (like get_subgraph_edges)
+    root_time_stamp = cg.read_node_id_row(
+        root_id, columns=column_keys.Hierarchy.Child
+    )[0].timestamp
+    edges, areas = _read_sv_edges(cg, sv_ids, False, root_time_stamp)
+
+    contact_mask = ~_in_sorted(sv_ids, edges[:, 1])
+    edges, areas = edges[contact_mask], areas[contact_mask]
+
+    if bounding_box is not None and len(edges) > 0:
+        chunk_ids, chunk_index = np.unique(
+            cg.get_chunk_ids_from_node_ids(edges[:, 1]), return_inverse=True
+        )
+        chunk_mask = cg.mask_nodes_by_bounding_box(chunk_ids, bounding_box)
+        bbox_mask = chunk_mask[chunk_index.reshape(-1)]
+        edges, areas = edges[bbox_mask], areas[bbox_mask]
+
+    partner_root_ids = np.zeros(len(edges), dtype=basetypes.NODE_ID)
+    if compute_partner and len(edges) > 0:
+        partner_sv_ids, partner_index = np.unique(edges[:, 1], return_inverse=True)
+        partner_root_ids = np.array(
+            cg.get_roots(partner_sv_ids, time_stamp=end_time), dtype=basetypes.NODE_ID
+        )[partner_index.reshape(-1)]
+    return edges, areas, partner_root_ids
+
+
+def _get_component_labels(sv_ids, edges):
+    """
+    Connected component label of each of the sorted sv_ids, edges not between
+    two of them are ignored.
+    """
+    edges = edges[_in_sorted(sv_ids, edges[:, 0]) & _in_sorted(sv_ids, edges[:, 1])]
+    # Self edges ensure lone supervoxels show up as a connected component
+    self_edges = np.stack((sv_ids, sv_ids), axis=-1)
+    graph, _, _, unique_sv_ids = flatgraph_utils.build_gt_graph(
+        np.concatenate((edges, self_edges)), make_directed=True
     )
-    # Fake edges to ensure lone contact site supervoxels show up as a connected component
-    self_edges = np.stack((unique_contact_sites_svs, unique_contact_sites_svs), axis=-1)
-    contact_sites_graph_edges = np.concatenate(
-        (contact_sites_edges_array[contact_sites_edge_mask], self_edges), axis=0
+    ccs = flatgraph_utils.connected_components(graph)
+
+    labels = np.empty(len(unique_sv_ids), dtype=np.uint64)
+    labels[np.concatenate(ccs)] = np.repeat(
+        np.arange(len(ccs), dtype=np.uint64), [len(cc) for cc in ccs]
     )
-    return contact_sites_graph_edges, contact_sites_svs_area_dict, True
+    # unique_sv_ids == sv_ids since all of them have a self edge
+    return labels
+
 
 def get_contact_sites(
     cg,
@@ -92,34 +145,48 @@ def get_contact_sites(
     the first two entries are the positions of those two chunks in global coordinates instead.
     If areas_only=True, then the tuple is just the area and no location is returned.
     """
-    contact_sites_graph_edges, contact_sites_svs_area_dict, any_contact_sites = _get_edges_for_contact_site_graph(
-        cg, root_id, bounding_box, bb_is_coordinate, end_time
-    )
-
-    if not any_contact_sites:
-        return collections.defaultdict(list)
-
-    contact_sites_svs_area_dict_vec = np.vectorize(contact_sites_svs_area_dict.get)
+    if compute_partner:
+        contact_site_metadata = ['segment id', 'lower bound coordinate', 'upper bound coordinate', 'area']
+    else:
+        contact_site_metadata = ['lower bound coordinate', 'upper bound coordinate', 'area']
 
-    graph, _, _, unique_sv_ids = flatgraph_utils.build_gt_graph(
-        contact_sites_graph_edges, make_directed=True
+    edges, areas, partner_root_ids = get_contact_site_edges(
+        cg, root_id, bounding_box, bb_is_coordinate, end_time, compute_partner
     )
+    if len(edges) == 0:
+        return [], contact_site_metadata
 
-    connected_components = flatgraph_utils.connected_components(graph)
+    # Contact area of each partner supervoxel
+    partner_sv_ids, sv_first_edge, partner_index = np.unique(
+        edges[:, 1], return_index=True, return_inverse=True
+    )
+    partner_index = partner_index.reshape(-1)
+    sv_areas = np.bincount(partner_index, weights=areas, minlength=len(partner_sv_ids))
+    sv_root_ids = partner_root_ids[sv_first_edge]
+
+    # A contact site is a connected component of partner supervoxels
+    partner_edges, _ = _read_sv_edges(cg, partner_sv_ids, True, end_time)
+    sv_labels = _get_component_labels(partner_sv_ids, partner_edges)
+
+    # Group by (partner root, component) pairs
+    _, site_first_sv, site_index = np.unique(
+        np.stack((sv_root_ids, sv_labels), axis=-1),
+        axis=0,
+        return_index=True,
+        return_inverse=True,
+    )
+    site_index = site_index.reshape(-1)
+    site_areas = np.bincount(site_index, weights=sv_areas).round().astype(basetypes.EDGE_AREA)
+    site_sv_ids = partner_sv_ids[site_first_sv]
+    site_root_ids = sv_root_ids[site_first_sv]
 
     contact_site_dict = collections.defaultdict(list)
-    # First create intermediary map of supervoxel to contact sites, so we
-    # can call cg.get_roots() on all supervoxels at once.
-    intermediary_sv_dict = {}
-    for cc in connected_components:
-        cc_sv_ids = unique_sv_ids[cc]
-        contact_sites_areas = contact_sites_svs_area_dict_vec(cc_sv_ids)
-
-        representative_sv = cc_sv_ids[0]
+    contact_site_list = []
+    for site_sv_id, site_root_id, site_area in zip(site_sv_ids, site_root_ids, site_areas):
         # Tuple of location and area of contact site
-        chunk_coordinates = cg.get_chunk_coordinates(representative_sv)
+        chunk_coordinates = cg.get_chunk_coordinates(site_sv_id)
         if areas_only:
-            data_pair = np.sum(contact_sites_areas)
+            data_pair = site_area
         elif voxel_location:
             voxel_lower_bound = (
                 cg.vx_vol_bounds[:, 0] + cg.chunk_size * chunk_coordinates
@@ -130,43 +197,186 @@ def get_contact_sites(
             data_pair = (
                 voxel_lower_bound * cg.segmentation_resolution,
                 voxel_upper_bound * cg.segmentation_resolution,
-                np.sum(contact_sites_areas),
+                site_area,
             )
         else:
             data_pair = (
                 chunk_coordinates,
                 chunk_coordinates + 1,
-                np.sum(contact_sites_areas),
+                site_area,
             )
 
         if compute_partner:
             # Cast np.uint64 to int for dict key because int is hashable
-            intermediary_sv_dict[int(representative_sv)] = data_pair
+            contact_site_dict[int(site_root_id)].append(data_pair)
         else:
-            contact_site_dict[len(contact_site_dict)].append(data_pair)
-    if compute_partner:
-        sv_list = np.array(list(intermediary_sv_dict.keys()), dtype=np.uint64)
-        partner_roots = cg.get_roots(sv_list)
-        for i in range(len(partner_roots)):
-            contact_site_dict[int(partner_roots[i])].append(
-                intermediary_sv_dict.get(int(sv_list[i]))
-            )
+            contact_site_list.append(data_pair)
 
-    contact_site_list = []
     for partner_id in contact_site_dict:
-        if compute_partner:
-            contact_site_list.append((np.uint64(partner_id), contact_site_dict[partner_id]))
-        else:
-            contact_site_list.append((*contact_site_dict[partner_id]))
-    
-    if compute_partner:
-        contact_site_metadata = ['segment id', 'lower bound coordinate', 'upper bound coordinate', 'area']
-    else:
-        contact_site_metadata = ['lower bound coordinate', 'upper bound coordinate', 'area']
-
+        contact_site_list.append((np.uint64(partner_id), contact_site_dict[partner_id]))
     return contact_site_list, contact_site_metadata
 
 
+def _read_contact_edges_batch(cg, batch_sv_ids, sv_ids, sv_root_index, end_time):
+    """
+    Reads the edges of a batch of supervoxels and returns the edges to supervoxels of
+    other roots, their areas and the connected edges of the supervoxels with such edges.
+    """
+    rows = cg.read_node_id_rows(
+        node_ids=batch_sv_ids,
+        columns=[
+            column_keys.Connectivity.Area,
+            column_keys.Connectivity.Partner,
+            column_keys.Connectivity.Connected,
+        ],
+        end_time=end_time,
+        end_time_inclusive=True,
+    )
+    edges = [np.empty((0, 2), dtype=basetypes.NODE_ID)]
+    areas = [np.empty(0, dtype=basetypes.EDGE_AREA)]
+    connected_edges = [np.empty((0, 2), dtype=basetypes.NODE_ID)]
+    for row_information in rows.items():
+        sv_edges, _, sv_areas = cg._retrieve_connectivity(
+            row_information, connected_edges=False
+        )
+        sv_connected_edges, _, _ = cg._retrieve_connectivity(
+            row_information, connected_edges=True
+        )
+        edges.append(sv_edges)
+        areas.append(sv_areas)
+        connected_edges.append(sv_connected_edges)
+    edges, areas = np.concatenate(edges), np.concatenate(areas)
+    connected_edges = np.concatenate(connected_edges)
+
+    partner_mask = _in_sorted(sv_ids, edges[:, 1])
+    edges, areas = edges[partner_mask], areas[partner_mask]
+    root_index = sv_root_index[np.searchsorted(sv_ids, edges)]
+    contact_mask = root_index[:, 0] != root_index[:, 1]
+    edges, areas = edges[contact_mask], areas[contact_mask]
+
+    connected_edges = connected_edges[
+        _in_sorted(np.unique(edges[:, 0]), connected_edges[:, 0])
+    ]
+    return edges, areas, connected_edges
+
+
+def get_contact_sites_multi(
+    cg, root_ids, end_time=None, chunk_batch_size=CONTACT_CHUNK_BATCH_SIZE, n_threads=None
+):
+    """
+    Given a list of root ids, find the contact sites between all pairs of them at once.
+    The subgraph of every root is traversed once and the edges of all their supervoxels
+    are read in batches of chunks concurrently.
+
+    Returns the sorted unique root ids and two symmetric sparse matrices (scipy.sparse.csr_matrix)
+    indexed by them: the total contact area and the number of contact sites of each pair.
+    A contact site is a connected component of the supervoxels of one root that touch the
+    other root. Like get_contact_sites_pairwise, the higher count of the two roots is used.
+    """
+    root_ids = np.unique(np.array(root_ids, dtype=basetypes.NODE_ID))
+    n_roots = len(root_ids)
+    empty_matrix = sparse.csr_matrix((n_roots, n_roots), dtype=basetypes.EDGE_AREA)
+    if n_roots < 2:
+        return root_ids, empty_matrix, empty_matrix.astype(np.int64)
+
+    # Global supervoxel -> root map as sorted arrays
+    l2_id_dict = cg._get_subgraph_multiple_nodes(
+        node_ids=root_ids, bounding_box=None, return_layers=[2], serializable=False
+    )
+    sv_ids = []
+    sv_root_index = []
+    for i, root_id in enumerate(root_ids):
+        root_sv_ids = cg.get_children(l2_id_dict[root_id], flatten=True)
+        sv_ids.append(root_sv_ids)
+        sv_root_index.append(np.full(len(root_sv_ids), i, dtype=np.int64))
+    sv_ids = np.concatenate(sv_ids).astype(basetypes.NODE_ID)
+    sv_root_index = np.concatenate(sv_root_index)
+    sv_order = np.argsort(sv_ids)
+    sv_ids, sv_root_index = sv_ids[sv_order], sv_root_index[sv_order]
+    if len(sv_ids) == 0:
+        return root_ids, empty_matrix, empty_matrix.astype(np.int64)
+
+    # Batches of supervoxels of chunk_batch_size chunks each
+    _, chunk_index = np.unique(
+        cg.get_chunk_ids_from_node_ids(sv_ids), return_inverse=True
+    )
+    chunk_index = chunk_index.reshape(-1)
+    chunk_order = np.argsort(chunk_index, kind="stable")
+    batch_bounds = np.searchsorted(
+        chunk_index[chunk_order],
+        np.arange(chunk_batch_size, chunk_index.max() + 1, chunk_batch_size),
+    )
+    sv_id_batches = np.split(sv_ids[chunk_order], batch_bounds)
+
+    def _read_contact_edges_thread(batch_sv_ids):
+        return _read_contact_edges_batch(cg, batch_sv_ids, sv_ids, sv_root_index, end_time)
+
+    if n_threads is None:
+        n_threads = min(len(sv_id_batches), 2 * mu.n_cpus)
+    batch_results = mu.multithread_func(
+        _read_contact_edges_thread,
+        sv_id_batches,
+        n_threads=n_threads,
+        debug=n_threads == 1,
+    )
+    edges = np.concatenate([r[0] for r in batch_results])
+    areas = np.concatenate([r[1] for r in batch_results])
+    connected_edges = np.concatenate([r[2] for r in batch_results])
+    if len(edges) == 0:
+        return root_ids, empty_matrix, empty_matrix.astype(np.int64)
+
+    # Every edge is stored by both of its supervoxels, count areas once
+    root_index = sv_root_index[np.searchsorted(sv_ids, edges)]
+    first_mask = root_index[:, 0] < root_index[:, 1]
+    area_matrix = sparse.coo_matrix(
+        (areas[first_mask], (root_index[first_mask, 0], root_index[first_mask, 1])),
+        shape=(n_roots, n_roots),
+    ).tocsr()
+    area_matrix = (area_matrix + area_matrix.T).astype(basetypes.EDGE_AREA)
+
+    # Nodes of the contact site graph are pairs (supervoxel, other root),
+    # packed as supervoxel index * n_roots + other root index
+    sv_index = np.searchsorted(sv_ids, edges[:, 0]).astype(np.uint64)
+    node_keys = np.unique(sv_index * np.uint64(n_roots) + root_index[:, 1].astype(np.uint64))
+    node_sv_index = node_keys // np.uint64(n_roots)
+    node_other_root_index = node_keys % np.uint64(n_roots)
+
+    # A connected edge (a, b) connects (a, r) and (b, r) if both touch r
+    connected_edges = connected_edges[_in_sorted(sv_ids, connected_edges[:, 1])]
+    a_index = np.searchsorted(sv_ids, connected_edges[:, 0]).astype(np.uint64)
+    b_index = np.searchsorted(sv_ids, connected_edges[:, 1]).astype(np.uint64)
+    a_node_start = np.searchsorted(node_sv_index, a_index, side="left")
+    a_node_count = np.searchsorted(node_sv_index, a_index, side="right") - a_node_start
+    edge_repeat = np.repeat(np.arange(len(a_index)), a_node_count)
+    node_offsets = np.arange(np.sum(a_node_count)) - np.repeat(
+        np.cumsum(a_node_count) - a_node_count, a_node_count
+    )
+    a_nodes = np.repeat(a_node_start, a_node_count) + node_offsets
+    b_keys = b_index[edge_repeat] * np.uint64(n_roots) + node_other_root_index[a_nodes]
+    b_mask = _in_sorted(node_keys, b_keys)
+    node_edges = np.stack((node_keys[a_nodes[b_mask]], b_keys[b_mask]), axis=-1)
+    node_labels = _get_component_labels(node_keys, node_edges)
+
+    # Count sites per (root, other root) and take the higher count of each pair
+    site_pairs = np.unique(
+        np.stack(
+            (
+                sv_root_index[node_sv_index.astype(np.int64)].astype(np.uint64),
+                node_other_root_index,
+                node_labels,
+            ),
+            axis=-1,
+        ),
+        axis=0,
+    )[:, :2].astype(np.int64)
+    site_matrix = sparse.coo_matrix(
+        (np.ones(len(site_pairs), dtype=np.int64), (site_pairs[:, 0], site_pairs[:, 1])),
+        shape=(n_roots, n_roots),
+    ).tocsr()
+    site_matrix = site_matrix.maximum(site_matrix.T)
+    return root_ids, area_matrix, site_matrix
+
+
 def _retrieve_connectivity_optimized(cg, dict_item):
     """
     An altered version of cg._retrieve_connectivity that is optimized
@@ -0,0 +1,216 @@
+"""
+Cache of the level 2 graphs (edge lists) of root ids.
+
+Roots never change, so their level 2 graphs can be kept until evicted. An
+edit only replaces the few level 2 nodes containing its supervoxels, so the
+graph of a new root is derived from the cached graphs of its former roots
+(`Hierarchy.FormerParent`): edges of the replaced level 2 nodes are dropped,
+edges of their replacements are read, and for splits only the connected
+components belonging to the new root are kept. Without cached former roots
+the graph is rebuilt with `analysis.get_lvl2_edge_list`.
+"""
+
+import collections
+import datetime
+import threading
+from typing import Optional, Sequence
+
+import numpy as np
+
+from pychunkedgraph.backend import flatgraph_utils
+from pychunkedgraph.backend.utils import column_keys
+from pychunkedgraph.graph_analysis import analysis
+
+MAX_CACHED_EDGES = 20_000_000
+# Undo of a redo of an undo ... is followed this far to find the edited edges
+MAX_OPERATION_CHAIN = 10
+
+_L2_GRAPH_CACHE = None
+_L2_GRAPH_CACHE_LOCK = threading.Lock()
+
+
+class L2GraphCache:
+    def __init__(self, max_edges: int = MAX_CACHED_EDGES):
+        """
+        :param max_edges: int
+            least recently used graphs are evicted above this many edges
+        """
+        self._max_edges = max_edges
+        self._lock = threading.Lock()
+        # (table_id, root_id) -> edges
+        self._graphs = collections.OrderedDict()
+        self._n_edges = 0
+        self.counters = collections.Counter()
+
+    def get(self, table_id: str, root_id: np.uint64) -> Optional[np.ndarray]:
+        key = (table_id, int(root_id))
+        with self._lock:
+            edges = self._graphs.get(key)
+            if edges is not None:
+                self._graphs.move_to_end(key)
+        return edges
+
+    def put(self, table_id: str, root_id: np.uint64, edges: np.ndarray) -> None:
+        key = (table_id, int(root_id))
+        with self._lock:
+            if key in self._graphs:
+                self._n_edges -= len(self._graphs.pop(key))
+            self._graphs[key] = edges
+            self._n_edges += len(edges)
+            while self._n_edges > self._max_edges and len(self._graphs) > 1:
+                _, evicted = self._graphs.popitem(last=False)
+                self._n_edges -= len(evicted)
+                self.counters["evictions"] += 1
+
+    def get_lvl2_edge_list(self, cg, root_id: np.uint64) -> np.ndarray:
+        """ Same as `analysis.get_lvl2_edge_list` for a root id """
+        edges = self.get(cg.table_id, root_id)
+        if edges is not None:
+            with self._lock:
+                self.counters["hits"] += 1
+            return edges
+
+        try:
+            edges = self._derive(cg, root_id)
+        except Exception:
+            cg.logger.exception(f"Deriving the level 2 graph of {root_id} failed")
+            edges = None
+
+        with self._lock:
+            self.counters["derived" if edges is not None else "rebuilt"] += 1
+        if edges is None:
+            edges = analysis.get_lvl2_edge_list(cg, root_id)
+        self.put(cg.table_id, root_id, edges)
+        return edges
+
+    def _derive(self, cg, root_id: np.uint64) -> Optional[np.ndarray]:
+        """ Derives the graph from the cached graphs of the former roots,
+        None if they are not all cached """
+        row = cg.read_node_id_rows(
+            node_ids=[root_id],
+            columns=[
+                column_keys.Hierarchy.FormerParent,
+                column_keys.OperationLogs.OperationID,
+            ],
+        ).get(root_id, {})
+        if (
+            column_keys.Hierarchy.FormerParent not in row
+            or column_keys.OperationLogs.OperationID not in row
+        ):
+            return None
+
+        former_root_ids = row[column_keys.Hierarchy.FormerParent][0].value
+        time_stamp = row[column_keys.Hierarchy.FormerParent][0].timestamp
+        former_edge_lists = [self.get(cg.table_id, r) for r in former_root_ids]
+        if any(edges is None for edges in former_edge_lists):
+            return None
+
+        sv_ids = get_edited_supervoxel_ids(
+            cg, row[column_keys.OperationLogs.OperationID][0].value
+        )
+        if sv_ids is None:
+            return None
+        return derive_lvl2_edge_list(cg, root_id, former_edge_lists, sv_ids, time_stamp)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["graphs"] = len(self._graphs)
+            stats["edges"] = self._n_edges
+        return stats
+
+
+def get_l2_graph_cache() -> L2GraphCache:
+    """ One cache per process """
+    global _L2_GRAPH_CACHE
+    with _L2_GRAPH_CACHE_LOCK:
+        if _L2_GRAPH_CACHE is None:
+            _L2_GRAPH_CACHE = L2GraphCache()
+        return _L2_GRAPH_CACHE
+
+
+def get_edited_supervoxel_ids(cg, operation_id: np.uint64) -> Optional[np.ndarray]:
+    """ Supervoxels of the edges added or removed by an operation; undo and
+    redo operations are followed to the operation they refer to
+
+    :return: np.ndarray or None if the log record has no edges
+    """
+    for _ in range(MAX_OPERATION_CHAIN):
+        log_record, _ = cg.read_log_row(operation_id)
+        sv_ids = [
+            np.array(log_record[column], dtype=np.uint64).reshape(-1)
+            for column in [
+                column_keys.OperationLogs.AddedEdge,
+                column_keys.OperationLogs.RemovedEdge,
+                column_keys.OperationLogs.SourceID,
+                column_keys.OperationLogs.SinkID,
+            ]
+            if column in log_record
+        ]
+        if sv_ids:
+            return np.unique(np.concatenate(sv_ids))
+
+        if column_keys.OperationLogs.UndoOperationID in log_record:
+            operation_id = log_record[column_keys.OperationLogs.UndoOperationID]
+        elif column_keys.OperationLogs.RedoOperationID in log_record:
+            operation_id = log_record[column_keys.OperationLogs.RedoOperationID]
+        else:
+            return None
+    return None
+
+
+def derive_lvl2_edge_list(
+    cg,
+    root_id: np.uint64,
+    former_edge_lists: Sequence[np.ndarray],
+    sv_ids: Sequence[np.uint64],
+    time_stamp: datetime.datetime,
+) -> np.ndarray:
+    """
+    Level 2 graph of a root created by an edit, from the graphs of its former roots.
+
+    :param cg: ChunkedGraph object
+    :param root_id: np.uint64
+    :param former_edge_lists: [np.ndarray]
+        level 2 edge lists of the former roots
+    :param sv_ids: [np.uint64]
+        supervoxels of the edited edges
+    :param time_stamp: datetime
+        time stamp of the edit
+    :return: np.ndarray (same as `analysis.get_lvl2_edge_list`)
+    """
+    sv_ids = np.array(sv_ids, dtype=np.uint64)
+    edges = np.concatenate(
+        [np.zeros((0, 2), dtype=np.uint64)]
+        + [np.array(e, dtype=np.uint64).reshape(-1, 2) for e in former_edge_lists]
+    )
+
+    # Bigtable time stamps have millisecond resolution
+    former_l2_ids = np.unique(
+        cg.get_parents(sv_ids, time_stamp=time_stamp - datetime.timedelta(milliseconds=1))
+    )
+    new_l2_ids = np.unique(cg.get_parents(sv_ids, time_stamp=time_stamp))
+    edges = edges[~np.any(np.isin(edges, former_l2_ids), axis=1)]
+
+    neighbors = analysis._read_l2_neighbors(
+        cg, [int(l2_id) for l2_id in new_l2_ids], cg.n_layers, time_stamp=time_stamp
+    )
+    new_edges = np.array(
+        [[l2_id, n] for l2_id, l2_neighbors in neighbors.items() for n in l2_neighbors],
+        dtype=np.uint64,
+    ).reshape(-1, 2)
+    edges = np.concatenate([edges, new_edges])
+    if len(edges) == 0:
+        return edges
+    edges = np.unique(np.sort(edges, axis=1), axis=0)
+
+    # After a split the edges of all new roots are left, keep the components
+    # reached from the new level 2 ids of this root
+    new_l2_root_ids = cg.get_roots(new_l2_ids, time_stamp=time_stamp)
+    root_l2_ids = new_l2_ids[new_l2_root_ids == root_id]
+    graph, _, _, unique_ids = flatgraph_utils.build_gt_graph(edges, is_directed=False)
+    ccs = flatgraph_utils.connected_components(graph)
+    keep_ids = [unique_ids[cc] for cc in ccs if np.any(np.isin(unique_ids[cc], root_l2_ids))]
+    if len(keep_ids) == 0:
+        return np.zeros((0, 2), dtype=np.uint64)
+    return edges[np.isin(edges[:, 0], np.concatenate(keep_ids))]
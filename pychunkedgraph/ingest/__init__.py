@@ -13,6 +13,7 @@ _cluster_ingest_config_fields = (
     "PARENTS_Q_NAME",
     "PARENTS_Q_LIMIT",
     "PARENTS_Q_INTERVAL",
+    "AUTO_PARENTS",  # enqueue a parent chunk when all of its children are done
 )
 _cluster_ingest_defaults = (
     REDIS_URL,
@@ -23,6 +24,7 @@ _cluster_ingest_defaults = (
     "parents",
     25000,
     120,
+    True,
 )
 ClusterIngestConfig = namedtuple(
     "ClusterIngestConfig",
@@ -38,8 +40,10 @@ _ingestconfig_fields = (
     "USE_RAW_EDGES",
     "USE_RAW_COMPONENTS",
     "TEST_RUN",
+    "L2_ATTRIBUTES",  # compute level 2 attributes from the watershed chunks
+    "NODE_STATS",  # write aggregate statistics (supervoxel and level 2 counts) of nodes
 )
-_ingestconfig_defaults = (None, None, None, False, False, False)
+_ingestconfig_defaults = (None, None, None, False, False, False, False, False)
 IngestConfig = namedtuple(
     "IngestConfig", _ingestconfig_fields, defaults=_ingestconfig_defaults
 )
@@ -2,6 +2,7 @@
 cli for running ingest
 """
 
+import datetime
 import time
 from itertools import product
 
@@ -14,6 +15,7 @@ from .utils import chunk_id_str
 from .manager import IngestionManager
 from .cluster import create_parent_chunk
 from ..backend.chunkedgraph import ChunkedGraph
+from ..backend.l2_attributes import enable_l2_attributes
 from .redis import keys as r_keys
 from .redis import get_redis_connection
 from ..backend.chunks.hierarchy import get_children_coords
@@ -73,7 +75,97 @@ def ingest_graph(
     )
 
     meta = ChunkedGraphMeta(data_source, graph_config, BigTableConfig())
-    enqueue_atomic_tasks(IngestionManager(ingest_config, meta))
+    imanager = IngestionManager(ingest_config, meta)
+    if ingest_config.L2_ATTRIBUTES:
+        enable_l2_attributes(imanager.cg)
+    enqueue_atomic_tasks(imanager)
+
+
+@ingest_cli.command("local")
+@click.argument("graph_id", type=str)
+@click.argument("dataset", type=click.Path(exists=True))
+@click.option("--raw", is_flag=True)
+@click.option("--test", is_flag=True)
+@click.option("--n-workers", type=int, default=1, help="Number of processes")
+@click.option(
+    "--prefetch/--no-prefetch",
+    default=True,
+    help="Download edge files of upcoming atomic chunks in the background",
+)
+def ingest_graph_local(
+    graph_id: str,
+    dataset: click.Path,
+    raw: bool,
+    test: bool,
+    n_workers: int,
+    prefetch: bool,
+):
+    """
+    Ingest on this machine without redis
+    Takes ingest config from a yaml file and builds all layers
+    """
+    from . import IngestConfig
+    from .local import ingest_local
+    from .utils import initialize_chunkedgraph
+    from ..backend import BigTableConfig
+    from ..backend import DataSource
+    from ..backend import GraphConfig
+    from ..backend import ChunkedGraphMeta
+
+    with open(dataset, "r") as stream:
+        config = yaml.safe_load(stream)
+
+    ingest_config = IngestConfig(
+        **config["ingest_config"],
+        USE_RAW_EDGES=raw,
+        USE_RAW_COMPONENTS=raw,
+        TEST_RUN=test,
+    )
+
+    graph_config = GraphConfig(
+        graph_id=graph_id,
+        chunk_size=np.array([256, 256, 512], dtype=int),
+        overwrite=True,
+    )
+
+    data_source = DataSource(
+        agglomeration=config["ingest_config"]["AGGLOMERATION"],
+        watershed=config["data_source"]["WATERSHED"],
+        edges=config["data_source"]["EDGES"],
+        components=config["data_source"]["COMPONENTS"],
+        data_version=config["data_source"]["DATA_VERSION"],
+        use_raw_edges=raw,
+        use_raw_components=raw,
+    )
+
+    meta = ChunkedGraphMeta(data_source, graph_config, BigTableConfig())
+    cg = initialize_chunkedgraph(meta)
+    if ingest_config.L2_ATTRIBUTES:
+        enable_l2_attributes(cg)
+
+    start = time.time()
+    completed = ingest_local(
+        IngestionManager(ingest_config, meta),
+        n_workers=n_workers,
+        prefetch_edges=prefetch,
+    )
+    for layer in sorted(completed):
+        print(f"{layer}\t: {completed[layer]}")
+    print(f"Ingest took {time.time() - start:.1f}s")
+
+
+def _is_queued_or_done(imanager: IngestionManager, layer: int, coords) -> bool:
+    """
+    With automatic parent scheduling parent chunks are queued by their last
+    child, these must not be queued again by the helper commands
+    """
+    if not imanager.config.CLUSTER.AUTO_PARENTS:
+        return False
+    chunk_str = "_".join(map(str, coords))
+    return bool(
+        imanager.redis.hexists(f"{layer}q", chunk_str)
+        or imanager.redis.hexists(f"{layer}c", chunk_str)
+    )
 
 
 @ingest_cli.command("layer")
@@ -83,6 +175,8 @@ def queue_layer(parent_layer):
     Helper command
     Queue all chunk tasks at a given layer
     Use this only when all the chunks at `parent_layer - 1` have been built.
+    With AUTO_PARENTS (default) parent chunks are queued automatically, only
+    chunks that were neither queued nor built are queued (e.g. lost jobs).
     """
     redis = get_redis_connection()
     imanager = IngestionManager.from_pickle(redis.get(r_keys.INGESTION_MANAGER))
@@ -94,6 +188,13 @@ def queue_layer(parent_layer):
         chunk_coords = list(product(*[range(r) for r in bounds]))
         np.random.shuffle(chunk_coords)
 
+    n_chunks = len(chunk_coords)
+    chunk_coords = [
+        c for c in chunk_coords if not _is_queued_or_done(imanager, parent_layer, c)
+    ]
+    if len(chunk_coords) < n_chunks:
+        print(f"Skipping {n_chunks - len(chunk_coords)} chunks queued or built already")
+
     for coords in chunk_coords:
         task_q = imanager.get_task_queue(imanager.config.CLUSTER.PARENTS_Q_NAME)
         task_q.enqueue(
@@ -110,13 +211,27 @@ def queue_layer(parent_layer):
 
 
 @ingest_cli.command("status")
-def ingest_status():
+@click.option("--window", type=int, default=600, help="Throughput window [s]")
+@click.option("--stragglers", is_flag=True, help="List straggler chunks")
+def ingest_status(window: int, stragglers: bool):
+    from .cluster import get_layer_progress
+
     redis = get_redis_connection()
     imanager = IngestionManager.from_pickle(redis.get(r_keys.INGESTION_MANAGER))
+    print("layer\t: done / total\tchunks/min\tETA\t\tstragglers")
     for layer in range(2, imanager.cg_meta.layer_count + 1):
-        layer_count = redis.hlen(f"{layer}c")
-        print(f"{layer}\t: {layer_count}")
-    print(imanager.cg_meta.layer_chunk_counts)
+        progress = get_layer_progress(imanager, layer, window=window)
+        eta = "-"
+        if progress["eta"] is not None:
+            eta = str(datetime.timedelta(seconds=int(progress["eta"])))
+        print(
+            f"{layer}\t: {progress['done']} / {progress['total']}"
+            f"\t{progress['throughput']:.1f}\t\t{eta}"
+            f"\t{len(progress['stragglers'])}"
+        )
+        if stragglers:
+            for chunk_str, duration in progress["stragglers"]:
+                print(f"\t{layer}_{chunk_str}\trunning {duration:.0f}s")
 
 
 @ingest_cli.command("chunk")
@@ -143,6 +258,8 @@ def queue_parent(chunk_info):
     """
     Helper command
     Queue parent chunk of a given child chunk
+    With AUTO_PARENTS (default) the parent is not queued again if it was
+    queued or built already.
     """
     redis = get_redis_connection()
     imanager = IngestionManager.from_pickle(redis.get(r_keys.INGESTION_MANAGER))
@@ -152,6 +269,9 @@ def queue_parent(chunk_info):
         np.array(chunk_info[1:], int) // imanager.cg_meta.graph_config.FANOUT
     )
     parent_chunk_str = "_".join(map(str, parent_coords))
+    if _is_queued_or_done(imanager, parent_layer, parent_coords):
+        print(f"Chunk {chunk_id_str(parent_layer, parent_coords)} queued or built already")
+        return
 
     parents_queue = imanager.get_task_queue(imanager.config.CLUSTER.PARENTS_Q_NAME)
     parents_queue.enqueue(
@@ -2,10 +2,12 @@
 Ingest / create chunkedgraph with workers.
 """
 
+import collections
 import time
 from itertools import product
 from typing import List
 from typing import Dict
+from typing import Optional
 from typing import Tuple
 from typing import Sequence
 
@@ -18,14 +20,70 @@ from ..backend import ChunkedGraphMeta
 from ..backend.chunks.hierarchy import get_children_coords
 
 
+def _pre_task_start(imanager: IngestionManager, layer: int, coords: np.ndarray):
+    chunk_str = "_".join(map(str, coords))
+    # start times, for durations and stragglers
+    imanager.redis.hset(f"{layer}s", chunk_str, time.time())
+
+
 def _post_task_completion(imanager: IngestionManager, layer: int, coords: np.ndarray):
     chunk_str = "_".join(map(str, coords))
     # remove from queued hash and put in completed hash
     imanager.redis.hdel(f"{layer}q", chunk_str)
-    imanager.redis.hset(f"{layer}c", chunk_str, "")
+    is_new = imanager.redis.hset(f"{layer}c", chunk_str, "")
+    imanager.redis.hset(f"{layer}t", chunk_str, time.time())
+    # a rerun of a completed task must not count twice
+    if is_new and imanager.config.CLUSTER.AUTO_PARENTS:
+        _enqueue_parent_if_ready(imanager, layer, coords)
     return
 
 
+def get_parent_coords(
+    cg_meta: ChunkedGraphMeta, layer: int, coords: Sequence[int]
+) -> Tuple[int, Tuple[int, int, int]]:
+    parent_layer = layer + 1
+    if parent_layer == cg_meta.layer_count:
+        return parent_layer, (0, 0, 0)
+    parent_coords = np.array(coords, dtype=int) // cg_meta.graph_config.fanout
+    return parent_layer, tuple(int(c) for c in parent_coords)
+
+
+def _enqueue_parent_if_ready(
+    imanager: IngestionManager, layer: int, coords: Sequence[int]
+):
+    """
+    Counts down the children of the parent chunk that are not done yet
+    and enqueues the parent with its last child
+    """
+    if layer >= imanager.cg_meta.layer_count:
+        return
+    parent_layer, parent_coords = get_parent_coords(imanager.cg_meta, layer, coords)
+    parent_str = "_".join(map(str, parent_coords))
+    # HINCRBY is atomic, exactly one child sees 0
+    remaining = imanager.redis.hincrby(f"{parent_layer}r", parent_str, -1)
+    if remaining == 0:
+        enqueue_parent_task(imanager, parent_layer, parent_coords)
+
+
+def enqueue_parent_task(
+    imanager: IngestionManager, parent_layer: int, parent_coords: Sequence[int]
+):
+    parent_str = "_".join(map(str, parent_coords))
+    parents_queue = imanager.get_task_queue(imanager.config.CLUSTER.PARENTS_Q_NAME)
+    parents_queue.enqueue(
+        create_parent_chunk,
+        job_id=chunk_id_str(parent_layer, parent_coords),
+        job_timeout=f"{int(parent_layer * parent_layer)}m",
+        result_ttl=0,
+        args=(
+            imanager.get_serialized_info(pickled=True),
+            parent_layer,
+            parent_coords,
+        ),
+    )
+    imanager.redis.hset(f"{parent_layer}q", parent_str, "")
+
+
 def create_parent_chunk(
     im_info: str,
     layer: int,
@@ -34,12 +92,30 @@ def create_parent_chunk(
     from .ingestion import create_parent_chunk_helper
 
     imanager = IngestionManager.from_pickle(im_info)
+    _pre_task_start(imanager, layer, parent_coords)
     create_parent_chunk_helper(
         ChunkTask(imanager.cg_meta, parent_coords, layer), imanager
     )
     _post_task_completion(imanager, layer, parent_coords)
 
 
+def _store_parent_dependencies(
+    imanager: IngestionManager, chunk_coords: Sequence[Sequence[int]]
+):
+    """Number of children to wait for, for every parent chunk."""
+    from .local import get_parent_dependencies
+
+    remaining = collections.defaultdict(dict)
+    dependencies = get_parent_dependencies(imanager.cg_meta, chunk_coords)
+    for (layer, coords), count in dependencies.items():
+        remaining[layer]["_".join(map(str, coords))] = count
+    for layer, counts in remaining.items():
+        imanager.redis.hset(f"{layer}r", mapping=counts)
+    # "3r" counts down while atomic chunks finish, keep their initial number
+    n_atomic = len(np.unique(np.array(chunk_coords, dtype=int).reshape(-1, 3), axis=0))
+    imanager.redis.set("2total", n_atomic)
+
+
 def enqueue_atomic_tasks(imanager: IngestionManager):
     imanager.redis.flushdb()
     chunk_coords = _get_test_chunks(imanager.cg.meta)
@@ -49,6 +125,9 @@ def enqueue_atomic_tasks(imanager: IngestionManager):
         chunk_coords = list(product(*[range(r) for r in atomic_chunk_bounds]))
         np.random.shuffle(chunk_coords)
 
+    if imanager.config.CLUSTER.AUTO_PARENTS:
+        _store_parent_dependencies(imanager, chunk_coords)
+
     for chunk_coord in chunk_coords:
         atomic_queue = imanager.get_task_queue(imanager.config.CLUSTER.ATOMIC_Q_NAME)
         # for optimal use of redis memory wait if queue limit is reached
@@ -70,10 +149,84 @@ def _create_atomic_chunk(im_info: str, coord: Sequence[int]):
 
     imanager = IngestionManager.from_pickle(im_info)
     coord = np.array(list(coord), dtype=np.int)
+    _pre_task_start(imanager, 2, coord)
     create_atomic_chunk_helper(ChunkTask(imanager.cg_meta, coord), imanager)
     _post_task_completion(imanager, 2, coord)
 
 
+def compute_layer_progress(
+    start_times: Dict[str, float],
+    finish_times: Dict[str, float],
+    total: int,
+    now: float,
+    window: float = 600,
+    straggler_factor: float = 3,
+) -> Dict:
+    """
+    Progress of a layer from the start and finish times of its chunks
+    Throughput is measured over the last `window` seconds, chunks running
+    longer than `straggler_factor` times the median duration are stragglers.
+    """
+    done = len(finish_times)
+    recent = sum(1 for t in finish_times.values() if t > now - window)
+    throughput = recent / window
+    eta = (total - done) / throughput if throughput > 0 else None
+
+    durations = [finish_times[c] - start_times[c] for c in finish_times if c in start_times]
+    median_duration = float(np.median(durations)) if durations else None
+
+    running = {c: now - t for c, t in start_times.items() if c not in finish_times}
+    stragglers = []
+    if median_duration is not None:
+        stragglers = [
+            (c, d) for c, d in running.items() if d > straggler_factor * median_duration
+        ]
+        stragglers.sort(key=lambda x: -x[1])
+    return {
+        "total": total,
+        "done": done,
+        "running": len(running),
+        "throughput": throughput * 60,  # chunks per minute
+        "eta": eta,
+        "median_duration": median_duration,
+        "stragglers": stragglers,
+    }
+
+
+def get_layer_progress(
+    imanager: IngestionManager,
+    layer: int,
+    window: float = 600,
+    straggler_factor: float = 3,
+    now: Optional[float] = None,
+) -> Dict:
+    def _read_times(key):
+        return {k.decode(): float(v) for k, v in imanager.redis.hgetall(key).items()}
+
+    if now is None:
+        now = time.time()
+
+    # chunk counts from the stored dependencies, a test run is a subset
+    if layer == 2:
+        total = int(imanager.redis.get("2total") or 0)
+    else:
+        total = imanager.redis.hlen(f"{layer}r")
+    if total == 0:
+        if layer == imanager.cg_meta.layer_count:
+            total = 1
+        else:
+            total = int(np.prod(imanager.cg_meta.layer_chunk_bounds[layer]))
+
+    return compute_layer_progress(
+        _read_times(f"{layer}s"),
+        _read_times(f"{layer}t"),
+        total,
+        now,
+        window=window,
+        straggler_factor=straggler_factor,
+    )
+
+
 def _get_test_chunks(meta: ChunkedGraphMeta):
     """
     Returns chunks that lie at the center of the dataset
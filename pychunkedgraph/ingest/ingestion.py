@@ -1,4 +1,6 @@
 from typing import Dict
+from typing import Optional
+from typing import Sequence
 from typing import Tuple
 
 import numpy as np
@@ -8,16 +10,32 @@ from .manager import IngestionManager
 from .backward_compat import get_chunk_data as get_chunk_data_old_format
 from .ran_agglomeration import read_raw_edge_data
 from .ran_agglomeration import read_raw_agglomeration_data
-from ..io.edges import get_chunk_edges
+from ..io.edges_cache import get_edges_cache
 from ..io.components import get_chunk_components
 
 
-def create_atomic_chunk_helper(task: ChunkTask, imanager: IngestionManager):
-    """Helper to queue atomic chunk task."""
-    chunk_edges_all, mapping = _get_atomic_chunk_data(imanager, task.coords)
+def create_atomic_chunk_helper(
+    task: ChunkTask,
+    imanager: IngestionManager,
+    prefetch_coords: Optional[Sequence[Sequence[int]]] = None,
+):
+    """
+    Helper to queue atomic chunk task.
+    Edge files of `prefetch_coords` (upcoming tasks) are downloaded
+    in the background while this chunk is processed.
+    """
+    chunk_edges_all, mapping = _get_atomic_chunk_data(
+        imanager, task.coords, prefetch_coords=prefetch_coords
+    )
     ids, affs, areas, isolated = get_chunk_data_old_format(chunk_edges_all, mapping)
     imanager.cg.add_atomic_edges_in_chunks(
-        ids, affs, areas, isolated, time_stamp=imanager.cg_meta.graph_config.time_stamp
+        ids,
+        affs,
+        areas,
+        isolated,
+        time_stamp=imanager.cg_meta.graph_config.time_stamp,
+        compute_l2_attributes=imanager.config.L2_ATTRIBUTES,
+        compute_node_stats=imanager.config.NODE_STATS,
     )
     return task
 
@@ -28,22 +46,27 @@ def create_parent_chunk_helper(task: ChunkTask, imanager: IngestionManager):
         task.layer,
         task.children_coords,
         time_stamp=imanager.cg_meta.graph_config.time_stamp,
+        compute_node_stats=imanager.config.NODE_STATS,
     )
     return task
 
 
 def _get_atomic_chunk_data(
-    imanager: IngestionManager, coord: np.ndarray
+    imanager: IngestionManager,
+    coord: np.ndarray,
+    prefetch_coords: Optional[Sequence[Sequence[int]]] = None,
 ) -> Tuple[Dict, Dict]:
     """
     Helper to read either raw data or processed data
     If reading from raw data, save it as processed data
     """
-    chunk_edges = (
-        read_raw_edge_data(imanager, coord)
-        if imanager.cg_meta.data_source.use_raw_edges
-        else get_chunk_edges(imanager.cg_meta.data_source.edges, [coord])
-    )
+    if imanager.cg_meta.data_source.use_raw_edges:
+        chunk_edges = read_raw_edge_data(imanager, coord)
+    else:
+        edges_cache = get_edges_cache(imanager.cg_meta.data_source.edges)
+        if prefetch_coords:
+            edges_cache.prefetch(prefetch_coords)
+        chunk_edges = edges_cache.get_chunk_edges([coord])
     mapping = (
         read_raw_agglomeration_data(imanager, coord)
         if imanager.cg_meta.data_source.use_raw_components
@@ -0,0 +1,188 @@
+"""
+Ingest on a single machine with a local process pool, without redis/rq.
+
+Runs the same helpers as the cluster workers (`create_atomic_chunk_helper`,
+`create_parent_chunk_helper`). Parent chunks are started as soon as all of
+their children are done, tracked in an in-memory map of the number of
+remaining children of every parent chunk.
+
+Atomic tasks prefetch the edge files of an upcoming atomic task. With more
+than one worker this needs the shared edges disk cache (`PCG_EDGES_CACHE_DIR`),
+the upcoming task most likely runs in another process.
+"""
+
+import collections
+from concurrent import futures
+from itertools import product
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+import numpy as np
+
+from .manager import IngestionManager
+from .types import ChunkTask
+from .utils import chunk_id_str
+from ..backend import ChunkedGraphMeta
+from ..io.edges_cache import get_edges_cache
+
+PRINT_FOR_DEBUGGING = False
+
+# IngestionManager of a worker process, created once per process
+_worker_imanager = None
+
+
+def get_parent_dependencies(
+    cg_meta: ChunkedGraphMeta, atomic_coords: Sequence[Sequence[int]]
+) -> Dict[Tuple[int, Tuple[int, int, int]], int]:
+    """
+    Number of children of every parent chunk that has to be built
+    for the given atomic chunks {(layer, coords): n_children}
+    """
+    remaining = {}
+    coords = np.unique(np.array(atomic_coords, dtype=int).reshape(-1, 3), axis=0)
+    for layer in range(3, cg_meta.layer_count + 1):
+        if layer == cg_meta.layer_count:
+            parent_coords = np.zeros_like(coords)
+        else:
+            parent_coords = coords // cg_meta.graph_config.fanout
+        coords, counts = np.unique(parent_coords, axis=0, return_counts=True)
+        for parent, count in zip(coords, counts):
+            remaining[(layer, tuple(int(c) for c in parent))] = int(count)
+    return remaining
+
+
+def _run_task(
+    imanager: IngestionManager,
+    layer: int,
+    coords: Tuple[int, int, int],
+    prefetch_coords: Optional[List[Tuple[int, int, int]]] = None,
+):
+    from .ingestion import create_atomic_chunk_helper
+    from .ingestion import create_parent_chunk_helper
+
+    task = ChunkTask(imanager.cg_meta, np.array(coords, dtype=int), layer)
+    if layer == 2:
+        create_atomic_chunk_helper(task, imanager, prefetch_coords=prefetch_coords)
+    else:
+        create_parent_chunk_helper(task, imanager)
+    return layer, coords
+
+
+def _init_worker(im_info: bytes):
+    global _worker_imanager
+    _worker_imanager = IngestionManager.from_pickle(im_info)
+
+
+def _run_worker_task(
+    layer: int,
+    coords: Tuple[int, int, int],
+    prefetch_coords: Optional[List[Tuple[int, int, int]]] = None,
+):
+    return _run_task(_worker_imanager, layer, coords, prefetch_coords)
+
+
+def _get_atomic_tasks(
+    imanager: IngestionManager,
+    atomic_coords: List[Tuple[int, int, int]],
+    n_workers: int,
+    prefetch_edges: bool,
+) -> List[Tuple]:
+    """
+    Atomic tasks (2, coords, prefetch_coords). Workers take tasks in order,
+    the task `n_workers` ahead is likely the next one of the same process.
+    """
+    prefetch = False
+    if prefetch_edges:
+        data_source = imanager.cg_meta.data_source
+        prefetch = not data_source.use_raw_edges and bool(data_source.edges)
+        if n_workers > 1:
+            prefetch = prefetch and get_edges_cache(data_source.edges).enabled
+
+    offset = max(n_workers, 1)
+    tasks = []
+    for i, coords in enumerate(atomic_coords):
+        prefetch_coords = None
+        if prefetch and i + offset < len(atomic_coords):
+            prefetch_coords = [atomic_coords[i + offset]]
+        tasks.append((2, coords, prefetch_coords))
+    return tasks
+
+
+def _get_atomic_coords(imanager: IngestionManager):
+    from .cluster import _get_test_chunks
+
+    if imanager.config.TEST_RUN:
+        return _get_test_chunks(imanager.cg_meta)
+    atomic_chunk_bounds = imanager.cg_meta.layer_chunk_bounds[2]
+    return list(product(*[range(r) for r in atomic_chunk_bounds]))
+
+
+def ingest_local(
+    imanager: IngestionManager,
+    n_workers: int = 1,
+    atomic_coords: Optional[Sequence[Sequence[int]]] = None,
+    prefetch_edges: bool = False,
+) -> Dict[int, int]:
+    """
+    Builds all chunks from the atomic chunks up to the root chunk.
+
+    :param imanager: IngestionManager, the graph has to exist
+    :param n_workers: processes; 1 runs all tasks in this process
+    :param atomic_coords: atomic chunks to build, defaults to all chunks
+        (or the test chunks for `TEST_RUN`)
+    :param prefetch_edges: download the edge files of upcoming atomic tasks
+        in the background
+    :return: number of built chunks per layer
+    """
+    if atomic_coords is None:
+        atomic_coords = _get_atomic_coords(imanager)
+    atomic_coords = [tuple(int(c) for c in coords) for coords in atomic_coords]
+
+    remaining = get_parent_dependencies(imanager.cg_meta, atomic_coords)
+    fanout = imanager.cg_meta.graph_config.fanout
+    layer_count = imanager.cg_meta.layer_count
+    completed = collections.Counter()
+
+    def _ready_parent(layer, coords):
+        """Parent task of a finished chunk if all its siblings are done."""
+        completed[layer] += 1
+        if layer == layer_count:
+            return None
+        parent_layer = layer + 1
+        if parent_layer == layer_count:
+            parent = (parent_layer, (0, 0, 0))
+        else:
+            parent = (parent_layer, tuple(c // fanout for c in coords))
+        remaining[parent] -= 1
+        if remaining[parent] > 0:
+            return None
+        if PRINT_FOR_DEBUGGING:
+            print(f"Chunk {chunk_id_str(*parent)} ready")
+        return parent
+
+    tasks = collections.deque(
+        _get_atomic_tasks(imanager, atomic_coords, n_workers, prefetch_edges)
+    )
+    if n_workers <= 1:
+        while tasks:
+            parent = _ready_parent(*_run_task(imanager, *tasks.popleft()))
+            if parent is not None:
+                tasks.append(parent)
+        return dict(completed)
+
+    with futures.ProcessPoolExecutor(
+        max_workers=n_workers,
+        initializer=_init_worker,
+        initargs=(imanager.get_serialized_info(pickled=True),),
+    ) as executor:
+        pending = {executor.submit(_run_worker_task, *task) for task in tasks}
+        while pending:
+            done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                parent = _ready_parent(*future.result())
+                if parent is not None:
+                    pending.add(executor.submit(_run_worker_task, *parent))
+    return dict(completed)
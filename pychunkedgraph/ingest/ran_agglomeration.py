@@ -45,8 +45,8 @@ def read_raw_edge_data(imanager, coord) -> Dict:
     for edge_type in EDGE_TYPES:
         sv_ids1 = edge_dict[edge_type]["sv1"]
         sv_ids2 = edge_dict[edge_type]["sv2"]
-        areas = np.ones(len(sv_ids1))
-        affinities = float("inf") * areas
+        areas = np.ones(len(sv_ids1), dtype=basetypes.EDGE_AREA)
+        affinities = np.full(len(sv_ids1), np.inf, dtype=basetypes.EDGE_AFFINITY)
         if not edge_type == EDGE_TYPES.cross_chunk:
             affinities = edge_dict[edge_type]["aff"]
             areas = edge_dict[edge_type]["area"]
@@ -203,13 +203,43 @@ def get_active_edges(imanager, coord, edges_d, mapping):
     return chunk_edges_active, np.unique(np.concatenate(pseudo_isolated_ids))
 
 
+def _get_sorted_mapping(mapping) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param mapping: (supervoxel ids, component ids) or {supervoxel id: component id}
+    :return: supervoxel ids (sorted) and their component ids
+    """
+    if isinstance(mapping, dict):
+        supervoxel_ids = np.fromiter(
+            mapping.keys(), dtype=basetypes.NODE_ID, count=len(mapping)
+        )
+        component_ids = np.fromiter(mapping.values(), dtype=np.int64, count=len(mapping))
+    else:
+        supervoxel_ids, component_ids = mapping
+    sorting = np.argsort(supervoxel_ids)
+    return supervoxel_ids[sorting], np.asarray(component_ids)[sorting]
+
+
+def _lookup_component_ids(node_ids, supervoxel_ids, component_ids) -> np.ndarray:
+    result = np.full(len(node_ids), -1, dtype=np.int64)
+    if len(supervoxel_ids) == 0:
+        return result
+    idx = np.minimum(np.searchsorted(supervoxel_ids, node_ids), len(supervoxel_ids) - 1)
+    found = supervoxel_ids[idx] == node_ids
+    result[found] = component_ids[idx[found]]
+    return result
+
+
 def define_active_edges(edge_dict, mapping) -> Union[Dict, np.ndarray]:
     """ Labels edges as within or across segments and extracts isolated ids
+    :param mapping: (supervoxel ids, component ids) or {supervoxel id: component id}
     :return: dict of np.ndarrays, np.ndarray
         bool arrays; True: connected (within same segment)
         isolated node ids
     """
-    mapping_vec = np.vectorize(lambda k: mapping.get(k, -1))
+    supervoxel_ids, component_ids = _get_sorted_mapping(mapping)
+    mapping_vec = lambda node_ids: _lookup_component_ids(
+        node_ids, supervoxel_ids, component_ids
+    )
     active = {}
     isolated = [[]]
     for k in edge_dict:
@@ -265,18 +295,22 @@ def read_raw_agglomeration_data(imanager, chunk_coord: np.ndarray):
     edges_list = _read_agg_files(filenames, base_path)
     G = nx.Graph()
     G.add_edges_from(np.concatenate(edges_list))
-    mapping = {}
     components = list(nx.connected_components(G))
     G.clear()
-    for i_cc, cc in enumerate(components):
-        cc = list(cc)
-        mapping.update(dict(zip(cc, [i_cc] * len(cc))))
-
-    if mapping and imanager.cg_meta.data_source.components:
+    supervoxel_ids = np.fromiter(
+        (sv_id for cc in components for sv_id in cc),
+        dtype=basetypes.NODE_ID,
+        count=sum(len(cc) for cc in components),
+    )
+    component_ids = np.repeat(
+        np.arange(len(components), dtype=np.int64), [len(cc) for cc in components]
+    )
+
+    if len(supervoxel_ids) and imanager.cg_meta.data_source.components:
         put_chunk_components(
             imanager.cg_meta.data_source.components, components, chunk_coord
         )
-    return mapping
+    return supervoxel_ids, component_ids
 
 
 def _read_agg_files(filenames, base_path):
@@ -1,5 +1,5 @@
 import json
-from typing import Dict, Iterable
+from typing import Dict, Iterable, Tuple, Union
 
 import numpy as np
 from cloudvolume.storage import SimpleStorage
@@ -19,19 +19,67 @@ def serialize(connected_components: Iterable) -> ChunkComponentsMsg:
     return components_message
 
 
-def deserialize(components_message: ChunkComponentsMsg) -> Dict:
-    mapping = {}
-    components = np.array(components_message.components, basetypes.NODE_ID)
-    idx = 0
-    n_components = 0
-    while idx < components.size:
-        component_size = int(components[idx])
-        start = idx + 1
-        component = components[start : start + component_size]
-        mapping.update(dict(zip(component, [n_components] * component_size)))
-        idx += component_size + 1
-        n_components += 1
-    return mapping
+def _get_component_starts(components: np.ndarray) -> np.ndarray:
+    """
+    Positions of the size entries in a serialized buffer
+    [size_0, ids_0..., size_1, ids_1..., ...].
+
+    Every position i is treated as a potential size entry pointing to the next
+    one at i + components[i] + 1. The chain starting at 0 is followed with
+    pointer doubling, after k steps all entries within 2^k hops are reached.
+    """
+    n = len(components)
+    # only positions whose jump stays inside the buffer can be size entries
+    candidates = np.flatnonzero(components < np.arange(n, 0, -1, dtype=np.uint64))
+    n_candidates = len(candidates)
+    if n_candidates == 0 or candidates[0] != 0:
+        raise ValueError("Invalid components buffer")
+
+    next_pos = candidates + components[candidates].astype(np.int64) + 1
+    jumps = np.searchsorted(candidates, next_pos)
+    invalid = jumps == n_candidates
+    invalid[~invalid] = candidates[jumps[~invalid]] != next_pos[~invalid]
+    # n_candidates: end of the buffer or no size entry
+    jumps[invalid] = n_candidates
+    jumps = np.append(jumps, n_candidates)
+
+    reached = np.zeros(n_candidates + 1, dtype=bool)
+    reached[0] = True
+    n_hops = 1
+    while n_hops <= n_candidates:
+        reached[jumps[reached]] = True
+        jumps = jumps[jumps]
+        n_hops *= 2
+    starts = candidates[reached[:-1]]
+    if starts[-1] + int(components[starts[-1]]) + 1 != n:
+        raise ValueError("Invalid components buffer")
+    return starts
+
+
+def deserialize(components_message: ChunkComponentsMsg) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :return: supervoxel ids and their component ids (index of the component)
+    """
+    components = np.fromiter(
+        components_message.components,
+        dtype=basetypes.NODE_ID,
+        count=len(components_message.components),
+    )
+    if components.size == 0:
+        return np.array([], dtype=basetypes.NODE_ID), np.array([], dtype=np.int64)
+
+    starts = _get_component_starts(components)
+    sizes = components[starts].astype(np.int64)
+    is_size_entry = np.zeros(components.size, dtype=bool)
+    is_size_entry[starts] = True
+    supervoxel_ids = components[~is_size_entry]
+    component_ids = np.repeat(np.arange(len(starts), dtype=np.int64), sizes)
+    return supervoxel_ids, component_ids
+
+
+def components_to_mapping(supervoxel_ids: np.ndarray, component_ids: np.ndarray) -> Dict:
+    """ {supervoxel id: component id} """
+    return dict(zip(supervoxel_ids, component_ids.tolist()))
 
 
 def put_chunk_components(components_dir, components, chunk_coord) -> None:
@@ -47,14 +95,25 @@ def put_chunk_components(components_dir, components, chunk_coord) -> None:
         )
 
 
-def get_chunk_components(components_dir, chunk_coord) -> Dict:
+def get_chunk_components(
+    components_dir, chunk_coord, as_dict: bool = False
+) -> Union[Tuple[np.ndarray, np.ndarray], Dict]:
+    """
+    :param as_dict: return {supervoxel id: component id} instead
+    :return: supervoxel ids and their component ids
+    """
     # filename format - components_x_y_z.serliazation
     file_name = f"components_{'_'.join(str(coord) for coord in chunk_coord)}.proto"
     with SimpleStorage(components_dir) as storage:
         content = storage.get_file(file_name)
-        if not content:
-            return {}
+    if content:
         components_message = ChunkComponentsMsg()
         components_message.ParseFromString(content)
-        return deserialize(components_message)
+        supervoxel_ids, component_ids = deserialize(components_message)
+    else:
+        supervoxel_ids = np.array([], dtype=basetypes.NODE_ID)
+        component_ids = np.array([], dtype=np.int64)
+    if as_dict:
+        return components_to_mapping(supervoxel_ids, component_ids)
+    return supervoxel_ids, component_ids
 
@@ -3,7 +3,7 @@ Functions for reading and writing edges
 to (slow) storage with CloudVolume
 """
 
-from typing import List, Dict, Tuple, Union
+from typing import List, Dict, Optional, Tuple, Union
 
 import numpy as np
 import zstandard as zstd
@@ -57,43 +57,61 @@ def _decompress_edges(content: bytes) -> Dict:
     return edges_dict
 
 
-def get_chunk_edges(
+def get_chunk_edges_file_name(chunk_coords: np.ndarray) -> str:
+    chunk_str = "_".join(str(coord) for coord in chunk_coords)
+    # filename format - edges_x_y_z.serialization.compression
+    return f"edges_{chunk_str}.proto.zst"
+
+
+def read_chunk_edges_files(
     edges_dir: str, chunks_coordinates: List[np.ndarray], cv_threads: int = 1
-) -> Dict:
+) -> List[Optional[Dict]]:
     """
     :param edges_dir: cloudvolume storage path
-    :type str:    
+    :type str:
     :param chunks_coordinates: list of chunk coords for which to load edges
     :type List[np.ndarray]:
     :param cv_threads: cloudvolume storage client thread count
-    :type int:     
-    :return: dictionary {"edge_type": Edges}
+    :type int:
+    :return: edges_dict of every chunk in the same order, None for empty chunks
     """
-    fnames = []
-    for chunk_coords in chunks_coordinates:
-        chunk_str = "_".join(str(coord) for coord in chunk_coords)
-        # filename format - edges_x_y_z.serialization.compression
-        fnames.append(f"edges_{chunk_str}.proto.zst")
-
+    fnames = [get_chunk_edges_file_name(coords) for coords in chunks_coordinates]
     storage = (
         Storage(edges_dir, n_threads=cv_threads)
         if cv_threads > 1
         else SimpleStorage(edges_dir)
     )
 
-    chunk_edge_dicts = []
+    contents = {}
     with storage:
         files = storage.get_files(fnames)
         for _file in files:
             # cv error
             if _file["error"]:
                 raise ValueError(_file["error"])
-            # empty chunk
-            if not _file["content"]:
-                continue
-            edges_dict = _decompress_edges(_file["content"])
-            chunk_edge_dicts.append(edges_dict)
-    return concatenate_chunk_edges(chunk_edge_dicts)
+            contents[_file["filename"]] = _file["content"]
+
+    # empty chunk -> None
+    return [
+        _decompress_edges(contents[fname]) if contents.get(fname) else None
+        for fname in fnames
+    ]
+
+
+def get_chunk_edges(
+    edges_dir: str, chunks_coordinates: List[np.ndarray], cv_threads: int = 1
+) -> Dict:
+    """
+    :param edges_dir: cloudvolume storage path
+    :type str:    
+    :param chunks_coordinates: list of chunk coords for which to load edges
+    :type List[np.ndarray]:
+    :param cv_threads: cloudvolume storage client thread count
+    :type int:     
+    :return: dictionary {"edge_type": Edges}
+    """
+    chunk_edge_dicts = read_chunk_edges_files(edges_dir, chunks_coordinates, cv_threads)
+    return concatenate_chunk_edges([d for d in chunk_edge_dicts if d is not None])
 
 
 def put_chunk_edges(
@@ -117,10 +135,7 @@ def put_chunk_edges(
     chunk_edges.cross_chunk.CopyFrom(serialize(edges_d[EDGE_TYPES.cross_chunk]))
 
     cctx = zstd.ZstdCompressor(level=compression_level)
-    chunk_str = "_".join(str(coord) for coord in chunk_coordinates)
-
-    # filename format - edges_x_y_z.serialization.compression
-    file = f"edges_{chunk_str}.proto.zst"
+    file = get_chunk_edges_file_name(chunk_coordinates)
     with Storage(edges_dir) as storage:
         storage.put_file(
             file_path=file,
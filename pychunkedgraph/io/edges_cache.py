@@ -0,0 +1,272 @@
+"""
+Prefetching and local disk cache for chunk edge files.
+
+Edge files of atomic chunks are downloaded and decoded once, the decoded
+arrays are kept as numpy files in a cache directory that can be shared by all
+worker processes on a host. `prefetch` downloads the files of upcoming tasks
+in background threads while the current chunk is processed. Without a cache
+directory prefetched chunks are only kept in memory until they are read.
+"""
+
+import collections
+import hashlib
+import os
+import threading
+import time
+from concurrent import futures
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .edges import read_chunk_edges_files
+from ..backend.edges import Edges
+from ..backend.edges import EDGE_TYPES
+from ..backend.edges.utils import concatenate_chunk_edges
+from ..backend.utils import basetypes
+
+# Caching is off unless a directory is configured
+DEFAULT_CACHE_DIR = os.environ.get("PCG_EDGES_CACHE_DIR", None)
+DEFAULT_MAX_DISK_BYTES = int(float(os.environ.get("PCG_EDGES_CACHE_GB", 16)) * 1024 ** 3)
+DEFAULT_PREFETCH_THREADS = int(os.environ.get("PCG_EDGES_PREFETCH_THREADS", 4))
+# Prefetched chunks that were not read yet, oldest are dropped
+MAX_PREFETCHED_CHUNKS = 64
+# Other processes may share the cache directory, its actual size is checked
+# at least this often
+DISK_RESCAN_INTERVAL_S = 30
+
+_EDGE_FIELDS = {
+    "node_ids1": basetypes.NODE_ID,
+    "node_ids2": basetypes.NODE_ID,
+    "affinities": basetypes.EDGE_AFFINITY,
+    "areas": basetypes.EDGE_AREA,
+}
+_COUNTERS = (
+    "requests",
+    "prefetches",
+    "prefetch_hits",
+    "disk_hits",
+    "misses",
+    "downloads",
+    "evictions",
+)
+
+# One cache per edges source and process
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_edges_cache(edges_dir: str) -> "EdgesCache":
+    """ Cache of this process for `edges_dir` with the default settings """
+    with _caches_lock:
+        if edges_dir not in _caches:
+            _caches[edges_dir] = EdgesCache(edges_dir)
+        return _caches[edges_dir]
+
+
+class EdgesCache:
+    def __init__(
+        self,
+        edges_dir: str,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+        n_threads: int = DEFAULT_PREFETCH_THREADS,
+    ):
+        """
+        :param edges_dir: str
+            cloudvolume storage path of the edge files
+        :param cache_dir: str or None
+            None disables the disk cache
+        :param max_disk_bytes: int
+            least recently used chunks are deleted when the directory (shared
+            by all processes using it) grows above this size
+        :param n_threads: int
+            concurrent downloads of `prefetch`
+        """
+        self._edges_dir = edges_dir
+        self._max_disk_bytes = max_disk_bytes
+        self._n_threads = n_threads
+        self._executor = None
+        self._lock = threading.Lock()
+        self._prefetched = collections.OrderedDict()
+        self._disk_files = collections.OrderedDict()
+        self._disk_bytes = 0
+        self._last_disk_scan = 0
+        self.counters = collections.Counter()
+
+        self._cache_dir = None
+        if cache_dir is not None:
+            name = hashlib.md5(edges_dir.encode()).hexdigest()
+            self._cache_dir = os.path.join(cache_dir, name)
+            os.makedirs(self._cache_dir, exist_ok=True)
+            self._scan_disk()
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache_dir is not None
+
+    def get_chunk_edges(self, chunks_coordinates: Sequence[Sequence[int]]) -> Dict:
+        """ Same as `io.edges.get_chunk_edges`
+
+        :param chunks_coordinates: list of chunk coords for which to load edges
+        :return: dictionary {"edge_type": Edges}
+        """
+        chunk_edge_dicts = [None] * len(chunks_coordinates)
+        missing = []
+        for i, chunk_coords in enumerate(chunks_coordinates):
+            key = self._get_key(chunk_coords)
+            with self._lock:
+                self.counters["requests"] += 1
+                future = self._prefetched.pop(key, None)
+            if future is not None:
+                with self._lock:
+                    self.counters["prefetch_hits"] += 1
+                chunk_edge_dicts[i] = future.result()
+                continue
+
+            chunk_edge_dicts[i] = self._load(key)
+            if chunk_edge_dicts[i] is None:
+                missing.append(i)
+
+        if missing:
+            with self._lock:
+                self.counters["misses"] += len(missing)
+            downloaded = self._download([chunks_coordinates[i] for i in missing])
+            for i, edges_d in zip(missing, downloaded):
+                chunk_edge_dicts[i] = edges_d
+        return concatenate_chunk_edges(chunk_edge_dicts)
+
+    def prefetch(self, chunks_coordinates: Sequence[Sequence[int]]) -> None:
+        """ Downloads the edge files of these chunks in the background unless
+        they are cached or already being downloaded """
+        if self._executor is None:
+            self._executor = futures.ThreadPoolExecutor(max_workers=self._n_threads)
+
+        for chunk_coords in chunks_coordinates:
+            key = self._get_key(chunk_coords)
+            with self._lock:
+                if key in self._prefetched:
+                    continue
+            if self.enabled and os.path.exists(
+                os.path.join(self._cache_dir, f"{key}.npz")
+            ):
+                continue
+            future = self._executor.submit(self._download_one, chunk_coords)
+            with self._lock:
+                self.counters["prefetches"] += 1
+                self._prefetched[key] = future
+                while len(self._prefetched) > MAX_PREFETCHED_CHUNKS:
+                    self._prefetched.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {key: self.counters[key] for key in _COUNTERS}
+            stats["prefetched_chunks"] = len(self._prefetched)
+            stats["disk_files"] = len(self._disk_files)
+            stats["disk_bytes"] = self._disk_bytes
+        hits = stats["disk_hits"] + stats["prefetch_hits"]
+        stats["hit_rate"] = hits / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+    def _get_key(self, chunk_coords) -> str:
+        return "_".join(str(int(c)) for c in chunk_coords)
+
+    def _download_one(self, chunk_coords) -> Dict:
+        return self._download([chunk_coords])[0]
+
+    def _download(self, chunks_coordinates) -> List[Dict]:
+        edge_dicts = read_chunk_edges_files(self._edges_dir, chunks_coordinates)
+        with self._lock:
+            self.counters["downloads"] += len(chunks_coordinates)
+
+        result = []
+        for chunk_coords, edges_d in zip(chunks_coordinates, edge_dicts):
+            # empty chunks are cached as well
+            if edges_d is None:
+                edges_d = concatenate_chunk_edges([])
+            if self.enabled:
+                self._store(self._get_key(chunk_coords), edges_d)
+            result.append(edges_d)
+        return result
+
+    def _load(self, key: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        path = os.path.join(self._cache_dir, f"{key}.npz")
+        try:
+            with np.load(path) as arrays:
+                edges_d = {}
+                for edge_type in EDGE_TYPES:
+                    fields = {f: arrays[f"{edge_type}_{f}"] for f in _EDGE_FIELDS}
+                    edges_d[edge_type] = Edges(**fields)
+        except (FileNotFoundError, ValueError, KeyError, OSError):
+            # Not cached, evicted in the meantime or partially written
+            with self._lock:
+                if key in self._disk_files:
+                    self._disk_bytes -= self._disk_files.pop(key)
+            return None
+
+        try:
+            # Recency for other processes sharing the directory
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.counters["disk_hits"] += 1
+            if key in self._disk_files:
+                self._disk_files.move_to_end(key)
+        return edges_d
+
+    def _store(self, key: str, edges_d: Dict) -> None:
+        arrays = {}
+        for edge_type in EDGE_TYPES:
+            for field, dtype in _EDGE_FIELDS.items():
+                arrays[f"{edge_type}_{field}"] = np.asarray(
+                    getattr(edges_d[edge_type], field), dtype=dtype
+                )
+
+        path = os.path.join(self._cache_dir, f"{key}.npz")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if key not in self._disk_files:
+                self._disk_files[key] = os.path.getsize(path)
+                self._disk_bytes += self._disk_files[key]
+            self._evict_disk()
+
+    def _scan_disk(self) -> None:
+        """ Rebuilds the disk LRU from the directory, oldest first """
+        entries = []
+        with os.scandir(self._cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".npz"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+
+        self._disk_files = collections.OrderedDict(
+            (key, n_bytes) for _, key, n_bytes in sorted(entries)
+        )
+        self._disk_bytes = sum(self._disk_files.values())
+        self._last_disk_scan = time.time()
+
+    def _evict_disk(self) -> None:
+        if (
+            self._disk_bytes > self._max_disk_bytes
+            or time.time() - self._last_disk_scan > DISK_RESCAN_INTERVAL_S
+        ):
+            self._scan_disk()
+
+        while self._disk_bytes > self._max_disk_bytes and len(self._disk_files) > 1:
+            key, n_bytes = self._disk_files.popitem(last=False)
+            self._disk_bytes -= n_bytes
+            self.counters["evictions"] += 1
+            try:
+                os.remove(os.path.join(self._cache_dir, f"{key}.npz"))
+            except FileNotFoundError:
+                pass
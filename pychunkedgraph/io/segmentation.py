@@ -0,0 +1,328 @@
+"""
+Chunk aligned local cache for (watershed) segmentation cutouts.
+
+The supervoxel segmentation never changes, so blocks downloaded once with
+CloudVolume can be kept on local disk (memory mapped numpy files) and in a
+small in-memory hot tier. Without a cache directory cutouts are read from
+CloudVolume directly.
+"""
+
+import collections
+import hashlib
+import itertools
+import os
+import time
+import threading
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+# Caching is off unless a directory is configured
+DEFAULT_CACHE_DIR = os.environ.get("PCG_SEGMENTATION_CACHE_DIR", None)
+DEFAULT_MAX_DISK_BYTES = int(
+    float(os.environ.get("PCG_SEGMENTATION_CACHE_GB", 8)) * 1024 ** 3
+)
+DEFAULT_MAX_MEMORY_BLOCKS = int(
+    os.environ.get("PCG_SEGMENTATION_CACHE_MEMORY_BLOCKS", 128)
+)
+# Other processes may share the cache directory, its actual size is checked
+# at least this often
+DISK_RESCAN_INTERVAL_S = 30
+
+
+class SegmentationCache:
+    def __init__(
+        self,
+        cv,
+        block_shape: Optional[Sequence[int]] = None,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+        max_memory_blocks: int = DEFAULT_MAX_MEMORY_BLOCKS,
+    ):
+        """
+        :param cv: CloudVolume
+            segmentation source, cutouts are read at its mip
+        :param block_shape: [int, int, int] or None
+            cache block size in voxels; defaults to the storage chunk size of
+            the cv since CloudVolume downloads whole storage chunks anyway
+        :param cache_dir: str or None
+            None disables caching, cutouts are read from the cv directly
+        :param max_disk_bytes: int
+            least recently used blocks are deleted when the directory (shared
+            by all processes using it) grows above this size
+        :param max_memory_blocks: int
+            number of blocks kept in memory
+        """
+        self._cv = cv
+        if block_shape is None:
+            block_shape = cv.chunk_size
+        self._block_shape = np.array(block_shape, dtype=np.int64)[:3]
+        self._offset = np.array(cv.voxel_offset, dtype=np.int64)[:3]
+        self._size = np.array(cv.volume_size, dtype=np.int64)[:3]
+        self._dtype = np.dtype(cv.dtype)
+
+        self._max_disk_bytes = max_disk_bytes
+        self._max_memory_blocks = max_memory_blocks
+        self._lock = threading.Lock()
+        self._memory_blocks = collections.OrderedDict()
+        self._disk_blocks = collections.OrderedDict()
+        self._disk_bytes = 0
+        self._last_disk_scan = 0
+        self.counters = collections.Counter()
+
+        self._cache_dir = None
+        if cache_dir is not None:
+            name = hashlib.md5(f"{cv.cloudpath}_{cv.mip}".encode()).hexdigest()
+            self._cache_dir = os.path.join(cache_dir, name)
+            os.makedirs(self._cache_dir, exist_ok=True)
+            self._scan_disk()
+
+    @property
+    def block_shape(self) -> np.ndarray:
+        return self._block_shape
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache_dir is not None
+
+    def __getitem__(self, slices: Tuple[slice, slice, slice]) -> np.ndarray:
+        """ `cache[x0:x1, y0:y1, z0:z1]`, same as `cutout`: always 3d, voxels
+        outside of the volume bounds are 0 """
+        start = np.array([s.start for s in slices], dtype=np.int64)
+        end = np.array([s.stop for s in slices], dtype=np.int64)
+        return self.cutout(start, end)
+
+    def cutout(self, start: Sequence[int], end: Sequence[int]) -> np.ndarray:
+        """ Returns the segmentation in [start, end), voxels outside of the
+        volume bounds are 0.
+
+        :param start: [int, int, int] voxel coordinate at the cv mip
+        :param end: [int, int, int]
+        :return: 3d np.ndarray
+        """
+        start = np.array(start, dtype=np.int64)
+        end = np.array(end, dtype=np.int64)
+        if not self.enabled:
+            with self._lock:
+                self.counters["downloads"] += 1
+            return self._read(start, end)
+
+        result = np.zeros(end - start, dtype=self._dtype)
+        block_coords = self._get_block_coords(start, end)
+        fetched = self._fetch_missing(block_coords)
+        for block_coord in block_coords:
+            block_start, block_end = self._get_block_bbox(block_coord)
+            inter_start = np.maximum(start, block_start)
+            inter_end = np.minimum(end, block_end)
+            block = fetched.get(block_coord)
+            if block is None:
+                block = self._get_block(block_coord)
+            src = tuple(
+                slice(s, e) for s, e in zip(inter_start - block_start, inter_end - block_start)
+            )
+            dst = tuple(slice(s, e) for s, e in zip(inter_start - start, inter_end - start))
+            result[dst] = block[src]
+        return result
+
+    def prefetch(self, start: Sequence[int], end: Sequence[int]) -> None:
+        """ Downloads all missing blocks overlapping [start, end) """
+        if not self.enabled:
+            return
+        self._fetch_missing(
+            self._get_block_coords(
+                np.array(start, dtype=np.int64), np.array(end, dtype=np.int64)
+            )
+        )
+
+    def _read(self, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+        """ Reads [start, end) from the cv, zero padded outside of its bounds """
+        result = np.zeros(end - start, dtype=self._dtype)
+        inter_start = np.maximum(start, self._offset)
+        inter_end = np.minimum(end, self._offset + self._size)
+        if np.any(inter_end <= inter_start):
+            return result
+
+        data = np.asarray(
+            self._cv[
+                inter_start[0] : inter_end[0],
+                inter_start[1] : inter_end[1],
+                inter_start[2] : inter_end[2],
+            ]
+        )
+        if data.ndim == 4:
+            data = data[..., 0]
+        dst = tuple(slice(s, e) for s, e in zip(inter_start - start, inter_end - start))
+        result[dst] = data
+        return result
+
+    def _fetch_missing(self, block_coords) -> dict:
+        with self._lock:
+            missing = [
+                c
+                for c in block_coords
+                if self._get_key(c) not in self._memory_blocks
+                and self._get_key(c) not in self._disk_blocks
+            ]
+        if not missing:
+            return {}
+
+        fetched = {}
+        for box_start, box_end in _get_fetch_boxes(missing):
+            fetch_start, _ = self._get_block_bbox(box_start)
+            _, fetch_end = self._get_block_bbox(box_end - 1)
+            data = self._read(fetch_start, fetch_end)
+            with self._lock:
+                self.counters["downloads"] += 1
+
+            for block_coord in itertools.product(
+                *[range(s, e) for s, e in zip(box_start, box_end)]
+            ):
+                block_start, block_end = self._get_block_bbox(block_coord)
+                block = data[
+                    tuple(
+                        slice(s, e)
+                        for s, e in zip(block_start - fetch_start, block_end - fetch_start)
+                    )
+                ]
+                fetched[block_coord] = np.ascontiguousarray(block)
+                self._store_block(block_coord, fetched[block_coord])
+        return fetched
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["memory_blocks"] = len(self._memory_blocks)
+            stats["disk_blocks"] = len(self._disk_blocks)
+            stats["disk_bytes"] = self._disk_bytes
+        return stats
+
+    def _get_block_coords(self, start: np.ndarray, end: np.ndarray):
+        start = np.maximum(start, self._offset)
+        end = np.minimum(end, self._offset + self._size)
+        if np.any(end <= start):
+            return []
+        first = (start - self._offset) // self._block_shape
+        last = (end - 1 - self._offset) // self._block_shape
+        grid = np.mgrid[
+            first[0] : last[0] + 1, first[1] : last[1] + 1, first[2] : last[2] + 1
+        ]
+        return [tuple(int(x) for x in c) for c in grid.reshape(3, -1).T]
+
+    def _get_block_bbox(self, block_coord) -> Tuple[np.ndarray, np.ndarray]:
+        block_start = self._offset + np.array(block_coord) * self._block_shape
+        block_end = np.minimum(block_start + self._block_shape, self._offset + self._size)
+        return block_start, block_end
+
+    def _get_key(self, block_coord) -> str:
+        return "_".join(str(int(c)) for c in block_coord)
+
+    def _get_block(self, block_coord) -> np.ndarray:
+        key = self._get_key(block_coord)
+        with self._lock:
+            if key in self._memory_blocks:
+                self._memory_blocks.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return self._memory_blocks[key]
+
+        path = os.path.join(self._cache_dir, f"{key}.npy")
+        try:
+            block = np.load(path, mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            # Evicted in the meantime or partially written
+            with self._lock:
+                if key in self._disk_blocks:
+                    self._disk_bytes -= self._disk_blocks.pop(key)
+            return self._fetch_missing([block_coord])[block_coord]
+
+        try:
+            # Recency for other processes sharing the directory
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.counters["disk_hits"] += 1
+            if key in self._disk_blocks:
+                self._disk_blocks.move_to_end(key)
+            self._add_to_memory(key, block)
+        return block
+
+    def _store_block(self, block_coord, block: np.ndarray) -> None:
+        key = self._get_key(block_coord)
+        path = os.path.join(self._cache_dir, f"{key}.npy")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, block)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if key not in self._disk_blocks:
+                self._disk_blocks[key] = os.path.getsize(path)
+                self._disk_bytes += self._disk_blocks[key]
+            self._add_to_memory(key, block)
+            self._evict_disk()
+
+    def _add_to_memory(self, key: str, block: np.ndarray) -> None:
+        self._memory_blocks[key] = block
+        self._memory_blocks.move_to_end(key)
+        while len(self._memory_blocks) > self._max_memory_blocks:
+            self._memory_blocks.popitem(last=False)
+
+    def _scan_disk(self) -> None:
+        """ Rebuilds the disk LRU from the directory, oldest first """
+        entries = []
+        with os.scandir(self._cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".npy"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+
+        self._disk_blocks = collections.OrderedDict(
+            (key, n_bytes) for _, key, n_bytes in sorted(entries)
+        )
+        self._disk_bytes = sum(self._disk_blocks.values())
+        self._last_disk_scan = time.time()
+
+    def _evict_disk(self) -> None:
+        if (
+            self._disk_bytes > self._max_disk_bytes
+            or time.time() - self._last_disk_scan > DISK_RESCAN_INTERVAL_S
+        ):
+            self._scan_disk()
+
+        while self._disk_bytes > self._max_disk_bytes and len(self._disk_blocks) > 1:
+            key, n_bytes = self._disk_blocks.popitem(last=False)
+            self._disk_bytes -= n_bytes
+            self.counters["evictions"] += 1
+            try:
+                os.remove(os.path.join(self._cache_dir, f"{key}.npy"))
+            except FileNotFoundError:
+                pass
+
+
+def _get_fetch_boxes(block_coords) -> Sequence[Tuple[np.ndarray, np.ndarray]]:
+    """ Merges block coordinates into boxes [start, end) made of only these
+    blocks: runs along x first, then runs of equal x ranges along y and z.
+    """
+    boxes = [(np.array(c), np.array(c) + 1) for c in block_coords]
+    for axis in range(3):
+        others = [a for a in range(3) if a != axis]
+        boxes.sort(
+            key=lambda b: tuple(b[0][others]) + tuple(b[1][others]) + (b[0][axis],)
+        )
+        merged = [boxes[0]]
+        for box_start, box_end in boxes[1:]:
+            last_start, last_end = merged[-1]
+            if (
+                np.array_equal(box_start[others], last_start[others])
+                and np.array_equal(box_end[others], last_end[others])
+                and box_start[axis] == last_end[axis]
+            ):
+                last_end[axis] = box_end[axis]
+            else:
+                merged.append((box_start, box_end))
+        boxes = merged
+    return boxes
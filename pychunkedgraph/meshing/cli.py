@@ -0,0 +1,28 @@
+"""
+cli for mesh maintenance
+"""
+
+import click
+from flask.cli import AppGroup
+
+from ..backend.chunkedgraph import ChunkedGraph
+from .mesh_index import rebuild_mesh_index
+
+mesh_cli = AppGroup("mesh")
+
+
+@mesh_cli.command("rebuild-index")
+@click.argument("graph_id", type=str)
+@click.option("--mesh-path", type=str, default=None, help="Defaults to the graph's mesh dir")
+def rebuild_index(graph_id: str, mesh_path: str):
+    """
+    Recreates the mesh existence index from a listing of all fragments and
+    merges the shards written by mesh tasks into it
+    """
+    cg = ChunkedGraph(graph_id)
+    result = rebuild_mesh_index(cg, mesh_path=mesh_path)
+    print(f"indexed {result['n_fragments']} fragments in {result['n_chunks']} chunks")
+
+
+def init_mesh_cmds(app):
+    app.cli.add_command(mesh_cli)
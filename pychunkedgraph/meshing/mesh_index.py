@@ -0,0 +1,190 @@
+"""
+Index of existing mesh fragments.
+
+For every chunk sorted uint64 arrays of the node ids with a fragment are kept
+next to the fragments, so manifests can check existence in memory instead of
+issuing one existence request per candidate. Every call of
+`chunk_mesh_task_new_remapping` that writes fragments adds a shard file with
+their ids (`index/<chunk_id>/<shard>.npy`) instead of updating a shared file,
+so concurrent tasks on the same chunk cannot overwrite each other. Reads
+merge the shards with the compacted index of the chunk (`index/<chunk_id>.npy`).
+
+Fragments are immutable (an edit creates new node ids), so a node id in the
+index always has a fragment. The reverse does not hold: fragments written
+before the index existed are missing from it, callers fall back to existence
+checks for those. `rebuild_mesh_index` recreates the compacted index from a
+listing of the mesh dir and removes the shards it covers.
+"""
+
+import collections
+import io
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+from cloudfiles import CloudFiles
+
+INDEX_DIR = "index"
+CACHE_TTL_S = 60
+
+_MESH_INDICES = {}
+_MESH_INDICES_LOCK = threading.Lock()
+
+
+def _serialize(node_ids: np.ndarray) -> bytes:
+    f = io.BytesIO()
+    np.save(f, np.asarray(node_ids, dtype=np.uint64))
+    return f.getvalue()
+
+
+def _deserialize(content: bytes) -> np.ndarray:
+    return np.load(io.BytesIO(content)).astype(np.uint64)
+
+
+class MeshIndex:
+    def __init__(self, mesh_path: str, cache_ttl_s: float = CACHE_TTL_S):
+        """
+        :param mesh_path: str
+            cloudpath of the mesh fragments
+        :param cache_ttl_s: float
+            chunk indices read within this time are not read again
+        """
+        self._cf = CloudFiles(mesh_path)
+        self._cache_ttl_s = cache_ttl_s
+        self._lock = threading.Lock()
+        # chunk_id -> (read time, sorted node ids)
+        self._cache = {}
+
+    def _get_path(self, chunk_id: np.uint64) -> str:
+        return f"{INDEX_DIR}/{int(chunk_id)}.npy"
+
+    def _get_shard_prefix(self, chunk_id: np.uint64) -> str:
+        return f"{INDEX_DIR}/{int(chunk_id)}/"
+
+    def get(self, chunk_ids: Iterable[np.uint64], use_cache: bool = True
+            ) -> Dict[np.uint64, np.ndarray]:
+        """ Sorted node ids with a fragment per chunk (empty if unknown) """
+        chunk_ids = [np.uint64(c) for c in set(int(c) for c in chunk_ids)]
+        result = {}
+        now = time.time()
+        with self._lock:
+            for chunk_id in chunk_ids:
+                entry = self._cache.get(chunk_id)
+                if use_cache and entry and now - entry[0] < self._cache_ttl_s:
+                    result[chunk_id] = entry[1]
+
+        to_read = [c for c in chunk_ids if c not in result]
+        if to_read:
+            path_chunk_ids = {}
+            for chunk_id in to_read:
+                path_chunk_ids[self._get_path(chunk_id)] = chunk_id
+                for path in self._cf.list(prefix=self._get_shard_prefix(chunk_id)):
+                    path_chunk_ids[path] = chunk_id
+
+            chunk_node_ids = collections.defaultdict(
+                lambda: [np.array([], dtype=np.uint64)])
+            for f in self._cf.get(list(path_chunk_ids)):
+                if f["content"] is not None:
+                    chunk_node_ids[path_chunk_ids[f["path"]]].append(
+                        _deserialize(f["content"]))
+            with self._lock:
+                for chunk_id in to_read:
+                    node_ids = np.unique(np.concatenate(chunk_node_ids[chunk_id]))
+                    self._cache[chunk_id] = (now, node_ids)
+                    result[chunk_id] = node_ids
+        return result
+
+    def _put(self, path: str, node_ids: np.ndarray) -> None:
+        self._cf.put(
+            path,
+            _serialize(node_ids),
+            content_type="application/octet-stream",
+            compress=False,
+            cache_control="no-cache",
+        )
+
+    def add(self, chunk_id: np.uint64, node_ids: Sequence[np.uint64]) -> None:
+        """ Adds node ids whose fragments were written for a chunk as a new
+        shard, existing shards are neither read nor rewritten """
+        node_ids = np.unique(np.array(node_ids, dtype=np.uint64))
+        if len(node_ids) == 0:
+            return
+        self._put(f"{self._get_shard_prefix(chunk_id)}{uuid.uuid4().hex}.npy", node_ids)
+
+        chunk_id = np.uint64(chunk_id)
+        with self._lock:
+            if chunk_id in self._cache:
+                read_time, cached_node_ids = self._cache[chunk_id]
+                self._cache[chunk_id] = (read_time, np.union1d(cached_node_ids, node_ids))
+
+    def put(self, chunk_id: np.uint64, node_ids: Sequence[np.uint64]) -> None:
+        """ Replaces the compacted index of a chunk, shards are kept """
+        node_ids = np.unique(np.array(node_ids, dtype=np.uint64))
+        self._put(self._get_path(chunk_id), node_ids)
+        with self._lock:
+            self._cache[np.uint64(chunk_id)] = (time.time(), node_ids)
+
+    def exists(self, cg, node_ids: Sequence[np.uint64]) -> np.ndarray:
+        """ Boolean mask of node ids known to have a fragment """
+        node_ids = np.array(node_ids, dtype=np.uint64)
+        if len(node_ids) == 0:
+            return np.zeros(0, dtype=bool)
+
+        chunk_ids = cg.get_chunk_ids_from_node_ids(node_ids)
+        indices = self.get(chunk_ids)
+        mask = np.zeros(len(node_ids), dtype=bool)
+        for chunk_id, chunk_node_ids in indices.items():
+            if len(chunk_node_ids) == 0:
+                continue
+            chunk_mask = chunk_ids == chunk_id
+            idx = np.searchsorted(chunk_node_ids, node_ids[chunk_mask])
+            idx[idx == len(chunk_node_ids)] = 0
+            mask[chunk_mask] = chunk_node_ids[idx] == node_ids[chunk_mask]
+        return mask
+
+
+def get_mesh_index(mesh_path: str) -> MeshIndex:
+    """ One index (and cache) per mesh path and process """
+    with _MESH_INDICES_LOCK:
+        if mesh_path not in _MESH_INDICES:
+            _MESH_INDICES[mesh_path] = MeshIndex(mesh_path)
+        return _MESH_INDICES[mesh_path]
+
+
+def rebuild_mesh_index(cg, mesh_path: Optional[str] = None) -> Dict[str, int]:
+    """ Recreates the compacted index of all chunks from a listing of the
+    fragments and removes the shards it replaces
+
+    :param cg: ChunkedGraph
+    :param mesh_path: str or None (cg.cv_mesh_path)
+    :return: dict with the number of chunks and fragments indexed
+    """
+    mesh_path = mesh_path or cg.cv_mesh_path
+    cf = CloudFiles(mesh_path)
+    # Shards listed before the fragments only hold ids of fragments that
+    # were written before, shards added later are kept
+    shard_paths = [path for path in cf.list(prefix=f"{INDEX_DIR}/")
+                   if path.count("/") == 2]
+
+    node_ids = []
+    for filename in cf.list(flat=True):
+        # fragments are named {node_id}:{lod}:{bbox}
+        if ":" not in filename:
+            continue
+        node_id_str = filename.split(":")[0]
+        if node_id_str.isdigit():
+            node_ids.append(int(node_id_str))
+    node_ids = np.unique(np.array(node_ids, dtype=np.uint64))
+
+    chunk_node_ids = collections.defaultdict(list)
+    if len(node_ids):
+        for chunk_id, node_id in zip(cg.get_chunk_ids_from_node_ids(node_ids), node_ids):
+            chunk_node_ids[chunk_id].append(node_id)
+
+    mesh_index = get_mesh_index(mesh_path)
+    for chunk_id, ids in chunk_node_ids.items():
+        mesh_index.put(chunk_id, ids)
+    cf.delete(shard_paths)
+    return {"n_chunks": len(chunk_node_ids), "n_fragments": len(node_ids)}
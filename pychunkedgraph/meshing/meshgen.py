@@ -6,6 +6,7 @@ import numpy as np
 import json
 import time
 import collections
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from functools import lru_cache
 import datetime
 import pytz
@@ -28,11 +29,14 @@ UTC = pytz.UTC
 from pychunkedgraph.backend import chunkedgraph  # noqa
 from pychunkedgraph.backend.utils import serializers, column_keys  # noqa
 from pychunkedgraph.meshing import meshgen_utils  # noqa
+from pychunkedgraph.meshing import mesh_index  # noqa
 
 # Change below to true if debugging and want to see results in stdout
 PRINT_FOR_DEBUGGING = False
 # Change below to false if debugging and do not need to write to cloud (warning: do not deploy w/ below set to false)
 WRITING_TO_CLOUD = True
+# Size of the local worker pool used to run the remeshing DAG
+REMESHING_N_THREADS = int(os.environ.get("REMESHING_N_THREADS", 4))
 
 
 def decode_draco_mesh_buffer(fragment):
@@ -75,7 +79,7 @@ def get_remapped_segmentation(
         cg, chunk_id, time_stamp=time_stamp, n_threads=n_threads
     )
 
-    cv = cloudvolume.CloudVolume(cg.cv.cloudpath, mip=mip)
+    seg_cache = cg.get_segmentation_cache(mip)
     mip_diff = mip - cg.cv.mip
 
     mip_chunk_size = cg.chunk_size.astype(np.int) / np.array(
@@ -94,11 +98,7 @@ def get_remapped_segmentation(
         cg.cv.mip_voxel_offset(mip) + cg.cv.mip_volume_size(mip),
     )
 
-    ws_seg = cv[
-        chunk_start[0] : chunk_end[0],
-        chunk_start[1] : chunk_end[1],
-        chunk_start[2] : chunk_end[2],
-    ].squeeze()
+    ws_seg = seg_cache.cutout(chunk_start, chunk_end)
 
     seg = fastremap.mask_except(ws_seg, list(sv_remapping.keys()), in_place=False)
     fastremap.remap(seg, sv_remapping, preserve_missing_labels=True, in_place=True)
@@ -149,7 +149,7 @@ def get_remapped_seg_for_lvl2_nodes(
     :return: remapped segmentation
     """
     # Determine the segmentation bounding box to download given cg, chunk_id, and mip. Then download
-    cv = cloudvolume.CloudVolume(cg.cv.cloudpath, mip=mip)
+    seg_cache = cg.get_segmentation_cache(mip)
     mip_diff = mip - cg.cv.mip
 
     mip_chunk_size = cg.chunk_size.astype(np.int) / np.array(
@@ -168,11 +168,7 @@ def get_remapped_seg_for_lvl2_nodes(
         cg.cv.mip_voxel_offset(mip) + cg.cv.mip_volume_size(mip),
     )
 
-    seg = cv[
-        chunk_start[0] : chunk_end[0],
-        chunk_start[1] : chunk_end[1],
-        chunk_start[2] : chunk_end[2],
-    ].squeeze()
+    seg = seg_cache.cutout(chunk_start, chunk_end)
 
     sv_of_lvl2_nodes = cg.get_children(lvl2_nodes)
 
@@ -758,6 +754,23 @@ def transform_draco_fragment_and_return_encoding_options(
     return cur_encoding_settings
 
 
+def _unique_rows(arr: np.ndarray):
+    """ `np.unique(arr, axis=0, return_inverse=True)` for n x 3 arrays via a
+    lexsort, which avoids the structured-dtype sort of np.unique
+
+    :return: unique rows (lexicographically sorted), inverse as uint32
+    """
+    inverse = np.empty(len(arr), dtype=np.uint32)
+    if len(arr) == 0:
+        return arr[:0], inverse
+    order = np.lexsort(arr.T[::-1])
+    arr_sorted = arr[order]
+    is_first = np.ones(len(arr), dtype=bool)
+    is_first[1:] = np.any(arr_sorted[1:] != arr_sorted[:-1], axis=1)
+    inverse[order] = np.cumsum(is_first) - 1
+    return arr_sorted[is_first], inverse
+
+
 def merge_draco_meshes_across_boundaries(cg, fragments, chunk_id, mip, high_padding):
     """
     Merge a list of draco mesh fragments, removing duplicate vertices that lie
@@ -803,39 +816,27 @@ def merge_draco_meshes_across_boundaries(cg, fragments, chunk_id, mip, high_padd
         )
         # Separate the vertices that are on the quantized chunk boundary from those that aren't
         are_chunk_aligned = (vertices == quantized_chunk_boundary).any(axis=1)
-        vertices = np.hstack((vertices, np.arange(vertexct[-1])[:, np.newaxis]))
-        chunk_aligned = vertices[are_chunk_aligned]
-        not_chunk_aligned = vertices[~are_chunk_aligned]
-        del vertices
+        chunk_aligned_ids = np.flatnonzero(are_chunk_aligned)
+        not_chunk_aligned_ids = np.flatnonzero(~are_chunk_aligned)
         del are_chunk_aligned
-        faces_remapping = {}
-        # Those that are not simply pass through (simple remap)
-        if len(not_chunk_aligned) > 0:
-            not_chunk_aligned_remap = dict(
-                zip(
-                    not_chunk_aligned[:, 3].astype(np.uint32),
-                    np.arange(len(not_chunk_aligned), dtype=np.uint32),
-                )
-            )
-            faces_remapping.update(not_chunk_aligned_remap)
-        # Those that are on the boundary we remove duplicates
-        if len(chunk_aligned) > 0:
-            unique_chunk_aligned, inverse_to_chunk_aligned = np.unique(
-                chunk_aligned[:, 0:3], return_inverse=True, axis=0
-            )
-            chunk_aligned_remap = dict(
-                zip(
-                    chunk_aligned[:, 3].astype(np.uint32),
-                    np.uint32(len(not_chunk_aligned))
-                    + inverse_to_chunk_aligned.astype(np.uint32),
-                )
-            )
-            faces_remapping.update(chunk_aligned_remap)
-            vertices = np.concatenate((not_chunk_aligned[:, 0:3], unique_chunk_aligned))
-        else:
-            vertices = not_chunk_aligned[:, 0:3]
+
+        # Old vertex index -> new vertex index. Those that are not on the
+        # boundary simply pass through, duplicates on the boundary are removed
+        faces_remapping = np.empty(vertexct[-1], dtype=np.uint32)
+        faces_remapping[not_chunk_aligned_ids] = np.arange(
+            len(not_chunk_aligned_ids), dtype=np.uint32
+        )
+        unique_chunk_aligned, inverse_to_chunk_aligned = _unique_rows(
+            vertices[chunk_aligned_ids]
+        )
+        faces_remapping[chunk_aligned_ids] = (
+            np.uint32(len(not_chunk_aligned_ids)) + inverse_to_chunk_aligned
+        )
+        vertices = np.concatenate(
+            (vertices[not_chunk_aligned_ids], unique_chunk_aligned)
+        )
         # Remap the faces to their new vertex indices
-        fastremap.remap(faces, faces_remapping, in_place=True)
+        faces = faces_remapping[faces].astype(faces.dtype, copy=False)
 
     return {
         "num_vertices": np.uint32(len(vertices)),
@@ -851,7 +852,7 @@ def black_out_dust_from_segmentation(seg, dust_threshold):
     :param dust_threshold: int
     :return:
     """
-    seg_ids, voxel_count = np.unique(seg, return_counts=True)
+    seg_ids, voxel_count = fastremap.unique(seg, return_counts=True)
     boundary = np.concatenate(
         (
             seg[-2, :, :],
@@ -863,13 +864,10 @@ def black_out_dust_from_segmentation(seg, dust_threshold):
         ),
         axis=None,
     )
-    seg_ids_on_boundary = np.unique(boundary)
-    dust_segids = [
-        sid
-        for sid, ct in zip(seg_ids, voxel_count)
-        if ct < int(dust_threshold) and np.isin(sid, seg_ids_on_boundary, invert=True)
-    ]
-    seg = fastremap.mask(seg, dust_segids, in_place=True)
+    seg_ids_on_boundary = fastremap.unique(boundary)
+    dust_mask = voxel_count < int(dust_threshold)
+    dust_mask &= np.isin(seg_ids, seg_ids_on_boundary, invert=True)
+    seg = fastremap.mask(seg, seg_ids[dust_mask], in_place=True)
 
 
 def _get_timestamp_from_node_ids(cg, node_ids):
@@ -877,6 +875,201 @@ def _get_timestamp_from_node_ids(cg, node_ids):
     return max(timestamps) + datetime.timedelta(milliseconds=1)
 
 
+def plan_remeshing(
+    cg, l2_node_ids: Sequence[np.uint64], stop_layer: int = None,
+):
+    """ Builds the remeshing DAG for a set of changed level 2 nodes. Every task
+    is a (layer, chunk_id) pair holding the node ids of that chunk that need a
+    new fragment; a task depends on all tasks holding children of its nodes.
+
+    :param cg: chunkedgraph instance
+    :param l2_node_ids: list of uint64
+    :param stop_layer: int
+    :return: dict (layer, chunk_id) -> set of node ids,
+             dict (layer, chunk_id) -> set of (layer, chunk_id) dependencies
+    """
+    max_layer = stop_layer or cg.n_layers
+    tasks = collections.defaultdict(set)
+    dependencies = collections.defaultdict(set)
+
+    node_ids = np.unique(np.array(l2_node_ids, dtype=np.uint64))
+    while len(node_ids) > 0:
+        layers = cg.get_chunk_layers(node_ids)
+        chunk_ids = cg.get_chunk_ids_from_node_ids(node_ids)
+        for node_id, layer, chunk_id in zip(node_ids, layers, chunk_ids):
+            tasks[(int(layer), np.uint64(chunk_id))].add(node_id)
+
+        # Only walk up from nodes below the stop layer
+        below_mask = layers < max_layer
+        node_ids = node_ids[below_mask]
+        if len(node_ids) == 0:
+            break
+        layers = layers[below_mask]
+        chunk_ids = chunk_ids[below_mask]
+
+        # One batched read for the whole frontier
+        parent_ids = cg.get_parents(node_ids)
+        if parent_ids is None:
+            break
+        parent_ids = np.array(parent_ids, dtype=np.uint64)
+        valid_mask = parent_ids != 0
+        parent_ids = parent_ids[valid_mask]
+        parent_layers = cg.get_chunk_layers(parent_ids)
+        parent_chunk_ids = cg.get_chunk_ids_from_node_ids(parent_ids)
+        in_scope_mask = parent_layers <= max_layer
+        for layer, chunk_id, parent_layer, parent_chunk_id in zip(
+            layers[valid_mask][in_scope_mask],
+            chunk_ids[valid_mask][in_scope_mask],
+            parent_layers[in_scope_mask],
+            parent_chunk_ids[in_scope_mask],
+        ):
+            dependencies[(int(parent_layer), np.uint64(parent_chunk_id))].add(
+                (int(layer), np.uint64(chunk_id))
+            )
+        node_ids = np.unique(parent_ids[in_scope_mask])
+
+    for task in tasks:
+        dependencies[task]
+    return dict(tasks), dict(dependencies)
+
+
+def remesh_chunk_task(
+    cg_info,
+    chunk_id,
+    node_ids,
+    mesh_path: str = None,
+    mip: int = 2,
+    max_err: int = 320,
+    cg=None,
+):
+    """ Remeshes (layer 2) or stitches (higher layers) one task of the remeshing
+    DAG. Module level function so that it can be enqueued with rq.
+    """
+    if cg is None:
+        cg = chunkedgraph.ChunkedGraph(**cg_info)
+    node_ids = np.array(list(node_ids), dtype=np.uint64)
+    time_stamp = None
+    if cg.get_chunk_layer(np.uint64(chunk_id)) == 2:
+        time_stamp = _get_timestamp_from_node_ids(cg, node_ids)
+    return chunk_mesh_task_new_remapping(
+        cg_info,
+        np.uint64(chunk_id),
+        mesh_path=mesh_path,
+        mip=mip,
+        max_err=max_err,
+        fragment_batch_size=20,
+        node_id_subset=node_ids,
+        cg=cg,
+        time_stamp=time_stamp,
+    )
+
+
+def _enqueue_remeshing_dag(cg, tasks, dependencies, queue, **task_kwargs):
+    """ Enqueues every task of the DAG on an rq queue, parents depend on the
+    jobs of their children and are released by rq once those finish.
+    """
+    cg_info = cg.get_serialized_info()
+    jobs = {}
+    for task in sorted(tasks, key=lambda t: t[0]):
+        layer, chunk_id = task
+        job = queue.enqueue(
+            remesh_chunk_task,
+            cg_info,
+            int(chunk_id),
+            [int(node_id) for node_id in tasks[task]],
+            depends_on=[jobs[dep] for dep in dependencies[task]] or None,
+            job_id=f"remesh_{cg.table_id}_{layer}_{chunk_id}_{time.time()}",
+            **task_kwargs,
+        )
+        jobs[task] = job
+    return jobs
+
+
+def _run_remeshing_dag(cg, tasks, dependencies, n_threads, **task_kwargs):
+    """ Runs the DAG in a local thread pool. A task is submitted as soon as all
+    of its dependencies finished. Returns per-layer timings.
+
+    A failing task is logged and all tasks depending on it (directly or not)
+    are skipped since they would stitch outdated child meshes; independent
+    branches keep running.
+    """
+    remaining = {task: set(deps) for task, deps in dependencies.items()}
+    dependents = collections.defaultdict(set)
+    for task, deps in dependencies.items():
+        for dep in deps:
+            dependents[dep].add(task)
+
+    cg_info = cg.get_serialized_info()
+    start = time.time()
+    layer_times = collections.defaultdict(
+        lambda: {
+            "n_tasks": 0,
+            "n_failed": 0,
+            "n_skipped": 0,
+            "task_time": 0.0,
+            "first_start": None,
+            "last_end": 0.0,
+        }
+    )
+
+    def _run_task(task):
+        layer, chunk_id = task
+        task_start = time.time()
+        if PRINT_FOR_DEBUGGING:
+            print("remeshing", chunk_id, tasks[task])
+        remesh_chunk_task(cg_info, chunk_id, tasks[task], cg=cg, **task_kwargs)
+        return task, task_start, time.time()
+
+    def _skip_dependents(task):
+        skipped = set()
+        stack = list(dependents[task])
+        while stack:
+            dependent = stack.pop()
+            if dependent in skipped:
+                continue
+            skipped.add(dependent)
+            stack.extend(dependents[dependent])
+        for dependent in skipped:
+            remaining.pop(dependent, None)
+            layer_times[dependent[0]]["n_skipped"] += 1
+        if skipped:
+            cg.logger.warning(
+                f"remeshing: skipped {len(skipped)} chunks depending on {task}"
+            )
+
+    with ThreadPoolExecutor(max_workers=max(1, n_threads)) as executor:
+        futures = {}
+        for task, deps in remaining.items():
+            if not deps:
+                futures[executor.submit(_run_task, task)] = task
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = futures.pop(future)
+                timing = layer_times[task[0]]
+                try:
+                    _, task_start, task_end = future.result()
+                except Exception:
+                    cg.logger.exception(f"remeshing of chunk {task} failed")
+                    timing["n_failed"] += 1
+                    _skip_dependents(task)
+                    continue
+
+                timing["n_tasks"] += 1
+                timing["task_time"] += task_end - task_start
+                if timing["first_start"] is None:
+                    timing["first_start"] = task_start - start
+                timing["last_end"] = max(timing["last_end"], task_end - start)
+                for dependent in dependents[task]:
+                    if dependent not in remaining:
+                        continue
+                    remaining[dependent].discard(task)
+                    if not remaining[dependent]:
+                        futures[executor.submit(_run_task, dependent)] = dependent
+
+    return {layer: dict(timing) for layer, timing in sorted(layer_times.items())}
+
+
 def remeshing(
     cg,
     l2_node_ids: Sequence[np.uint64],
@@ -884,71 +1077,51 @@ def remeshing(
     mesh_path: str = None,
     mip: int = 2,
     max_err: int = 320,
+    n_threads: int = 1,
+    queue=None,
 ):
     """ Given a chunkedgraph, a list of level 2 nodes, perform remeshing and stitching up the node hierarchy (or up to the stop_layer)
 
+    Chunks are scheduled as a DAG: a chunk is (re)meshed as soon as all chunks
+    holding its children are done, either in a local thread pool or on an rq
+    queue (e.g. `mesh-chunks`) using job dependencies.
+
     :param cg: chunkedgraph instance
     :param l2_node_ids: list of uint64
     :param stop_layer: int
     :param mesh_path: str
     :param mip: int
     :param max_err: int
-    :return:
+    :param n_threads: int
+        size of the local worker pool
+    :param queue: rq.Queue or None
+        if given, tasks are enqueued instead of run locally
+    :return: dict layer -> timings (local) or dict task -> rq job (queue)
+    :raises RuntimeError: if any chunk failed locally (after all independent
+        chunks were processed)
     """
-    l2_chunk_dict = collections.defaultdict(set)
-    # Find the chunk_ids of the l2_node_ids
+    tasks, dependencies = plan_remeshing(cg, l2_node_ids, stop_layer=stop_layer)
+    task_kwargs = {"mesh_path": mesh_path, "mip": mip, "max_err": max_err}
+    if queue is not None:
+        return _enqueue_remeshing_dag(cg, tasks, dependencies, queue, **task_kwargs)
 
-    def add_nodes_to_l2_chunk_dict(ids):
-        for node_id in ids:
-            chunk_id = cg.get_chunk_id(node_id)
-            l2_chunk_dict[chunk_id].add(node_id)
+    layer_times = _run_remeshing_dag(
+        cg, tasks, dependencies, n_threads, **task_kwargs
+    )
+    for layer, timing in layer_times.items():
+        cg.logger.debug(
+            f"remeshing layer {layer}: {timing['n_tasks']} chunks, "
+            f"{timing['task_time']:.2f}s task time, "
+            f"done after {timing['last_end']:.2f}s"
+        )
 
-    add_nodes_to_l2_chunk_dict(l2_node_ids)
-    for chunk_id, node_ids in l2_chunk_dict.items():
-        if PRINT_FOR_DEBUGGING:
-            print("remeshing", chunk_id, node_ids)
-        l2_time_stamp = _get_timestamp_from_node_ids(cg, node_ids)
-        # Remesh the l2_node_ids
-        chunk_mesh_task_new_remapping(
-            cg.get_serialized_info(),
-            chunk_id,
-            mesh_path=mesh_path,
-            mip=mip,
-            fragment_batch_size=20,
-            node_id_subset=node_ids,
-            cg=cg,
-            time_stamp=l2_time_stamp
+    n_failed = sum(timing["n_failed"] for timing in layer_times.values())
+    if n_failed:
+        n_skipped = sum(timing["n_skipped"] for timing in layer_times.values())
+        raise RuntimeError(
+            f"remeshing failed for {n_failed} chunks, {n_skipped} chunks skipped"
         )
-    chunk_dicts = []
-    max_layer = stop_layer or cg._n_layers
-    for layer in range(3, max_layer + 1):
-        chunk_dicts.append(collections.defaultdict(set))
-    cur_chunk_dict = l2_chunk_dict
-    # Find the parents of each l2_node_id up to the stop_layer, as well as their associated chunk_ids
-    for layer in range(3, max_layer + 1):
-        for _, node_ids in cur_chunk_dict.items():
-            parent_nodes = cg.get_parents(node_ids)
-            for parent_node in parent_nodes:
-                chunk_layer = cg.get_chunk_layer(parent_node)
-                index_in_dict_array = chunk_layer - 3
-                if index_in_dict_array < len(chunk_dicts):
-                    chunk_id = cg.get_chunk_id(parent_node)
-                    chunk_dicts[index_in_dict_array][chunk_id].add(parent_node)
-        cur_chunk_dict = chunk_dicts[layer - 3]
-    for chunk_dict in chunk_dicts:
-        for chunk_id, node_ids in chunk_dict.items():
-            if PRINT_FOR_DEBUGGING:
-                print("remeshing", chunk_id, node_ids)
-            # Stitch the meshes of the parents we found in the previous loop
-            chunk_mesh_task_new_remapping(
-                cg.get_serialized_info(),
-                chunk_id,
-                mesh_path=mesh_path,
-                mip=mip,
-                fragment_batch_size=20,
-                node_id_subset=node_ids,
-                cg=cg,
-            )
+    return layer_times
 
 
 # TODO: refactor this bloated function
@@ -972,6 +1145,7 @@ def chunk_mesh_task_new_remapping(
         cg = chunkedgraph.ChunkedGraph(**cg_info)
     mesh_path = mesh_path or cg.cv_mesh_path
     result = []
+    written_node_ids = []
 
     layer, _, chunk_offset = get_meshing_necessities_from_graph(cg, chunk_id, mip)
     cx, cy, cz = cg.get_chunk_coordinates(chunk_id)
@@ -1043,6 +1217,7 @@ def chunk_mesh_task_new_remapping(
                         compress=compress,
                         cache_control="no-cache",
                     )
+                    written_node_ids.append(obj_id)
     else:
         # For each node with more than one child, create a new fragment by
         # merging the mesh fragments of the children.
@@ -1237,6 +1412,12 @@ def chunk_mesh_task_new_remapping(
                         compress=False,
                         cache_control="no-cache",
                     )
+                    written_node_ids.append(new_fragment_id.split(":")[0])
+
+    if written_node_ids:
+        mesh_index.get_mesh_index(mesh_path).add(
+            chunk_id, np.array(written_node_ids, dtype=np.uint64)
+        )
 
     if PRINT_FOR_DEBUGGING:
         print(", ".join(str(x) for x in result))
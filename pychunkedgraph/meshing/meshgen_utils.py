@@ -8,6 +8,10 @@ from cloudfiles import CloudFiles
 from typing import Sequence
 
 from pychunkedgraph.backend import chunkedgraph  # noqa
+from pychunkedgraph.meshing import mesh_index
+
+# Upper bound on the number of nodes whose children are read at once
+MAX_FRONTIER_SIZE = 10000
 
 
 def str_to_slice(slice_str: str):
@@ -94,30 +98,46 @@ def get_downstream_multi_child_node(cg, node_id: np.uint64,
     return get_downstream_multi_child_node(cg, children[0], stop_layer)
 
 
-def get_downstream_multi_child_nodes(cg, node_ids: Sequence[np.uint64], require_children=True):
+def get_downstream_multi_child_nodes(
+    cg,
+    node_ids: Sequence[np.uint64],
+    require_children=True,
+    stop_layer: int = 2,
+    max_frontier_size: int = MAX_FRONTIER_SIZE,
+):
     """
     Return the first descendant of `node_ids` (including themselves) with more than
     one child, or the first descendant of `node_ids` (including themselves) on or
-    below layer 2.
+    below layer `stop_layer`.
+
+    The hierarchy is traversed level-synchronously: the children of the whole
+    frontier are read with one batched call (of at most `max_frontier_size`
+    nodes) and all single-child nodes move on to their child at once.
     """
-    # FIXME: Make stop_layer configurable
-    stop_layer = 2
-
-    def recursive_helper(cur_node_ids):
-        cur_node_ids, unique_to_original = np.unique(cur_node_ids, return_inverse=True)
-        stop_layer_mask = np.array([cg.get_chunk_layer(node_id) > stop_layer for node_id in cur_node_ids])
-        if np.any(stop_layer_mask):
-            node_to_children_dict = cg.get_children(cur_node_ids[stop_layer_mask])
-            children_array = np.array(list(node_to_children_dict.values()))
-            only_child_mask = np.array([len(children_for_node) == 1 for children_for_node in children_array])
-            only_children = children_array[only_child_mask].astype(np.uint64).ravel()
-            if np.any(only_child_mask):
-                temp_array = cur_node_ids[stop_layer_mask]
-                temp_array[only_child_mask] = recursive_helper(only_children)
-                cur_node_ids[stop_layer_mask] = temp_array
-        return cur_node_ids[unique_to_original]
-    
-    return recursive_helper(node_ids)
+    node_ids = np.array(node_ids, dtype=np.uint64)
+    if len(node_ids) == 0:
+        return node_ids
+
+    descendants, inverse = np.unique(node_ids, return_inverse=True)
+    frontier = np.flatnonzero(cg.get_chunk_layers(descendants) > stop_layer)
+    while len(frontier) > 0:
+        next_frontier = []
+        for start in range(0, len(frontier), max_frontier_size):
+            batch = frontier[start : start + max_frontier_size]
+            children_d = cg.get_children(descendants[batch], flatten=False)
+            children = [children_d[node_id] for node_id in descendants[batch]]
+            single_child_mask = np.array([len(c) == 1 for c in children], dtype=bool)
+            if not np.any(single_child_mask):
+                continue
+
+            batch = batch[single_child_mask]
+            descendants[batch] = np.array(
+                [c[0] for c in children if len(c) == 1], dtype=np.uint64
+            )
+            layers = cg.get_chunk_layers(descendants[batch])
+            next_frontier.append(batch[layers > stop_layer])
+        frontier = np.concatenate(next_frontier) if next_frontier else []
+    return descendants[inverse.reshape(-1)]
 
 
 def get_highest_child_nodes_with_meshes(
@@ -147,10 +167,16 @@ def get_highest_child_nodes_with_meshes(
     if verify_existence:
         valid_node_ids = []
         cf = CloudFiles(cg.cv_mesh_path)
+        index = mesh_index.get_mesh_index(cg.cv_mesh_path)
         while True:
-            filenames = [get_mesh_name(cg, c) for c in candidates]
-            existence_dict = cf.exists(filenames)
-            # cg.logger.info("Existence took: %.3fs" % (time.time() - time_start))
+            candidates = np.array(candidates, dtype=np.uint64)
+
+            # Existence is resolved from the mesh index, only candidates
+            # missing from it are checked on the bucket
+            existence = index.exists(cg, candidates)
+            valid_node_ids.extend(candidates[existence])
+            filenames = [get_mesh_name(cg, c) for c in candidates[~existence]]
+            existence_dict = cf.exists(filenames) if filenames else {}
             missing_meshes = []
             for mesh_key in existence_dict:
                 node_id = np.uint64(mesh_key.split(":")[0])
@@ -158,12 +184,10 @@ def get_highest_child_nodes_with_meshes(
                     valid_node_ids.append(node_id)
                 elif cg.get_chunk_layer(node_id) > stop_layer:
                     missing_meshes.append(node_id)
-            time_start = time.time()
             if missing_meshes:
                 candidates = cg.get_children(missing_meshes, flatten=True)
             else:
                 break
-            # cg.logger.info("ChunkedGraph lookup took: %.3fs" % (time.time() - time_start))
 
     else:
         valid_node_ids = candidates
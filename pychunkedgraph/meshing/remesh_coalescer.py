@@ -0,0 +1,281 @@
+"""
+Coalescing of remesh requests.
+
+Bursts of edits on the same neuron trigger one remesh request each. Changed
+level 2 ids are collected per table and chunk for a short debounce window and
+flushed as a single remesh job; ids whose root has been superseded in the
+meantime are dropped since a later request covers their replacement.
+
+`RemeshCoalescer` keeps pending ids in process memory and is meant for the
+remesh threads started by the server process itself. `RedisRemeshCoalescer`
+keeps them in Redis so that all server processes share one pending set per
+table and queue, and nothing is lost when a process is recycled.
+"""
+
+import collections
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+
+def drop_superseded(cg, l2_node_ids: np.ndarray):
+    """ Drops ids that are no longer part of a latest root
+
+    :return: remaining ids, number of dropped ids
+    """
+    if len(l2_node_ids) == 0:
+        return l2_node_ids, 0
+    root_ids = cg.get_roots(l2_node_ids)
+    unique_roots, inverse = np.unique(root_ids, return_inverse=True)
+    is_latest = np.asarray(cg.is_latest_roots(unique_roots))[inverse]
+    return l2_node_ids[is_latest], int(np.sum(~is_latest))
+
+
+class RemeshCoalescer:
+    def __init__(
+        self,
+        flush_func: Callable,
+        debounce_s: float = 2.0,
+        max_wait_s: float = 10.0,
+        max_retries: int = 3,
+    ):
+        """
+        :param flush_func: callable
+            called with (cg, l2_node_ids) once per coalesced job
+        :param debounce_s: float
+            a job is flushed after no new ids arrived for this long
+        :param max_wait_s: float
+            upper bound on how long ids can be held back
+        :param max_retries: int
+            ids of a failed flush are re-queued this many times
+        """
+        self._flush_func = flush_func
+        self._debounce_s = debounce_s
+        self._max_wait_s = max_wait_s
+        self._max_retries = max_retries
+        self._lock = threading.Lock()
+        # table_id -> chunk_id -> set of l2 ids
+        self._pending = {}
+        self._cgs = {}
+        self._first_request_time = {}
+        self._timers = {}
+        self._attempts = {}
+        self.counters = collections.Counter()
+
+    def add(self, cg, l2_node_ids: Sequence[np.uint64]) -> None:
+        """ Registers changed level 2 ids and (re)arms the debounce timer """
+        l2_node_ids = np.array(l2_node_ids, dtype=np.uint64)
+        if len(l2_node_ids) == 0:
+            return
+
+        with self._lock:
+            self.counters["requests"] += 1
+            self.counters["l2_ids_received"] += len(l2_node_ids)
+        self._add(cg, l2_node_ids)
+
+    def _add(self, cg, l2_node_ids: np.ndarray, attempt: int = 0) -> None:
+        table_id = cg.table_id
+        chunk_ids = cg.get_chunk_ids_from_node_ids(l2_node_ids)
+        with self._lock:
+            self._attempts[table_id] = max(self._attempts.get(table_id, 0), attempt)
+            pending = self._pending.setdefault(
+                table_id, collections.defaultdict(set)
+            )
+            self.counters["chunks_coalesced"] += len(
+                set(chunk_ids) & set(pending.keys())
+            )
+            for chunk_id, l2_id in zip(chunk_ids, l2_node_ids):
+                pending[chunk_id].add(l2_id)
+
+            self._cgs[table_id] = cg
+            now = time.time()
+            self._first_request_time.setdefault(table_id, now)
+            if table_id in self._timers:
+                self._timers[table_id].cancel()
+                self.counters["requests_coalesced"] += 1
+
+            waited = now - self._first_request_time[table_id]
+            delay = max(0.0, min(self._debounce_s, self._max_wait_s - waited))
+            timer = threading.Timer(delay, self.flush, args=(table_id,))
+            timer.daemon = True
+            self._timers[table_id] = timer
+            timer.start()
+
+    def flush(self, table_id: str) -> None:
+        """ Runs one remesh job for everything pending on a table """
+        with self._lock:
+            pending = self._pending.pop(table_id, None)
+            cg = self._cgs.pop(table_id, None)
+            self._first_request_time.pop(table_id, None)
+            timer = self._timers.pop(table_id, None)
+            attempt = self._attempts.pop(table_id, 0)
+        if timer is not None:
+            timer.cancel()
+        if not pending:
+            return
+
+        l2_node_ids = np.array(
+            [l2_id for l2_ids in pending.values() for l2_id in l2_ids],
+            dtype=np.uint64,
+        )
+        try:
+            l2_node_ids = self._drop_superseded(cg, l2_node_ids)
+        except Exception:
+            # Remeshing superseded ids is wasted work but not wrong
+            cg.logger.exception(f"remesh coalescer: root lookup failed for {table_id}")
+            with self._lock:
+                self.counters["superseded_check_failures"] += 1
+        if len(l2_node_ids) == 0:
+            return
+
+        with self._lock:
+            self.counters["jobs"] += 1
+        try:
+            self._flush_func(cg, l2_node_ids)
+        except Exception:
+            with self._lock:
+                self.counters["failed_jobs"] += 1
+            if attempt < self._max_retries:
+                cg.logger.exception(
+                    f"remesh coalescer: job for {table_id} failed, re-queueing "
+                    f"{len(l2_node_ids)} ids (attempt {attempt + 1})"
+                )
+                self._add(cg, l2_node_ids, attempt=attempt + 1)
+            else:
+                cg.logger.exception(
+                    f"remesh coalescer: job for {table_id} failed, dropping "
+                    f"{len(l2_node_ids)} ids: {l2_node_ids}"
+                )
+
+    def flush_all(self) -> None:
+        with self._lock:
+            table_ids = list(self._pending.keys())
+        for table_id in table_ids:
+            self.flush(table_id)
+
+    def _drop_superseded(self, cg, l2_node_ids: np.ndarray) -> np.ndarray:
+        l2_node_ids, n_skipped = drop_superseded(cg, l2_node_ids)
+        if n_skipped:
+            with self._lock:
+                self.counters["l2_ids_skipped"] += n_skipped
+        return l2_node_ids
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["pending_chunks"] = sum(len(p) for p in self._pending.values())
+        return stats
+
+
+class RedisRemeshCoalescer:
+    """ Pending ids live in a Redis set per table and queue. The first request
+    of a window enqueues a job; requests arriving before that job started
+    only add their ids and get the same job id. The job waits for the rest of
+    the debounce window and then takes everything pending (`pop`). Taken ids
+    are kept under the job id until `done` so a retried job sees them again.
+    """
+
+    def __init__(self, connection, name: str, debounce_s: float = 2.0,
+                 ttl_s: int = 24 * 3600):
+        """
+        :param connection: redis.Redis
+        :param name: str
+            distinguishes queues, e.g. the rq queue name
+        :param debounce_s: float
+        :param ttl_s: int
+            expiry of all keys, a window is reopened after this long even if
+            its job never ran
+        """
+        self._redis = connection
+        self._name = name
+        self._debounce_s = debounce_s
+        self._ttl_s = ttl_s
+        self._stats_key = f"pcg:remesh:{name}:stats"
+
+    def _key(self, table_id: str, suffix: str) -> str:
+        return f"pcg:remesh:{self._name}:{table_id}:{suffix}"
+
+    def add(self, table_id: str, l2_node_ids: Sequence[np.uint64],
+            enqueue_func: Callable) -> Optional[str]:
+        """ Registers changed level 2 ids
+
+        :param enqueue_func: callable
+            called with a new job id when no job is waiting for the table
+        :return: id of the job that will remesh the ids
+        """
+        l2_node_ids = [int(l2_id) for l2_id in l2_node_ids]
+        if len(l2_node_ids) == 0:
+            return None
+
+        pending_key = self._key(table_id, "pending")
+        window_key = self._key(table_id, "window")
+        pipe = self._redis.pipeline()
+        pipe.sadd(pending_key, *l2_node_ids)
+        pipe.expire(pending_key, self._ttl_s)
+        pipe.hincrby(self._stats_key, "requests", 1)
+        pipe.hincrby(self._stats_key, "l2_ids_received", len(l2_node_ids))
+        pipe.execute()
+
+        # The window key is removed by the job when it takes the pending ids,
+        # ids added before that are covered by the job
+        while True:
+            job_id = f"remesh_{table_id}_{uuid.uuid4().hex}"
+            if self._redis.set(window_key, f"{job_id} {time.time()}", nx=True,
+                               ex=self._ttl_s):
+                enqueue_func(job_id)
+                return job_id
+
+            window = self._redis.get(window_key)
+            if window is not None:
+                self._redis.hincrby(self._stats_key, "requests_coalesced", 1)
+                return window.decode().split(" ")[0]
+
+    def pop(self, cg, job_id: str) -> np.ndarray:
+        """ Called by the job: waits for the end of the debounce window, then
+        takes all pending ids of the table and drops superseded ones.
+        """
+        pending_key = self._key(cg.table_id, "pending")
+        window_key = self._key(cg.table_id, "window")
+        job_key = self._key(cg.table_id, job_id)
+
+        window = self._redis.get(window_key)
+        if window is not None and window.decode().startswith(f"{job_id} "):
+            window_start = float(window.decode().split(" ")[1])
+            time.sleep(max(0.0, window_start + self._debounce_s - time.time()))
+
+        pipe = self._redis.pipeline()
+        pipe.sunionstore(job_key, [job_key, pending_key])
+        pipe.delete(pending_key)
+        pipe.delete(window_key)
+        pipe.expire(job_key, self._ttl_s)
+        pipe.smembers(job_key)
+        l2_node_ids = pipe.execute()[-1]
+        l2_node_ids = np.array(sorted(int(l2_id) for l2_id in l2_node_ids),
+                               dtype=np.uint64)
+
+        try:
+            l2_node_ids, n_skipped = drop_superseded(cg, l2_node_ids)
+        except Exception:
+            # Remeshing superseded ids is wasted work but not wrong
+            cg.logger.exception(
+                f"remesh coalescer: root lookup failed for {cg.table_id}"
+            )
+            n_skipped = 0
+
+        pipe = self._redis.pipeline()
+        pipe.hincrby(self._stats_key, "l2_ids_skipped", n_skipped)
+        pipe.hincrby(self._stats_key, "jobs", 1)
+        pipe.execute()
+        return l2_node_ids
+
+    def done(self, table_id: str, job_id: str) -> None:
+        """ Called by the job after remeshing succeeded """
+        self._redis.delete(self._key(table_id, job_id))
+
+    def stats(self) -> Dict:
+        return {
+            k.decode(): int(v) for k, v in self._redis.hgetall(self._stats_key).items()
+        }
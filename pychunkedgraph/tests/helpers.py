@@ -173,7 +173,7 @@ def gen_graph_simplequerytest(request, gen_graph):
     return graph
 
 
-def create_chunk(cgraph, vertices=None, edges=None, timestamp=None):
+def create_chunk(cgraph, vertices=None, edges=None, timestamp=None, compute_node_stats=False):
     """
     Helper function to add vertices and edges to the chunkedgraph - no safety checks!
     """
@@ -245,7 +245,8 @@ def create_chunk(cgraph, vertices=None, edges=None, timestamp=None):
 
     # Use affinities as areas
     cgraph.add_atomic_edges_in_chunks(
-        edge_ids, edge_affs, edge_affs, isolated_node_ids, time_stamp=timestamp
+        edge_ids, edge_affs, edge_affs, isolated_node_ids, time_stamp=timestamp,
+        compute_node_stats=compute_node_stats
     )
 
 
@@ -2867,3 +2867,1835 @@ class TestMeshes:
         assert merged_vertices["num_vertices"] == 6
         assert np.array_equal(merged_vertices["vertices"], expected_vertices)
         assert np.array_equal(merged_vertices["faces"], expected_faces)
+
+    @pytest.mark.timeout(30)
+    @mock.patch(
+        "pychunkedgraph.meshing.meshgen.get_meshing_necessities_from_graph",
+        return_value=(0, 0, np.array([1, 12, 5])),
+    )
+    @mock.patch(
+        "pychunkedgraph.meshing.meshgen.get_draco_encoding_settings_for_chunk",
+        return_value={
+            "quantization_bits": 3,
+            "quantization_range": 21,
+            "quantization_origin": np.array([-1, 11, 3]),
+        },
+    )
+    def test_merge_draco_meshes_shared_by_many_fragments(self, *args):
+        """
+        With the settings above the quantized boundary planes are x=2, y=11
+        and z=6. [2, 0, 0] is shared by all three fragments and [7, 11, 0] by
+        two of them, both are merged. The duplicate [5, 5, 5] is not on the
+        boundary and is kept twice.
+        """
+        fragments = [
+            {
+                "mesh": {
+                    "num_vertices": 3,
+                    "vertices": np.array([[5, 5, 5], [2, 0, 0], [4, 4, 4]]),
+                    "faces": np.array([0, 1, 2]),
+                }
+            },
+            {
+                "mesh": {
+                    "num_vertices": 3,
+                    "vertices": np.array([[2, 0, 0], [5, 5, 5], [7, 11, 0]]),
+                    "faces": np.array([0, 1, 2]),
+                }
+            },
+            {
+                "mesh": {
+                    "num_vertices": 3,
+                    "vertices": np.array([[7, 11, 0], [2, 0, 0], [0, 0, 0]]),
+                    "faces": np.array([0, 1, 2]),
+                }
+            },
+        ]
+        merged = meshgen.merge_draco_meshes_across_boundaries(
+            MockChunkedGraph(), fragments, 0, 0, 0
+        )
+        expected_vertices = np.array(
+            [5, 5, 5, 4, 4, 4, 5, 5, 5, 0, 0, 0, 2, 0, 0, 7, 11, 0]
+        )
+        expected_faces = np.array([0, 4, 1, 4, 2, 5, 5, 4, 3])
+        assert merged["num_vertices"] == 6
+        assert np.array_equal(merged["vertices"], expected_vertices)
+        assert np.array_equal(merged["faces"], expected_faces)
+
+    @pytest.mark.timeout(30)
+    def test_black_out_dust_from_segmentation(self):
+        """
+        Only the last two planes of every axis count as the border. Below the
+        threshold of 3 voxels, 2 and 3 are removed while 4 touches the border
+        and is kept. 5 is large enough.
+        """
+        seg = np.ones((4, 4, 4), dtype=np.uint64)
+        seg[1, 1, 1] = seg[0, 1, 1] = 2
+        seg[0, 0, 0] = 3
+        seg[3, 3, 3] = 4
+        seg[0, 0, 1] = seg[0, 1, 0] = seg[1, 0, 0] = seg[1, 0, 1] = 5
+
+        expected = seg.copy()
+        expected[1, 1, 1] = expected[0, 1, 1] = 0
+        expected[0, 0, 0] = 0
+
+        meshgen.black_out_dust_from_segmentation(seg, 3)
+        assert np.array_equal(seg, expected)
+
+    @pytest.mark.timeout(30)
+    def test_get_downstream_multi_child_nodes(self, gen_graph_simplequerytest):
+        """
+        A¹ forms a single-child chain down to layer 2, the root of B¹ and C¹
+        has two children, the level 2 node of B¹ is on the stop layer.
+        """
+        cgraph = gen_graph_simplequerytest
+        l2_a = cgraph.get_parent(to_label(cgraph, 1, 0, 0, 0, 0))
+        l2_b = cgraph.get_parent(to_label(cgraph, 1, 1, 0, 0, 0))
+        root_a = cgraph.get_root(l2_a)
+        root_bc = cgraph.get_root(l2_b)
+
+        node_ids = [root_a, root_bc, root_a, l2_b]
+        expected = [l2_a, root_bc, l2_a, l2_b]
+        for max_frontier_size in [1, 10]:
+            with mock.patch.object(
+                cgraph, "get_children", wraps=cgraph.get_children
+            ) as get_children:
+                result = meshgen_utils.get_downstream_multi_child_nodes(
+                    cgraph, node_ids, max_frontier_size=max_frontier_size
+                )
+            assert np.array_equal(result, expected)
+            if max_frontier_size == 10:
+                # One batched read per level below the roots
+                assert get_children.call_count <= 2
+
+    @pytest.mark.timeout(30)
+    def test_plan_remeshing(self, gen_graph_simplequerytest):
+        """
+        Remeshing the level 2 nodes of chunks B and C needs both layer 3 chunks
+        and the root chunk, each parent depending on the chunks of its children.
+        """
+        cgraph = gen_graph_simplequerytest
+
+        l2_b = cgraph.get_parent(to_label(cgraph, 1, 1, 0, 0, 0))
+        l2_c = cgraph.get_parent(to_label(cgraph, 1, 2, 0, 0, 0))
+        tasks, dependencies = meshgen.plan_remeshing(
+            cgraph, [l2_b, l2_c], stop_layer=4
+        )
+
+        l2_tasks = [(2, cgraph.get_chunk_id(l2_b)), (2, cgraph.get_chunk_id(l2_c))]
+        l3_b = cgraph.get_parent(l2_b)
+        l3_c = cgraph.get_parent(l2_c)
+        l3_tasks = [(3, cgraph.get_chunk_id(l3_b)), (3, cgraph.get_chunk_id(l3_c))]
+        root_id = cgraph.get_root(l2_b)
+        root_task = (4, cgraph.get_chunk_id(root_id))
+
+        assert len(tasks) == 5
+        assert tasks[l2_tasks[0]] == {l2_b}
+        assert tasks[l3_tasks[1]] == {l3_c}
+        assert tasks[root_task] == {root_id}
+        assert dependencies[l2_tasks[0]] == set()
+        assert dependencies[l3_tasks[0]] == {l2_tasks[0]}
+        assert dependencies[l3_tasks[1]] == {l2_tasks[1]}
+        assert dependencies[root_task] == set(l3_tasks)
+
+    @pytest.mark.timeout(30)
+    def test_run_remeshing_dag(self):
+        """
+        A parent chunk starts only after all its children are done, per layer
+        timings are returned.
+        """
+        tasks = {(2, 1): {1}, (2, 2): {2}, (3, 3): {3}, (4, 4): {4}}
+        dependencies = {
+            (2, 1): set(),
+            (2, 2): set(),
+            (3, 3): {(2, 1), (2, 2)},
+            (4, 4): {(3, 3)},
+        }
+        events = []
+
+        def remesh_chunk_task(cg_info, chunk_id, node_ids, **kwargs):
+            events.append(("start", chunk_id))
+            sleep(0.01 * (2 - chunk_id % 2))
+            events.append(("end", chunk_id))
+
+        with mock.patch.object(meshgen, "remesh_chunk_task", remesh_chunk_task):
+            layer_times = meshgen._run_remeshing_dag(
+                mock.Mock(), tasks, dependencies, n_threads=2
+            )
+
+        assert events.index(("start", 3)) > events.index(("end", 1))
+        assert events.index(("start", 3)) > events.index(("end", 2))
+        assert events.index(("start", 4)) > events.index(("end", 3))
+        assert sorted(layer_times.keys()) == [2, 3, 4]
+        assert layer_times[2]["n_tasks"] == 2
+        assert layer_times[4]["n_tasks"] == 1
+        assert layer_times[4]["first_start"] >= layer_times[3]["last_end"]
+
+    @pytest.mark.timeout(30)
+    def test_run_remeshing_dag_failure(self):
+        """
+        Chunks depending on a failed chunk are skipped, others still run.
+        """
+        tasks = {(2, 1): {1}, (2, 2): {2}, (3, 3): {3}, (3, 4): {4}, (4, 5): {5}}
+        dependencies = {
+            (2, 1): set(),
+            (2, 2): set(),
+            (3, 3): {(2, 1)},
+            (3, 4): {(2, 2)},
+            (4, 5): {(3, 3), (3, 4)},
+        }
+        remeshed = []
+
+        def remesh_chunk_task(cg_info, chunk_id, node_ids, **kwargs):
+            if chunk_id == 1:
+                raise ValueError("failing chunk")
+            remeshed.append(chunk_id)
+
+        cg = mock.Mock()
+        with mock.patch.object(meshgen, "remesh_chunk_task", remesh_chunk_task):
+            layer_times = meshgen._run_remeshing_dag(
+                cg, tasks, dependencies, n_threads=2
+            )
+
+        assert sorted(remeshed) == [2, 4]
+        assert layer_times[2]["n_failed"] == 1
+        assert layer_times[3]["n_skipped"] == 1
+        assert layer_times[4]["n_skipped"] == 1
+        assert cg.logger.exception.called
+
+
+class TestRemeshCoalescer:
+    @pytest.mark.timeout(30)
+    def test_coalesce_and_drop_superseded(self, gen_graph_simplequerytest):
+        """
+        Two requests within the debounce window end up in one job, level 2 ids
+        replaced by the merge of A and B are dropped.
+        """
+        from pychunkedgraph.meshing import remesh_coalescer
+
+        cgraph = gen_graph_simplequerytest
+        l2_a = cgraph.get_parent(to_label(cgraph, 1, 0, 0, 0, 0))
+        l2_b = cgraph.get_parent(to_label(cgraph, 1, 1, 0, 0, 0))
+        l2_c = cgraph.get_parent(to_label(cgraph, 1, 2, 0, 0, 0))
+
+        jobs = []
+        coalescer = remesh_coalescer.RemeshCoalescer(
+            lambda cg, l2_ids: jobs.append(sorted(l2_ids)), debounce_s=60
+        )
+        coalescer.add(cgraph, [l2_a, l2_b])
+        coalescer.add(cgraph, [l2_b, l2_c])
+
+        # Merging A and B creates new level 2 nodes for both
+        cgraph.add_edges(
+            "Jane Doe",
+            [to_label(cgraph, 1, 0, 0, 0, 0), to_label(cgraph, 1, 1, 0, 0, 0)],
+            affinities=[0.3],
+        )
+        coalescer.flush_all()
+
+        assert jobs == [[l2_c]]
+        stats = coalescer.stats()
+        assert stats["requests"] == 2
+        assert stats["requests_coalesced"] == 1
+        assert stats["chunks_coalesced"] == 1
+        assert stats["l2_ids_skipped"] == 2
+        assert stats["jobs"] == 1
+        assert stats["pending_chunks"] == 0
+
+    @pytest.mark.timeout(30)
+    def test_flush_failures(self):
+        """
+        Ids are remeshed unfiltered when the root lookup fails and re-queued
+        when the job fails.
+        """
+        from pychunkedgraph.meshing import remesh_coalescer
+
+        cg = mock.Mock()
+        cg.table_id = "test"
+        cg.get_chunk_ids_from_node_ids = lambda node_ids: node_ids // 10
+        cg.get_roots.side_effect = RuntimeError("lookup failed")
+
+        jobs = []
+
+        def flush_func(cg, l2_ids):
+            jobs.append(sorted(l2_ids))
+            if len(jobs) == 1:
+                raise RuntimeError("enqueue failed")
+
+        coalescer = remesh_coalescer.RemeshCoalescer(
+            flush_func, debounce_s=60, max_retries=1
+        )
+        coalescer.add(cg, [11, 21])
+        coalescer.flush_all()
+        assert coalescer.stats()["pending_chunks"] == 2
+
+        coalescer.flush_all()
+        assert jobs == [[11, 21], [11, 21]]
+        stats = coalescer.stats()
+        assert stats["failed_jobs"] == 1
+        assert stats["superseded_check_failures"] == 2
+        assert stats["pending_chunks"] == 0
+        assert cg.logger.exception.called
+
+    class _Redis:
+        """ Strings, sets and hashes of a redis connection """
+
+        class _Pipeline:
+            def __init__(self, redis):
+                self._redis = redis
+                self._calls = []
+
+            def __getattr__(self, name):
+                def _queue(*args, **kwargs):
+                    self._calls.append((getattr(self._redis, name), args, kwargs))
+                return _queue
+
+            def execute(self):
+                results = [func(*args, **kwargs) for func, args, kwargs in self._calls]
+                self._calls = []
+                return results
+
+        def __init__(self):
+            self.data = {}
+
+        def pipeline(self):
+            return self._Pipeline(self)
+
+        def set(self, key, value, nx=False, ex=None):
+            if nx and key in self.data:
+                return None
+            self.data[key] = str(value).encode()
+            return True
+
+        def get(self, key):
+            return self.data.get(key)
+
+        def delete(self, key):
+            return int(self.data.pop(key, None) is not None)
+
+        def expire(self, key, ttl):
+            return key in self.data
+
+        def sadd(self, key, *values):
+            members = self.data.setdefault(key, set())
+            n_members = len(members)
+            members.update(str(v).encode() for v in values)
+            return len(members) - n_members
+
+        def smembers(self, key):
+            return set(self.data.get(key, set()))
+
+        def sunionstore(self, dest, keys):
+            self.data[dest] = set().union(*[self.data.get(k, set()) for k in keys])
+            return len(self.data[dest])
+
+        def hincrby(self, key, field, amount):
+            fields = self.data.setdefault(key, {})
+            fields[field] = fields.get(field, 0) + amount
+            return fields[field]
+
+        def hgetall(self, key):
+            return {k.encode(): str(v).encode() for k, v in self.data.get(key, {}).items()}
+
+    @pytest.mark.timeout(30)
+    def test_redis_coalescer(self):
+        """
+        Requests within the debounce window share one job, which waits for the
+        end of the window and takes the ids of both. Taken ids stay with the
+        job until it is done, the next request opens a new window.
+        """
+        import time
+        from pychunkedgraph.meshing import remesh_coalescer
+
+        # Id 3 belongs to a superseded root
+        cg = mock.Mock()
+        cg.table_id = "test"
+        cg.get_roots.side_effect = lambda node_ids: node_ids * np.uint64(10)
+        cg.is_latest_roots.side_effect = lambda root_ids: root_ids != 30
+
+        coalescer = remesh_coalescer.RedisRemeshCoalescer(
+            self._Redis(), "remesh", debounce_s=0.5)
+        enqueued = []
+        assert coalescer.add("test", [], enqueued.append) is None
+
+        time_start = time.time()
+        job_id = coalescer.add("test", [1, 2], enqueued.append)
+        assert coalescer.add("test", [np.uint64(2), np.uint64(3)], enqueued.append) == job_id
+        assert enqueued == [job_id]
+
+        assert coalescer.pop(cg, job_id).tolist() == [1, 2]
+        assert time.time() - time_start >= 0.5
+
+        # A retried job sees its ids again without waiting
+        time_start = time.time()
+        assert coalescer.pop(cg, job_id).tolist() == [1, 2]
+        assert time.time() - time_start < 0.5
+
+        coalescer.done("test", job_id)
+        assert len(coalescer.pop(cg, job_id)) == 0
+
+        next_job_id = coalescer.add("test", [4], enqueued.append)
+        assert next_job_id != job_id
+        assert enqueued == [job_id, next_job_id]
+        assert coalescer.pop(cg, next_job_id).tolist() == [4]
+
+        assert coalescer.stats() == {
+            "requests": 3,
+            "requests_coalesced": 1,
+            "l2_ids_received": 5,
+            "l2_ids_skipped": 2,
+            "jobs": 4,
+        }
+
+
+class TestSupervoxelLookup:
+    class ArraySegmentationCache:
+        def __init__(self, seg):
+            self._seg = seg
+
+        def cutout(self, start, end):
+            result = np.zeros(np.array(end) - np.array(start), dtype=np.uint64)
+            inter_start = np.maximum(start, 0)
+            inter_end = np.minimum(end, self._seg.shape)
+            src = tuple(slice(s, e) for s, e in zip(inter_start, inter_end))
+            dst = tuple(slice(s - o, e - o) for s, e, o in zip(inter_start, inter_end, start))
+            result[dst] = self._seg[src]
+            return result
+
+    @pytest.fixture
+    def cgraph(self, gen_graph_simplequerytest):
+        """
+        Segmentation along x: A¹ [0, 10), 3 [10, 15), 2 [15, 20), C¹ [20, 30)
+        """
+        cgraph = gen_graph_simplequerytest
+        seg = np.zeros((30, 10, 10), dtype=np.uint64)
+        seg[0:10] = to_label(cgraph, 1, 0, 0, 0, 0)
+        seg[10:15] = to_label(cgraph, 1, 1, 0, 0, 0)
+        seg[15:20] = to_label(cgraph, 1, 1, 0, 0, 1)
+        seg[20:30] = to_label(cgraph, 1, 2, 0, 0, 0)
+        cgraph._cv.resolution = np.array([50, 50, 50])
+        cgraph._segmentation_caches[cgraph._cv_mip] = self.ArraySegmentationCache(seg)
+        return cgraph
+
+    @pytest.mark.timeout(30)
+    def test_closest_supervoxel(self, cgraph):
+        sv_a = to_label(cgraph, 1, 0, 0, 0, 0)
+        sv_b0 = to_label(cgraph, 1, 1, 0, 0, 0)
+        sv_b1 = to_label(cgraph, 1, 1, 0, 0, 1)
+        root_a = cgraph.get_root(sv_a)
+        root_bc = cgraph.get_root(sv_b0)
+        l2_b = cgraph.get_parent(sv_b0)
+
+        coordinates = [[12, 5, 5], [8, 5, 5], [8, 5, 5], [22, 5, 5]]
+        parent_ids = [root_bc, root_bc, root_a, l2_b]
+        atomic_ids = cgraph.get_atomic_ids_from_coords_multi(coordinates, parent_ids)
+        assert np.array_equal(atomic_ids, [sv_b0, sv_b0, sv_a, sv_b1])
+
+    @pytest.mark.timeout(30)
+    def test_layer1_parent(self, cgraph):
+        sv_c = to_label(cgraph, 1, 2, 0, 0, 0)
+        atomic_ids = cgraph.get_atomic_ids_from_coords_multi([[2, 5, 5]], [sv_c])
+        assert np.array_equal(atomic_ids, [sv_c])
+
+    @pytest.mark.timeout(30)
+    def test_old_parent(self, cgraph):
+        """
+        A¹ is still found through its root from before the merge with B¹
+        """
+        sv_a = to_label(cgraph, 1, 0, 0, 0, 0)
+        sv_b0 = to_label(cgraph, 1, 1, 0, 0, 0)
+        old_root_a = cgraph.get_root(sv_a)
+
+        new_root_ids = cgraph.add_edges(
+            "Jane Doe", [sv_a, sv_b0], affinities=[0.3]
+        ).new_root_ids
+        assert len(new_root_ids) == 1
+
+        coordinates = [[12, 5, 5], [12, 5, 5]]
+        parent_ids = [old_root_a, new_root_ids[0]]
+        atomic_ids = cgraph.get_atomic_ids_from_coords_multi(coordinates, parent_ids)
+        assert np.array_equal(atomic_ids, [sv_a, sv_b0])
+
+    @pytest.mark.timeout(30)
+    def test_no_match(self, cgraph):
+        from pychunkedgraph.app import app_utils
+
+        root_a = cgraph.get_root(to_label(cgraph, 1, 0, 0, 0, 0))
+
+        # 19 voxels * 50 nm away from A¹
+        atomic_ids = cgraph.get_atomic_ids_from_coords_multi([[28, 5, 5]], [root_a])
+        assert np.array_equal(atomic_ids, [0])
+
+        with pytest.raises(cg_exceptions.BadRequest):
+            app_utils.handle_supervoxel_id_lookup(
+                cgraph, np.array([[2, 5, 5], [28, 5, 5]]), [root_a, root_a]
+            )
+
+
+class TestMeshIndex:
+    @pytest.fixture
+    def mock_cg(self, tmp_path):
+        cg = mock.Mock()
+        cg.cv_mesh_path = f"file://{tmp_path}/meshes"
+        cg.get_chunk_ids_from_node_ids = lambda node_ids: np.array(
+            node_ids, dtype=np.uint64
+        ) // np.uint64(100)
+        cg.get_chunk_layer = lambda node_id: int(node_id) // 1000
+        return cg
+
+    @pytest.mark.timeout(30)
+    def test_add_and_exists(self, mock_cg):
+        from pychunkedgraph.meshing import mesh_index
+
+        index = mesh_index.MeshIndex(mock_cg.cv_mesh_path)
+        index.add(1, [101, 105])
+        index.add(1, [103])
+        index.add(2, [201])
+
+        # A new instance reads the index from the mesh dir
+        index = mesh_index.MeshIndex(mock_cg.cv_mesh_path)
+        assert np.array_equal(index.get([1])[1], [101, 103, 105])
+        mask = index.exists(mock_cg, [101, 102, 103, 201, 301])
+        assert np.array_equal(mask, [True, False, True, True, False])
+
+    @pytest.mark.timeout(30)
+    def test_concurrent_add(self, mock_cg):
+        """
+        Two tasks adding to the same chunk both keep their ids, also when one
+        of them has read the index before the other one wrote. Adding does
+        not read the index of the chunk.
+        """
+        from pychunkedgraph.meshing import mesh_index
+
+        index_a = mesh_index.MeshIndex(mock_cg.cv_mesh_path)
+        index_b = mesh_index.MeshIndex(mock_cg.cv_mesh_path)
+        assert len(index_a.get([1])[1]) == 0
+        index_b.add(1, [102])
+        with mock.patch.object(index_a._cf, "get", side_effect=AssertionError):
+            index_a.add(1, [101])
+        assert np.array_equal(index_a.get([1])[1], [101])
+
+        index = mesh_index.MeshIndex(mock_cg.cv_mesh_path)
+        assert np.array_equal(index.get([1])[1], [101, 102])
+
+    @pytest.mark.timeout(30)
+    def test_rebuild(self, mock_cg, tmp_path):
+        from cloudfiles import CloudFiles
+        from pychunkedgraph.meshing import mesh_index
+
+        cf = CloudFiles(mock_cg.cv_mesh_path)
+        for node_id in [101, 105, 201]:
+            cf.put(f"{node_id}:0:0-1_0-1_0-1", b"mesh")
+        cf.put("info", b"{}")
+        mesh_index.MeshIndex(mock_cg.cv_mesh_path).add(1, [105])
+
+        result = mesh_index.rebuild_mesh_index(mock_cg)
+        assert result == {"n_chunks": 2, "n_fragments": 3}
+        # The shard is merged into the compacted index
+        assert list(cf.list(prefix="index/1/")) == []
+
+        index = mesh_index.MeshIndex(mock_cg.cv_mesh_path)
+        assert np.array_equal(index.get([1])[1], [101, 105])
+        assert np.array_equal(index.get([2])[2], [201])
+
+    @pytest.mark.timeout(30)
+    def test_manifest_existence(self, mock_cg):
+        """
+        Indexed fragments are not checked on the bucket, fragments missing
+        from the index still are
+        """
+        from cloudfiles import CloudFiles
+        from pychunkedgraph.meshing import mesh_index
+
+        # 3001 has no fragment, its children 2001 (indexed) and 2002 (not
+        # indexed) have
+        CloudFiles(mock_cg.cv_mesh_path).put("2002:0:bbox", b"mesh")
+        mesh_index.get_mesh_index(mock_cg.cv_mesh_path).add(20, [2001])
+        mock_cg.get_children = lambda node_ids, flatten: np.array(
+            [2001, 2002], dtype=np.uint64
+        )
+
+        with mock.patch.object(
+            meshgen_utils, "get_mesh_name", lambda cg, node_id: f"{node_id}:0:bbox"
+        ), mock.patch.object(
+            meshgen_utils.CloudFiles, "exists", autospec=True,
+            side_effect=CloudFiles.exists
+        ) as exists:
+            node_ids = meshgen_utils.get_highest_child_nodes_with_meshes(
+                mock_cg, np.uint64(3001), verify_existence=True
+            )
+
+        assert sorted(node_ids) == [2001, 2002]
+        checked = [name for call in exists.call_args_list for name in call[0][1]]
+        assert sorted(checked) == ["2002:0:bbox", "3001:0:bbox"]
+
+
+class TestSegmentationCache:
+    @pytest.fixture
+    def file_cv(self, tmp_path):
+        from cloudvolume import CloudVolume
+
+        info = CloudVolume.create_new_info(
+            num_channels=1,
+            layer_type="segmentation",
+            data_type="uint64",
+            encoding="raw",
+            resolution=[8, 8, 40],
+            voxel_offset=[10, 20, 5],
+            chunk_size=[16, 16, 8],
+            volume_size=[50, 40, 20],
+        )
+        cv = CloudVolume(f"file://{tmp_path}/seg", info=info)
+        cv.commit_info()
+        data = np.random.randint(0, 100, size=(50, 40, 20)).astype(np.uint64)
+        cv[10:60, 20:60, 5:25] = data
+        return CloudVolume(f"file://{tmp_path}/seg"), data
+
+    @pytest.mark.timeout(30)
+    def test_cutout(self, file_cv, tmp_path):
+        from pychunkedgraph.io.segmentation import SegmentationCache
+
+        cv, data = file_cv
+        cache = SegmentationCache(cv, cache_dir=str(tmp_path / "cache"))
+
+        cutout = cache.cutout([12, 25, 6], [40, 50, 20])
+        assert np.array_equal(cutout, data[2:30, 5:30, 1:15])
+        assert cache.stats()["downloads"] == 1
+
+        # Served from the cache, out of bounds voxels are 0
+        cutout = cache[5:70, 15:70, 0:30]
+        assert np.array_equal(cutout[5:55, 5:45, 5:25], data)
+        assert np.all(cutout[:5] == 0)
+        assert cache.stats()["memory_hits"] > 0
+
+        # A new cache instance picks up the blocks on disk
+        cache = SegmentationCache(cv, cache_dir=str(tmp_path / "cache"))
+        cutout = cache.cutout([12, 25, 6], [40, 50, 20])
+        assert np.array_equal(cutout, data[2:30, 5:30, 1:15])
+        assert cache.stats().get("downloads", 0) == 0
+        assert cache.stats()["disk_hits"] > 0
+
+    @pytest.mark.timeout(30)
+    def test_disk_eviction(self, file_cv, tmp_path):
+        from pychunkedgraph.io.segmentation import SegmentationCache
+
+        cv, data = file_cv
+        cache = SegmentationCache(
+            cv, cache_dir=str(tmp_path / "cache"), max_disk_bytes=50000
+        )
+        cutout = cache.cutout([10, 20, 5], [60, 60, 25])
+        assert np.array_equal(cutout, data)
+        assert cache.stats()["disk_bytes"] <= 50000
+        assert cache.stats()["evictions"] > 0
+
+    @pytest.mark.timeout(30)
+    def test_shared_disk_limit(self, file_cv, tmp_path):
+        """
+        The size limit holds for the directory, not per cache instance
+        """
+        from pychunkedgraph.io.segmentation import SegmentationCache
+
+        cv, data = file_cv
+        cache_dir = tmp_path / "cache"
+        cache_a = SegmentationCache(cv, cache_dir=str(cache_dir), max_disk_bytes=50000)
+        cache_b = SegmentationCache(cv, cache_dir=str(cache_dir), max_disk_bytes=50000)
+        assert np.array_equal(cache_a.cutout([10, 20, 5], [35, 60, 25]), data[:25])
+        assert np.array_equal(cache_b.cutout([35, 20, 5], [60, 60, 25]), data[25:])
+
+        n_bytes = sum(f.stat().st_size for f in cache_dir.glob("*/*.npy"))
+        assert n_bytes <= 50000
+
+    @pytest.mark.timeout(30)
+    def test_scattered_missing_blocks(self, file_cv, tmp_path):
+        """
+        Cached blocks are not downloaded again when the missing blocks
+        surround them
+        """
+        from pychunkedgraph.io import segmentation
+
+        boxes = segmentation._get_fetch_boxes(
+            [(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1), (1, 0, 1)]
+        )
+        blocks = set()
+        for box_start, box_end in boxes:
+            blocks.update(
+                tuple(c) for c in np.array(np.meshgrid(
+                    *[np.arange(s, e) for s, e in zip(box_start, box_end)]
+                )).reshape(3, -1).T
+            )
+        assert len(boxes) == 2
+        assert blocks == {(0, 0, 0), (1, 0, 0), (0, 1, 0), (0, 0, 1), (1, 0, 1)}
+
+        cv, data = file_cv
+        cache = segmentation.SegmentationCache(cv, cache_dir=str(tmp_path / "cache"))
+        cache.cutout([26, 36, 13], [42, 52, 21])
+        with mock.patch.object(cache, "_read", wraps=cache._read) as read:
+            assert np.array_equal(cache.cutout([10, 20, 5], [60, 60, 25]), data)
+        for (start, end), _ in read.call_args_list:
+            assert not (np.all(start <= [26, 36, 13]) and np.all(end >= [42, 52, 21]))
+
+    @pytest.mark.timeout(30)
+    def test_disabled(self, file_cv, tmp_path):
+        from pychunkedgraph.io.segmentation import SegmentationCache
+
+        cv, data = file_cv
+        cache = SegmentationCache(cv, cache_dir=None)
+        assert not cache.enabled
+        cutout = cache[5:70, 15:70, 0:30]
+        assert np.array_equal(cutout[5:55, 5:45, 5:25], data)
+        assert np.all(cutout[:5] == 0)
+        assert cache.stats()["disk_blocks"] == 0
+
+
+class TestL2Attributes:
+    @pytest.mark.timeout(30)
+    def test_compute(self):
+        from pychunkedgraph.backend import l2_attributes
+
+        np.random.seed(0)
+        seg = np.random.randint(0, 6, size=(7, 8, 9)).astype(np.uint64)
+        offset = np.array([10, 20, 30])
+        # Supervoxel 5 is not part of a requested level 2 node
+        sv_ids = [1, 2, 3, 4]
+        l2_ids = [100, 100, 200, 300]
+        attributes = l2_attributes.compute_l2_attributes(seg, sv_ids, l2_ids, offset)
+
+        assert sorted(attributes.keys()) == [100, 200, 300]
+        for l2_id, svs in [(100, [1, 2]), (200, [3]), (300, [4])]:
+            coords = np.array(np.where(np.isin(seg, svs))).T + offset
+            assert attributes[l2_id]["voxel_count"] == len(coords)
+            assert np.allclose(attributes[l2_id]["centroid"], np.mean(coords, axis=0))
+            assert np.array_equal(
+                attributes[l2_id]["bbox"],
+                [np.min(coords, axis=0), np.max(coords, axis=0) + 1],
+            )
+
+        # Attributes of a merged node can be derived from its parts
+        merged = l2_attributes.compute_l2_attributes(seg, [3, 4], [400, 400], offset)
+        combined = l2_attributes.combine_l2_attributes(
+            [attributes[200], attributes[300]]
+        )
+        assert combined["voxel_count"] == merged[400]["voxel_count"]
+        assert np.allclose(combined["centroid"], merged[400]["centroid"])
+        assert np.array_equal(combined["bbox"], merged[400]["bbox"])
+
+    @pytest.mark.timeout(30)
+    def test_update_on_merge(self, gen_graph):
+        """
+        Attributes of a merged level 2 node are combined from the former nodes
+        ┌─────┐      ┌─────┐
+        │  A¹ │      │  A¹ │
+        │ 1 2 │  =>  │ 1━2 │
+        │     │      │     │
+        └─────┘      └─────┘
+        """
+        from pychunkedgraph.backend import l2_attributes
+
+        cgraph = gen_graph(n_layers=3)
+
+        fake_timestamp = datetime.utcnow() - timedelta(days=10)
+        create_chunk(cgraph,
+                     vertices=[to_label(cgraph, 1, 0, 0, 0, 0), to_label(cgraph, 1, 0, 0, 0, 1)],
+                     edges=[],
+                     timestamp=fake_timestamp)
+
+        former_l2_ids = [cgraph.get_parent(to_label(cgraph, 1, 0, 0, 0, i)) for i in range(2)]
+        former_attributes = {
+            former_l2_ids[0]: {"voxel_count": 10, "centroid": np.array([1, 1, 1]),
+                               "bbox": np.array([[0, 0, 0], [3, 3, 3]])},
+            former_l2_ids[1]: {"voxel_count": 30, "centroid": np.array([5, 1, 1]),
+                               "bbox": np.array([[3, 0, 0], [8, 2, 2]])},
+        }
+        cgraph.bulk_write(l2_attributes.create_l2_attribute_rows(
+            cgraph, former_attributes, time_stamp=fake_timestamp))
+        # Edits only maintain attributes of graphs ingested with them
+        assert not l2_attributes.has_l2_attributes(cgraph)
+        l2_attributes.enable_l2_attributes(cgraph)
+        assert l2_attributes.has_l2_attributes(cgraph)
+
+        cgraph.add_edges("Jane Doe", [to_label(cgraph, 1, 0, 0, 0, 1), to_label(cgraph, 1, 0, 0, 0, 0)], affinities=0.3)
+
+        new_l2_id = cgraph.get_parent(to_label(cgraph, 1, 0, 0, 0, 0))
+        assert new_l2_id not in former_l2_ids
+        attributes = l2_attributes.read_l2_attributes(cgraph, [new_l2_id])[new_l2_id]
+        assert attributes["voxel_count"] == 40
+        assert np.allclose(attributes["centroid"], [4, 1, 1])
+        assert np.array_equal(attributes["bbox"], [[0, 0, 0], [8, 3, 3]])
+
+
+
+class TestNodeStats:
+    @pytest.mark.timeout(30)
+    def test_ingest_and_edits(self, gen_graph):
+        """
+        Stats written during ingest are maintained through a merge and a split
+        ┌─────┬─────┐      ┌─────┬─────┐
+        │  A¹ │  B¹ │      │  A¹ │  B¹ │
+        │ 1━0━━━0   │  =>  │ 1━0━━━0   │
+        │     │   1 │      │     │ ┗━1 │
+        └─────┴─────┘      └─────┴─────┘
+        """
+        from pychunkedgraph.backend import node_stats
+
+        cgraph = gen_graph(n_layers=3)
+
+        fake_timestamp = datetime.utcnow() - timedelta(days=10)
+        create_chunk(cgraph,
+                     vertices=[to_label(cgraph, 1, 0, 0, 0, 0), to_label(cgraph, 1, 0, 0, 0, 1)],
+                     edges=[(to_label(cgraph, 1, 0, 0, 0, 0), to_label(cgraph, 1, 0, 0, 0, 1), 0.5),
+                            (to_label(cgraph, 1, 0, 0, 0, 0), to_label(cgraph, 1, 1, 0, 0, 0), inf)],
+                     timestamp=fake_timestamp, compute_node_stats=True)
+        create_chunk(cgraph,
+                     vertices=[to_label(cgraph, 1, 1, 0, 0, 0), to_label(cgraph, 1, 1, 0, 0, 1)],
+                     edges=[(to_label(cgraph, 1, 1, 0, 0, 0), to_label(cgraph, 1, 0, 0, 0, 0), inf)],
+                     timestamp=fake_timestamp, compute_node_stats=True)
+        cgraph.add_layer(3, np.array([[0, 0, 0], [1, 0, 0]]), time_stamp=fake_timestamp,
+                         n_threads=1, compute_node_stats=True)
+
+        def _root_stats(sv_id):
+            root_id = cgraph.get_root(sv_id)
+            stats = node_stats.read_node_stats(cgraph, [root_id])[root_id]
+            computed = node_stats.compute_node_stats(cgraph, root_id)
+            for key in ["n_supervoxels", "n_l2"]:
+                assert stats[key] == computed[key]
+            assert np.array_equal(stats["chunk_bbox"], computed["chunk_bbox"])
+            return stats["n_supervoxels"], stats["n_l2"], stats["chunk_bbox"].tolist()
+
+        assert _root_stats(to_label(cgraph, 1, 0, 0, 0, 1)) == (3, 2, [[0, 0, 0], [2, 1, 1]])
+        assert _root_stats(to_label(cgraph, 1, 1, 0, 0, 1)) == (1, 1, [[1, 0, 0], [2, 1, 1]])
+
+        cgraph.add_edges("Jane Doe", [to_label(cgraph, 1, 1, 0, 0, 1), to_label(cgraph, 1, 1, 0, 0, 0)], affinities=0.3)
+        assert _root_stats(to_label(cgraph, 1, 0, 0, 0, 1)) == (4, 2, [[0, 0, 0], [2, 1, 1]])
+
+        cgraph.remove_edges("Jane Doe", to_label(cgraph, 1, 0, 0, 0, 0), to_label(cgraph, 1, 0, 0, 0, 1), mincut=False)
+        assert _root_stats(to_label(cgraph, 1, 0, 0, 0, 1)) == (1, 1, [[0, 0, 0], [1, 1, 1]])
+        assert _root_stats(to_label(cgraph, 1, 1, 0, 0, 1)) == (3, 2, [[0, 0, 0], [2, 1, 1]])
+
+class TestL2ShortestPath:
+    class MockChunkedGraph:
+        """ Level 2 ids are 1000 * chunk index + i, supervoxel ids are
+        10 * l2 id + j, all level 2 ids share one parent """
+
+        def __init__(self, graph, shape):
+            self.graph = graph
+            self.shape = shape
+
+        def get_chunk_coordinates(self, l2_id):
+            return np.array(np.unravel_index(int(l2_id) // 1000, self.shape))
+
+        def get_first_shared_parent(self, first_node_id, second_node_id):
+            return 1
+
+        def get_chunk_layer(self, node_id):
+            return 3
+
+        def get_parents(self, sv_ids, time_stamp=None):
+            return np.array(sv_ids, dtype=np.uint64) // np.uint64(10)
+
+        def read_cross_chunk_edges_for_nodes(self, node_ids, start_layer, end_layer):
+            return {
+                l2_id: np.array(
+                    [[l2_id * 10, n * 10 + 1] for n in self.graph.neighbors(l2_id)],
+                    dtype=np.uint64,
+                ).reshape(-1, 2)
+                for l2_id in node_ids
+                if l2_id in self.graph
+            }
+
+    @pytest.mark.timeout(30)
+    def test_bidirectional_search(self):
+        import networkx as nx
+        from pychunkedgraph.graph_analysis import analysis
+
+        np.random.seed(0)
+        shape = (8, 8, 3)
+        graph = nx.Graph()
+        for chunk_index in range(np.prod(shape)):
+            coords = np.array(np.unravel_index(chunk_index, shape))
+            for axis in range(3):
+                neighbor_coords = coords.copy()
+                neighbor_coords[axis] += 1
+                if neighbor_coords[axis] >= shape[axis]:
+                    continue
+                neighbor_index = np.ravel_multi_index(neighbor_coords, shape)
+                for i, j in np.random.randint(0, 2, size=(2, 2)):
+                    if np.random.rand() < 0.7:
+                        graph.add_edge(chunk_index * 1000 + i, neighbor_index * 1000 + j)
+        cg = self.MockChunkedGraph(graph, shape)
+
+        l2_ids = sorted(graph.nodes)
+        for _ in range(20):
+            source, target = np.random.choice(l2_ids, 2, replace=False)
+            path, stats = analysis.find_l2_shortest_path(
+                cg, source, target, batch_size=8, return_stats=True
+            )
+            if not nx.has_path(graph, source, target):
+                assert path is None
+                continue
+            assert path[0] == source and path[-1] == target
+            assert len(path) == nx.shortest_path_length(graph, source, target) + 1
+            for u, v in zip(path[:-1], path[1:]):
+                assert graph.has_edge(int(u), int(v))
+            assert stats["n_explored"] <= stats["n_read"] <= len(l2_ids)
+
+        assert list(analysis.find_l2_shortest_path(cg, l2_ids[0], l2_ids[0])) == [l2_ids[0]]
+
+
+class TestL2GraphCache:
+    class MockChunkedGraph:
+        """ Replays states of a small graph, a state is valid from its time stamp on:
+        (time stamp, supervoxel -> l2, l2 -> cross chunk edges, l2 -> root) """
+
+        n_layers = 3
+        table_id = "test"
+
+        def __init__(self, states):
+            self.states = states
+
+        def _state(self, time_stamp):
+            if time_stamp is None:
+                return self.states[-1]
+            return [s for s in self.states if s[0] <= time_stamp][-1]
+
+        def get_parents(self, sv_ids, time_stamp=None):
+            return np.array([self._state(time_stamp)[1][sv] for sv in sv_ids], dtype=np.uint64)
+
+        def get_roots(self, node_ids, time_stamp=None):
+            return np.array([self._state(time_stamp)[3][n] for n in node_ids], dtype=np.uint64)
+
+        def get_chunk_layer(self, node_id):
+            return self.n_layers
+
+        def get_children_at_layer(self, root_id, layer):
+            return np.array([l2 for state in self.states for l2, r in state[3].items()
+                             if r == root_id], dtype=np.uint64)
+
+        def read_cross_chunk_edges_for_nodes(self, node_ids, start_layer, end_layer):
+            cross_edges = {}
+            for state in self.states:
+                cross_edges.update(state[2])
+            return {n: np.array(cross_edges[n], dtype=np.uint64).reshape(-1, 2)
+                    for n in node_ids}
+
+    @pytest.mark.timeout(30)
+    def test_derive_split_and_merge(self):
+        from pychunkedgraph.backend import flatgraph_utils
+        from pychunkedgraph.graph_analysis import analysis, l2_graph_cache
+
+        t0 = datetime(2020, 1, 1)
+        t1 = t0 + timedelta(seconds=1)
+        t2 = t1 + timedelta(seconds=1)
+        # A{1, 2} - B{3, 4} - C{5}, all in root 900
+        before = (t0, {1: 100, 2: 100, 3: 200, 4: 200, 5: 300},
+                  {100: [[1, 3]], 200: [[3, 1], [4, 5]], 300: [[5, 4]]},
+                  {100: 900, 200: 900, 300: 900})
+        # Splitting 3 and 4: A - B1{3} in root 901, B2{4} - C in root 902
+        split = (t1, {1: 100, 2: 100, 3: 210, 4: 220, 5: 300},
+                 {210: [[3, 1]], 220: [[4, 5]]},
+                 {100: 901, 210: 901, 220: 902, 300: 902})
+        # Merging them again: A - B3{3, 4} - C in root 903
+        merge = (t2, {1: 100, 2: 100, 3: 230, 4: 230, 5: 300},
+                 {230: [[3, 1], [4, 5]]},
+                 {100: 903, 230: 903, 300: 903})
+        cg = self.MockChunkedGraph([before, split, merge])
+
+        former_edges = analysis.get_lvl2_edge_list(cg, 900)
+        for root_id in [901, 902]:
+            derived = l2_graph_cache.derive_lvl2_edge_list(cg, root_id, [former_edges], [3, 4], t1)
+            assert np.array_equal(derived, analysis.get_lvl2_edge_list(cg, root_id))
+
+        derived = l2_graph_cache.derive_lvl2_edge_list(
+            cg, 903, [analysis.get_lvl2_edge_list(cg, 901), analysis.get_lvl2_edge_list(cg, 902)],
+            [3, 4], t2)
+        assert np.array_equal(derived, [[100, 230], [230, 300]])
+
+
+class TestContactSites:
+    def _build_split_chain(self, gen_graph):
+        """
+        Chain of supervoxels 0━1━2━3━4━5 and a lone supervoxel 6 in chunk A,
+        split into roots A {0, 1}, B {2, 3} and C {4, 5}. Affinities double
+        as areas: A-B touch with area 3, B-C with area 5.
+        """
+        cgraph = gen_graph(n_layers=3)
+        fake_timestamp = datetime.utcnow() - timedelta(days=10)
+        sv_ids = [to_label(cgraph, 1, 0, 0, 0, i) for i in range(7)]
+        create_chunk(cgraph,
+                     vertices=sv_ids,
+                     edges=[(sv_ids[0], sv_ids[1], 1.0), (sv_ids[1], sv_ids[2], 3.0),
+                            (sv_ids[2], sv_ids[3], 1.0), (sv_ids[3], sv_ids[4], 5.0),
+                            (sv_ids[4], sv_ids[5], 1.0)],
+                     timestamp=fake_timestamp)
+        cgraph.add_layer(3, np.array([[0, 0, 0]]), time_stamp=fake_timestamp, n_threads=1)
+
+        cgraph.remove_edges("Jane Doe", sv_ids[1], sv_ids[2], mincut=False)
+        cgraph.remove_edges("Jane Doe", sv_ids[3], sv_ids[4], mincut=False)
+        return cgraph, [cgraph.get_root(sv_ids[i]) for i in [0, 2, 4, 6]]
+
+    @pytest.mark.timeout(30)
+    def test_get_contact_sites(self, gen_graph):
+        from pychunkedgraph.graph_analysis import contact_sites
+
+        cgraph, (root_a, root_b, root_c, root_lone) = self._build_split_chain(gen_graph)
+
+        sites, metadata = contact_sites.get_contact_sites(
+            cgraph, root_b, voxel_location=False)
+        assert metadata[0] == "segment id"
+        sites = dict(sites)
+        assert sorted(sites) == sorted([root_a, root_c])
+        for partner_id, area in [(root_a, 3), (root_c, 5)]:
+            assert len(sites[partner_id]) == 1
+            lower_bound, upper_bound, site_area = sites[partner_id][0]
+            assert np.array_equal(lower_bound, [0, 0, 0])
+            assert np.array_equal(upper_bound, [1, 1, 1])
+            assert site_area == area
+
+        sites, _ = contact_sites.get_contact_sites(cgraph, root_a, areas_only=True)
+        assert len(sites) == 1
+        assert sites[0][0] == root_b and sites[0][1] == [3]
+
+        assert contact_sites.get_contact_sites(cgraph, root_lone)[0] == []
+
+    @pytest.mark.timeout(30)
+    def test_get_contact_sites_multi(self, gen_graph):
+        """
+        Area and site count of every pair, in any order of the roots and any
+        batching of chunks. A and C do not touch.
+        """
+        from pychunkedgraph.graph_analysis import contact_sites
+
+        cgraph, root_ids = self._build_split_chain(gen_graph)
+        root_order = np.argsort(root_ids)
+        expected_areas = np.array([[0, 3, 0, 0], [3, 0, 5, 0], [0, 5, 0, 0], [0, 0, 0, 0]])
+        expected_areas = expected_areas[np.ix_(root_order, root_order)]
+
+        for chunk_batch_size in [1, 8]:
+            multi_root_ids, area_matrix, site_matrix = contact_sites.get_contact_sites_multi(
+                cgraph, root_ids[::-1], chunk_batch_size=chunk_batch_size, n_threads=1)
+            assert np.array_equal(multi_root_ids, np.sort(root_ids))
+            assert np.array_equal(area_matrix.toarray(), expected_areas)
+            assert np.array_equal(site_matrix.toarray(), expected_areas > 0)
+
+
+class TestFlatSegmentationExport:
+    class _Graph:
+        """ Two chunks, supervoxels 1-4 -> level 2 nodes 21, 22 -> 31 -> root 41,
+        supervoxel 5 -> 23 -> 32 -> root 42 """
+
+        def __init__(self):
+            self.chunk_size = np.array([8, 8, 4])
+            self.n_layers = 4
+            self.parents = {21: 31, 22: 31, 23: 32, 31: 41, 32: 42}
+            self.layers = {21: 2, 22: 2, 23: 2, 31: 3, 32: 3, 41: 4, 42: 4}
+            self.chunk_svs = {0: {1: 21, 2: 21}, 1: {3: 22, 4: 22, 5: 23}}
+            self.parent_reads = []
+
+        def get_chunk_layers(self, node_ids):
+            return np.array([self.layers.get(int(n), 4) for n in node_ids])
+
+        def get_parents(self, node_ids, time_stamp=None):
+            self.parent_reads.extend(int(n) for n in node_ids)
+            return np.array([self.parents[int(n)] for n in node_ids], dtype=np.uint64)
+
+        def range_read_chunk(self, layer, x, y, z, columns=None, time_stamp=None):
+            Cell = collections.namedtuple("Cell", ["value"])
+            return {np.uint64(sv): [Cell(np.uint64(l2))]
+                    for sv, l2 in self.chunk_svs.get(int(x), {}).items()}
+
+    @pytest.mark.timeout(30)
+    def test_write_block(self, tmp_path):
+        from cloudfiles import CloudFiles
+        from cloudvolume import CloudVolume
+        from pychunkedgraph.exporting import export
+
+        info = CloudVolume.create_new_info(
+            num_channels=1, layer_type="segmentation", data_type="uint64",
+            encoding="raw", resolution=[8, 8, 40], voxel_offset=[0, 0, 0],
+            chunk_size=[8, 8, 4], volume_size=[16, 8, 4])
+        from_cv = CloudVolume(f"file://{tmp_path}/ws", info=info)
+        from_cv.commit_info()
+        to_cv = CloudVolume(f"file://{tmp_path}/seg", info=info)
+        to_cv.commit_info()
+
+        ws = np.zeros((16, 8, 4), dtype=np.uint64)
+        ws[:8, :4] = 1
+        ws[:8, 4:] = 2
+        ws[8:, :3] = 3
+        ws[8:, 3:5] = 4
+        ws[8:, 5:7] = 5
+        # Unknown to the graph
+        ws[8:, 7] = 6
+        from_cv[:, :, :] = ws
+
+        cg = self._Graph()
+        progress_cf = CloudFiles(f"file://{tmp_path}/progress")
+        assert export.write_flat_segmentation_block(
+            cg, [0, 0, 0], [2, 1, 1], from_cv, to_cv, progress_cf=progress_cf)
+
+        expected = np.zeros_like(ws)
+        expected[np.isin(ws, [1, 2, 3, 4])] = 41
+        expected[ws == 5] = 42
+        assert np.array_equal(to_cv[:, :, :][..., 0], expected)
+
+        # Both chunks share the parents of 31, which is read once
+        assert cg.parent_reads.count(31) == 1
+
+        # Finished blocks are skipped
+        assert not export.write_flat_segmentation_block(
+            cg, [0, 0, 0], [2, 1, 1], from_cv, to_cv, progress_cf=progress_cf)
+
+
+class TestOperationLogExport:
+    class _Graph:
+        def __init__(self, n_operations):
+            self.log_rows = {}
+            for i in range(1, n_operations + 1):
+                self.log_rows[np.uint64(i)] = self._log_row(i)
+
+        @staticmethod
+        def _log_row(i):
+            from pytz import UTC
+
+            ol = column_keys.OperationLogs
+            row = {
+                ol.UserID: "user_%d" % (i % 2),
+                ol.RootID: np.array([100 + i], dtype=np.uint64),
+                ol.SourceID: np.array([i], dtype=np.uint64),
+                ol.SinkID: np.array([i + 1], dtype=np.uint64),
+                ol.SourceCoordinate: np.array([[i, 0, 0]], dtype=np.int64),
+                ol.SinkCoordinate: np.array([[0, i, 0]], dtype=np.int64),
+                "timestamp": UTC.localize(datetime(2020, 1, 1) + timedelta(hours=10 * i)),
+            }
+            if i % 3 == 0:
+                row[ol.RemovedEdge] = np.array([[i, i + 1]], dtype=np.uint64)
+                row[ol.BoundingBoxOffset] = np.array([240, 240, 24], dtype=np.int64)
+            else:
+                row[ol.AddedEdge] = np.array([[i, i + 1]], dtype=np.uint64)
+                row[ol.Affinity] = np.array([0.5], dtype=np.float32)
+            return row
+
+        def get_max_operation_id(self):
+            return np.int64(len(self.log_rows))
+
+        def read_log_rows(self, operation_ids):
+            return {op_id: self.log_rows[op_id] for op_id in operation_ids
+                    if op_id in self.log_rows}
+
+    @pytest.mark.timeout(30)
+    def test_incremental_export(self, tmp_path):
+        from pychunkedgraph.exporting import operation_log
+
+        path = str(tmp_path / "log")
+        cg = self._Graph(7)
+        assert operation_log.export_operation_log(cg, path, batch_size=3) == 7
+        assert operation_log.get_last_exported_operation_id(path) == 7
+
+        # Only new operations are appended
+        cg = self._Graph(12)
+        assert operation_log.export_operation_log(cg, path, batch_size=3) == 5
+
+        df = operation_log.load_operation_log(path)
+        assert df["operation_id"].tolist() == list(range(1, 13))
+        assert len(set(df["date"])) > 1
+        for _, row in df.iterrows():
+            i = row["operation_id"]
+            assert row["user_id"] == "user_%d" % (i % 2)
+            assert list(row["root_ids"]) == [100 + i]
+            assert [list(c) for c in row["source_coords"]] == [[i, 0, 0]]
+            if i % 3 == 0:
+                assert [list(e) for e in row["removed_edges"]] == [[i, i + 1]]
+                assert row["added_edges"] is None
+            else:
+                assert [list(e) for e in row["added_edges"]] == [[i, i + 1]]
+                assert np.allclose(row["affinities"], [0.5])
+
+        df = operation_log.load_operation_log(path, start_operation_id=10)
+        assert df["operation_id"].tolist() == [10, 11, 12]
+
+    @pytest.mark.timeout(30)
+    def test_operations_in_flight(self, tmp_path):
+        from pytz import UTC
+        from pychunkedgraph.exporting import operation_log
+
+        path = str(tmp_path / "log")
+        cg = self._Graph(5)
+        # Operation 3 is still running, 4 was logged just now
+        log_row_3 = cg.log_rows.pop(np.uint64(3))
+        cg.log_rows[np.uint64(4)]["timestamp"] = datetime.now(UTC)
+        assert operation_log.export_operation_log(cg, path, batch_size=2) == 2
+        assert operation_log.get_last_exported_operation_id(path) == 2
+
+        cg.log_rows[np.uint64(3)] = log_row_3
+        assert operation_log.export_operation_log(cg, path, batch_size=2) == 1
+        assert operation_log.export_operation_log(
+            cg, path, grace_period=timedelta(0)) == 2
+        df = operation_log.load_operation_log(path)
+        assert df["operation_id"].tolist() == [1, 2, 3, 4, 5]
+
+
+class TestAddLayerPreprocessing:
+    @pytest.mark.timeout(30)
+    def test_get_latest_duplicate_mask(self):
+        """ Rows 0, 1 and 3 are the same node (largest child 10), the one
+        with the highest segment id is kept """
+        from pychunkedgraph.backend import chunkedgraph_utils
+
+        mask = chunkedgraph_utils.get_latest_duplicate_mask(
+            np.array([5, 2, 7, 3], dtype=np.uint64),
+            np.array([10, 10, 20, 10], dtype=np.uint64))
+        assert np.array_equal(mask, [True, False, True, False])
+
+    @pytest.mark.timeout(30)
+    def test_resolve_cross_chunk_edges(self):
+        """ Node 100 owns supervoxels 1 and 2, 200 owns 3 and 300 owns 4.
+        Supervoxel 9 belongs to no node, its edge is dropped. """
+        from pychunkedgraph.backend import chunkedgraph_utils
+
+        node_ids = np.array([100, 100, 200, 200, 300, 300], dtype=np.uint64)
+        atomic_cross_edges = np.array(
+            [[1, 3], [2, 3], [3, 1], [3, 2], [4, 9], [4, 1]], dtype=np.uint64)
+
+        edges = chunkedgraph_utils.resolve_cross_chunk_edges(node_ids, atomic_cross_edges)
+        assert np.array_equal(edges, [[100, 200], [200, 100], [300, 100]])
+        assert chunkedgraph_utils.resolve_cross_chunk_edges(
+            np.empty(0, dtype=np.uint64), np.empty((0, 2), dtype=np.uint64)).shape == (0, 2)
+
+    @pytest.mark.timeout(30)
+    def test_chunk_ids_and_layers(self, gen_graph):
+        cgraph = gen_graph(n_layers=5)
+        node_ids = np.array([to_label(cgraph, l, x, 1, 0, 3)
+                             for l in range(1, 6) for x in range(2)], dtype=np.uint64)
+
+        assert np.array_equal(cgraph.get_chunk_layers(node_ids),
+                              [cgraph.get_chunk_layer(n) for n in node_ids])
+        assert np.array_equal(cgraph.get_chunk_ids_from_node_ids(node_ids),
+                              [cgraph.get_chunk_id(n) for n in node_ids])
+
+
+class TestAtomicRows:
+    @pytest.mark.timeout(30)
+    def test_group_edges_by_supervoxel(self):
+        """
+        Supervoxels 1, 2 and 3 are in the chunk, 8 and 9 outside of it.
+        Connected edges come first for every supervoxel, edges within the
+        chunk show up for both of their supervoxels.
+        """
+        from pychunkedgraph.backend import chunkedgraph_utils
+
+        def _edges(*edges):
+            return np.array(edges, dtype=np.uint64).reshape(-1, 2)
+
+        edge_id_dict = {
+            "in_connected": _edges([1, 2]),
+            "in_disconnected": _edges([2, 3]),
+            "between_connected": _edges([1, 9]),
+            "between_disconnected": _edges([3, 9]),
+            "cross": _edges([2, 8]),
+        }
+        edge_aff_dict = {
+            "in_connected": np.array([0.5], dtype=np.float32),
+            "in_disconnected": np.array([0.1], dtype=np.float32),
+            "between_connected": np.array([0.7], dtype=np.float32),
+            "between_disconnected": np.array([0.2], dtype=np.float32),
+        }
+        edge_area_dict = {
+            "in_connected": np.array([10], dtype=np.uint64),
+            "in_disconnected": np.array([20], dtype=np.uint64),
+            "between_connected": np.array([30], dtype=np.uint64),
+            "between_disconnected": np.array([40], dtype=np.uint64),
+        }
+
+        grouped_edges = chunkedgraph_utils.group_edges_by_supervoxel(
+            edge_id_dict, edge_aff_dict, edge_area_dict)
+
+        assert np.array_equal(grouped_edges["node_ids"], [1, 2, 3])
+        assert np.array_equal(grouped_edges["offsets"], [0, 2, 5, 7])
+        assert np.array_equal(grouped_edges["partners"], [2, 9, 1, 8, 3, 2, 9])
+        assert np.array_equal(
+            grouped_edges["affinities"],
+            np.array([0.5, 0.7, 0.5, np.inf, 0.1, 0.1, 0.2], dtype=np.float32))
+        assert np.array_equal(grouped_edges["areas"], [10, 30, 10, 1, 20, 20, 40])
+        assert np.array_equal(grouped_edges["n_connected"], [2, 2, 0])
+        assert np.array_equal(grouped_edges["parent_cross_node_ids"], [1, 2])
+        assert np.array_equal(grouped_edges["parent_cross_edges"], [[1, 9], [2, 8]])
+
+
+class TestLocalIngest:
+    @pytest.mark.timeout(30)
+    def test_parent_readiness(self):
+        from types import SimpleNamespace
+        from pychunkedgraph.ingest import local
+
+        cg_meta = SimpleNamespace(layer_count=5, graph_config=SimpleNamespace(fanout=2))
+        imanager = SimpleNamespace(cg_meta=cg_meta)
+        atomic_coords = [(x, y, 0) for x in range(4) for y in range(2)]
+
+        built = []
+        with mock.patch("pychunkedgraph.ingest.ingestion.create_atomic_chunk_helper",
+                        lambda task, im, prefetch_coords=None:
+                        built.append((2, tuple(task.coords)))), \
+                mock.patch("pychunkedgraph.ingest.ingestion.create_parent_chunk_helper",
+                           lambda task, im: built.append((task.layer, tuple(task.coords)))):
+            completed = local.ingest_local(imanager, n_workers=1,
+                                           atomic_coords=atomic_coords)
+
+        assert completed == {2: 8, 3: 2, 4: 1, 5: 1}
+        assert built[-1] == (5, (0, 0, 0))
+        # Parents are built after all of their children
+        for i, (layer, coords) in enumerate(built):
+            if layer == 2:
+                continue
+            children = [(l, c) for l, c in built
+                        if l == layer - 1 and (layer == 5 or
+                                               tuple(np.array(c) // 2) == coords)]
+            assert all(built.index(child) < i for child in children)
+            assert len(children) > 0
+
+    @pytest.mark.timeout(60)
+    def test_ingest_small_dataset(self, gen_graph, tmp_path):
+        from cloudvolume import CloudVolume
+        from pychunkedgraph.backend import ChunkedGraphMeta, DataSource, GraphConfig
+        from pychunkedgraph.backend import BigTableConfig
+        from pychunkedgraph.backend.edges import Edges, EDGE_TYPES
+        from pychunkedgraph.ingest import IngestConfig
+        from pychunkedgraph.ingest.local import ingest_local
+        from pychunkedgraph.ingest.manager import IngestionManager
+        from pychunkedgraph.io.components import put_chunk_components
+        from pychunkedgraph.io.edges import put_chunk_edges
+
+        # Two atomic chunks -> 3 layers
+        info = CloudVolume.create_new_info(
+            num_channels=1, layer_type="segmentation", data_type="uint64",
+            encoding="raw", resolution=[4, 4, 40], voxel_offset=[0, 0, 0],
+            chunk_size=[64, 64, 64], volume_size=[1024, 512, 64])
+        CloudVolume(f"file://{tmp_path}/ws", info=info).commit_info()
+
+        cgraph = gen_graph(n_layers=3)
+        a0, a1 = to_label(cgraph, 1, 0, 0, 0, 1), to_label(cgraph, 1, 0, 0, 0, 2)
+        a2 = to_label(cgraph, 1, 0, 0, 0, 3)
+        b0 = to_label(cgraph, 1, 1, 0, 0, 1)
+
+        def _edges(pairs):
+            pairs = np.array(pairs, dtype=np.uint64).reshape(-1, 2)
+            return Edges(pairs[:, 0], pairs[:, 1],
+                         affinities=np.full(len(pairs), 0.9, dtype=np.float32),
+                         areas=np.ones(len(pairs), dtype=np.uint64))
+
+        chunk_data = {
+            (0, 0, 0): ({EDGE_TYPES.in_chunk: _edges([[a0, a1], [a1, a2]]),
+                         EDGE_TYPES.between_chunk: _edges([]),
+                         EDGE_TYPES.cross_chunk: _edges([[a1, b0]])},
+                        [[a0, a1], [a2]]),
+            (1, 0, 0): ({EDGE_TYPES.in_chunk: _edges([]),
+                         EDGE_TYPES.between_chunk: _edges([]),
+                         EDGE_TYPES.cross_chunk: _edges([[b0, a1]])},
+                        [[b0]]),
+        }
+        for coords, (edges_d, components) in chunk_data.items():
+            put_chunk_edges(f"file://{tmp_path}/edges", coords, edges_d, 3)
+            put_chunk_components(f"file://{tmp_path}/components", components, coords)
+
+        data_source = DataSource(watershed=f"file://{tmp_path}/ws",
+                                 edges=f"file://{tmp_path}/edges",
+                                 components=f"file://{tmp_path}/components")
+        graph_config = GraphConfig(graph_id=cgraph.table_id,
+                                   chunk_size=np.array([512, 512, 64], dtype=int))
+        meta = ChunkedGraphMeta(data_source, graph_config, BigTableConfig())
+        assert meta.layer_count == 3
+
+        imanager = IngestionManager(IngestConfig(), meta)
+        imanager._cg = cgraph
+        completed = ingest_local(imanager, n_workers=1)
+        assert completed == {2: 2, 3: 1}
+
+        root = cgraph.get_root(a0)
+        assert cgraph.get_chunk_layer(root) == 3
+        assert cgraph.get_root(b0) == root
+        assert cgraph.get_root(a2) != root
+        assert sorted(cgraph.get_subgraph_nodes(root)) == sorted([a0, a1, b0])
+
+
+class TestIngestScheduling:
+    class _Redis:
+        """ Hashes of a redis connection """
+
+        def __init__(self):
+            self.hashes = collections.defaultdict(dict)
+
+        def hset(self, key, field=None, value=None, mapping=None):
+            mapping = dict(mapping or {})
+            if field is not None:
+                mapping[field] = value
+            n_new = sum(f not in self.hashes[key] for f in mapping)
+            self.hashes[key].update(mapping)
+            return n_new
+
+        def hdel(self, key, field):
+            return int(self.hashes[key].pop(field, None) is not None)
+
+        def hincrby(self, key, field, amount):
+            self.hashes[key][field] = int(self.hashes[key].get(field, 0)) + amount
+            return self.hashes[key][field]
+
+        def hgetall(self, key):
+            return {k.encode(): str(v).encode() for k, v in self.hashes[key].items()}
+
+        def hlen(self, key):
+            return len(self.hashes[key])
+
+        def hexists(self, key, field):
+            return field in self.hashes[key]
+
+        def set(self, key, value):
+            self.hashes[key] = value
+
+        def get(self, key):
+            value = self.hashes.get(key)
+            return None if value is None else str(value).encode()
+
+    @pytest.mark.timeout(30)
+    def test_auto_parents(self):
+        from types import SimpleNamespace
+        from pychunkedgraph.ingest import ClusterIngestConfig, cluster
+
+        cg_meta = SimpleNamespace(layer_count=4, graph_config=SimpleNamespace(fanout=2))
+        imanager = SimpleNamespace(
+            redis=self._Redis(), cg_meta=cg_meta,
+            config=SimpleNamespace(CLUSTER=ClusterIngestConfig()))
+        atomic_coords = [(x, y, 0) for x in range(4) for y in range(2)]
+        cluster._store_parent_dependencies(imanager, atomic_coords)
+        assert imanager.redis.hashes["3r"] == {"0_0_0": 4, "1_0_0": 4}
+
+        enqueued = []
+        with mock.patch.object(cluster, "enqueue_parent_task",
+                               lambda im, layer, coords: enqueued.append((layer, coords))):
+            for coords in atomic_coords[:3]:
+                cluster._post_task_completion(imanager, 2, coords)
+            # Completing a chunk again does not count
+            cluster._post_task_completion(imanager, 2, atomic_coords[0])
+            assert enqueued == []
+
+            cluster._post_task_completion(imanager, 2, atomic_coords[3])
+            assert enqueued == [(3, (0, 0, 0))]
+
+            for coords in atomic_coords[4:]:
+                cluster._post_task_completion(imanager, 2, coords)
+            cluster._post_task_completion(imanager, 3, (0, 0, 0))
+            assert enqueued[-1] == (3, (1, 0, 0))
+            cluster._post_task_completion(imanager, 3, (1, 0, 0))
+            assert enqueued[-1] == (4, (0, 0, 0))
+            cluster._post_task_completion(imanager, 4, (0, 0, 0))
+        assert len(enqueued) == 3
+
+    @pytest.mark.timeout(30)
+    def test_helper_commands_skip_auto_parents(self):
+        from types import SimpleNamespace
+        from pychunkedgraph.ingest import ClusterIngestConfig
+        from pychunkedgraph.ingest.cli import _is_queued_or_done
+
+        imanager = SimpleNamespace(
+            redis=self._Redis(),
+            config=SimpleNamespace(CLUSTER=ClusterIngestConfig(AUTO_PARENTS=True)))
+        imanager.redis.hset("3q", "0_0_0", "")
+        imanager.redis.hset("3c", "1_0_0", "")
+        assert _is_queued_or_done(imanager, 3, (0, 0, 0))
+        assert _is_queued_or_done(imanager, 3, np.array([1, 0, 0]))
+        assert not _is_queued_or_done(imanager, 3, (2, 0, 0))
+
+        imanager.config = SimpleNamespace(CLUSTER=ClusterIngestConfig(AUTO_PARENTS=False))
+        assert not _is_queued_or_done(imanager, 3, (0, 0, 0))
+
+    @pytest.mark.timeout(30)
+    def test_layer_progress(self):
+        from pychunkedgraph.ingest.cluster import compute_layer_progress
+
+        now = 10000.0
+        start_times = {"0_0_0": now - 900, "1_0_0": now - 500, "2_0_0": now - 300,
+                       "3_0_0": now - 200, "4_0_0": now - 20}
+        finish_times = {"0_0_0": now - 800, "1_0_0": now - 400, "2_0_0": now - 200}
+        progress = compute_layer_progress(start_times, finish_times, total=10, now=now,
+                                          window=600, straggler_factor=1.5)
+        assert progress["done"] == 3
+        assert progress["running"] == 2
+        # 2 chunks in the last 10 minutes
+        assert np.isclose(progress["throughput"], 2 / 10)
+        assert np.isclose(progress["eta"], 7 / (2 / 600))
+        assert progress["median_duration"] == 100
+        assert [c for c, _ in progress["stragglers"]] == ["3_0_0"]
+
+    @pytest.mark.timeout(30)
+    def test_get_layer_progress(self):
+        import time
+        from types import SimpleNamespace
+        from pychunkedgraph.ingest import ClusterIngestConfig, cluster
+
+        cg_meta = SimpleNamespace(layer_count=4, graph_config=SimpleNamespace(fanout=2),
+                                  layer_chunk_bounds={2: (8, 8, 8), 3: (4, 4, 4)})
+        imanager = SimpleNamespace(
+            redis=self._Redis(), cg_meta=cg_meta,
+            config=SimpleNamespace(CLUSTER=ClusterIngestConfig(AUTO_PARENTS=True)))
+        atomic_coords = [(x, y, 0) for x in range(4) for y in range(2)]
+        cluster._store_parent_dependencies(imanager, atomic_coords)
+
+        now = time.time()
+        with mock.patch.object(cluster, "enqueue_parent_task", lambda *args: None):
+            for coords in atomic_coords[:6]:
+                cluster._pre_task_start(imanager, 2, coords)
+                cluster._post_task_completion(imanager, 2, coords)
+        cluster._pre_task_start(imanager, 2, atomic_coords[6])
+
+        # The countdown of the parents does not change the total
+        progress = cluster.get_layer_progress(imanager, 2, now=now + 1)
+        assert progress["total"] == 8
+        assert progress["done"] == 6
+        assert progress["running"] == 1
+        assert 0 < progress["eta"]
+        assert cluster.get_layer_progress(imanager, 3, now=now + 1)["total"] == 2
+        assert cluster.get_layer_progress(imanager, 4, now=now + 1)["total"] == 1
+
+
+class TestEdgesCache:
+    @pytest.mark.timeout(30)
+    def test_prefetch_and_disk_cache(self, tmp_path):
+        from pychunkedgraph.backend.edges import Edges, EDGE_TYPES
+        from pychunkedgraph.io.edges import get_chunk_edges, put_chunk_edges
+        from pychunkedgraph.io.edges_cache import EdgesCache
+
+        edges_dir = f"file://{tmp_path}/edges"
+        for x in range(3):
+            pairs = np.random.randint(1, 1000, (10 * (x + 1), 2)).astype(np.uint64)
+            edges = Edges(pairs[:, 0], pairs[:, 1],
+                          affinities=np.random.rand(len(pairs)).astype(np.float32),
+                          areas=np.ones(len(pairs), dtype=np.uint64))
+            put_chunk_edges(edges_dir, (x, 0, 0), {EDGE_TYPES.in_chunk: edges,
+                                                   EDGE_TYPES.between_chunk: edges,
+                                                   EDGE_TYPES.cross_chunk: edges}, 3)
+        coords = [(0, 0, 0), (1, 0, 0), (2, 0, 0), (3, 0, 0)]  # last is empty
+
+        def _assert_equal(edges_d, expected_d):
+            for edge_type in EDGE_TYPES:
+                assert np.array_equal(edges_d[edge_type].get_pairs(),
+                                      expected_d[edge_type].get_pairs())
+                assert np.array_equal(edges_d[edge_type].affinities,
+                                      expected_d[edge_type].affinities)
+
+        cache = EdgesCache(edges_dir, cache_dir=str(tmp_path / "cache"))
+        cache.prefetch(coords[1:3])
+        _assert_equal(cache.get_chunk_edges(coords), get_chunk_edges(edges_dir, coords))
+        stats = cache.stats()
+        assert stats["prefetch_hits"] == 2
+        assert stats["downloads"] == 4
+        assert stats["disk_files"] == 4
+
+        # Another process sharing the directory
+        cache = EdgesCache(edges_dir, cache_dir=str(tmp_path / "cache"))
+        cache.prefetch(coords)
+        _assert_equal(cache.get_chunk_edges(coords[:2]),
+                      get_chunk_edges(edges_dir, coords[:2]))
+        assert cache.stats()["downloads"] == 0
+        assert cache.stats()["hit_rate"] == 1.0
+
+        # Least recently used files are deleted
+        cache = EdgesCache(edges_dir, cache_dir=str(tmp_path / "small"), max_disk_bytes=1)
+        cache.get_chunk_edges(coords[:2])
+        assert cache.stats()["disk_files"] == 1
+        assert cache.stats()["evictions"] == 1
+
+
+class TestComponentsDeserialization:
+    @pytest.mark.timeout(30)
+    def test_deserialize(self):
+        from pychunkedgraph.io.components import components_to_mapping
+        from pychunkedgraph.io.components import deserialize, serialize
+
+        # small supervoxel ids look like component sizes
+        components = [np.array([7, 3], dtype=np.uint64),
+                      np.array([5], dtype=np.uint64),
+                      np.array([1, 0, 2], dtype=np.uint64)]
+        supervoxel_ids, component_ids = deserialize(serialize(components))
+        assert np.array_equal(supervoxel_ids, [7, 3, 5, 1, 0, 2])
+        assert np.array_equal(component_ids, [0, 0, 1, 2, 2, 2])
+        assert components_to_mapping(supervoxel_ids, component_ids) == \
+            {7: 0, 3: 0, 5: 1, 1: 2, 0: 2, 2: 2}
+
+    @pytest.mark.timeout(30)
+    def test_define_active_edges(self):
+        from pychunkedgraph.backend.edges import Edges
+        from pychunkedgraph.ingest.ran_agglomeration import define_active_edges
+
+        edges = {"in": Edges(np.array([1, 2, 3, 5], dtype=np.uint64),
+                             np.array([2, 3, 4, 6], dtype=np.uint64))}
+        mapping = (np.array([4, 1, 2, 3], dtype=np.uint64), np.array([1, 0, 0, 1]))
+        active, isolated = define_active_edges(edges, mapping)
+        assert active["in"].tolist() == [True, False, True, False]
+        assert isolated.tolist() == [5, 6]
+
+        active_d, isolated_d = define_active_edges(edges, {4: 1, 1: 0, 2: 0, 3: 1})
+        assert np.array_equal(active_d["in"], active["in"])
+        assert np.array_equal(isolated_d, isolated)
+
+
+class TestEdgesBuilder:
+    @pytest.mark.timeout(30)
+    def test_build(self):
+        from pychunkedgraph.backend.edges import DEFAULT_AFFINITY, Edges, EdgesBuilder
+        from pychunkedgraph.backend.utils import basetypes
+
+        ids = np.arange(10, dtype=np.uint64)
+        parts = [Edges(ids[:4], ids[1:5]),
+                 Edges(ids[4:6], ids[5:7], affinities=np.array([0.5, 0.7]),
+                       areas=np.array([3, 4])),
+                 Edges([], []),
+                 Edges(ids[6:9], ids[7:10], areas=np.array([5, 6, 7]))]
+
+        edges = EdgesBuilder(parts).build()
+        assert len(edges) == 9
+        assert np.array_equal(edges.get_pairs()[:, 0], np.concatenate([ids[:6], ids[6:9]]))
+        assert edges.affinities.dtype == basetypes.EDGE_AFFINITY
+        assert edges.areas.dtype == basetypes.EDGE_AREA
+        assert np.allclose(edges.affinities[4:6], [0.5, 0.7])
+        assert np.all(edges.affinities[6:] == np.float32(DEFAULT_AFFINITY))
+        assert edges.areas.tolist() == [0, 0, 0, 0, 3, 4, 5, 6, 7]
+
+        added = parts[0] + parts[1]
+        added += parts[3]
+        assert np.array_equal(added.get_pairs(), edges.get_pairs())
+        assert np.array_equal(added.affinities, edges.affinities)
+        assert np.array_equal(added.areas, edges.areas)
+
+        # Default values are only created when they are read
+        edges = EdgesBuilder([parts[0], parts[0]]).build()
+        assert edges._affinities is None and edges._areas is None
+        assert edges.affinities.dtype == basetypes.EDGE_AFFINITY
+
+
+class TestBulkMerge:
+    @pytest.mark.timeout(30)
+    def test_bulk_merge(self, gen_graph):
+        """
+        Edges 1-2, 2-3 and 4-5 between isolated supervoxels of one chunk
+        Expected: one operation for 1, 2, 3 and one for 4, 5, or an error
+        for an invalid group without affecting the others
+        """
+        cgraph = gen_graph(n_layers=2)
+
+        fake_timestamp = datetime.utcnow() - timedelta(days=10)
+        sv_ids = [to_label(cgraph, 1, 0, 0, 0, i) for i in range(7)]
+        create_chunk(cgraph, vertices=sv_ids, edges=[], timestamp=fake_timestamp)
+
+        edges = np.array([[sv_ids[1], sv_ids[2]], [sv_ids[4], sv_ids[5]],
+                          [sv_ids[3], sv_ids[2]], [sv_ids[6], sv_ids[6]]], dtype=np.uint64)
+        results = cgraph.add_edges_bulk("Jane Doe", edges, affinities=[0.1, 0.2, 0.3, 0.4])
+        results = sorted(results, key=lambda r: r.edge_indices[0])
+
+        assert [r.edge_indices.tolist() for r in results] == [[0, 2], [1], [3]]
+        assert results[2].result is None and "self-loop" in results[2].error
+        assert results[0].result.operation_id != results[1].result.operation_id
+        root_a = cgraph.get_root(sv_ids[1])
+        assert cgraph.get_root(sv_ids[2]) == cgraph.get_root(sv_ids[3]) == root_a
+        assert cgraph.get_root(sv_ids[4]) == cgraph.get_root(sv_ids[5]) != root_a
+        assert cgraph.get_root(sv_ids[0]) != root_a
+
+        # All edges of a group are in one log row and undone together
+        log_row = cgraph.read_log_row(results[0].result.operation_id)[0]
+        assert len(log_row[column_keys.OperationLogs.AddedEdge]) == 2
+        cgraph.undo_operation("Jane Doe", results[0].result.operation_id)
+        assert len({cgraph.get_root(sv_ids[i]) for i in [1, 2, 3]}) == 3
+        assert cgraph.get_root(sv_ids[4]) == cgraph.get_root(sv_ids[5])
+
+
+class TestEditHelperReads:
+    class FakeGraph:
+        """ Three layers below the root, node id = layer << 56 | index,
+        every node has `fanout` children """
+
+        n_layers = 4
+
+        def __init__(self, fanout=3):
+            self.reads = collections.Counter()
+            self.parents = {}
+            self.children = collections.defaultdict(list)
+            for layer in range(1, self.n_layers):
+                n_nodes = fanout ** (self.n_layers - layer)
+                for i in range(n_nodes):
+                    node_id = self._node_id(layer, i)
+                    parent_id = self._node_id(layer + 1, i // fanout)
+                    self.parents[node_id] = parent_id
+                    self.children[parent_id].append(node_id)
+
+        def _node_id(self, layer, i):
+            return np.uint64(layer << 56 | i)
+
+        def get_chunk_layer(self, node_id):
+            return int(node_id) >> 56
+
+        def get_chunk_layers(self, node_ids):
+            return np.array([self.get_chunk_layer(n) for n in node_ids], dtype=int)
+
+        def get_parents(self, node_ids):
+            self.reads["parents"] += 1
+            return np.array([self.parents.get(n, 0) for n in node_ids], dtype=np.uint64)
+
+        def get_children(self, node_ids, flatten=False):
+            self.reads["children"] += 1
+            return {n: np.array(self.children[n], dtype=np.uint64) for n in node_ids}
+
+        def read_cross_chunk_edges_for_nodes(self, node_ids, flatten=True):
+            self.reads["cross_edges"] += 1
+            return {n: {l: np.array([[n, n]], dtype=np.uint64)
+                        for l in range(self.get_chunk_layer(n), self.n_layers)}
+                    for n in node_ids}
+
+    @pytest.mark.timeout(30)
+    def test_bulk_family_read(self):
+        from pychunkedgraph.backend.chunkedgraph_edits import EditHelper
+
+        cg = self.FakeGraph()
+        lvl2_ids = [cg._node_id(2, i) for i in [0, 1, 4, 8]]
+        eh = EditHelper(cg, {cg._node_id(2, 100): lvl2_ids}, {})
+        eh.bulk_family_read()
+
+        # One parent read per layer, one children and cross edge read
+        assert cg.reads == {"parents": 3, "children": 1, "cross_edges": 1}
+        root_id = cg._node_id(4, 0)
+        for lvl2_id in lvl2_ids:
+            assert eh.get_root(lvl2_id) == root_id
+            assert 3 in eh.read_cross_chunk_edges(lvl2_id)
+        assert eh.read_cross_chunk_edges(cg._node_id(3, 2))[3].tolist() == \
+            [[cg._node_id(3, 2)] * 2]
+        assert cg.reads == {"parents": 3, "children": 1, "cross_edges": 1}
+
+        # Descendants are read level by level, the start nodes are at different layers
+        eh.bulk_layer_children_read([root_id, cg._node_id(3, 1)], 1)
+        assert cg.reads["children"] == 3
+        assert len(eh.get_layer_children(root_id, 1)) == 27
+        assert cg.reads["children"] == 3
+
+    @pytest.mark.timeout(30)
+    def test_bulk_reads_on_graph(self, gen_graph):
+        """
+        The cached bulk reads return what the single reads of the graph
+        return, and edits through them keep the hierarchy intact.
+        ┌─────┬─────┬─────┐      ┌─────┬─────┬─────┐
+        │  A¹ │  B¹ │  C¹ │      │  A¹ │  B¹ │  C¹ │
+        │ 0━1━┿━━0  │  0  │  =>  │ 0━1━┿━━0  │  0  │
+        │     │     │     │      │ ┗━━━┿━━━━━┿━━┛  │
+        └─────┴─────┴─────┘      └─────┴─────┴─────┘
+        """
+        from pychunkedgraph.backend.chunkedgraph_edits import EditHelper
+
+        cgraph = gen_graph(n_layers=5)
+        fake_timestamp = datetime.utcnow() - timedelta(days=10)
+        a0, a1 = to_label(cgraph, 1, 0, 0, 0, 0), to_label(cgraph, 1, 0, 0, 0, 1)
+        b0 = to_label(cgraph, 1, 1, 0, 0, 0)
+        c0 = to_label(cgraph, 1, 2, 0, 0, 0)
+        create_chunk(cgraph,
+                     vertices=[a0, a1],
+                     edges=[(a0, a1, 0.5), (a1, b0, 0.5)],
+                     timestamp=fake_timestamp)
+        create_chunk(cgraph,
+                     vertices=[b0],
+                     edges=[(b0, a1, 0.5)],
+                     timestamp=fake_timestamp)
+        create_chunk(cgraph,
+                     vertices=[c0],
+                     edges=[],
+                     timestamp=fake_timestamp)
+        cgraph.add_layer(3, np.array([[0, 0, 0], [1, 0, 0]]), time_stamp=fake_timestamp, n_threads=1)
+        cgraph.add_layer(3, np.array([[2, 0, 0]]), time_stamp=fake_timestamp, n_threads=1)
+        cgraph.add_layer(4, np.array([[0, 0, 0], [1, 0, 0]]), time_stamp=fake_timestamp, n_threads=1)
+        cgraph.add_layer(5, np.array([[0, 0, 0]]), time_stamp=fake_timestamp, n_threads=1)
+
+        lvl2_ids = [cgraph.get_parent(a0), cgraph.get_parent(c0)]
+        eh = EditHelper(cgraph, {np.uint64(0): lvl2_ids}, {})
+        eh.bulk_family_read()
+
+        ancestor_ids = []
+        for node_id in lvl2_ids:
+            while node_id is not None:
+                ancestor_ids.append(node_id)
+                node_id = cgraph.get_parent(node_id)
+
+        for node_id in ancestor_ids:
+            assert eh.get_parent(node_id) == cgraph.get_parent(node_id)
+            if cgraph.get_chunk_layer(node_id) == cgraph.n_layers:
+                continue
+            assert np.array_equal(eh.get_children(eh.get_parent(node_id)),
+                                  cgraph.get_children(cgraph.get_parent(node_id)))
+            cross_edges = eh.read_cross_chunk_edges(node_id)
+            expected_cross_edges = cgraph.read_cross_chunk_edges(node_id)
+            assert sorted(cross_edges) == sorted(expected_cross_edges)
+            for layer in cross_edges:
+                assert np.array_equal(cross_edges[layer], expected_cross_edges[layer])
+
+        # Merge across layer 4, then split again
+        result = cgraph.add_edges("Jane Doe", [c0, a0], affinities=0.3)
+        assert len(result.new_root_ids) == 1
+        assert cgraph.get_root(a0) == cgraph.get_root(c0) == result.new_root_ids[0]
+        assert np.array_equal(np.unique(cgraph.get_subgraph_nodes(result.new_root_ids[0])),
+                              np.sort([a0, a1, b0, c0]))
+        assert [c0, a0] in cgraph.read_cross_chunk_edges(cgraph.get_parent(c0))[4].tolist()
+
+        result = cgraph.remove_edges("Jane Doe", c0, a0, mincut=False)
+        assert len(result.new_root_ids) == 2
+        assert cgraph.get_root(a0) == cgraph.get_root(b0) != cgraph.get_root(c0)
+        assert np.array_equal(np.unique(cgraph.get_subgraph_nodes(cgraph.get_root(a0))),
+                              np.sort([a0, a1, b0]))
+        assert len(cgraph.read_cross_chunk_edges(cgraph.get_parent(c0))[4]) == 0
+
+
+class TestCrossChunkEdgeAccumulator:
+    @pytest.mark.timeout(30)
+    def test_build(self):
+        """ [1, 5] is in two dictionaries, layer 4 only in one of them """
+        from pychunkedgraph.backend.chunkedgraph_utils import (
+            CrossChunkEdgeAccumulator, combine_cross_chunk_edge_dicts)
+
+        def _edges(*edges):
+            return np.array(edges, dtype=np.uint64).reshape(-1, 2)
+
+        cross_edge_dicts = [{2: _edges([1, 6], [1, 5]), 3: _edges([3, 4])},
+                            {2: _edges([1, 5]), 4: _edges([2, 9])},
+                            {3: _edges([1, 7])}]
+
+        for start_layer in [2, 3]:
+            accumulator = CrossChunkEdgeAccumulator(start_layer=start_layer)
+            for cross_edge_dict in cross_edge_dicts:
+                accumulator.add(cross_edge_dict)
+            combined = accumulator.build()
+
+            assert sorted(combined) == list(range(start_layer, 5))
+            if start_layer == 2:
+                assert np.array_equal(combined[2], [[1, 5], [1, 6]])
+            assert np.array_equal(combined[3], [[1, 7], [3, 4]])
+            assert np.array_equal(combined[4], [[2, 9]])
+
+        combined = combine_cross_chunk_edge_dicts(cross_edge_dicts[0], cross_edge_dicts[1])
+        assert sorted(combined) == [2, 3, 4]
+        assert np.array_equal(combined[2], [[1, 5], [1, 6]])
+        assert CrossChunkEdgeAccumulator().build() == {}
+
+    @pytest.mark.timeout(30)
+    def test_unresolved_cross_edges(self):
+        """ Node 10 owns supervoxel 1 and its partner 20 owns 2. Supervoxel 9
+        belongs to neither, its edge is an error instead of being dropped. """
+        from pychunkedgraph.backend import chunkedgraph_edits
+
+        cross_edges = {10: {3: np.array([[1, 2]], dtype=np.uint64)},
+                       20: {3: np.array([[2, 1], [2, 9]], dtype=np.uint64)}}
+        eh = mock.Mock()
+        eh.old_node_ids = np.array([30], dtype=np.uint64)
+        eh.read_cross_chunk_edges = lambda node_id: cross_edges[node_id]
+
+        with mock.patch.object(chunkedgraph_edits, "old_parent_childrens",
+                               return_value=(None, None, [np.uint64(20)])):
+            with pytest.raises(AssertionError):
+                chunkedgraph_edits.compute_cross_chunk_connected_components(
+                    eh, [np.uint64(10)], 3)
+
+            cross_edges[20][3] = cross_edges[20][3][:1]
+            ccs, unique_graph_ids = \
+                chunkedgraph_edits.compute_cross_chunk_connected_components(
+                    eh, [np.uint64(10)], 3)
+            assert np.array_equal(unique_graph_ids, [10, 20])
+            assert len(ccs) == 1 and len(ccs[0]) == 2